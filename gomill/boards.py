@@ -30,6 +30,8 @@ class _Region(object):
         self.points = set()
         self.neighbouring_colours = set()
 
+_unpack_map = {'.' : None, 'b' : 'b', 'w' : 'w'}
+
 class Board(object):
     """A legal Go position.
 
@@ -58,6 +60,35 @@ class Board(object):
         b._is_empty = self._is_empty
         return b
 
+    def pack(self):
+        """Return a compact representation of the position.
+
+        Returns an 8-bit string, suitable for from_packed().
+
+        """
+        return "".join([colour or "." for row in self.board for colour in row])
+
+    @classmethod
+    def from_packed(cls, side, s):
+        """Alternative constructor: create a Board from pack() output.
+
+        side -- board size (int)
+        s    -- string returned by pack() for a board of this size
+
+        Raises ValueError if the string isn't valid for the board size.
+
+        """
+        b = cls(side)
+        if len(s) != side * side:
+            raise ValueError("wrong length for packed board")
+        try:
+            b.board = [map(_unpack_map.__getitem__, s[i:i+side])
+                       for i in xrange(0, side*side, side)]
+        except KeyError:
+            raise ValueError("invalid packed board")
+        b._is_empty = (s.count(".") == side * side)
+        return b
+
     def _make_group(self, row, col, colour):
         points = set()
         is_surrounded = True
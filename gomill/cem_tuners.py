@@ -191,6 +191,9 @@ class Cem_tuner(Competition):
 
         competitions.validate_handicap(
             self.handicap, self.handicap_style, self.board_size)
+        self.time_settings = competitions.make_time_settings(
+            self.main_time, self.byo_yomi_time, self.byo_yomi_style,
+            self.byo_yomi_stones, self.byo_yomi_periods)
 
         if not 0.0 < self.elite_proportion < 1.0:
             raise ControlFileError("elite_proportion out of range (0.0 to 1.0)")
@@ -431,6 +434,7 @@ class Cem_tuner(Competition):
         job.move_limit = self.move_limit
         job.handicap = self.handicap
         job.handicap_is_free = (self.handicap_style == 'free')
+        job.time_settings = self.time_settings
         job.use_internal_scorer = (self.scorer == 'internal')
         job.internal_scorer_handicap_compensation = \
             self.internal_scorer_handicap_compensation
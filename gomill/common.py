@@ -37,6 +37,16 @@ def colour_name(colour):
 
 column_letters = "ABCDEFGHJKLMNOPQRSTUVWXYZ"
 
+def _make_vertex_strings():
+    result = {None : "pass"}
+    for row in xrange(25):
+        for col in xrange(25):
+            result[row, col] = column_letters[col] + str(row+1)
+    return result
+
+# Map (row, col) or None -> vertex string, for all points on the largest board
+_vertex_strings = _make_vertex_strings()
+
 def format_vertex(move):
     """Return coordinates as a string like 'A1', or 'pass'.
 
@@ -45,6 +55,14 @@ def format_vertex(move):
     The result is suitable for use directly in GTP responses.
 
     """
+    try:
+        return _vertex_strings[move]
+    except (KeyError, TypeError):
+        pass
+    return _format_vertex(move)
+
+def _format_vertex(move):
+    """Implementation of format_vertex() without the lookup table."""
     if move is None:
         return "pass"
     row, col = move
@@ -56,6 +74,26 @@ def format_vertex_list(moves):
     """Return a list of coordinates as a string like 'A1,B2'."""
     return ",".join(map(format_vertex, moves))
 
+# Map board size -> dict vertex string -> (row, col) or None
+#  (the strings are the 'standard' forms, in upper and lower case)
+_vertex_tables = {}
+
+def _get_vertex_table(board_size):
+    try:
+        return _vertex_tables[board_size]
+    except KeyError:
+        pass
+    if not 0 < board_size <= 25:
+        return None
+    table = {"pass" : None, "PASS" : None}
+    for row in xrange(board_size):
+        for col in xrange(board_size):
+            vertex = _vertex_strings[row, col]
+            table[vertex] = (row, col)
+            table[vertex.lower()] = (row, col)
+    _vertex_tables[board_size] = table
+    return table
+
 def move_from_vertex(vertex, board_size):
     """Interpret a string representing a vertex, as specified by GTP.
 
@@ -65,6 +103,16 @@ def move_from_vertex(vertex, board_size):
     vertex specification for a board of size 'board_size'.
 
     """
+    table = _get_vertex_table(board_size)
+    if table is not None:
+        try:
+            return table[vertex]
+        except (KeyError, TypeError):
+            pass
+    return _move_from_vertex(vertex, board_size)
+
+def _move_from_vertex(vertex, board_size):
+    """Implementation of move_from_vertex() without the lookup table."""
     if not 0 < board_size <= 25:
         raise ValueError("board_size out of range")
     try:
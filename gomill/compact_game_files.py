@@ -0,0 +1,452 @@
+"""Flat binary files of Compact_games, and parallel ingestion of SGF files.
+
+A compact game file holds the setup stones, main-sequence moves and basic
+game information (see sgf_moves.Compact_game) for any number of games. It is
+much quicker to read than the SGF files it was made from.
+
+File format (all integers are little-endian):
+  header: 8-byte magic string, format version (uint32)
+  then any number of chunks, each holding games from one source file (a
+  source file's games may be divided between several chunks):
+    source pathname length (uint32), game count (uint32), data length (uint32)
+    source pathname
+    game records
+
+Each game record is:
+  game number within the source (uint32), board size (uint8),
+  handicap (int32, 0 if none), komi (float64),
+  lengths (uint32 each) of: result, black setup, white setup, moves
+  result (8-bit string)
+  black setup point indices (int16 each)
+  white setup point indices (int16 each)
+  move colours ('b' or 'w', one byte each)
+  move point indices (int16 each)
+
+ingest_sgf_files() builds a compact game file from SGF files, parsing them in
+parallel worker processes (if multiprocessing is available).
+
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from gomill import job_manager
+from gomill import sgf_grammar
+from gomill import sgf_moves
+
+
+_magic = "GMLGAMES"
+_format_version = 1
+_header_struct = struct.Struct("<8sI")
+_chunk_struct = struct.Struct("<III")
+_record_struct = struct.Struct("<IBidIIII")
+
+def _array_to_string(a):
+    if sys.byteorder == 'big':
+        a = array('h', a)
+        a.byteswap()
+    return a.tostring()
+
+def _array_from_string(s):
+    a = array('h')
+    a.fromstring(s)
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a
+
+def pack_games(games):
+    """Serialise a sequence of games as game records.
+
+    games -- iterable of pairs (game number, sgf_moves.Compact_game)
+
+    Returns an 8-bit string.
+
+    """
+    pieces = []
+    for game_number, game in games:
+        result = game.result or ""
+        pieces.append(_record_struct.pack(
+            game_number, game.size, game.handicap or 0, game.komi,
+            len(result), len(game.black_setup), len(game.white_setup),
+            len(game.move_colours)))
+        pieces.append(result)
+        pieces.append(_array_to_string(game.black_setup))
+        pieces.append(_array_to_string(game.white_setup))
+        pieces.append(game.move_colours)
+        pieces.append(_array_to_string(game.move_points))
+    return "".join(pieces)
+
+def unpack_games(s):
+    """Read game records produced by pack_games().
+
+    Returns a list of pairs (game number, sgf_moves.Compact_game)
+
+    Raises ValueError if the data is malformed.
+
+    """
+    result = []
+    i = 0
+    record_size = _record_struct.size
+    try:
+        while i < len(s):
+            (game_number, size, handicap, komi, result_length,
+             black_count, white_count, move_count) = _record_struct.unpack(
+                s[i : i+record_size])
+            i += record_size
+            game = sgf_moves.Compact_game()
+            game.size = size
+            game.handicap = handicap or None
+            game.komi = komi
+            if result_length:
+                game.result = s[i : i+result_length]
+            else:
+                game.result = None
+            i += result_length
+            game.black_setup = _array_from_string(s[i : i+2*black_count])
+            i += 2*black_count
+            game.white_setup = _array_from_string(s[i : i+2*white_count])
+            i += 2*white_count
+            game.move_colours = s[i : i+move_count]
+            i += move_count
+            game.move_points = _array_from_string(s[i : i+2*move_count])
+            i += 2*move_count
+            if len(game.move_points) != move_count:
+                raise ValueError
+            result.append((game_number, game))
+    except (struct.error, ValueError):
+        raise ValueError("malformed game record")
+    return result
+
+
+class Compact_game_file_writer(object):
+    """Write a compact game file.
+
+    Instantiate with the pathname of the file to create (any existing file is
+    replaced).
+
+    Raises EnvironmentError if the file can't be written.
+
+    """
+    def __init__(self, pathname):
+        self.file = open(pathname, "wb")
+        self.file.write(_header_struct.pack(_magic, _format_version))
+
+    def write_chunk(self, source, game_count, data):
+        """Write a chunk of games.
+
+        source     -- 8-bit string (normally the SGF file's pathname)
+        game_count -- int
+        data       -- string from pack_games()
+
+        """
+        self.file.write(_chunk_struct.pack(len(source), game_count, len(data)))
+        self.file.write(source)
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+def read_compact_game_file(pathname):
+    """Read the games from a compact game file.
+
+    Returns an iterator yielding tuples
+      (source, game number, sgf_moves.Compact_game)
+
+    The file is read one chunk at a time.
+
+    Raises EnvironmentError if the file can't be read.
+
+    Raises ValueError if the file isn't a compact game file, or is malformed.
+
+    """
+    f = open(pathname, "rb")
+    try:
+        header = f.read(_header_struct.size)
+        try:
+            magic, format_version = _header_struct.unpack(header)
+        except struct.error:
+            magic = None
+        if magic != _magic or format_version != _format_version:
+            raise ValueError("not a compact game file: %s" % pathname)
+        while True:
+            s = f.read(_chunk_struct.size)
+            if not s:
+                break
+            try:
+                source_length, game_count, data_length = \
+                    _chunk_struct.unpack(s)
+            except struct.error:
+                raise ValueError("truncated compact game file")
+            source = f.read(source_length)
+            data = f.read(data_length)
+            if len(data) != data_length:
+                raise ValueError("truncated compact game file")
+            games = unpack_games(data)
+            if len(games) != game_count:
+                raise ValueError("malformed game record")
+            for game_number, game in games:
+                yield source, game_number, game
+    finally:
+        f.close()
+
+
+def find_sgf_files(pathnames):
+    """Expand directories in a list of pathnames.
+
+    Returns a list of pathnames: directories are replaced by all files with
+    the extension '.sgf' (ignoring case) in the directory tree, in sorted
+    order. Other pathnames are left in place.
+
+    """
+    result = []
+    for pathname in pathnames:
+        if not os.path.isdir(pathname):
+            result.append(pathname)
+            continue
+        for dirpath, dirnames, filenames in os.walk(pathname):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.lower().endswith(".sgf"):
+                    result.append(os.path.join(dirpath, filename))
+    return result
+
+# Files larger than this are divided into several pieces by split_sgf_files()
+_default_range_size = 1 << 24
+
+def _map_file(pathname):
+    """Memory-map a file for reading.
+
+    Returns an mmap, or an empty string if the file is empty.
+
+    """
+    f = open(pathname, "rb")
+    try:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return ""
+        return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+
+def split_sgf_files(pathnames, range_size=None):
+    """Divide SGF files into pieces which can be read separately.
+
+    pathnames  -- list of SGF file pathnames
+    range_size -- int (default 16MB)
+
+    Returns an iterator yielding tuples
+      (pathname, start offset, end offset, first game number)
+    suitable for passing to read_sgf_file_games(). The end offset is None for
+    a piece which runs to the end of the file.
+
+    Files no larger than range_size bytes (and files which can't be read) are
+    yielded whole, as (pathname, 0, None, 0), without being read. Larger files
+    are divided at game boundaries into pieces of at most range_size bytes
+    (unless a single game is larger than that). The boundaries are found
+    using sgf_grammar.iter_game_ranges(), which is much faster than parsing
+    the games.
+
+    The pieces are produced lazily, so a caller handing them out to worker
+    processes can start the workers before a large file has been scanned.
+
+    """
+    if range_size is None:
+        range_size = _default_range_size
+    for pathname in pathnames:
+        try:
+            size = os.stat(pathname).st_size
+            if size > range_size:
+                data = _map_file(pathname)
+        except EnvironmentError:
+            size = 0
+        if size <= range_size:
+            yield pathname, 0, None, 0
+            continue
+        try:
+            piece_start = 0
+            piece_first_game = 0
+            game_number = 0
+            try:
+                for start, end in sgf_grammar.iter_game_ranges(data):
+                    if (end - piece_start > range_size and
+                        game_number > piece_first_game):
+                        yield pathname, piece_start, start, piece_first_game
+                        piece_start = start
+                        piece_first_game = game_number
+                    game_number += 1
+            except ValueError:
+                # The final piece includes the incomplete game, so reading
+                # it will report the error.
+                pass
+            yield pathname, piece_start, None, piece_first_game
+        finally:
+            data.close()
+
+def read_sgf_file_games(pathname, reader, start_offset=0, end_offset=None,
+                        first_game_number=0):
+    """Apply a function to each game in an SGF file.
+
+    pathname          -- SGF file (which may contain a collection)
+    reader            -- function taking a game's SGF data (8-bit string)
+    start_offset      -- byte offset to start reading from (default 0)
+    end_offset        -- byte offset to stop reading at (default None)
+    first_game_number -- number of the first game read (default 0)
+
+    Returns a pair (results, errors)
+      results -- list of tuples (game number, start, end, value)
+      errors  -- list of strings
+
+    Game numbers count from 0 within the file (that is, from
+    first_game_number if start_offset is used to skip earlier games). start
+    and end are the byte offsets of the game's data in the file, and value is
+    the value returned by 'reader'.
+
+    If end_offset is not None, games starting at or after end_offset are
+    ignored. (split_sgf_files() provides suitable offsets and game numbers.)
+
+    The file is memory-mapped, and each game is passed to 'reader' once; the
+    games' boundaries are found using sgf_grammar.iter_game_ranges(), rather
+    than by parsing them.
+
+    If 'reader' raises ValueError, the game is skipped and reported in the
+    error messages. If the file ends in the middle of a game, that's reported
+    as a parse error (and the games preceding it are kept). If start_offset
+    is 0 and no games are found, that's reported as an error too.
+
+    Raises EnvironmentError if the file can't be read.
+
+    """
+    results = []
+    errors = []
+    data = _map_file(pathname)
+    game_number = first_game_number
+    try:
+        try:
+            for start, end in sgf_grammar.iter_game_ranges(data, start_offset):
+                if end_offset is not None and start >= end_offset:
+                    break
+                try:
+                    value = reader(data[start:end])
+                except ValueError, e:
+                    errors.append("game %d: %s" % (
+                        game_number, str(e) or "malformed property value"))
+                else:
+                    results.append((game_number, start, end, value))
+                game_number += 1
+        except ValueError, e:
+            # Games before the incomplete one have been kept
+            errors.append("error parsing game %d: %s" % (game_number, e))
+        else:
+            if game_number == 0 and start_offset == 0:
+                errors.append("no SGF data found")
+    finally:
+        if not isinstance(data, str):
+            data.close()
+    return results, errors
+
+class _Ingestion_response(object):
+    """Response from an _Ingestion_job.
+
+    Public attributes:
+      pathname   -- as for the job
+      game_count -- int
+      data       -- string from pack_games()
+      errors     -- list of strings
+
+    """
+    def __init__(self, pathname, game_count, data, errors):
+        self.pathname = pathname
+        self.game_count = game_count
+        self.data = data
+        self.errors = errors
+
+class _Ingestion_job(object):
+    """Job reading the games from a piece of an SGF file.
+
+    Instantiate with a tuple from split_sgf_files().
+
+    This is suitable for use with job_manager.
+
+    """
+    def __init__(self, piece):
+        (self.pathname, self.start_offset, self.end_offset,
+         self.first_game_number) = piece
+
+    def run(self, worker_id):
+        try:
+            results, errors = read_sgf_file_games(
+                self.pathname, sgf_moves.read_compact_game,
+                self.start_offset, self.end_offset, self.first_game_number)
+        except EnvironmentError, e:
+            raise job_manager.JobFailed(str(e))
+        games = [(game_number, game)
+                 for (game_number, _, _, game) in results]
+        return _Ingestion_response(
+            self.pathname, len(games), pack_games(games), errors)
+
+class _Ingester(object):
+    """Job source for ingest_sgf_files()."""
+    def __init__(self, pathnames, writer):
+        self.pieces = split_sgf_files(pathnames)
+        self.writer = writer
+        self.game_count = 0
+        self.errors = []
+
+    def get_job(self):
+        try:
+            piece = self.pieces.next()
+        except StopIteration:
+            return job_manager.NoJobAvailable
+        return _Ingestion_job(piece)
+
+    def process_response(self, response):
+        self.writer.write_chunk(
+            response.pathname, response.game_count, response.data)
+        self.game_count += response.game_count
+        for msg in response.errors:
+            self.errors.append("%s: %s" % (response.pathname, msg))
+
+    def process_error_response(self, job, message):
+        self.errors.append("%s: %s" % (job.pathname, message))
+
+def ingest_sgf_files(pathnames, output_pathname,
+                     max_workers=None, allow_mp=True):
+    """Read games from SGF files and write a compact game file.
+
+    pathnames       -- list of SGF files or directories
+    output_pathname -- compact game file to write
+    max_workers     -- number of worker processes (default: one per CPU)
+    allow_mp        -- bool (default True)
+
+    Returns a pair (number of games written, list of error messages)
+
+    Directories are expanded using find_sgf_files(). Files may contain
+    collections; large files are divided into pieces using split_sgf_files().
+    Each piece is parsed in a worker process, which sends its games back as a
+    single packed chunk; chunks are written as they arrive, so the order of
+    the chunks in the output isn't necessarily the order of 'pathnames', and
+    a large file's games may be spread over several chunks.
+
+    If allow_mp is false, or multiprocessing isn't available, the files are
+    parsed in the calling process.
+
+    Games which can't be read (see sgf_moves.read_compact_game()) are
+    skipped, and reported in the error messages (see read_sgf_file_games()).
+
+    Raises EnvironmentError if the output file can't be written.
+
+    """
+    writer = Compact_game_file_writer(output_pathname)
+    try:
+        ingester = _Ingester(find_sgf_files(pathnames), writer)
+        job_manager.run_jobs(
+            job_source=ingester,
+            max_workers=max_workers,
+            allow_mp=allow_mp,
+            passed_exceptions=[EnvironmentError])
+    finally:
+        writer.close()
+    return ingester.game_count, ingester.errors
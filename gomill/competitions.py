@@ -3,6 +3,7 @@
 import os
 
 from gomill import game_jobs
+from gomill import gameplay
 from gomill import gtp_controller
 from gomill import handicap_layout
 from gomill.settings import *
@@ -51,6 +52,9 @@ _player_settings = [
             defaultmaker=list),
     Setting('discard_stderr', interpret_bool, default=False),
     Setting('sgf_player_name_from_gtp', interpret_bool, default=True),
+    Setting('memory_sample_interval', allow_none(interpret_float),
+            default=None),
+    Setting('genmove_cache', allow_none(interpret_8bit_string), default=None),
     ]
 
 class Player_config(Quiet_config):
@@ -255,6 +259,12 @@ class Competition(object):
         player.allow_claim = config['allow_claim']
         player.discard_stderr = config['discard_stderr']
         player.sgf_player_name_from_gtp = config['sgf_player_name_from_gtp']
+        player.memory_sample_interval = config['memory_sample_interval']
+        try:
+            player.genmove_cache = self.resolve_pathname(
+                config['genmove_cache'])
+        except Exception, e:
+            raise ControlFileError("'genmove_cache': %s" % e)
 
         player.startup_gtp_commands = []
         try:
@@ -476,6 +486,29 @@ def validate_handicap(handicap, handicap_style, board_size):
             (handicap_style, board_size))
 
 
+def make_time_settings(main_time, byo_yomi_time, byo_yomi_style,
+                       byo_yomi_stones, byo_yomi_periods):
+    """Make a Time_settings object from the time-related settings.
+
+    main_time -- float or None
+    (others as for gameplay.Time_settings)
+
+    Returns a gameplay.Time_settings, or None if main_time is None.
+
+    Raises ControlFileError with a description if the settings aren't
+    permitted.
+
+    """
+    if main_time is None:
+        return None
+    try:
+        return gameplay.Time_settings(
+            main_time, byo_yomi_time, byo_yomi_style,
+            byo_yomi_stones, byo_yomi_periods)
+    except ValueError, e:
+        raise ControlFileError("bad time settings: %s" % e)
+
+
 ## Helper functions
 
 def leading_zero_template(ceiling):
@@ -509,5 +542,11 @@ game_settings = [
     Setting('scorer', interpret_enum('internal', 'players'), default='players'),
     Setting('internal_scorer_handicap_compensation',
             interpret_enum('no', 'full', 'short'), default='full'),
+    Setting('main_time', allow_none(interpret_float), default=None),
+    Setting('byo_yomi_time', interpret_float, default=0.0),
+    Setting('byo_yomi_style', interpret_enum('canadian', 'japanese'),
+            default='canadian'),
+    Setting('byo_yomi_stones', interpret_positive_int, default=1),
+    Setting('byo_yomi_periods', interpret_positive_int, default=1),
     ]
 
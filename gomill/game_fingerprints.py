@@ -0,0 +1,423 @@
+"""Find duplicate games in collections of SGF files.
+
+A game's fingerprint identifies its setup stones and main-sequence moves up to
+symmetry: games which are rotations or reflections of one another, or which
+have the colours swapped, have the same fingerprint. Game information (player
+names, result, and so on) is ignored, so the same game uploaded with different
+headers also has the same fingerprint.
+
+find_duplicate_games() fingerprints the games in a set of SGF files in worker
+processes, using an on-disk Fingerprint_set to find the duplicates, and can
+write a collection containing the first copy of each game.
+
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from gomill import compact_game_files
+from gomill import job_manager
+from gomill import opening_books
+from gomill import sgf_moves
+
+
+## Fingerprints
+
+_forward_permutations_by_size = {}
+
+def _get_forward_permutations(size):
+    """Return the symmetry transformations as point index permutations.
+
+    Returns a list of 8 lists: for each transformation, the list maps a point
+    index (row*size + col) to the index of the point it's mapped to.
+
+    """
+    try:
+        return _forward_permutations_by_size[size]
+    except KeyError:
+        pass
+    result = []
+    for fn, permutation in opening_books.get_symmetry_permutations(size):
+        forward = [None] * (size*size)
+        for i, j in enumerate(permutation):
+            forward[j] = i
+        result.append(forward)
+    _forward_permutations_by_size[size] = result
+    return result
+
+_swap_colours = "".join(chr(i) for i in xrange(256)).replace(
+    "b", "\0").replace("w", "b").replace("\0", "w")
+
+def _points_to_string(points):
+    a = array('h', points)
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a.tostring()
+
+def get_fingerprint(game):
+    """Return a game's fingerprint.
+
+    game -- sgf_moves.Compact_game
+
+    Returns a 16-byte string.
+
+    The fingerprint depends on the board size, the setup stones, and the
+    moves; it's the same for all eight rotations and reflections of the game,
+    and if Black and White are swapped.
+
+    """
+    size = game.size
+    colours = game.move_colours
+    swapped_colours = colours.translate(_swap_colours)
+    best = None
+    for forward in _get_forward_permutations(size):
+        black = _points_to_string(sorted([forward[p]
+                                          for p in game.black_setup]))
+        white = _points_to_string(sorted([forward[p]
+                                          for p in game.white_setup]))
+        moves = _points_to_string([(-1 if p == -1 else forward[p])
+                                   for p in game.move_points])
+        for candidate in [(colours, black, white, moves),
+                          (swapped_colours, white, black, moves)]:
+            if best is None or candidate < best:
+                best = candidate
+    colours, black, white, moves = best
+    return hashlib.md5("%d:%d:%d:%s%s%s%s" % (
+        size, len(black), len(white), colours, black, white, moves)).digest()
+
+
+## On-disk set
+
+class Fingerprint_set(object):
+    """On-disk hash table mapping fingerprints to integers.
+
+    Instantiate with
+      pathname         -- file to use (any existing file is replaced)
+      initial_capacity -- int (default 65536)
+
+    Keys are 16-byte strings (normally from get_fingerprint()); values are
+    integers in the range 0 <= value < 2**64-1.
+
+    The table is kept in a memory-mapped file, using open addressing, and is
+    rebuilt at twice the size when it becomes too full. So its memory use is
+    left to the operating system's page cache.
+
+    Raises EnvironmentError if the file can't be created.
+
+    Public attributes (treat as read-only):
+      pathname -- as passed to the constructor
+      count    -- int (number of keys in the set)
+
+    """
+    _magic = "GMLFPSET"
+    _header_struct = struct.Struct("<8sQQ")
+    # Key, value+1 (so that an all-zero slot is empty)
+    _slot_struct = struct.Struct("<16sQ")
+
+    def __init__(self, pathname, initial_capacity=65536):
+        self.pathname = pathname
+        capacity = 16
+        while capacity < initial_capacity:
+            capacity *= 2
+        self.count = 0
+        self._create(pathname, capacity)
+
+    def _create(self, pathname, capacity):
+        f = open(pathname, "w+b")
+        try:
+            f.write(self._header_struct.pack(self._magic, capacity, 0))
+            f.truncate(self._header_struct.size +
+                       capacity * self._slot_struct.size)
+            f.flush()
+            self._map = mmap.mmap(f.fileno(), 0)
+        finally:
+            f.close()
+        self._capacity = capacity
+
+    def _find_slot(self, key):
+        """Return the offset of the slot for 'key' (which may be empty)."""
+        slot_size = self._slot_struct.size
+        base = self._header_struct.size
+        mask = self._capacity - 1
+        m = self._map
+        index = struct.unpack("<Q", key[:8])[0] & mask
+        while True:
+            offset = base + index * slot_size
+            slot_key = m[offset:offset+16]
+            if slot_key == key or m[offset+16:offset+24] == "\0" * 8:
+                return offset
+            index = (index + 1) & mask
+
+    def _grow(self):
+        old_map = self._map
+        old_capacity = self._capacity
+        new_pathname = self.pathname + ".new"
+        self._create(new_pathname, old_capacity * 2)
+        slot_size = self._slot_struct.size
+        base = self._header_struct.size
+        for index in xrange(old_capacity):
+            offset = base + index * slot_size
+            slot = old_map[offset:offset+slot_size]
+            if slot[16:] != "\0" * 8:
+                new_offset = self._find_slot(slot[:16])
+                self._map[new_offset:new_offset+slot_size] = slot
+        old_map.close()
+        os.rename(new_pathname, self.pathname)
+
+    def get(self, key, default=None):
+        """Return the value for 'key', or 'default' if it isn't in the set."""
+        offset = self._find_slot(key)
+        stored, = struct.unpack("<Q", self._map[offset+16:offset+24])
+        if stored == 0:
+            return default
+        return stored - 1
+
+    def add(self, key, value):
+        """Add a key to the set, unless it's already present.
+
+        Returns None if the key was added; otherwise returns the value
+        previously stored for the key (which is left unchanged).
+
+        """
+        if len(key) != 16:
+            raise ValueError("key must be 16 bytes")
+        offset = self._find_slot(key)
+        stored, = struct.unpack("<Q", self._map[offset+16:offset+24])
+        if stored != 0:
+            return stored - 1
+        if (self.count + 1) * 10 > self._capacity * 7:
+            self._grow()
+            offset = self._find_slot(key)
+        self._map[offset:offset+self._slot_struct.size] = \
+            self._slot_struct.pack(key, value + 1)
+        self.count += 1
+        return None
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def close(self):
+        """Write the header and close the file."""
+        if self._map is None:
+            return
+        self._map[:self._header_struct.size] = self._header_struct.pack(
+            self._magic, self._capacity, self.count)
+        self._map.close()
+        self._map = None
+
+
+## Finding duplicates
+
+class _Fingerprinting_response(object):
+    """Response from a _Fingerprinting_job.
+
+    Public attributes:
+      job_index  -- as for the job
+      file_index -- as for the job
+      games      -- list of tuples (game number, fingerprint, start, end)
+      errors     -- list of strings
+
+    """
+    def __init__(self, job_index, file_index, games, errors):
+        self.job_index = job_index
+        self.file_index = file_index
+        self.games = games
+        self.errors = errors
+
+class _Fingerprinting_job(object):
+    """Job fingerprinting the games from a piece of an SGF file.
+
+    Instantiate with
+      job_index  -- int
+      file_index -- int
+      piece      -- tuple from compact_game_files.split_sgf_files()
+
+    This is suitable for use with job_manager.
+
+    """
+    def __init__(self, job_index, file_index, piece):
+        self.job_index = job_index
+        self.file_index = file_index
+        (self.pathname, self.start_offset, self.end_offset,
+         self.first_game_number) = piece
+
+    def run(self, worker_id):
+        def reader(s):
+            return get_fingerprint(sgf_moves.read_compact_game(s))
+        try:
+            results, errors = compact_game_files.read_sgf_file_games(
+                self.pathname, reader,
+                self.start_offset, self.end_offset, self.first_game_number)
+        except EnvironmentError, e:
+            raise job_manager.JobFailed(str(e))
+        games = [(game_number, fingerprint, start, end)
+                 for (game_number, start, end, fingerprint) in results]
+        return _Fingerprinting_response(
+            self.job_index, self.file_index, games, errors)
+
+class _Duplicate_finder(object):
+    """Job source for find_duplicate_games().
+
+    Large files are divided into pieces (see
+    compact_game_files.split_sgf_files()), each fingerprinted by a separate
+    job.
+
+    Responses are processed in job order (buffering any which arrive early),
+    so the choice of which copy of a game comes first doesn't depend on
+    scheduling.
+
+    """
+    def __init__(self, pathnames, fingerprint_set, output_file):
+        self.pathnames = pathnames
+        self.fingerprint_set = fingerprint_set
+        self.output_file = output_file
+        self._pieces = self._iter_pieces()
+        self._next_job = 0
+        self._next_response = 0
+        self._pending = {}
+        self.game_count = 0
+        self.unique_count = 0
+        # map (file index, game number) of first copy -> list of
+        #  (file index, game number) of later copies
+        self.duplicates = {}
+        self.errors = []
+
+    def _iter_pieces(self):
+        for file_index, pathname in enumerate(self.pathnames):
+            for piece in compact_game_files.split_sgf_files([pathname]):
+                yield file_index, piece
+
+    def get_job(self):
+        try:
+            file_index, piece = self._pieces.next()
+        except StopIteration:
+            return job_manager.NoJobAvailable
+        job = _Fingerprinting_job(self._next_job, file_index, piece)
+        self._next_job += 1
+        return job
+
+    def _process_games(self, response):
+        file_index = response.file_index
+        pathname = self.pathnames[file_index]
+        for msg in response.errors:
+            self.errors.append("%s: %s" % (pathname, msg))
+        if not response.games:
+            return
+        f = None
+        if self.output_file is not None:
+            f = open(pathname, "rb")
+        try:
+            for game_number, fingerprint, start, end in response.games:
+                self.game_count += 1
+                existing = self.fingerprint_set.add(
+                    fingerprint, (file_index << 32) | game_number)
+                if existing is None:
+                    self.unique_count += 1
+                    if f is not None:
+                        f.seek(start)
+                        self.output_file.write(f.read(end - start))
+                        self.output_file.write("\n")
+                else:
+                    first = (existing >> 32, existing & 0xffffffff)
+                    self.duplicates.setdefault(first, []).append(
+                        (file_index, game_number))
+        finally:
+            if f is not None:
+                f.close()
+
+    def _process_pending(self):
+        while self._next_response in self._pending:
+            response = self._pending.pop(self._next_response)
+            if response is not None:
+                self._process_games(response)
+            self._next_response += 1
+
+    def process_response(self, response):
+        self._pending[response.job_index] = response
+        self._process_pending()
+
+    def process_error_response(self, job, message):
+        self.errors.append("%s: %s" % (job.pathname, message))
+        self._pending[job.job_index] = None
+        self._process_pending()
+
+    def get_duplicate_groups(self):
+        """Return the duplicate groups found.
+
+        Returns a list of lists of pairs (pathname, game number), in file
+        order; the first game in each group is the first copy.
+
+        """
+        result = []
+        for first, later in sorted(self.duplicates.iteritems()):
+            result.append([(self.pathnames[file_index], game_number)
+                           for (file_index, game_number)
+                           in [first] + later])
+        return result
+
+def find_duplicate_games(pathnames, hash_pathname, output_pathname=None,
+                         max_workers=None, allow_mp=True):
+    """Find duplicate games in SGF files.
+
+    pathnames       -- list of SGF files or directories
+    hash_pathname   -- file to use for the Fingerprint_set
+    output_pathname -- file to write deduplicated games to (optional)
+    max_workers     -- number of worker processes (default: one per CPU)
+    allow_mp        -- bool (default True)
+
+    Returns a tuple (game count, unique game count, duplicate groups, errors)
+      duplicate groups -- list of lists of pairs (pathname, game number)
+      errors           -- list of strings
+
+    Directories are expanded using compact_game_files.find_sgf_files(). Files
+    may contain collections.
+
+    Games are fingerprinted using get_fingerprint(). The first copy of a game
+    is the first in the order of 'pathnames' (and then file order). Each
+    duplicate group lists the first copy followed by its duplicates.
+
+    If output_pathname is specified, the first copy of each game is written
+    to it, unchanged, as an SGF collection (one game per line, unless the
+    game's SGF itself contains newlines).
+
+    Large files are divided into pieces which are fingerprinted in parallel
+    (see compact_game_files.split_sgf_files()).
+
+    Games which can't be read are skipped, and reported in the error messages
+    (see compact_game_files.read_sgf_file_games()).
+
+    The hash file is removed afterwards.
+
+    Raises EnvironmentError if the hash or output file can't be written.
+
+    """
+    sgf_pathnames = compact_game_files.find_sgf_files(pathnames)
+    fingerprint_set = Fingerprint_set(hash_pathname)
+    try:
+        if output_pathname is None:
+            output_file = None
+        else:
+            output_file = open(output_pathname, "wb")
+        try:
+            finder = _Duplicate_finder(
+                sgf_pathnames, fingerprint_set, output_file)
+            job_manager.run_jobs(
+                job_source=finder,
+                max_workers=max_workers,
+                allow_mp=allow_mp,
+                passed_exceptions=[EnvironmentError])
+        finally:
+            if output_file is not None:
+                output_file.close()
+    finally:
+        fingerprint_set.close()
+        os.remove(hash_pathname)
+    return (finder.game_count, finder.unique_count,
+            finder.get_duplicate_groups(), finder.errors)
@@ -3,6 +3,8 @@
 import datetime
 import os
 
+from gomill import game_stores
+from gomill import genmove_caches
 from gomill import gtp_controller
 from gomill import gtp_games
 from gomill import job_manager
@@ -25,6 +27,8 @@ class Player(object):
       cwd                  -- working directory to change to (default None)
       environ              -- maplike of environment variables (default None)
       sgf_player_name_from_gtp -- Use gtp player name in sgf files (default True)
+      memory_sample_interval   -- float or None (default None)
+      genmove_cache            -- pathname or None (default None)
 
     See gtp_controllers.Gtp_controller for an explanation of gtp_aliases.
 
@@ -36,6 +40,16 @@ class Player(object):
     environment variables; use 'environ' to add variables or replace particular
     values.
 
+    If memory_sample_interval is set, the player's memory use is sampled during
+    the game at most once in that many seconds (see
+    Subprocess_gtp_channel.enable_memory_sampling()).
+
+    If genmove_cache is set, the player's moves are cached in (and taken from)
+    that file (see gtp_games.Gtp_game.set_genmove_cache()). The engine identity
+    used in the cache keys is made from the command line, startup commands,
+    and GTP aliases, together with the engine's responses to 'name', 'version'
+    and 'gomill-describe_engine'.
+
     Players are suitable for pickling.
 
     """
@@ -48,6 +62,8 @@ class Player(object):
         self.cwd = None
         self.environ = None
         self.sgf_player_name_from_gtp = True
+        self.memory_sample_interval = None
+        self.genmove_cache = None
 
     def make_environ(self):
         """Return environment variables to use with the player's subprocess.
@@ -69,6 +85,8 @@ class Player(object):
         result.allow_claim = self.allow_claim
         result.discard_stderr = self.discard_stderr
         result.sgf_player_name_from_gtp = self.sgf_player_name_from_gtp
+        result.memory_sample_interval = self.memory_sample_interval
+        result.genmove_cache = self.genmove_cache
         result.gtp_aliases = dict(self.gtp_aliases)
         result.startup_gtp_commands = list(self.startup_gtp_commands)
         result.cwd = self.cwd
@@ -88,6 +106,12 @@ class Game_job_result(object):
       warnings              -- list of strings
       log_entries           -- list of strings
       engine_descriptions   -- map player code -> Engine_description
+      resource_usage        -- map player code -> Engine_resource_usage or None
+      genmove_cache_stats   -- map player code -> pair (hits, lookups)
+
+    resource_usage is the same as game_result.resource_usage.
+
+    genmove_cache_stats has entries only for players with a genmove_cache.
 
     Game_job_results are suitable for pickling.
 
@@ -114,12 +138,14 @@ class Game_job(object):
       game_data           -- arbitrary pickleable data
       handicap            -- int
       handicap_is_free    -- bool (default False)
+      time_settings       -- gameplay.Time_settings
       use_internal_scorer -- bool (default True)
       internal_scorer_handicap_compensation -- 'no' , 'short', or 'full'
                              (default 'no')
       sgf_filename        -- filename for the SGF file
       sgf_dirname         -- directory pathname for the SGF file
       void_sgf_dirname    -- directory pathname for the SGF file for void games
+      game_store_pathname -- pathname of a game store to record the game in
       sgf_game_name       -- string to show as SGF Game Name (default game_id)
       sgf_event           -- string to show as SGF EVent
       sgf_note            -- multiline string to put into SGF root comment
@@ -133,12 +159,18 @@ class Game_job(object):
     game_data is returned in the job result. It's provided as a convenient way
     to pass a small amount of information from get_job() to process_response().
 
+    If time_settings is set, the game is played with those time limits (see
+    gtp_games.Gtp_game.set_time_settings()).
+
     If use_internal_scorer is False, the Players' is_reliable_scorer attributes
     are used to determine who scores the game (see errors.rst).
 
     If sgf_dirname and sgf_filename are set, an SGF file will be written after
     the game is over.
 
+    If game_store_pathname is set, the game record is appended to that game
+    store instead (see game_stores.append_game()), and sgf_dirname is ignored.
+
     If void_sgf_dirname and sgf_filename are set, an SGF file will be written
     for any void games (games which were aborted due to unhandled errors) which
     have at least one move. The leaf directory will be created if necessary.
@@ -158,9 +190,11 @@ class Game_job(object):
     def __init__(self):
         self.handicap = None
         self.handicap_is_free = False
+        self.time_settings = None
         self.sgf_filename = None
         self.sgf_dirname = None
         self.void_sgf_dirname = None
+        self.game_store_pathname = None
         self.sgf_game_name = None
         self.sgf_event = None
         self.sgf_note = None
@@ -196,8 +230,17 @@ class Game_job(object):
                 except EnvironmentError:
                     pass
 
+    def _open_genmove_cache(self, player):
+        if player.genmove_cache is None:
+            return None
+        try:
+            return genmove_caches.get_genmove_cache(player.genmove_cache)
+        except EnvironmentError, e:
+            raise job_manager.JobFailed(
+                "player %s: can't open genmove cache:\n%s" % (player.code, e))
+
     def _start_player(self, game_controller, game,
-                      colour, player, gtp_log_file):
+                      colour, player, gtp_log_file, genmove_cache):
         if player.discard_stderr:
             stderr_pathname = os.devnull
         else:
@@ -220,11 +263,21 @@ class Game_job(object):
             env=env, cwd=player.cwd, stderr=stderr)
         controller = game_controller.get_controller(colour)
         controller.set_gtp_aliases(player.gtp_aliases)
+        if player.memory_sample_interval is not None:
+            controller.channel.enable_memory_sampling(
+                player.memory_sample_interval)
         if gtp_log_file is not None:
             controller.channel.enable_logging(
                 gtp_log_file, prefix="%s: " % colour)
         for command, arguments in player.startup_gtp_commands:
             game_controller.send_command(colour, command, *arguments)
+        if genmove_cache is not None:
+            ed = game_controller.engine_descriptions[colour]
+            engine_identity = repr((
+                player.cmd_args, player.startup_gtp_commands,
+                sorted(player.gtp_aliases.items()),
+                ed.raw_name, ed.raw_version, ed.description))
+            game.set_genmove_cache(colour, genmove_cache, engine_identity)
 
     def _run(self):
         warnings = []
@@ -239,6 +292,10 @@ class Game_job(object):
             raise job_manager.JobFailed("error creating game: %s" % e)
         if self.use_internal_scorer:
             game.use_internal_scorer(self.internal_scorer_handicap_compensation)
+        if self.time_settings is not None:
+            game.set_time_settings(self.time_settings)
+        genmove_cache_b = self._open_genmove_cache(self.player_b)
+        genmove_cache_w = self._open_genmove_cache(self.player_w)
 
         if self.gtp_log_pathname is not None:
             gtp_log_file = open(self.gtp_log_pathname, "w")
@@ -248,9 +305,11 @@ class Game_job(object):
 
         try:
             self._start_player(game_controller, game,
-                               'b', self.player_b, gtp_log_file)
+                               'b', self.player_b, gtp_log_file,
+                               genmove_cache_b)
             self._start_player(game_controller, game,
-                               'w', self.player_w, gtp_log_file)
+                               'w', self.player_w, gtp_log_file,
+                               genmove_cache_w)
             game.prepare()
             if self.handicap:
                 try:
@@ -273,6 +332,7 @@ class Game_job(object):
         for colour in game.cpu_time_errors:
             del ru_cpu_times[colour]
         game.result.soft_update_cpu_times(ru_cpu_times)
+        game.result.set_resource_usage(game_controller.get_resource_usage())
         late_error_messages = game_controller.describe_late_errors()
         if late_error_messages:
             log_entries.append(late_error_messages)
@@ -282,6 +342,14 @@ class Game_job(object):
         response.game_result = game.result
         response.warnings = warnings
         response.log_entries = log_entries
+        response.resource_usage = game.result.resource_usage
+        response.genmove_cache_stats = {}
+        for colour, (hits, lookups) in \
+                sorted(game.get_genmove_cache_stats().items()):
+            player_code = game_controller.players[colour]
+            response.genmove_cache_stats[player_code] = (hits, lookups)
+            log_entries.append("%s genmove cache: %d hits from %d lookups" %
+                               (player_code, hits, lookups))
 
         response.engine_descriptions = {
             self.player_b.code : game_controller.engine_descriptions['b'],
@@ -361,7 +429,12 @@ class Game_job(object):
         return sgf_game
 
     def _record_game(self, game_controller, game):
-        """Record the game in the standard sgf directory."""
+        """Record the game in the game store or the standard sgf directory."""
+        if self.game_store_pathname is not None:
+            sgf_game = self._make_sgf(game_controller, game)
+            self._write_to_store(
+                self.game_store_pathname, self.game_id, sgf_game)
+            return
         if self.sgf_dirname is None or self.sgf_filename is None:
             return
         pathname = os.path.join(self.sgf_dirname, self.sgf_filename)
@@ -390,6 +463,10 @@ class Game_job(object):
         f.write(sgf_string)
         f.close()
 
+    def _write_to_store(self, pathname, game_id, sgf_game):
+        # For overriding in the testsuite
+        game_stores.append_game(pathname, game_id, sgf_game)
+
     def _ensure_dir(self, pathname):
         # For overriding in the testsuite
         utils.ensure_dir(pathname)
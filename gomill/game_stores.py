@@ -0,0 +1,378 @@
+"""Append-only binary stores of game records.
+
+A game store holds any number of games in a single file, as an alternative to
+writing one SGF file per game. Each record holds a short header (the game id,
+board size, result, and move count), the moves packed as point indices, and
+the remaining SGF properties (comments, timing information, and so on)
+compressed.
+
+Only the main sequence of each game is stored; SGF files exported from a store
+have no variations, but otherwise have the same properties as the games which
+were stored.
+
+Stores can be shared between processes: writers take an exclusive lock (using
+fcntl.flock) and append each record with a single write, and readers pick up
+records appended since they last looked.
+
+On systems which don't support fcntl, no locking is done, so a store
+shouldn't be written by more than one process at a time.
+
+File format (all integers are little-endian):
+  header: 8-byte magic string
+  then any number of records, each:
+    payload length (uint32), node count (uint32), move count (uint32),
+    game id length (uint16), result length (uint16), board size (uint8),
+    winner (uint8: 0 for none, 1 for black, 2 for white)
+    payload:
+      game id
+      result (the RE property's raw value)
+      node colours ('b', 'w', or '-' for a node without a move, one byte each)
+      node move point indices (int16 each: row * size + col, -1 for a pass or
+                               no move)
+      zlib-compressed pickle of (root properties, other properties)
+
+Root properties are a list of pairs (identifier, list of raw values). Other
+properties are a list of pairs (node number, list of such pairs), for the
+nodes after the root which have properties other than their move; node number
+0 is the first node after the root.
+
+"""
+
+import cPickle as pickle
+import os
+import struct
+import zlib
+from array import array
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from gomill import compact_game_files
+from gomill import sgf
+from gomill import sgf_grammar
+from gomill import sgf_properties
+
+
+_magic = "GMLSTORE"
+_record_struct = struct.Struct("<IIIHHBB")
+_winner_codes = {None : 0, 'b' : 1, 'w' : 2}
+_winners = {0 : None, 1 : 'b', 2 : 'w'}
+
+def _flock(fd, operation_name):
+    if fcntl is not None:
+        fcntl.flock(fd, getattr(fcntl, operation_name))
+
+
+class Stored_game(object):
+    """Summary of a game in a game store.
+
+    Public attributes (treat as read-only):
+      game_id    -- 8-bit string
+      offset     -- int (byte offset of the record in the store file)
+      size       -- int (board size)
+      result     -- 8-bit string (the RE property's raw value), or None
+      winner     -- 'b', 'w', or None
+      move_count -- int
+
+    """
+    __slots__ = ('game_id', 'offset', 'size', 'result', 'winner',
+                 'move_count')
+
+    def __init__(self, game_id, offset, size, result, winner, move_count):
+        self.game_id = game_id
+        self.offset = offset
+        self.size = size
+        self.result = result
+        self.winner = winner
+        self.move_count = move_count
+
+    def __repr__(self):
+        return "<Stored_game %s at %d>" % (self.game_id, self.offset)
+
+
+def _raw_properties(node, excluded=()):
+    return [(identifier, node.get_raw_list(identifier))
+            for identifier in sorted(node.properties())
+            if identifier not in excluded]
+
+def pack_game(game_id, sgf_game):
+    """Serialise an Sgf_game as a game store record.
+
+    game_id  -- 8-bit string
+    sgf_game -- Sgf_game
+
+    Returns an 8-bit string.
+
+    Raises ValueError if the game id is too long, or a move property is
+    malformed.
+
+    """
+    size = sgf_game.get_size()
+    nodes = sgf_game.get_main_sequence()
+    root = nodes[0]
+    if root.has_property("RE"):
+        result = root.get_raw("RE")
+    else:
+        result = ""
+    colours = []
+    points = []
+    other_properties = []
+    move_count = 0
+    for node_number, node in enumerate(nodes[1:]):
+        colour, raw = node.get_raw_move()
+        if colour is None:
+            colours.append("-")
+            points.append(-1)
+            excluded = ()
+        else:
+            colours.append(colour)
+            move = sgf_properties.interpret_go_point(raw, size)
+            if move is None:
+                points.append(-1)
+            else:
+                points.append(move[0] * size + move[1])
+            # Keep the raw value if it isn't in the standard form
+            if raw == sgf_properties.serialise_go_point(move, size):
+                excluded = (colour.upper(),)
+            else:
+                excluded = ()
+            move_count += 1
+        props = _raw_properties(node, excluded)
+        if props:
+            other_properties.append((node_number, props))
+    if len(game_id) > 0xffff or len(result) > 0xffff:
+        raise ValueError("game id or result too long")
+    compressed = zlib.compress(pickle.dumps(
+        (_raw_properties(root), other_properties), protocol=-1))
+    payload = "".join([
+        game_id, result, "".join(colours),
+        compact_game_files._array_to_string(array('h', points)),
+        compressed])
+    header = _record_struct.pack(
+        len(payload), len(colours), move_count, len(game_id), len(result),
+        size, _winner_codes[sgf_game.get_winner()])
+    return header + payload
+
+def _unpack_coarse_game(size, node_count, payload, start):
+    """Make a Coarse_game_tree from a record's payload.
+
+    start -- offset of the node colours in the payload
+
+    """
+    colours = payload[start:start+node_count]
+    start += node_count
+    points = compact_game_files._array_from_string(
+        payload[start:start+2*node_count])
+    start += 2*node_count
+    root_properties, other_properties = pickle.loads(
+        zlib.decompress(payload[start:]))
+    sequence = [dict(root_properties)]
+    for colour, point in zip(colours, points):
+        if colour == "-":
+            sequence.append({})
+        else:
+            if point == -1:
+                move = None
+            else:
+                move = divmod(point, size)
+            sequence.append({colour.upper() :
+                             [sgf_properties.serialise_go_point(move, size)]})
+    for node_number, props in other_properties:
+        sequence[node_number+1].update(props)
+    coarse_game = sgf_grammar.Coarse_game_tree()
+    coarse_game.sequence = sequence
+    return coarse_game
+
+def append_game(pathname, game_id, sgf_game):
+    """Append a game to a game store.
+
+    pathname -- store file (created if it doesn't exist)
+    game_id  -- 8-bit string
+    sgf_game -- Sgf_game
+
+    Only the game's main sequence is stored.
+
+    Raises EnvironmentError if the file can't be written.
+
+    """
+    record = pack_game(game_id, sgf_game)
+    fd = os.open(pathname, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0666)
+    try:
+        _flock(fd, 'LOCK_EX')
+        try:
+            if os.fstat(fd).st_size == 0:
+                record = _magic + record
+            os.write(fd, record)
+        finally:
+            _flock(fd, 'LOCK_UN')
+    finally:
+        os.close(fd)
+
+
+class Game_store(object):
+    """Read access to a game store.
+
+    Instantiate with the store's pathname.
+
+    Instantiating reads the record headers (but not the games themselves);
+    call refresh() to pick up games appended since.
+
+    If a game id appears more than once, the last record is used.
+
+    Raises EnvironmentError if the file can't be read, and ValueError if it
+    isn't a game store.
+
+    Public attributes (treat as read-only):
+      pathname -- as passed to the constructor
+      games    -- list of Stored_game objects, in file order
+
+    """
+    def __init__(self, pathname):
+        self.pathname = pathname
+        self.games = []
+        # map game_id -> Stored_game
+        self._games_by_id = {}
+        self._scanned_to = 0
+        self.refresh()
+
+    def refresh(self):
+        """Read any records appended since the store was last read.
+
+        Returns the number of new records.
+
+        A partly-written record at the end of the file is ignored (it will be
+        read by a later refresh() if it's completed).
+
+        Raises EnvironmentError if the file can't be read.
+
+        """
+        f = open(self.pathname, "rb")
+        try:
+            _flock(f.fileno(), 'LOCK_SH')
+            try:
+                return self._read_headers(f)
+            finally:
+                _flock(f.fileno(), 'LOCK_UN')
+        finally:
+            f.close()
+
+    def _read_headers(self, f):
+        if self._scanned_to == 0:
+            magic = f.read(len(_magic))
+            if magic != _magic:
+                raise ValueError("not a game store: %s" % self.pathname)
+            self._scanned_to = len(_magic)
+        file_size = os.fstat(f.fileno()).st_size
+        header_size = _record_struct.size
+        position = self._scanned_to
+        new_count = 0
+        # Stored_games superseded by records read in this call
+        superseded = set()
+        while position + header_size <= file_size:
+            f.seek(position)
+            header = f.read(header_size)
+            (payload_length, node_count, move_count,
+             id_length, result_length, size, winner) = \
+                _record_struct.unpack(header)
+            end = position + header_size + payload_length
+            if end > file_size:
+                break
+            s = f.read(id_length + result_length)
+            if result_length:
+                result = s[id_length:]
+            else:
+                result = None
+            game = Stored_game(s[:id_length], position, size, result,
+                               _winners.get(winner), move_count)
+            old_game = self._games_by_id.get(game.game_id)
+            if old_game is not None:
+                superseded.add(old_game)
+            self.games.append(game)
+            self._games_by_id[game.game_id] = game
+            new_count += 1
+            position = end
+        if superseded:
+            # One pass, rather than a list.remove() for each duplicate
+            self.games = [game for game in self.games
+                          if game not in superseded]
+        self._scanned_to = position
+        return new_count
+
+    def __len__(self):
+        return len(self.games)
+
+    def __contains__(self, game_id):
+        return game_id in self._games_by_id
+
+    def get_game_ids(self):
+        """Return a list of the stored game ids, in file order."""
+        return [game.game_id for game in self.games]
+
+    def get_sgf_game(self, game_id):
+        """Return a stored game as an Sgf_game.
+
+        Raises KeyError if there is no such game.
+
+        Raises EnvironmentError if the file can't be read.
+
+        Raises ValueError if the record is malformed.
+
+        """
+        game = self._games_by_id[game_id]
+        f = open(self.pathname, "rb")
+        try:
+            f.seek(game.offset)
+            header = f.read(_record_struct.size)
+            (payload_length, node_count, move_count,
+             id_length, result_length, size, winner) = \
+                _record_struct.unpack(header)
+            payload = f.read(payload_length)
+        finally:
+            f.close()
+        if len(payload) != payload_length:
+            raise ValueError("truncated game store")
+        try:
+            coarse_game = _unpack_coarse_game(
+                size, node_count, payload, id_length + result_length)
+        except (zlib.error, pickle.UnpicklingError, EOFError, IndexError):
+            raise ValueError("malformed game record")
+        return sgf.Sgf_game.from_coarse_game_tree(coarse_game)
+
+    def get_sgf(self, game_id):
+        """Return a stored game as SGF data.
+
+        Returns an 8-bit string.
+
+        Raises the same exceptions as get_sgf_game().
+
+        """
+        return self.get_sgf_game(game_id).serialise()
+
+    def export_sgf_files(self, dirname, get_filename=None):
+        """Write each stored game to an SGF file.
+
+        dirname      -- directory to write to (must exist)
+        get_filename -- function game_id -> filename (optional)
+
+        By default, the filenames are the game ids with '.sgf' appended.
+        Existing files are overwritten.
+
+        Returns the number of files written.
+
+        Raises EnvironmentError if a file can't be read or written.
+
+        Raises ValueError if a record is malformed.
+
+        """
+        if get_filename is None:
+            get_filename = lambda game_id: "%s.sgf" % game_id
+        for game in self.games:
+            sgf_string = self.get_sgf(game.game_id)
+            f = open(os.path.join(dirname, get_filename(game.game_id)), "w")
+            try:
+                f.write(sgf_string)
+            finally:
+                f.close()
+        return len(self.games)
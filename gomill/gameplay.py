@@ -5,6 +5,8 @@ don't directly involve GTP.
 
 """
 
+import time
+
 from gomill import __version__
 from gomill.utils import *
 from gomill.common import *
@@ -43,13 +45,14 @@ class Game(object):
       seen_resignation -- bool
       seen_claim       -- bool
       seen_forfeit     -- bool
+      seen_time_loss   -- bool
       hit_move_limit   -- bool
       winner           -- colour or None
       forfeit_reason   -- string or None
 
     When is_over is true, exactly one of the other boolean attributes is true.
-    winner is set for seen_resignation, seen_claim, and seen_forfeit, but not
-    for passed_out or hit_move_limit.
+    winner is set for seen_resignation, seen_claim, seen_forfeit, and
+    seen_time_loss, but not for passed_out or hit_move_limit.
 
     move_count is the number of moves already played. Passes are included;
     illegal moves are not.
@@ -70,6 +73,7 @@ class Game(object):
         self.seen_resignation = False
         self.seen_claim = False
         self.seen_forfeit = False
+        self.seen_time_loss = False
         self.hit_move_limit = False
         self.winner = None
         self.forfeit_reason = None
@@ -142,6 +146,18 @@ class Game(object):
         self.forfeit_reason = reason
         self._set_over()
 
+    def record_time_loss_by(self, loser):
+        """Record that a player has run out of time.
+
+        loser -- colour
+
+        """
+        if self.is_over:
+            raise GameStateError("game is already over")
+        self.winner = opponent_of(loser)
+        self.seen_time_loss = True
+        self._set_over()
+
     def record_move(self, colour, move):
         """Record that a move or pass has been played.
 
@@ -406,11 +422,163 @@ class Result(object):
             result.sgf_result += "F"
             result.is_forfeit = True
             result.detail = game.forfeit_reason
+        elif game.seen_time_loss:
+            result.sgf_result += "T"
+            result.detail = "out of time"
         else:
             raise AssertionError
         return result
 
 
+class Time_settings(object):
+    """Description of a game's time limits.
+
+    Instantiate with:
+      main_time        -- int or float (seconds)
+      byo_yomi_time    -- int or float (seconds; default 0)
+      byo_yomi_style   -- 'canadian' (default) or 'japanese'
+      byo_yomi_stones  -- int (default 1)
+      byo_yomi_periods -- int (default 1)
+
+    Public attributes are the same as the instantiation parameters (main_time
+    and byo_yomi_time are converted to float).
+
+    If byo_yomi_time is 0, there is no byo-yomi: main time is an absolute limit.
+
+    With Canadian byo-yomi, once a player's main time has run out each period
+    of byo_yomi_time seconds must cover byo_yomi_stones moves.
+
+    With Japanese byo-yomi, once a player's main time has run out each move
+    must be played within byo_yomi_time seconds; a move which takes longer uses
+    up one of the byo_yomi_periods periods for each byo_yomi_time seconds it
+    runs over. byo_yomi_stones is ignored.
+
+    Raises ValueError if the parameters are out of range.
+
+    Time_settings are suitable for pickling.
+
+    """
+    def __init__(self, main_time, byo_yomi_time=0, byo_yomi_style='canadian',
+                 byo_yomi_stones=1, byo_yomi_periods=1):
+        if byo_yomi_style not in ('canadian', 'japanese'):
+            raise ValueError("unknown byo_yomi_style: %s" % byo_yomi_style)
+        if main_time < 0:
+            raise ValueError("negative main_time")
+        if byo_yomi_time < 0:
+            raise ValueError("negative byo_yomi_time")
+        if byo_yomi_time == 0 and main_time == 0:
+            raise ValueError("no time allowed")
+        if byo_yomi_stones < 1:
+            raise ValueError("byo_yomi_stones must be positive")
+        if byo_yomi_periods < 1:
+            raise ValueError("byo_yomi_periods must be positive")
+        self.main_time = float(main_time)
+        self.byo_yomi_time = float(byo_yomi_time)
+        self.byo_yomi_style = byo_yomi_style
+        self.byo_yomi_stones = byo_yomi_stones
+        self.byo_yomi_periods = byo_yomi_periods
+
+    @property
+    def has_byo_yomi(self):
+        return self.byo_yomi_time > 0
+
+    def describe_overtime(self):
+        """Return a description of the byo-yomi suitable for SGF OT.
+
+        Returns a string like '5x30 byo-yomi' or '25/300 Canadian', or None if
+        there is no byo-yomi.
+
+        """
+        if not self.has_byo_yomi:
+            return None
+        if self.byo_yomi_style == 'japanese':
+            return "%dx%s byo-yomi" % (
+                self.byo_yomi_periods, format_float(self.byo_yomi_time))
+        else:
+            return "%d/%s Canadian" % (
+                self.byo_yomi_stones, format_float(self.byo_yomi_time))
+
+    def describe(self):
+        """Return a short human-readable description of the time limits."""
+        s = "%ss" % format_float(self.main_time)
+        overtime = self.describe_overtime()
+        if overtime is None:
+            return s + " absolute"
+        return "%s + %s" % (s, overtime)
+
+class Game_clock(object):
+    """Track one player's remaining time.
+
+    Instantiate with a Time_settings.
+
+    Public attributes (treat as read-only):
+      time_settings -- the Time_settings
+      in_byo_yomi   -- bool
+      time_left     -- float
+      stones_left   -- int or None
+      periods_left  -- int or None
+
+    time_left is the main time left; once the player is in byo-yomi it is the
+    time left in the current byo-yomi period.
+
+    stones_left is the number of moves left to play in the current Canadian
+    byo-yomi period. periods_left is the number of Japanese byo-yomi periods
+    left. They're None when they don't apply.
+
+    """
+    def __init__(self, time_settings):
+        self.time_settings = time_settings
+        self.in_byo_yomi = False
+        self.time_left = time_settings.main_time
+        self.stones_left = None
+        self.periods_left = None
+
+    def _start_byo_yomi(self):
+        ts = self.time_settings
+        self.in_byo_yomi = True
+        self.time_left = ts.byo_yomi_time
+        if ts.byo_yomi_style == 'japanese':
+            self.periods_left = ts.byo_yomi_periods
+        else:
+            self.stones_left = ts.byo_yomi_stones
+
+    def record_move_time(self, elapsed):
+        """Charge a move's thinking time to the clock.
+
+        elapsed -- float (seconds)
+
+        Returns False if the player has run out of time (in which case the
+        clock's state is not meaningful), otherwise True.
+
+        """
+        ts = self.time_settings
+        if not self.in_byo_yomi:
+            if elapsed <= self.time_left:
+                self.time_left -= elapsed
+                return True
+            if not ts.has_byo_yomi:
+                return False
+            elapsed -= self.time_left
+            self._start_byo_yomi()
+        if ts.byo_yomi_style == 'japanese':
+            if elapsed > ts.byo_yomi_time * self.periods_left:
+                return False
+            # A period is used up for each full byo_yomi_time the move ran
+            # over; the next move has a fresh period.
+            while elapsed > ts.byo_yomi_time:
+                elapsed -= ts.byo_yomi_time
+                self.periods_left -= 1
+            return True
+        if elapsed > self.time_left:
+            return False
+        self.time_left -= elapsed
+        self.stones_left -= 1
+        if self.stones_left == 0:
+            self.time_left = ts.byo_yomi_time
+            self.stones_left = ts.byo_yomi_stones
+        return True
+
+
 class Diagnostics(object):
     """Message text received from a player."""
     def __init__(self, colour, message):
@@ -549,6 +717,33 @@ class Backend(object):
         """
         return None
 
+    def notify_time_settings(self, time_settings):
+        """Inform both players of the game's time limits.
+
+        time_settings -- Time_settings
+
+        This is only called if the game has time limits, immediately after
+        start_new_game().
+
+        There is a default implementation, which does nothing.
+
+        """
+        pass
+
+    def notify_time_left(self, colour, clock):
+        """Inform a player of its remaining time.
+
+        colour -- player to inform
+        clock  -- Game_clock (treat as read-only)
+
+        This is only called if the game has time limits, immediately before
+        each call to get_move().
+
+        There is a default implementation, which does nothing.
+
+        """
+        pass
+
 
 class GameRunnerStateError(StandardError):
     """Error from Game_runner: wrong state for requested action."""
@@ -566,6 +761,7 @@ class Game_runner(object):
       runner = Game_runner(...)
       runner.set_move_callback(...) [optional]
       runner.set_result_class(...) [optional]
+      runner.set_time_settings(...) [optional]
       runner.prepare()
       runner.set_handicap(...) [optional]
       runner.run()
@@ -584,6 +780,11 @@ class Game_runner(object):
     If a player rejects its opponent's move as illegal, we assume it is correct
     and the opponent forfeits the game.
 
+    If time settings are specified, the wall-clock time taken by each call to
+    the backend's get_move() is charged to the player's clock, and a player
+    who runs out of time loses the game (with SGF result 'B+T' or 'W+T'). The
+    move which took too long is not played.
+
     """
 
     def __init__(self, backend, board_size, komi=0, move_limit=None):
@@ -595,7 +796,10 @@ class Game_runner(object):
         self.result_class = Result
         self.additional_sgf_props = []
         self.handicap_stones = None
+        self.time_settings = None
+        self.clocks = None
         self.moves = []
+        self.move_times = []
         self.final_diagnostics = None
         self.game_score = None
         self.result = None
@@ -633,15 +837,30 @@ class Game_runner(object):
         """
         self.result_class = cls
 
+    def set_time_settings(self, time_settings):
+        """Specify time limits for the game.
+
+        time_settings -- Time_settings
+
+        If this isn't called, the game has no time limits.
+
+        """
+        if self._state != 0:
+            raise GameRunnerStateError
+        self.time_settings = time_settings
+
     def prepare(self):
         """Perform any initialisation needed by the backend.
 
-        Propagates any exceptions from the backend start_new_game() method.
+        Propagates any exceptions from the backend start_new_game() and
+        notify_time_settings() methods.
 
         """
         if self._state != 0:
             raise GameRunnerStateError
         self.backend.start_new_game(self.board_size, self.komi)
+        if self.time_settings is not None:
+            self.backend.notify_time_settings(self.time_settings)
         self._state = 1
 
     def set_handicap(self, handicap, is_free):
@@ -693,11 +912,24 @@ class Game_runner(object):
         game.set_game_over_callback(self.backend.end_game)
         return game
 
+    def _get_time(self):
+        # For overriding in the testsuite
+        return time.time()
+
     def _do_move(self, game):
         colour = game.next_player
         opponent = opponent_of(colour)
+        if self.clocks is not None:
+            clock = self.clocks[colour]
+            self.backend.notify_time_left(colour, clock)
+        else:
+            clock = None
+        start_time = self._get_time()
         action, detail = self.backend.get_move(colour)
-        if action == 'forfeit':
+        elapsed = self._get_time() - start_time
+        if clock is not None and not clock.record_move_time(elapsed):
+            game.record_time_loss_by(colour)
+        elif action == 'forfeit':
             game.record_forfeit_by(colour, detail)
         elif action == 'resign':
             game.record_resignation_by(colour)
@@ -738,6 +970,12 @@ class Game_runner(object):
             return
 
         self.moves.append((colour, move, comment))
+        if clock is not None:
+            if clock.stones_left is not None:
+                overtime_count = clock.stones_left
+            else:
+                overtime_count = clock.periods_left
+            self.move_times.append((clock.time_left, overtime_count))
 
         if self.after_move_callback:
             self.after_move_callback(colour=colour, move=move, board=game.board)
@@ -757,6 +995,7 @@ class Game_runner(object):
         Propagates any exceptions from backend methods:
           get_move()
           notify_move()
+          notify_time_left()
           score_game()
           get_last_move_comment()
           end_game()
@@ -770,6 +1009,9 @@ class Game_runner(object):
         if self._state not in (1, 2):
             raise GameRunnerStateError
         game = self._make_game()
+        if self.time_settings is not None:
+            self.clocks = {'b' : Game_clock(self.time_settings),
+                           'w' : Game_clock(self.time_settings)}
         self._state = 3
         while not game.is_over:
             self._do_move(game)
@@ -811,6 +1053,22 @@ class Game_runner(object):
         """
         return self.game_score
 
+    def to_arrays(self):
+        """Return the handicap stones and moves played as NumPy arrays.
+
+        Returns a dict of arrays: moves, setup, comment_offsets, comment_data.
+        See sgf_arrays for details.
+
+        The moves and comments are the same as those from get_moves(); the
+        setup stones are the handicap stones (if any).
+
+        Raises ImportError if NumPy isn't available.
+
+        """
+        from gomill import sgf_arrays
+        setup = [('b', point) for point in self.handicap_stones or []]
+        return sgf_arrays.records_to_arrays(setup, self.moves)
+
     def make_sgf(self):
         """Return an SGF description of the game.
 
@@ -819,6 +1077,11 @@ class Game_runner(object):
           DT AP SZ KM
           HA (if there was a handicap)
           RE (if the result is known)
+          TM (if there were time limits)
+          OT (if there was byo-yomi)
+
+        If there were time limits, each move node has BL or WL set to the time
+        the player had left after the move (and OB or OW in byo-yomi).
 
         Doesn't set a root node comment. Doesn't put result.detail anywhere.
 
@@ -837,12 +1100,22 @@ class Game_runner(object):
             root.set('RE', self.result.sgf_result)
         for prop, value in self.additional_sgf_props:
             root.set(prop, value)
+        if self.time_settings is not None:
+            root.set('TM', self.time_settings.main_time)
+            overtime = self.time_settings.describe_overtime()
+            if overtime is not None:
+                root.set('OT', overtime)
         sgf_game.set_date()
         if self.handicap_stones:
             root.set_setup_stones(black=self.handicap_stones, white=[])
-        for colour, move, comment in self.moves:
+        for i, (colour, move, comment) in enumerate(self.moves):
             node = sgf_game.extend_main_sequence()
             node.set_move(colour, move)
+            if self.move_times:
+                time_left, overtime_count = self.move_times[i]
+                node.set(colour.upper() + 'L', round(time_left, 3))
+                if overtime_count is not None:
+                    node.set('O' + colour.upper(), overtime_count)
             if comment is not None:
                 node.set("C", comment)
         final = self.get_final_diagnostics()
@@ -0,0 +1,147 @@
+"""Persistent cache of the moves generated by deterministic engines.
+
+A cache file maps keys (describing an engine, a game's setup, its move
+history, and the player to move) to the move the engine generated.
+
+The file is append-only, with one entry per line. It can be shared between
+processes: each process reads entries added by the others, and writers take an
+exclusive lock (using fcntl.flock) while appending.
+
+On systems which don't support fcntl, no locking is done, so a cache file
+shouldn't be written by more than one process at a time.
+
+"""
+
+import atexit
+import hashlib
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def make_cache_key(engine_identity, board_size, komi, colour, history):
+    """Return a cache key.
+
+    engine_identity -- string
+    board_size      -- int
+    komi            -- int or float
+    colour          -- 'b' or 'w' (the player to move)
+    history         -- list of strings describing the game so far
+
+    Returns a 32-character string.
+
+    """
+    return hashlib.md5("\0".join(
+        [engine_identity, str(board_size), repr(float(komi)), colour] +
+        history)).hexdigest()
+
+
+class Genmove_cache(object):
+    """Access to a genmove cache file.
+
+    Instantiate with the cache file's pathname; the file is created if it
+    doesn't exist.
+
+    Raises EnvironmentError if the file can't be opened.
+
+    Moves are GTP vertices (or 'resign'), normalised to lower case.
+
+    """
+    def __init__(self, pathname):
+        self.pathname = pathname
+        self._fd = os.open(pathname, os.O_RDWR | os.O_CREAT | os.O_APPEND,
+                           0666)
+        self._moves = {}
+        self._position = 0
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _flock(self, operation_name):
+        # operation_name is 'LOCK_SH', 'LOCK_EX', or 'LOCK_UN'
+        if fcntl is not None:
+            fcntl.flock(self._fd, getattr(fcntl, operation_name))
+
+    def _read_new_entries(self):
+        os.lseek(self._fd, self._position, os.SEEK_SET)
+        chunks = []
+        while True:
+            chunk = os.read(self._fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        data = "".join(chunks)
+        # Only consume complete lines.
+        end = data.rfind("\n") + 1
+        for line in data[:end].splitlines():
+            key, _, move = line.partition(" ")
+            if move:
+                self._moves.setdefault(key, move)
+        self._position += end
+
+    def lookup(self, key):
+        """Return the cached move for a key, or None."""
+        move = self._moves.get(key)
+        if move is not None:
+            return move
+        self._flock('LOCK_SH')
+        try:
+            self._read_new_entries()
+        finally:
+            self._flock('LOCK_UN')
+        return self._moves.get(key)
+
+    def store(self, key, move):
+        """Record the move for a key.
+
+        If another process has already recorded a move for the key, the move
+        that was recorded first is kept.
+
+        Raises EnvironmentError if the file can't be written.
+
+        """
+        move = move.lower()
+        self._flock('LOCK_EX')
+        try:
+            self._read_new_entries()
+            if key in self._moves:
+                return
+            line = "%s %s\n" % (key, move)
+            os.write(self._fd, line)
+            self._moves[key] = move
+        finally:
+            self._flock('LOCK_UN')
+
+
+_open_caches = {}
+
+def get_genmove_cache(pathname):
+    """Return a Genmove_cache for the specified file.
+
+    Within a process, repeated calls with the same pathname return the same
+    object (so entries already read aren't read again). The caches stay open
+    until close_genmove_caches() is called (which happens automatically when
+    the process exits).
+
+    """
+    key = (os.getpid(), os.path.abspath(pathname))
+    try:
+        return _open_caches[key]
+    except KeyError:
+        pass
+    cache = Genmove_cache(pathname)
+    _open_caches[key] = cache
+    return cache
+
+def close_genmove_caches():
+    """Close all caches returned by get_genmove_cache()."""
+    for cache in _open_caches.values():
+        cache.close()
+    _open_caches.clear()
+
+atexit.register(close_genmove_caches)
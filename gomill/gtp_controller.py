@@ -9,6 +9,8 @@ import os
 import re
 import signal
 import subprocess
+import sys
+import time
 
 from gomill.utils import *
 from gomill.common import *
@@ -75,6 +77,7 @@ class Gtp_channel(object):
     public attributes:
       exit_status
       resource_usage
+      memory_samples
 
     exit_status describes the engine's exit status as an integer. It is None if
     not available. The integer is in the form returned by os.wait() (in
@@ -86,10 +89,16 @@ class Gtp_channel(object):
     In practice these attributes are only available for subprocess-based
     channels, and only after they've been closed.
 
+    memory_samples is a list of ints: the engine's resident set size in
+    kilobytes, as sampled while the channel was open. It is empty unless the
+    channel supports sampling and it has been enabled (see
+    Subprocess_gtp_channel.enable_memory_sampling()).
+
     """
     def __init__(self):
         self.exit_status = None
         self.resource_usage = None
+        self.memory_samples = []
         self.log_dest = None
         self.log_prefix = None
 
@@ -375,6 +384,14 @@ class Linebased_gtp_channel(Gtp_channel):
 def permit_sigpipe():
     signal.signal(signal.SIGPIPE, signal.SIG_DFL)
 
+def _get_page_size_kb():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') // 1024
+    except (AttributeError, ValueError, OSError):
+        return 4
+
+_page_size_kb = _get_page_size_kb()
+
 class Subprocess_gtp_channel(Linebased_gtp_channel):
     """A GTP channel to a subprocess.
 
@@ -397,6 +414,11 @@ class Subprocess_gtp_channel(Linebased_gtp_channel):
     Closing the channel waits for the subprocess to exit.
 
     """
+    # Memory sampling state (see enable_memory_sampling())
+    _statm_pathname = None
+    _sample_interval = None
+    _last_sample_time = None
+
     def __init__(self, command, stderr=None, cwd=None, env=None):
         Linebased_gtp_channel.__init__(self)
         try:
@@ -411,6 +433,51 @@ class Subprocess_gtp_channel(Linebased_gtp_channel):
         self.command_pipe = p.stdin
         self.response_pipe = p.stdout
 
+    def enable_memory_sampling(self, interval):
+        """Record the engine's memory use while the channel is open.
+
+        interval -- float (minimum number of seconds between samples)
+
+        The engine's resident set size is read from /proc/<pid>/statm each time
+        a response is received, provided at least 'interval' seconds have passed
+        since the previous sample. The samples are stored in memory_samples.
+
+        This does nothing on systems without /proc.
+
+        """
+        pathname = "/proc/%d/statm" % self.subprocess.pid
+        if not os.path.exists(pathname):
+            return
+        self._statm_pathname = pathname
+        self._sample_interval = interval
+        self._last_sample_time = None
+
+    def _sample_memory(self):
+        now = time.time()
+        if (self._last_sample_time is not None and
+            now - self._last_sample_time < self._sample_interval):
+            return
+        self._last_sample_time = now
+        try:
+            f = open(self._statm_pathname)
+            try:
+                fields = f.read().split()
+            finally:
+                f.close()
+            rss = int(fields[1]) * _page_size_kb
+        except (EnvironmentError, IndexError, ValueError):
+            # The engine may have exited already; that's fine.
+            return
+        # An exiting process reports no resident memory
+        if rss > 0:
+            self.memory_samples.append(rss)
+
+    def get_response_impl(self):
+        result = Linebased_gtp_channel.get_response_impl(self)
+        if self._statm_pathname is not None:
+            self._sample_memory()
+        return result
+
     def send_command_line(self, command):
         try:
             self.command_pipe.write(command)
@@ -448,6 +515,8 @@ class Subprocess_gtp_channel(Linebased_gtp_channel):
         except EnvironmentError, e:
             errors.append("error closing response pipe:\n%s" % e)
             errors.append(str(e))
+        # Stop sampling: after wait4() the pid may be reused.
+        self._statm_pathname = None
         try:
             # We don't really care about the exit status, but we do want to be
             # sure it isn't still running.
@@ -888,6 +957,60 @@ class Engine_description(object):
             else:
                 return self.name + ":" + self.clean_version
 
+class Engine_resource_usage(object):
+    """Resource usage of an engine subprocess.
+
+    Instantiate with
+      rusage         -- rusage object as returned by os.wait4()
+      memory_samples -- list of ints (sampled resident set size in kilobytes)
+
+    Public attributes:
+      cpu_time             -- float (user time + system time, in seconds)
+      max_rss              -- int (peak resident set size, in kilobytes)
+      minor_faults         -- int
+      major_faults         -- int
+      voluntary_switches   -- int (voluntary context switches)
+      involuntary_switches -- int (involuntary context switches)
+      memory_sample_count  -- int
+      sampled_max_rss      -- int (kilobytes) or None
+      sampled_mean_rss     -- float (kilobytes) or None
+
+    max_rss comes from the operating system's own accounting, so it reflects
+    the true peak even if memory sampling wasn't enabled. The sampled_ values
+    are None if there were no samples.
+
+    Engine_resource_usages are suitable for pickling.
+
+    """
+    def __init__(self, rusage, memory_samples=()):
+        self.cpu_time = rusage.ru_utime + rusage.ru_stime
+        max_rss = rusage.ru_maxrss
+        # Darwin reports ru_maxrss in bytes; everyone else uses kilobytes.
+        if sys.platform == 'darwin':
+            max_rss //= 1024
+        self.max_rss = max_rss
+        self.minor_faults = rusage.ru_minflt
+        self.major_faults = rusage.ru_majflt
+        self.voluntary_switches = rusage.ru_nvcsw
+        self.involuntary_switches = rusage.ru_nivcsw
+        self.memory_sample_count = len(memory_samples)
+        if memory_samples:
+            self.sampled_max_rss = max(memory_samples)
+            self.sampled_mean_rss = (float(sum(memory_samples)) /
+                                     len(memory_samples))
+        else:
+            self.sampled_max_rss = None
+            self.sampled_mean_rss = None
+
+    @property
+    def context_switches(self):
+        return self.voluntary_switches + self.involuntary_switches
+
+    def __repr__(self):
+        return ("<Engine_resource_usage: cpu %.2fs, max rss %dkB>" %
+                (self.cpu_time, self.max_rss))
+
+
 class Game_controller(object):
     """Manage a pair of GTP controllers representing game players.
 
@@ -909,7 +1032,7 @@ class Game_controller(object):
         higher-level helpers
       gc.close_players()
       gc.describe_late_errors()
-      gc.get_resource_usage_cpu_times()
+      gc.get_resource_usage_cpu_times() and/or gc.get_resource_usage()
 
     Public attributes for reading:
       players             -- map colour -> player code
@@ -1137,6 +1260,28 @@ class Game_controller(object):
                 result[colour] = ru.ru_utime + ru.ru_stime
         return result
 
+    def get_resource_usage(self):
+        """Return the measured resource usage of the engines.
+
+        Returns a dict colour -> Engine_resource_usage or None
+
+        As for get_resource_usage_cpu_times(), this information isn't available
+        until the controller has been closed, and it's safe to call this even
+        if one or both of the engines was never successfully started.
+
+        """
+        result = {'b' : None, 'w' : None}
+        for colour in 'b', 'w':
+            try:
+                controller = self.controllers[colour]
+            except KeyError:
+                continue
+            channel = controller.channel
+            if channel.resource_usage is not None:
+                result[colour] = Engine_resource_usage(
+                    channel.resource_usage, channel.memory_samples)
+        return result
+
 
     ## Higher-level GTP helpers
 
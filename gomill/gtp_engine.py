@@ -146,6 +146,13 @@ _remove_response_controls_re = re.compile(r"[\x00-\x08\x0b-\x1f\x7f]")
 _normalise_whitespace_re = re.compile(r"[\x09\x20]+")
 _command_id_re = re.compile(r"^-?[0-9]+")
 
+# Lines which handle_line() can split directly: no control characters other
+# than a trailing newline, no comment, no tabs, and no command id.
+_simple_line_re = re.compile(
+    r"^ *[^\x00-\x20\x7f#0-9-][^\x00-\x1f\x7f#]*\n?\Z")
+# Responses which _clean_response() would change.
+_unclean_response_re = re.compile(r"[\x00-\x08\x0b-\x1f\x7f\t]|\n\n|\s\Z")
+
 def _preprocess_line(s):
     """Clean up an input line and normalise whitespace."""
     s = s.partition("#")[0]
@@ -161,6 +168,8 @@ def _clean_response(response):
         s = response.encode("utf-8")
     else:
         s = str(response)
+    if not _unclean_response_re.search(s):
+        return s
     s = s.rstrip()
     s = s.replace("\n\n", "\n.\n")
     s = _remove_response_controls_re.sub("", s)
@@ -357,6 +366,20 @@ class Gtp_engine_protocol(object):
         If end_session is true, the GTP session should be terminated.
 
         """
+        if _simple_line_re.match(line):
+            # Fast path: the line needs no cleaning up and has no command id
+            tokens = line.split()
+            command = tokens[0]
+            if command in self.handlers:
+                is_error, cleaned_response, end_session = \
+                    self.run_command(command, tokens[1:])
+                if cleaned_response == "":
+                    if is_error:
+                        return "?\n\n", end_session
+                    return "=\n\n", end_session
+                if is_error:
+                    return "? " + cleaned_response + "\n\n", end_session
+                return "= " + cleaned_response + "\n\n", end_session
         normalised = _preprocess_line(line)
         if normalised == "" or normalised == " ":
             return None, False
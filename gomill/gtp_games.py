@@ -3,6 +3,7 @@
 from gomill.utils import *
 from gomill.common import *
 from gomill import gameplay
+from gomill import genmove_caches
 from gomill.gtp_controller import BadGtpResponse
 
 class Game_result(gameplay.Result):
@@ -16,6 +17,8 @@ class Game_result(gameplay.Result):
       winning_player -- player code or None
       losing_player  -- player code or None
       cpu_times      -- map player code -> float (representing seconds) or None
+      resource_usage -- map player code ->
+                          gtp_controller.Engine_resource_usage or None
 
     Call set_players() before using these.
 
@@ -23,6 +26,9 @@ class Game_result(gameplay.Result):
 
     cpu_times are user time + system time.
 
+    resource_usage is only available for engines run as subprocesses (see
+    set_resource_usage()).
+
     Game_results are suitable for pickling.
 
     """
@@ -41,6 +47,7 @@ class Game_result(gameplay.Result):
         self.player_w = players['w']
         self.winning_player = self.players.get(self.winning_colour)
         self.cpu_times = {self.player_b : None, self.player_w : None}
+        self.resource_usage = {self.player_b : None, self.player_w : None}
         if self.is_forfeit:
             self.detail = "forfeit by %s: %s" % (
                 self.players[self.losing_colour], self.detail)
@@ -61,9 +68,13 @@ class Game_result(gameplay.Result):
             self.is_forfeit,
             self.game_id,
             self.cpu_times,
+            self.resource_usage,
             )
 
     def __setstate__(self, state):
+        # In gomill 0.8.2 and earlier, there was no resource_usage
+        if len(state) == 8:
+            state += (None,)
         (self.player_b,
          self.player_w,
          self.winning_colour,
@@ -72,7 +83,11 @@ class Game_result(gameplay.Result):
          self.is_forfeit,
          self.game_id,
          cpu_times,
+         resource_usage,
          ) = state
+        if resource_usage is None:
+            resource_usage = {self.player_b : None, self.player_w : None}
+        self.resource_usage = resource_usage
         # In gomill 0.7 and earlier, cpu_time could be '?'; treat this as None
         for colour, cpu_time in cpu_times.items():
             if cpu_time == '?':
@@ -95,6 +110,16 @@ class Game_result(gameplay.Result):
                 continue
             self.cpu_times[self.players[colour]] = cpu_time
 
+    def set_resource_usage(self, resource_usage):
+        """Set the resource_usage dict.
+
+        resource_usage -- dict colour ->
+                            gtp_controller.Engine_resource_usage or None
+
+        """
+        for colour, usage in resource_usage.iteritems():
+            self.resource_usage[self.players[colour]] = usage
+
     def describe(self):
         """Return a short human-readable description of the result."""
         if self.winning_colour is not None:
@@ -187,12 +212,23 @@ class _Gtp_backend(gameplay.Backend):
         self.internal_scorer = False
         self.handicap_compensation = "no"
         self.handicap = None
+        # colours whose engines were sent kgs-time_settings
+        self.uses_kgs_time_settings = set()
+        # map colour -> (Genmove_cache, engine identity)
+        self.genmove_caches = {}
+        # map colour -> [hits, lookups]
+        self.genmove_cache_stats = {}
+        # colours whose last move came from a genmove cache
+        self.cached_move_colours = set()
+        # strings describing the handicap and moves so far (for cache keys)
+        self.history = []
 
     def start_new_game(self, board_size, komi):
         """Reset the engines' GTP game state (board size, contents, komi)."""
         assert board_size == self.board_size
         assert komi == self.komi
         self.gc.set_cautious_mode(False)
+        self.history = []
         for colour in "b", "w":
             self.gc.send_command(colour, "boardsize", str(board_size))
             self.gc.send_command(colour, "clear_board")
@@ -220,6 +256,7 @@ class _Gtp_backend(gameplay.Backend):
 
     def notify_free_handicap(self, points):
         vertices = [format_vertex(point) for point in points]
+        self.history.append("handicap " + " ".join(sorted(vertices)))
         self.gc.send_command("w", "set_free_handicap", *vertices)
 
     def notify_fixed_handicap(self, colour, handicap, points):
@@ -234,6 +271,45 @@ class _Gtp_backend(gameplay.Backend):
             raise BadGtpResponse(
                 "bad response from fixed_handicap command "
                 "to %s: %s" % (self.gc.players[colour], vertices))
+        if colour == "b":
+            self.history.append("handicap " + " ".join(
+                sorted(format_vertex(point) for point in points)))
+
+    def notify_time_settings(self, time_settings):
+        # Standard GTP time_settings can't express Japanese byo-yomi, so we use
+        # kgs-time_settings if available, and otherwise describe it as
+        # Canadian byo-yomi with one stone per period.
+        ts = time_settings
+        main_time = str(int(ts.main_time))
+        byo_yomi_time = str(int(ts.byo_yomi_time))
+        for colour in "b", "w":
+            if not ts.has_byo_yomi:
+                self.gc.maybe_send_command(
+                    colour, "time_settings", main_time, "0", "0")
+            elif ts.byo_yomi_style == 'canadian':
+                self.gc.maybe_send_command(
+                    colour, "time_settings", main_time, byo_yomi_time,
+                    str(ts.byo_yomi_stones))
+            elif self.gc.known_command(colour, "kgs-time_settings"):
+                self.gc.maybe_send_command(
+                    colour, "kgs-time_settings", "byoyomi", main_time,
+                    byo_yomi_time, str(ts.byo_yomi_periods))
+                self.uses_kgs_time_settings.add(colour)
+            else:
+                self.gc.maybe_send_command(
+                    colour, "time_settings", main_time, byo_yomi_time, "1")
+
+    def notify_time_left(self, colour, clock):
+        if not clock.in_byo_yomi:
+            stones = 0
+        elif clock.stones_left is not None:
+            stones = clock.stones_left
+        elif colour in self.uses_kgs_time_settings:
+            stones = clock.periods_left
+        else:
+            stones = 1
+        self.gc.maybe_send_command(
+            colour, "time_left", colour, str(int(clock.time_left)), str(stones))
 
     def get_move(self, colour):
         if (self.claim_allowed[colour] and
@@ -243,10 +319,23 @@ class _Gtp_backend(gameplay.Backend):
         else:
             genmove_command = ["genmove", colour]
             may_claim = False
+        self.cached_move_colours.discard(colour)
+        cache_key = None
+        if colour in self.genmove_caches and not may_claim:
+            cache_key, raw_move = self._get_cached_move(colour)
+            if raw_move is not None:
+                return self._interpret_move(raw_move, False)
         try:
             raw_move = self.gc.send_command(colour, *genmove_command)
         except BadGtpResponse, e:
             return 'forfeit', str(e)
+        action, detail = self._interpret_move(raw_move, may_claim)
+        if cache_key is not None and action in ('move', 'resign'):
+            cache, _ = self.genmove_caches[colour]
+            cache.store(cache_key, raw_move)
+        return action, detail
+
+    def _interpret_move(self, raw_move, may_claim):
         move_s = raw_move.lower()
         if move_s == "resign":
             return 'resign', None
@@ -258,7 +347,35 @@ class _Gtp_backend(gameplay.Backend):
             return 'forfeit', "attempted ill-formed move %s" % raw_move
         return 'move', move
 
+    def _get_cached_move(self, colour):
+        """Look up a move in the player's genmove cache.
+
+        Returns a pair (cache key, raw move or None).
+
+        If there's a cached move (other than 'resign'), tells the engine about
+        it using 'play'; if the engine rejects it, returns None as the move.
+
+        """
+        cache, engine_identity = self.genmove_caches[colour]
+        stats = self.genmove_cache_stats[colour]
+        key = genmove_caches.make_cache_key(
+            engine_identity, self.board_size, self.komi, colour, self.history)
+        stats[1] += 1
+        raw_move = cache.lookup(key)
+        if raw_move is None:
+            return key, None
+        if raw_move != "resign":
+            try:
+                self.gc.send_command(colour, "play", colour, raw_move)
+            except BadGtpResponse:
+                return key, None
+        stats[0] += 1
+        self.cached_move_colours.add(colour)
+        return key, raw_move
+
     def get_last_move_comment(self, colour):
+        if colour in self.cached_move_colours:
+            return None
         comment = self.gc.maybe_send_command(colour, "gomill-explain_last_move")
         comment = sanitise_utf8(comment)
         if comment == "":
@@ -267,6 +384,7 @@ class _Gtp_backend(gameplay.Backend):
 
     def notify_move(self, colour, move):
         vertex = format_vertex(move)
+        self.history.append(opponent_of(colour) + " " + vertex)
         try:
             self.gc.send_command(colour, "play", opponent_of(colour), vertex)
         except BadGtpResponse, e:
@@ -349,6 +467,8 @@ class Gtp_game(object):
         game.use_internal_scorer() or game.allow_scorer(...)
         game.set_claim_allowed(...)
         game.set_move_callback(...)
+        game.set_time_settings(...)
+        game.set_genmove_cache(...)
       game.prepare()
       game.set_handicap(...) [optional]
       game.run()
@@ -447,6 +567,54 @@ class Gtp_game(object):
         """
         self.game_runner.set_move_callback(fn)
 
+    def set_time_settings(self, time_settings):
+        """Specify time limits for the game.
+
+        time_settings -- gameplay.Time_settings
+
+        The engines are told the limits using the GTP time_settings command (or
+        kgs-time_settings for Japanese byo-yomi, if supported), and sent
+        time_left before each genmove. Engines which don't support these
+        commands are still held to the limits.
+
+        See gameplay.Game_runner for how the limits are enforced.
+
+        """
+        self.game_runner.set_time_settings(time_settings)
+
+    def set_genmove_cache(self, colour, cache, engine_identity):
+        """Use a persistent cache for the specified player's moves.
+
+        cache           -- genmove_caches.Genmove_cache
+        engine_identity -- string
+
+        Before sending genmove, the cache is consulted using a key made from
+        engine_identity, the board size, komi, colour, handicap stones, and the
+        moves played so far. If there's an entry, the engine is sent 'play'
+        with the cached move instead of 'genmove'. Otherwise the generated move
+        is added to the cache.
+
+        This is only useful for deterministic engines; engine_identity should
+        distinguish everything which might affect the engine's choice of move.
+        The cache isn't used for 'gomill-genmove_ex' (see set_claim_allowed()).
+
+        Note that moves from the cache take almost no time, so they're not a
+        good test of an engine's behaviour under time limits.
+
+        """
+        self.backend.genmove_caches[colour] = (cache, engine_identity)
+        self.backend.genmove_cache_stats[colour] = [0, 0]
+
+    def get_genmove_cache_stats(self):
+        """Report on the use of genmove caches.
+
+        Returns a map colour -> pair (hits, lookups), with entries for the
+        players which have a cache (see set_genmove_cache()).
+
+        """
+        return dict((colour, tuple(stats)) for (colour, stats)
+                    in self.backend.genmove_cache_stats.iteritems())
+
 
     ## Game-running API
 
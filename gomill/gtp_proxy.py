@@ -5,6 +5,11 @@ on to another engine (the _back end_).
 
 """
 
+from __future__ import with_statement
+
+import Queue
+import threading
+
 from gomill import gtp_controller
 from gomill import gtp_engine
 from gomill.gtp_controller import (
@@ -63,10 +68,18 @@ class Gtp_proxy(object):
     If you want to hide one of the underlying commands, or don't want one of the
     additional commands, just use engine.remove_command().
 
+    See enable_response_cache() for caching the back end's responses.
+
     """
     def __init__(self):
         self.controller = None
         self.engine = None
+        self._static_commands = None
+        self._position_commands = None
+        self._static_cache = {}
+        self._position_cache = {}
+        self.cache_hits = {}
+        self.cache_misses = {}
 
     def _back_end_is_set(self):
         return self.controller is not None
@@ -171,6 +184,56 @@ class Gtp_proxy(object):
         gtp_engine.run_interactive_gtp_session(self.engine)
         self.close()
 
+    def enable_response_cache(
+        self,
+        static_commands=('name', 'version', 'protocol_version',
+                         'list_commands', 'known_command'),
+        position_commands=('showboard',)):
+        """Cache the back end's responses to commands which don't change state.
+
+        static_commands   -- sequence of command names
+        position_commands -- sequence of command names
+
+        After this is called, pass_command() (and so handle_command() and the
+        proxy engine's handlers) answers repeated commands from the cache
+        rather than sending them to the back end. Responses are cached per
+        command and arguments; failure responses are never cached.
+
+        Responses to static_commands are cached for the rest of the session.
+
+        Responses to position_commands are cached until any command not listed
+        in either sequence (eg 'play', 'undo', 'clear_board', 'genmove') is
+        passed to the back end.
+
+        The proxy maintains the following public attributes:
+          cache_hits   -- map command name -> number of responses from the cache
+          cache_misses -- map command name -> number of cacheable commands sent
+                          to the back end
+
+        Calling this again replaces the command lists and empties the cache.
+
+        """
+        self._static_commands = frozenset(static_commands)
+        self._position_commands = frozenset(position_commands)
+        self._static_cache = {}
+        self._position_cache = {}
+
+    def _get_response_cache(self, command):
+        """Return the cache dict to use for a command, or None.
+
+        Empties the position cache if the command might change the back end's
+        state.
+
+        """
+        if self._static_commands is None:
+            return None
+        if command in self._static_commands:
+            return self._static_cache
+        if command in self._position_commands:
+            return self._position_cache
+        self._position_cache.clear()
+        return None
+
     def pass_command(self, command, args):
         """Pass a command to the back end, and return its response.
 
@@ -190,10 +253,24 @@ class Gtp_proxy(object):
         """
         if not self._back_end_is_set():
             raise StandardError("back end isn't set")
+        cache = self._get_response_cache(command)
+        if cache is not None:
+            key = (command, tuple(args))
+            try:
+                response = cache[key]
+            except KeyError:
+                self.cache_misses[command] = \
+                    self.cache_misses.get(command, 0) + 1
+            else:
+                self.cache_hits[command] = self.cache_hits.get(command, 0) + 1
+                return response
         try:
-            return self.controller.do_command(command, *args)
+            response = self.controller.do_command(command, *args)
         except GtpChannelError, e:
             raise BackEndError(str(e), cause=e)
+        if cache is not None:
+            cache[key] = response
+        return response
 
     def handle_command(self, command, args):
         """Run a command on the back end, from inside a GTP handler.
@@ -260,3 +337,425 @@ class Gtp_proxy(object):
         except IndexError:
             gtp_engine.report_bad_arguments()
         return self.handle_command(command, args[1:])
+
+
+class _Back_end_worker(object):
+    """Thread running commands on one of a Gtp_fanout_proxy's back ends.
+
+    Public attributes:
+      index      -- int (position in the list of back ends)
+      controller -- Gtp_controller
+      is_live    -- bool
+      error      -- string describing why the back end was dropped (or None)
+
+    Jobs are callables taking no arguments; they run in the order they were
+    submitted.
+
+    """
+    def __init__(self, index, controller):
+        self.index = index
+        self.controller = controller
+        self.is_live = True
+        self.error = None
+        self._jobs = Queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            job()
+
+    def submit(self, job):
+        self._jobs.put(job)
+
+    def stop(self):
+        """Wait for outstanding jobs to finish and stop the thread."""
+        self._jobs.put(None)
+        self._thread.join()
+
+    def drop(self, message):
+        if self.is_live:
+            self.is_live = False
+            self.error = message
+
+    def run_command(self, command, args):
+        """Run a command on the back end.
+
+        Returns a pair (outcome, response), where outcome is
+          True  -- success response
+          False -- failure response
+          None  -- low-level error, or the back end has been dropped
+
+        Drops the back end if there's a low-level error.
+
+        """
+        if not self.is_live:
+            return None, self.error
+        try:
+            return True, self.controller.do_command(command, *args)
+        except BadGtpResponse, e:
+            return False, e.gtp_error_message
+        except GtpChannelError, e:
+            self.drop(str(e))
+            return None, str(e)
+
+class _Fanout_command(object):
+    """Collects the responses to a command sent to several back ends.
+
+    Public attributes:
+      responses -- list of tuples (worker, outcome, response), in the order
+                   the responses arrived
+
+    """
+    def __init__(self, workers):
+        self.workers = workers
+        self.responses = []
+        self._condition = threading.Condition()
+
+    def add_response(self, worker, outcome, response):
+        """Record a back end's response (called from the worker thread).
+
+        Returns the first non-low-level-error response recorded before this
+        one, as a tuple (worker, outcome, response), or None.
+
+        """
+        with self._condition:
+            earlier = None
+            for t in self.responses:
+                if t[1] is not None:
+                    earlier = t
+                    break
+            self.responses.append((worker, outcome, response))
+            self._condition.notifyAll()
+        return earlier
+
+    def get_response(self, worker):
+        """Return the (outcome, response) pair from the specified worker."""
+        with self._condition:
+            for t in self.responses:
+                if t[0] is worker:
+                    return t[1:]
+        return None, None
+
+    def wait(self, predicate):
+        """Wait until predicate(responses) is true, or all have responded.
+
+        Returns a copy of the responses list.
+
+        """
+        with self._condition:
+            while (len(self.responses) < len(self.workers) and
+                   not predicate(self.responses)):
+                self._condition.wait()
+            return self.responses[:]
+
+def _count_valid(responses):
+    return sum(1 for (_, outcome, _) in responses if outcome is not None)
+
+def _count_successes(responses):
+    return sum(1 for (_, outcome, _) in responses if outcome)
+
+class Gtp_fanout_proxy(object):
+    """Manager for a GTP proxy engine with several back ends.
+
+    Public attributes:
+      engine       -- Gtp_engine_protocol
+      genmove_wins -- map back end index -> number of genmoves it supplied
+
+    The back ends are expected to be instances of equivalent engines (for
+    example, the same engine with different thread counts, or a primary build
+    and a fallback build).
+
+    The proxy engine supports the commands reported by the first back end's
+    'list_commands'. They are handled as follows:
+
+     - commands listed in mirrored_commands are sent to all back ends. The
+       response is the first response to arrive. A back end which later gives
+       a success response where the first was a failure (or vice versa) is
+       dropped.
+
+     - 'genmove' is sent to all back ends. The proxy waits for 'quorum'
+       success responses (or all responses, if fewer back ends are live), and
+       returns the most common of those moves (preferring the earliest in case
+       of a tie). With the default quorum of 1 this is the first valid answer.
+       Back ends which generated a different move (including those which
+       respond after the proxy has returned) are resynchronised by sending
+       'undo' and then 'play' with the chosen move; a back end which fails
+       either command is dropped.
+
+     - other commands are sent only to the first live back end.
+
+    So commands which change the engines' state must appear in
+    mirrored_commands; commands like 'place_free_handicap' whose results vary
+    between back ends aren't supported.
+
+    Each back end is driven by its own thread, so a back end which is slow to
+    answer a genmove doesn't hold up later commands: they are queued for it
+    and the proxy answers from the others.
+
+    A back end which sees a low-level (transport or protocol) error is
+    dropped. If all back ends have been dropped, commands report a fatal
+    error.
+
+    The 'quit' handler passes 'quit' to all live back ends and raises GtpQuit.
+
+    """
+    default_mirrored_commands = (
+        'boardsize', 'clear_board', 'komi', 'play', 'undo', 'fixed_handicap',
+        'set_free_handicap', 'loadsgf', 'time_settings', 'kgs-time_settings',
+        'time_left', 'kgs-game_over')
+
+    def __init__(self, quorum=1, mirrored_commands=None):
+        self.quorum = quorum
+        if mirrored_commands is None:
+            mirrored_commands = self.default_mirrored_commands
+        self.mirrored_commands = frozenset(mirrored_commands)
+        self.engine = None
+        self.workers = []
+        self.genmove_wins = {}
+
+    def set_back_end_controllers(self, controllers):
+        """Specify the back ends using Gtp_controllers.
+
+        controllers -- nonempty list of Gtp_controllers
+
+        Raises BackEndError if it can't communicate with the first back end.
+
+        """
+        if self.workers:
+            raise StandardError("back ends already set")
+        if not controllers:
+            raise ValueError("no back ends")
+        try:
+            self.back_end_commands = controllers[0].list_commands()
+        except (GtpChannelError, BadGtpResponse), e:
+            raise BackEndError(str(e), cause=e)
+        self.workers = [_Back_end_worker(i, controller)
+                        for (i, controller) in enumerate(controllers)]
+        self._make_engine()
+
+    def set_back_end_subprocesses(self, commands, **kwargs):
+        """Specify the back ends as subprocesses.
+
+        commands -- list of command lists (as for subprocess.Popen)
+
+        Additional keyword arguments are passed to the Subprocess_gtp_channel
+        constructors.
+
+        Raises BackEndError if it can't launch all the back ends, or can't
+        communicate with the first.
+
+        """
+        controllers = []
+        for i, command in enumerate(commands):
+            try:
+                channel = gtp_controller.Subprocess_gtp_channel(
+                    command, **kwargs)
+            except GtpChannelError, e:
+                for controller in controllers:
+                    controller.safe_close()
+                raise BackEndError(
+                    "can't launch back end command\n%s" % e, cause=e)
+            controllers.append(
+                gtp_controller.Gtp_controller(channel, "back end %d" % i))
+        self.set_back_end_controllers(controllers)
+
+    def _make_engine(self):
+        self.engine = gtp_engine.Gtp_engine_protocol()
+        handlers = {}
+        for command in self.back_end_commands:
+            if command == 'genmove':
+                handler = self.handle_genmove
+            elif command in self.mirrored_commands:
+                def handler(args, _command=command):
+                    return self.handle_mirrored_command(_command, args)
+            else:
+                def handler(args, _command=command):
+                    return self.handle_command(_command, args)
+            handlers[command] = handler
+        self.engine.add_commands(handlers)
+        self.engine.add_protocol_commands()
+        self.engine.add_command('quit', self.handle_quit)
+
+    def get_live_back_ends(self):
+        """Return a list of the indexes of the back ends still in use."""
+        return [worker.index for worker in self.workers if worker.is_live]
+
+    def get_dropped_back_ends(self):
+        """Describe the back ends which have been dropped.
+
+        Returns a list of pairs (index, message).
+
+        """
+        return [(worker.index, worker.error)
+                for worker in self.workers if not worker.is_live]
+
+    def _get_live_workers(self):
+        result = [worker for worker in self.workers if worker.is_live]
+        if not result:
+            raise GtpFatalError(
+                "all back ends have failed:\n" +
+                "\n".join(message for (_, message)
+                          in self.get_dropped_back_ends()))
+        return result
+
+    def _fan_out(self, workers, command, args, check_consistency):
+        """Queue a command for the specified back ends.
+
+        Returns a _Fanout_command.
+
+        """
+        fanout = _Fanout_command(workers)
+        for worker in workers:
+            def job(worker=worker):
+                outcome, response = worker.run_command(command, args)
+                earlier = fanout.add_response(worker, outcome, response)
+                if (check_consistency and outcome is not None and
+                    earlier is not None and earlier[1] != outcome):
+                    worker.drop(
+                        "response to '%s' disagrees with back end %d" %
+                        (command, earlier[0].index))
+            worker.submit(job)
+        return fanout
+
+    def _report(self, responses):
+        """Return the first valid response, or raise the appropriate error."""
+        for worker, outcome, response in responses:
+            if outcome is None:
+                continue
+            if not outcome:
+                raise GtpError(response)
+            return response
+        raise GtpFatalError(
+            "all back ends have failed:\n" +
+            "\n".join(message for (_, _, message) in responses))
+
+    def handle_command(self, command, args):
+        """Run a command on the first live back end, from a GTP handler.
+
+        Falls back to the next live back end if there's a low-level error.
+
+        """
+        while True:
+            worker = self._get_live_workers()[0]
+            fanout = self._fan_out([worker], command, args, False)
+            ((_, outcome, response),) = fanout.wait(lambda responses:False)
+            if outcome is not None:
+                break
+        if not outcome:
+            raise GtpError(response)
+        return response
+
+    def handle_mirrored_command(self, command, args):
+        """Run a command on all back ends, from a GTP handler."""
+        fanout = self._fan_out(self._get_live_workers(), command, args, True)
+        return self._report(fanout.wait(_count_valid))
+
+    def _choose_move(self, responses):
+        votes = {}
+        candidates = []
+        for worker, outcome, response in responses:
+            if not outcome:
+                continue
+            move = response.upper()
+            if move not in votes:
+                votes[move] = 0
+                candidates.append((worker, response))
+            votes[move] += 1
+        best = None
+        for worker, response in candidates:
+            if best is None or votes[response.upper()] > votes[best[1].upper()]:
+                best = (worker, response)
+        return best
+
+    def handle_genmove(self, args):
+        workers = self._get_live_workers()
+        quorum = self.quorum
+        fanout = self._fan_out(workers, 'genmove', args, False)
+        responses = fanout.wait(
+            lambda responses: _count_successes(responses) >= quorum)
+        best = self._choose_move(responses)
+        if best is None:
+            self._report(responses)
+        winner, move = best
+        self.genmove_wins[winner.index] = \
+            self.genmove_wins.get(winner.index, 0) + 1
+        colour = args[0] if args else None
+        for worker in workers:
+            def job(worker=worker):
+                self._resynchronise(
+                    worker, fanout.get_response(worker), colour, move)
+            worker.submit(job)
+        return move
+
+    def _resynchronise(self, worker, genmove_response, colour, move):
+        """Bring a back end's position into line with the chosen move.
+
+        Called from the worker thread after its genmove has completed.
+
+        """
+        outcome, response = genmove_response
+        if outcome is None:
+            return
+        if outcome:
+            if response.upper() == move.upper():
+                return
+            if response.lower() != 'resign':
+                undo_outcome, undo_response = worker.run_command('undo', [])
+                if not undo_outcome:
+                    worker.drop("can't resynchronise: undo failed: %s" %
+                                undo_response)
+                    return
+        if move.lower() == 'resign':
+            return
+        play_outcome, play_response = worker.run_command(
+            'play', [colour, move])
+        if not play_outcome:
+            worker.drop("can't resynchronise: play %s failed: %s" %
+                        (move, play_response))
+
+    def handle_quit(self, args):
+        workers = [worker for worker in self.workers if worker.is_live]
+        fanout = self._fan_out(workers, 'quit', [], False)
+        responses = fanout.wait(lambda responses:False)
+        for worker in workers:
+            worker.controller.channel_is_bad = True
+        result = ""
+        for worker, outcome, response in responses:
+            if outcome:
+                result = response
+                break
+        raise GtpQuit(result)
+
+    def close(self):
+        """Close the channels to the back ends.
+
+        Waits for any outstanding back end commands to complete.
+
+        This will send 'quit' to each back end if low-level errors have not
+        previously been seen on its channel.
+
+        Errors (including failure responses to 'quit') are reported by raising
+        BackEndError.
+
+        """
+        late_errors = []
+        for worker in self.workers:
+            worker.stop()
+            worker.controller.safe_close()
+            late_errors += worker.controller.retrieve_error_messages()
+        if late_errors:
+            raise BackEndError("\n".join(late_errors))
+
+    def run(self):
+        """Run a GTP session on stdin and stdout, using the proxy engine.
+
+        Closes the channels to the back ends before it returns.
+
+        """
+        gtp_engine.run_interactive_gtp_session(self.engine)
+        self.close()
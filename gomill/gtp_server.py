@@ -0,0 +1,120 @@
+"""Serve GTP engine sessions over sockets.
+
+This hosts any number of concurrent GTP sessions in a single process, each
+with its own Gtp_engine_protocol object.
+
+This module requires Python 2.6 or later.
+
+"""
+
+import errno
+import os
+import socket
+import SocketServer
+
+from gomill import gtp_engine
+
+
+class _Gtp_session_handler(SocketServer.StreamRequestHandler):
+    """Run a single GTP session on an accepted connection."""
+    def handle(self):
+        engine = self.server.engine_factory()
+        try:
+            gtp_engine.run_gtp_session(engine, self.rfile, self.wfile)
+        except gtp_engine.ControllerDisconnected:
+            pass
+        except socket.error, e:
+            if e.errno not in (errno.ECONNRESET, errno.EPIPE):
+                raise
+        finally:
+            self.server.session_ended(engine)
+
+
+# SocketServer classes are old-style, so these mixins call base class methods
+# explicitly (UnixStreamServer is a subclass of TCPServer).
+
+class _Gtp_server_mixin:
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, engine_factory, address, end_session_callback=None):
+        self.engine_factory = engine_factory
+        self.end_session_callback = end_session_callback
+        SocketServer.TCPServer.__init__(self, address, _Gtp_session_handler)
+
+    def session_ended(self, engine):
+        if self.end_session_callback is not None:
+            self.end_session_callback(engine)
+
+class _Threading_tcp_server(_Gtp_server_mixin, SocketServer.ThreadingMixIn,
+                            SocketServer.TCPServer):
+    pass
+
+class _Forking_tcp_server(_Gtp_server_mixin, SocketServer.ForkingMixIn,
+                          SocketServer.TCPServer):
+    pass
+
+class _Unix_server_mixin(_Gtp_server_mixin):
+    def server_close(self):
+        SocketServer.TCPServer.server_close(self)
+        try:
+            os.remove(self.server_address)
+        except EnvironmentError:
+            pass
+
+class _Threading_unix_server(_Unix_server_mixin, SocketServer.ThreadingMixIn,
+                             SocketServer.UnixStreamServer):
+    pass
+
+class _Forking_unix_server(_Unix_server_mixin, SocketServer.ForkingMixIn,
+                           SocketServer.UnixStreamServer):
+    pass
+
+_server_classes = {
+    ('tcp', False) : _Threading_tcp_server,
+    ('tcp', True)  : _Forking_tcp_server,
+    ('unix', False) : _Threading_unix_server,
+    ('unix', True)  : _Forking_unix_server,
+    }
+
+
+def make_gtp_server(engine_factory, address, use_processes=False,
+                    end_session_callback=None):
+    """Create a server which runs GTP sessions on incoming connections.
+
+    engine_factory       -- callable returning a Gtp_engine_protocol
+    address              -- pair (host, port) or string (Unix socket pathname)
+    use_processes        -- bool (default False)
+    end_session_callback -- callable taking a Gtp_engine_protocol (optional)
+
+    Returns a SocketServer.BaseServer instance, already bound and listening.
+    Call its serve_forever() method to accept connections, and its shutdown()
+    and server_close() methods to stop.
+
+    engine_factory is called once for each connection; the resulting engine
+    (and anything its handlers refer to) is used only for that connection's
+    session. A session ends when the controller closes the connection or the
+    engine signals end of session (eg, on 'quit').
+
+    If use_processes is false, each session runs in its own thread. Handlers
+    for different sessions may then run concurrently, but CPU-bound handlers
+    will compete for the interpreter lock. If use_processes is true, each
+    session runs in a forked child process, so CPU-bound handlers run in
+    parallel; engine_factory is then called in the child.
+
+    If end_session_callback is specified, it is called with the engine object
+    when each session ends (in the thread or process which ran the session).
+
+    If the address is a Unix socket pathname, the socket file is removed by
+    server_close(). Port 0 requests an arbitrary free TCP port; the address
+    actually used is available as the server's server_address attribute.
+
+    Raises EnvironmentError (socket.error) if the socket can't be bound.
+
+    """
+    if isinstance(address, basestring):
+        family = 'unix'
+    else:
+        family = 'tcp'
+    cls = _server_classes[family, bool(use_processes)]
+    return cls(engine_factory, address, end_session_callback)
@@ -2,6 +2,10 @@
 
 from __future__ import with_statement
 
+import os
+import threading
+from itertools import islice
+
 from gomill import __version__
 from gomill.common import *
 from gomill import ascii_boards
@@ -44,6 +48,59 @@ class History_move(object):
         return (self.move is None)
 
 
+class Move_history_view(object):
+    """Read-only view of the first part of a list of History_move objects.
+
+    This behaves like a list as far as indexing, slicing, iteration, len(),
+    comparison and concatenation go (slicing and concatenation return lists).
+
+    Instantiate with the list and the number of entries to show. The list may
+    be appended to afterwards, but the entries covered by the view mustn't be
+    changed.
+
+    """
+    __slots__ = ('_moves', '_length')
+
+    def __init__(self, moves, length):
+        self._moves = moves
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return islice(self._moves, self._length)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            moves = self._moves
+            return [moves[i] for i in xrange(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("move history index out of range")
+        return self._moves[index]
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, tuple, Move_history_view)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "<Move_history_view %r>" % list(self)
+
+
 class Game_state(object):
     """Data passed to a move generator.
 
@@ -52,13 +109,15 @@ class Game_state(object):
       board                     -- boards.Board
       komi                      -- float
       history_base              -- boards.Board
-      move_history              -- list of History_move objects
+      move_history              -- Move_history_view
       ko_point                  -- (row, col) or None
       handicap                  -- int >= 2 or None
       for_regression            -- bool
       time_settings             -- tuple (m, b, s), or None
       time_remaining            -- int (seconds), or None
       canadian_stones_remaining -- int or None
+      is_pondering              -- bool
+      cancellation_token        -- Cancellation_token or None
 
     'board' represents the current board position.
 
@@ -72,6 +131,14 @@ class Game_state(object):
     The get_last_move() and get_last_move_and_cookie() functions below are
     provided to help interpret move history.
 
+    board, history_base and move_history are snapshots: Gtp_state never
+    modifies them after passing them to a move generator, so the move generator
+    may keep references to them (for example, to reuse analysis on a later
+    call). It still mustn't modify them itself; a move generator which wants
+    to explore variations should work on board.copy(). move_history is a
+    read-only sequence which shares storage with the engine's own history, so
+    making a Game_state doesn't copy the move list.
+
 
     ko_point is the point forbidden by the simple ko rule. This is provided for
     convenience for engines which don't want to deduce it from the move history.
@@ -103,6 +170,14 @@ class Game_state(object):
     possible for time_remaining to be available but not time_settings (if the
     controller doesn't send time_settings).
 
+
+    is_pondering is true if the move generator is being called speculatively,
+    in a background thread, while the opponent is thinking (see
+    Gtp_state.enable_pondering()). In that case cancellation_token is set, and
+    the move generator should check it from time to time and return its best
+    move so far as soon as it is cancelled. Otherwise cancellation_token is
+    None.
+
     """
 
 class Move_generator_result(object):
@@ -136,6 +211,132 @@ class Move_generator_result(object):
         self.cookie = None
 
 
+class Cancellation_token(object):
+    """Flag telling a pondering move generator to stop searching.
+
+    Public methods:
+      cancel()
+      is_cancelled() -> bool
+
+    """
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    def is_cancelled(self):
+        return self._event.isSet()
+
+
+class _Ponder(object):
+    """Speculative move generation running in a background thread.
+
+    Public attributes:
+      colour            -- colour the ponder is generating a move for
+      reply_colour      -- opponent of 'colour'
+      history_length    -- length of the move history including the reply
+      predicted_move    -- predicted reply: (row, col), None for a pass, or
+                           the string 'none' if there is no usable prediction
+      reply_seen        -- bool: the predicted reply has been played
+      result            -- Move_generator_result, or None
+
+    The thread first predicts the opponent's reply (prediction_token is the
+    cancellation token for this stage), then generates a move for the
+    position after that reply.
+
+    """
+    def __init__(self, colour, history_length):
+        self.colour = colour
+        self.reply_colour = opponent_of(colour)
+        self.history_length = history_length
+        self.predicted_move = 'none'
+        self.reply_seen = False
+        self.result = None
+        self.prediction_token = Cancellation_token()
+        self.token = Cancellation_token()
+        self.prediction_done = threading.Event()
+        self.done = threading.Event()
+
+    def cancel(self):
+        self.prediction_token.cancel()
+        self.token.cancel()
+
+    def accept_reply(self, history_move, history_length):
+        """Say whether a move just played is the predicted reply.
+
+        Stops the prediction stage if it's still running.
+
+        """
+        if (self.reply_seen or history_length != self.history_length or
+            history_move.colour != self.reply_colour):
+            return False
+        self.prediction_token.cancel()
+        self.prediction_done.wait()
+        if history_move.move != self.predicted_move:
+            return False
+        self.reply_seen = True
+        return True
+
+    def get_result(self, wait_time):
+        """Return the generated move, waiting for it if necessary.
+
+        wait_time -- float (seconds), or None
+
+        If the move hasn't been generated after wait_time seconds, cancels the
+        move generator and waits for it to return.
+
+        Returns a Move_generator_result, or None if the move generator failed.
+
+        """
+        self.done.wait(wait_time)
+        if not self.done.isSet():
+            self.token.cancel()
+            self.done.wait()
+        return self.result
+
+
+class _Loaded_sgf(object):
+    """Information from an SGF file, as cached by Gtp_state for loadsgf.
+
+    Public attributes:
+      size        -- int
+      komi        -- float, or None if the file's komi is invalid
+      handicap    -- int or None
+      setup_error -- string or None
+      setup_board -- boards.Board (position from setup stones), or None
+      plays       -- list of pairs (colour, move)
+      checkpoints -- map move count -> (board, simple_ko_point,
+                                        simple_ko_player)
+
+    setup_error is set if the setup stones or moves couldn't be interpreted.
+
+    checkpoints records some of the positions reached after playing the moves.
+    It's filled in as the positions are visited.
+
+    """
+    def __init__(self, sgf_game):
+        self.size = sgf_game.get_size()
+        try:
+            self.komi = sgf_game.get_komi()
+        except ValueError:
+            self.komi = None
+        try:
+            self.handicap = sgf_game.get_handicap()
+        except ValueError:
+            # Handicap isn't important, so soldier on
+            self.handicap = None
+        try:
+            self.setup_board, self.plays = \
+                sgf_moves.get_setup_and_moves(sgf_game)
+        except ValueError, e:
+            self.setup_error = str(e)
+            self.setup_board, self.plays = None, []
+        else:
+            self.setup_error = None
+        self.checkpoints = {}
+
+
 class Gtp_state(object):
     """Manage the stateful part of the GTP engine protocol.
 
@@ -163,7 +364,22 @@ class Gtp_state(object):
     If the move generator returns an occupied point, Gtp_state will report a GTP
     error. Gtp_state does not enforce any ko rule. It permits self-captures.
 
+    Gtp_state treats its Board objects as immutable once they represent a
+    position in the game: playing a move makes a new Board, and the previous
+    position is kept so that undo doesn't need to replay the move history.
+
+    If pondering is enabled (see enable_pondering()), the move generator is
+    also called in a background thread while the opponent is thinking.
+
+    loadsgf keeps the most recently loaded files (up to sgf_cache_size of
+    them), together with every checkpoint_interval'th position reached, so that
+    loading a different move number from the same file needs at most
+    checkpoint_interval moves to be played. A cached file is reused only if
+    its modification time and size are unchanged.
+
     """
+    sgf_cache_size = 16
+    checkpoint_interval = 16
 
     def __init__(self, move_generator, acceptable_sizes=None):
         self.komi = 0.0
@@ -172,6 +388,13 @@ class Gtp_state(object):
             'b' : (None, None),
             'w' : (None, None),
             }
+        # list of tuples (pathname, file signature, _Loaded_sgf), most
+        # recently used last
+        self._sgf_cache = []
+        self.pondering_enabled = False
+        self.reply_predictor = None
+        # _Ponder or None
+        self._ponder = None
         self.move_generator = move_generator
         if acceptable_sizes is None:
             self.acceptable_sizes = set((19,))
@@ -181,53 +404,157 @@ class Gtp_state(object):
             self.board_size = min(self.acceptable_sizes)
         self.reset()
 
+    def enable_pondering(self, reply_predictor=None):
+        """Generate moves speculatively while the opponent is thinking.
+
+        reply_predictor -- move generator function (optional)
+
+        After each genmove, Gtp_state starts a background thread which
+        predicts the opponent's reply, and then calls the move generator for
+        the position after that reply. If the next play command matches the
+        prediction, the following genmove uses the pondered move (waiting for
+        it to be generated if necessary). Otherwise the ponder is cancelled.
+
+        The reply predictor is called with the same arguments as a move
+        generator, and should return a Move_generator_result for the opponent.
+        If it isn't specified, the move generator itself is used.
+
+        Both the predictor and the move generator are called with
+        game_state.is_pondering set; see Game_state. As the calls happen in a
+        separate thread, the move generator must be thread-safe.
+
+        If the pondered move isn't ready when genmove arrives, the move
+        generator is given until _get_ponder_wait_time() has passed and is
+        then cancelled.
+
+        """
+        self.pondering_enabled = True
+        self.reply_predictor = reply_predictor
+
+    def _discard_ponder(self):
+        if self._ponder is not None:
+            self._ponder.cancel()
+            self._ponder = None
+
+    def _get_ponder_wait_time(self, colour):
+        """Return how long genmove should wait for an unfinished ponder.
+
+        Returns a float (seconds), or None to wait indefinitely.
+
+        The default implementation uses the information from time_left: it
+        allows the time remaining divided by the number of stones to play in
+        the current byo-yomi period (or by 30, in main time). Without any
+        information from time_left it returns None.
+
+        """
+        time_remaining, stones_remaining = self.time_status[colour]
+        if time_remaining is None:
+            return None
+        if stones_remaining is None:
+            stones_remaining = 30
+        return float(time_remaining) / max(stones_remaining, 1)
+
     def reset(self):
+        self._discard_ponder()
         self.board = boards.Board(self.board_size)
         # None, or a small integer
         self.handicap = None
         self.simple_ko_point = None
         # Player that any simple_ko_point is banned for
         self.simple_ko_player = None
-        self.history_base = boards.Board(self.board_size)
+        self.history_base = self.board
         # list of History_move objects
         self.move_history = []
+        # Length of the longest Move_history_view made from move_history
+        self._history_shared_length = 0
+        # list of tuples (board, simple_ko_point, simple_ko_player), giving
+        # the state before each move in move_history (or None if unknown)
+        self._previous_positions = []
 
     def set_history_base(self, board):
         """Change the history base to a new position.
 
         Takes ownership of 'board'.
 
-        Clears the move history.
+        Clears the move history, makes 'board' the current position, and
+        clears any simple ko restriction. (In gomill 0.8.2 and earlier, this
+        changed only the history base and move history; callers set the
+        current position separately.)
 
         """
+        self._discard_ponder()
         self.history_base = board
+        self.board = board
+        self.simple_ko_point = None
+        self.simple_ko_player = None
         self.move_history = []
+        self._history_shared_length = 0
+        self._previous_positions = []
+
+    def record_move(self, history_move):
+        """Play a move on the current position and add it to the history.
+
+        history_move -- History_move
+
+        Raises ValueError if the move is illegal (in which case nothing is
+        changed).
+
+        """
+        if (self._ponder is not None and
+            not self._ponder.accept_reply(history_move,
+                                          len(self.move_history) + 1)):
+            self._discard_ponder()
+        previous = (self.board, self.simple_ko_point, self.simple_ko_player)
+        if history_move.is_pass():
+            self.simple_ko_point = None
+        else:
+            board = self.board.copy()
+            row, col = history_move.move
+            # Propagates ValueError if the move is bad
+            self.simple_ko_point = board.play(row, col, history_move.colour)
+            self.simple_ko_player = opponent_of(history_move.colour)
+            self.board = board
+        self._previous_positions.append(previous)
+        self.move_history.append(history_move)
+
+    def undo_move(self):
+        """Return to the position before the last move in the history.
+
+        Raises ValueError if the move history is empty.
+
+        """
+        if not self.move_history:
+            raise ValueError
+        self._discard_ponder()
+        previous = self._previous_positions.pop()
+        if previous is None:
+            # Position came from a loadsgf checkpoint
+            self.reset_to_moves(self.move_history[:-1])
+            return
+        (self.board, self.simple_ko_point, self.simple_ko_player) = previous
+        if self._history_shared_length >= len(self.move_history):
+            # A Game_state's view includes the last move, so don't change the
+            # shared list
+            self.move_history = self.move_history[:-1]
+            self._history_shared_length = 0
+        else:
+            self.move_history.pop()
 
     def reset_to_moves(self, history_moves):
         """Reset to history base and play the specified moves.
 
         history_moves -- list of History_move objects.
 
-        'history_moves' becomes the new move history. Takes ownership of
-        'history_moves'.
+        The moves in 'history_moves' become the new move history (the list
+        itself isn't kept, so the caller may go on to modify it).
 
         Raises ValueError if there is an invalid move in the list.
 
         """
-        self.board = self.history_base.copy()
-        simple_ko_point = None
-        simple_ko_player = None
+        self.set_history_base(self.history_base)
         for history_move in history_moves:
-            if history_move.is_pass():
-                self.simple_ko_point = None
-                continue
-            row, col = history_move.move
             # Propagates ValueError if the move is bad
-            simple_ko_point = self.board.play(row, col, history_move.colour)
-            simple_ko_player = opponent_of(history_move.colour)
-        self.simple_ko_point = simple_ko_point
-        self.simple_ko_player = simple_ko_player
-        self.move_history = history_moves
+            self.record_move(history_move)
 
     def set_komi(self, f):
         max_komi = 625.0
@@ -235,6 +562,8 @@ class Gtp_state(object):
             f = -max_komi
         elif f > max_komi:
             f = max_komi
+        if f != self.komi:
+            self._discard_ponder()
         self.komi = f
 
     def handle_boardsize(self, args):
@@ -269,11 +598,11 @@ class Gtp_state(object):
                 number_of_stones, self.board_size)
         except ValueError:
             raise GtpError("invalid number of stones")
+        board = boards.Board(self.board_size)
         for row, col in points:
-            self.board.play(row, col, 'b')
-        self.simple_ko_point = None
+            board.play(row, col, 'b')
         self.handicap = number_of_stones
-        self.set_history_base(self.board.copy())
+        self.set_history_base(board)
         return " ".join(format_vertex((row, col))
                         for (row, col) in points)
 
@@ -284,6 +613,7 @@ class Gtp_state(object):
             raise GtpError("invalid number of stones")
         if not self.board.is_empty():
             raise GtpError("board not empty")
+        board = boards.Board(self.board_size)
         try:
             for vertex_s in args:
                 move = gtp_engine.interpret_vertex(vertex_s, self.board_size)
@@ -291,15 +621,14 @@ class Gtp_state(object):
                     raise GtpError("'pass' not permitted")
                 row, col = move
                 try:
-                    self.board.play(row, col, 'b')
+                    board.play(row, col, 'b')
                 except ValueError:
                     raise GtpError("engine error: %s is occupied" % vertex_s)
         except Exception:
             self.reset()
             raise
-        self.set_history_base(self.board.copy())
+        self.set_history_base(board)
         self.handicap = len(args)
-        self.simple_ko_point = None
 
     def _choose_free_handicap_moves(self, number_of_stones):
         i = min(number_of_stones,
@@ -321,21 +650,21 @@ class Gtp_state(object):
         if number_of_stones == max_points:
             number_of_stones = max_points - 1
         moves = self._choose_free_handicap_moves(number_of_stones)
+        board = boards.Board(self.board_size)
         try:
             try:
                 if len(moves) > number_of_stones:
                     raise ValueError
                 for row, col in moves:
-                    self.board.play(row, col, 'b')
+                    board.play(row, col, 'b')
             except (ValueError, TypeError):
                 raise GtpError("invalid result from move generator: %s"
                                % format_vertex_list(moves))
         except Exception:
             self.reset()
             raise
-        self.simple_ko_point = None
         self.handicap = number_of_stones
-        self.set_history_base(self.board.copy())
+        self.set_history_base(board)
         return " ".join(format_vertex((row, col))
                         for (row, col) in moves)
 
@@ -346,32 +675,24 @@ class Gtp_state(object):
             gtp_engine.report_bad_arguments()
         colour = gtp_engine.interpret_colour(colour_s)
         move = gtp_engine.interpret_vertex(vertex_s, self.board_size)
-        if move is None:
-            self.simple_ko_point = None
-            self.move_history.append(History_move(colour, None))
-            return
-        row, col = move
         try:
-            self.simple_ko_point = self.board.play(row, col, colour)
-            self.simple_ko_player = opponent_of(colour)
+            self.record_move(History_move(colour, move))
         except ValueError:
             raise GtpError("illegal move")
-        self.move_history.append(History_move(colour, move))
 
     def handle_showboard(self, args):
         return "\n%s\n" % ascii_boards.render_board(self.board)
 
-    def _handle_genmove(self, args, for_regression=False, allow_claim=False):
-        """Common implementation for genmove commands."""
-        try:
-            colour = gtp_engine.interpret_colour(args[0])
-        except IndexError:
-            gtp_engine.report_bad_arguments()
+    def _make_game_state(self, colour, for_regression=False):
+        """Return a Game_state for the current position."""
         game_state = Game_state()
         game_state.size = self.board_size
         game_state.board = self.board
         game_state.history_base = self.history_base
-        game_state.move_history = self.move_history
+        history_length = len(self.move_history)
+        game_state.move_history = Move_history_view(
+            self.move_history, history_length)
+        self._history_shared_length = history_length
         game_state.komi = self.komi
         game_state.for_regression = for_regression
         if self.simple_ko_point is not None and self.simple_ko_player == colour:
@@ -382,27 +703,114 @@ class Gtp_state(object):
         game_state.time_settings = self.time_settings
         game_state.time_remaining, game_state.canadian_stones_remaining = \
             self.time_status[colour]
-        generated = self.move_generator(game_state, colour)
+        game_state.is_pondering = False
+        game_state.cancellation_token = None
+        return game_state
+
+    def _start_ponder(self, colour):
+        """Start pondering a move for 'colour' after the opponent's reply."""
+        ponder = _Ponder(colour, len(self.move_history) + 1)
+        game_state = self._make_game_state(ponder.reply_colour)
+        game_state.is_pondering = True
+        game_state.cancellation_token = ponder.prediction_token
+        thread = threading.Thread(target=self._run_ponder,
+                                  args=(ponder, game_state))
+        thread.setDaemon(True)
+        self._ponder = ponder
+        thread.start()
+
+    def _run_ponder(self, ponder, game_state):
+        # Runs in the ponder thread. game_state describes the position before
+        # the opponent's reply.
+        try:
+            try:
+                predictor = self.reply_predictor or self.move_generator
+                predicted = predictor(game_state, ponder.reply_colour)
+                if predicted.resign or predicted.claim:
+                    return
+                if predicted.pass_move:
+                    move = None
+                else:
+                    move = predicted.move
+                board = game_state.board
+                ko_point = None
+                if move is not None:
+                    board = board.copy()
+                    row, col = move
+                    ko_point = board.play(row, col, ponder.reply_colour)
+                ponder.predicted_move = move
+            finally:
+                ponder.prediction_done.set()
+            if ponder.token.is_cancelled():
+                return
+            next_state = Game_state()
+            next_state.__dict__.update(game_state.__dict__)
+            next_state.board = board
+            next_state.move_history = game_state.move_history + [
+                History_move(ponder.reply_colour, move)]
+            next_state.ko_point = ko_point
+            next_state.time_remaining, next_state.canadian_stones_remaining = \
+                self.time_status[ponder.colour]
+            next_state.cancellation_token = ponder.token
+            ponder.result = self.move_generator(next_state, ponder.colour)
+        except Exception:
+            # genmove will call the move generator again and report the error
+            ponder.result = None
+        finally:
+            ponder.done.set()
+
+    def _take_ponder_result(self, colour):
+        """Return the pondered move for 'colour', if available.
+
+        Returns a Move_generator_result or None.
+
+        Discards the ponder in any case.
+
+        """
+        ponder = self._ponder
+        if ponder is None:
+            return None
+        if not ponder.reply_seen or ponder.colour != colour:
+            self._discard_ponder()
+            return None
+        self._ponder = None
+        return ponder.get_result(self._get_ponder_wait_time(colour))
+
+    def _handle_genmove(self, args, for_regression=False, allow_claim=False):
+        """Common implementation for genmove commands."""
+        try:
+            colour = gtp_engine.interpret_colour(args[0])
+        except IndexError:
+            gtp_engine.report_bad_arguments()
+        if for_regression:
+            generated = None
+        else:
+            generated = self._take_ponder_result(colour)
+        if generated is None:
+            game_state = self._make_game_state(colour, for_regression)
+            generated = self.move_generator(game_state, colour)
         if allow_claim and generated.claim:
             return 'claim'
         if generated.resign:
             return 'resign'
         if generated.pass_move:
             if not for_regression:
-                self.move_history.append(History_move(
+                self.record_move(History_move(
                     colour, None, generated.comments, generated.cookie))
+                if self.pondering_enabled:
+                    self._start_ponder(colour)
             return 'pass'
         row, col = generated.move
         vertex = format_vertex((row, col))
         if not for_regression:
             try:
-                self.simple_ko_point = self.board.play(row, col, colour)
-                self.simple_ko_player = opponent_of(colour)
+                self.record_move(
+                    History_move(colour, (row, col),
+                                 generated.comments, generated.cookie))
             except ValueError:
                 raise GtpError("engine error: tried to play %s" % vertex)
-            self.move_history.append(
-                History_move(colour, generated.move,
-                             generated.comments, generated.cookie))
+            if self.pondering_enabled:
+                self._start_ponder(colour)
         return vertex
 
     def handle_genmove(self, args):
@@ -421,12 +829,10 @@ class Gtp_state(object):
         return self._handle_genmove(args, for_regression=True)
 
     def handle_undo(self, args):
-        if not self.move_history:
-            raise GtpError("cannot undo")
         try:
-            self.reset_to_moves(self.move_history[:-1])
+            self.undo_move()
         except ValueError:
-            raise GtpError("corrupt history")
+            raise GtpError("cannot undo")
 
     def _load_file(self, pathname):
         """Read the specified file and return its contents as a string.
@@ -439,15 +845,36 @@ class Gtp_state(object):
         with open(pathname) as f:
             return f.read()
 
-    def handle_loadsgf(self, args):
+    def _get_file_signature(self, pathname):
+        """Return a value which changes whenever the specified file changes.
+
+        Returns None if the file can't be examined (loadsgf then doesn't cache
+        the file's contents).
+
+        Subclasses which override _load_file() should normally override this
+        too.
+
+        """
         try:
-            pathname = args[0]
-        except IndexError:
-            gtp_engine.report_bad_arguments()
-        if len(args) > 1:
-            move_number = gtp_engine.interpret_int(args[1])
-        else:
-            move_number = None
+            st = os.stat(pathname)
+        except EnvironmentError:
+            return None
+        return (st.st_mtime, st.st_size)
+
+    def _get_loaded_sgf(self, pathname):
+        """Return a _Loaded_sgf for the specified file, using the cache.
+
+        Raises GtpError if the file can't be loaded.
+
+        """
+        signature = self._get_file_signature(pathname)
+        for i, entry in enumerate(self._sgf_cache):
+            if entry[0] == pathname:
+                del self._sgf_cache[i]
+                if signature is not None and entry[1] == signature:
+                    self._sgf_cache.append(entry)
+                    return entry[2]
+                break
         # The GTP spec mandates the "cannot load file" error message, so we
         # can't be more helpful.
         try:
@@ -458,36 +885,66 @@ class Gtp_state(object):
             sgf_game = sgf.Sgf_game.from_string(s)
         except ValueError:
             raise GtpError("cannot load file")
-        new_size = sgf_game.get_size()
-        if new_size not in self.acceptable_sizes:
-            raise GtpError("unacceptable size")
-        self.board_size = new_size
+        loaded_sgf = _Loaded_sgf(sgf_game)
+        if signature is not None and self.sgf_cache_size > 0:
+            self._sgf_cache.append((pathname, signature, loaded_sgf))
+            del self._sgf_cache[:-self.sgf_cache_size]
+        return loaded_sgf
+
+    def _reset_to_loaded_sgf(self, loaded_sgf, move_count):
+        """Reset to the position after the first move_count moves from a file.
+
+        Uses and updates loaded_sgf's checkpoints.
+
+        Raises ValueError if there is an invalid move in the list.
+
+        """
+        history_moves = [History_move(colour, move)
+                         for (colour, move) in loaded_sgf.plays[:move_count]]
+        interval = self.checkpoint_interval
+        self.set_history_base(loaded_sgf.setup_board)
+        start = move_count - move_count % interval
+        while start > 0 and start not in loaded_sgf.checkpoints:
+            start -= interval
+        if start > 0:
+            (self.board, self.simple_ko_point, self.simple_ko_player) = \
+                loaded_sgf.checkpoints[start]
+            self.move_history = history_moves[:start]
+            self._previous_positions = [None] * start
+        for history_move in history_moves[start:]:
+            # Propagates ValueError if the move is bad
+            self.record_move(history_move)
+            n = len(self.move_history)
+            if n % interval == 0 and n not in loaded_sgf.checkpoints:
+                loaded_sgf.checkpoints[n] = (
+                    self.board, self.simple_ko_point, self.simple_ko_player)
+
+    def handle_loadsgf(self, args):
         try:
-            komi = sgf_game.get_komi()
-        except ValueError:
+            pathname = args[0]
+        except IndexError:
+            gtp_engine.report_bad_arguments()
+        if len(args) > 1:
+            move_number = gtp_engine.interpret_int(args[1])
+        else:
+            move_number = None
+        loaded_sgf = self._get_loaded_sgf(pathname)
+        if loaded_sgf.size not in self.acceptable_sizes:
+            raise GtpError("unacceptable size")
+        self.board_size = loaded_sgf.size
+        if loaded_sgf.komi is None:
             raise GtpError("bad komi")
-        try:
-            handicap = sgf_game.get_handicap()
-        except ValueError:
-            # Handicap isn't important, so soldier on
-            handicap = None
-        try:
-            sgf_board, plays = sgf_moves.get_setup_and_moves(sgf_game)
-        except ValueError, e:
-            raise GtpError(str(e))
-        history_moves = [History_move(colour, move)
-                         for (colour, move) in plays]
+        if loaded_sgf.setup_error is not None:
+            raise GtpError(loaded_sgf.setup_error)
         if move_number is None:
-            new_move_history = history_moves
+            move_count = len(loaded_sgf.plays)
         else:
             # gtp spec says we want the "position before move_number"
-            move_number = max(0, move_number-1)
-            new_move_history = history_moves[:move_number]
+            move_count = max(0, move_number-1)
         old_history_base = self.history_base
         old_move_history = self.move_history
         try:
-            self.set_history_base(sgf_board)
-            self.reset_to_moves(new_move_history)
+            self._reset_to_loaded_sgf(loaded_sgf, move_count)
         except ValueError:
             try:
                 self.set_history_base(old_history_base)
@@ -495,8 +952,8 @@ class Gtp_state(object):
             except ValueError:
                 raise GtpError("bad move in file and corrupt history")
             raise GtpError("bad move in file")
-        self.set_komi(komi)
-        self.handicap = handicap
+        self.set_komi(loaded_sgf.komi)
+        self.handicap = loaded_sgf.handicap
 
     def handle_time_left(self, args):
         # colour time stones
@@ -598,6 +598,9 @@ class Mcts_tuner(Competition):
 
         competitions.validate_handicap(
             self.handicap, self.handicap_style, self.board_size)
+        self.time_settings = competitions.make_time_settings(
+            self.main_time, self.byo_yomi_time, self.byo_yomi_style,
+            self.byo_yomi_stones, self.byo_yomi_periods)
 
         try:
             specials = load_settings(self.special_settings, config)
@@ -776,6 +779,7 @@ class Mcts_tuner(Competition):
         job.move_limit = self.move_limit
         job.handicap = self.handicap
         job.handicap_is_free = (self.handicap_style == 'free')
+        job.time_settings = self.time_settings
         job.use_internal_scorer = (self.scorer == 'internal')
         job.internal_scorer_handicap_compensation = \
             self.internal_scorer_handicap_compensation
@@ -0,0 +1,482 @@
+"""Opening books built from collections of game records.
+
+An opening book maps positions (identified up to symmetry) to the moves which
+were played from them, with the number of times each was seen.
+
+Books are built with Opening_book_builder and stored in a compact binary file,
+which Opening_book reads using mmap, so a large book costs little memory and
+is quick to open.
+
+Opening_book_proxy is a GTP proxy which answers 'genmove' from a book while the
+position is in book, and passes it on to the back end engine otherwise.
+
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+
+from gomill import boards
+from gomill import gtp_engine
+from gomill import gtp_proxy
+from gomill import sgf_moves
+from gomill.common import format_vertex, move_from_vertex
+from gomill.gtp_engine import GtpError
+
+
+## Symmetry
+
+def _make_transforms(size):
+    n = size - 1
+    return [
+        lambda r, c: (r, c),
+        lambda r, c: (c, n-r),
+        lambda r, c: (n-r, n-c),
+        lambda r, c: (n-c, r),
+        lambda r, c: (r, n-c),
+        lambda r, c: (n-r, c),
+        lambda r, c: (c, r),
+        lambda r, c: (n-c, n-r),
+        ]
+
+# index of the inverse of each of the transforms above
+_inverse_transforms = [0, 3, 2, 1, 4, 5, 6, 7]
+
+_transforms_by_size = {}
+
+def get_symmetry_permutations(size):
+    """Return the symmetry transformations for the specified board size.
+
+    Returns a list of 8 pairs (fn, permutation)
+      fn          -- function (row, col) -> (row, col)
+      permutation -- list of point indexes
+
+    permutation[i] is the index (row*size + col) of the point which fn maps to
+    the point with index i.
+
+    The first transformation is the identity.
+
+    The result is cached, and shared between callers: treat it as read-only.
+
+    """
+    try:
+        return _transforms_by_size[size]
+    except KeyError:
+        pass
+    result = []
+    for fn in _make_transforms(size):
+        permutation = [None] * (size*size)
+        for row in xrange(size):
+            for col in xrange(size):
+                r, c = fn(row, col)
+                permutation[r*size + c] = row*size + col
+        result.append((fn, permutation))
+    _transforms_by_size[size] = result
+    return result
+
+def get_canonical_key(board, colour):
+    """Return a key identifying a position up to symmetry.
+
+    board  -- boards.Board
+    colour -- 'b' or 'w' (the player to move)
+
+    Returns a pair (key, transform)
+      key       -- 8-byte string
+      transform -- function (row, col) -> (row, col)
+
+    Positions which are rotations or reflections of one another (with the same
+    player to move) have the same key. 'transform' maps points in this
+    position to the corresponding points in the canonical orientation.
+
+    """
+    key, transforms = _get_canonical_key(board, colour)
+    return key, transforms[0]
+
+def _get_canonical_key(board, colour):
+    """Implementation of get_canonical_key().
+
+    Returns a pair (key, list of transforms)
+
+    If the position is symmetrical, there's more than one transform which maps
+    it to the canonical orientation.
+
+    """
+    size = board.side
+    cells = [point or "." for row in board.board for point in row]
+    best = None
+    for fn, permutation in get_symmetry_permutations(size):
+        s = "".join([cells[i] for i in permutation])
+        if best is None or s < best:
+            best = s
+            best_transforms = [fn]
+        elif s == best:
+            best_transforms.append(fn)
+    key = hashlib.md5("%s%d:%s" % (colour, size, best)).digest()[:8]
+    return key, best_transforms
+
+def _get_inverse(board_size, transform):
+    """Return the inverse of a transform from get_canonical_key()."""
+    transforms = get_symmetry_permutations(board_size)
+    for index, (fn, _) in enumerate(transforms):
+        if fn is transform:
+            return transforms[_inverse_transforms[index]][0]
+    raise ValueError("unknown transform")
+
+
+## Book files
+
+_MAGIC = "GMLBOOK1"
+_header_struct = struct.Struct("<8sI")
+_record_struct = struct.Struct("<8sHI")
+_PASS = 0xffff
+
+def _encode_move(move):
+    if move is None:
+        return _PASS
+    row, col = move
+    return (row << 8) | col
+
+def _decode_move(code):
+    if code == _PASS:
+        return None
+    return code >> 8, code & 0xff
+
+
+class Opening_book_builder(object):
+    """Accumulate the opening moves from game records.
+
+    Instantiate with
+      max_moves -- int (number of moves to take from each game)
+
+    Public attributes:
+      games_added -- int
+
+    """
+    def __init__(self, max_moves=40):
+        self.max_moves = max_moves
+        self.games_added = 0
+        # map key -> map canonical move -> count
+        self._positions = {}
+
+    def add_position(self, board, colour, move):
+        """Record that 'move' was played from the specified position.
+
+        board  -- boards.Board
+        colour -- 'b' or 'w'
+        move   -- (row, col), or None for a pass
+
+        """
+        key, transforms = _get_canonical_key(board, colour)
+        if move is not None:
+            # In a symmetrical position, equivalent moves are stored as one.
+            move = min([transform(*move) for transform in transforms])
+        moves = self._positions.setdefault(key, {})
+        moves[move] = moves.get(move, 0) + 1
+
+    def add_game(self, sgf_game):
+        """Record the opening moves from an Sgf_game.
+
+        Uses the game's leftmost variation, stopping at the first illegal
+        move.
+
+        Raises ValueError if the game's setup position is unusable (as for
+        sgf_moves.get_setup_and_moves()).
+
+        """
+        board, plays = sgf_moves.get_setup_and_moves(sgf_game)
+        if board.side > 25:
+            raise ValueError("board too large")
+        for colour, move in plays[:self.max_moves]:
+            self.add_position(board, colour, move)
+            if move is not None:
+                try:
+                    board.play(move[0], move[1], colour)
+                except ValueError:
+                    break
+        self.games_added += 1
+
+    def write(self, pathname, min_count=1):
+        """Write the book to a file.
+
+        min_count -- int
+
+        Moves seen fewer than min_count times from a position are left out.
+
+        """
+        records = []
+        for key, moves in self._positions.iteritems():
+            for move, count in moves.iteritems():
+                if count >= min_count:
+                    records.append((key, -count, _encode_move(move)))
+        records.sort()
+        f = open(pathname, "wb")
+        try:
+            f.write(_header_struct.pack(_MAGIC, len(records)))
+            pack = _record_struct.pack
+            f.write("".join([pack(key, code, -negcount)
+                             for (key, negcount, code) in records]))
+        finally:
+            f.close()
+
+
+class Opening_book(object):
+    """Read-only access to an opening book file.
+
+    Instantiate with the book's pathname.
+
+    Raises EnvironmentError if the file can't be read, and ValueError if it
+    isn't a valid book file.
+
+    Public attributes:
+      record_count -- int
+
+    """
+    def __init__(self, pathname):
+        f = open(pathname, "rb")
+        try:
+            size = os.fstat(f.fileno()).st_size
+            if size < _header_struct.size:
+                raise ValueError("not an opening book: %s" % pathname)
+            self._map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        magic, self.record_count = _header_struct.unpack(
+            self._map[:_header_struct.size])
+        if (magic != _MAGIC or
+            size != (_header_struct.size +
+                     self.record_count * _record_struct.size)):
+            self._map.close()
+            raise ValueError("not an opening book: %s" % pathname)
+
+    def close(self):
+        self._map.close()
+
+    def _find_first(self, key):
+        """Return the index of the first record whose key is >= key."""
+        base = _header_struct.size
+        record_size = _record_struct.size
+        m = self._map
+        lo = 0
+        hi = self.record_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = base + mid*record_size
+            if m[offset:offset+8] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get_moves(self, board, colour):
+        """Return the book moves for a position.
+
+        board  -- boards.Board
+        colour -- 'b' or 'w' (the player to move)
+
+        Returns a list of pairs (move, count), most frequent first (empty if
+        the position isn't in the book). Moves are (row, col), or None for a
+        pass.
+
+        """
+        key, transform = get_canonical_key(board, colour)
+        inverse = None
+        result = []
+        base = _header_struct.size
+        record_size = _record_struct.size
+        unpack = _record_struct.unpack
+        m = self._map
+        for index in xrange(self._find_first(key), self.record_count):
+            offset = base + index*record_size
+            record_key, code, count = unpack(m[offset:offset+record_size])
+            if record_key != key:
+                break
+            move = _decode_move(code)
+            if move is not None:
+                if inverse is None:
+                    inverse = _get_inverse(board.side, transform)
+                move = inverse(*move)
+            result.append((move, count))
+        return result
+
+
+## GTP proxy
+
+class Opening_book_proxy(gtp_proxy.Gtp_proxy):
+    """GTP proxy which answers genmove from an opening book when it can.
+
+    Instantiate with an Opening_book.
+
+    Public attributes:
+      book             -- Opening_book
+      book_moves_made  -- int (number of genmoves answered from the book)
+
+    The proxy keeps track of the position by watching the commands passed to
+    the back end ('boardsize', 'clear_board', 'play', 'undo', 'genmove' and
+    the handicap commands). Until the first 'boardsize', and after 'loadsgf' or
+    anything else it can't follow, it considers the position unknown, and
+    passes all genmoves on until the next 'clear_board'.
+
+    When 'genmove' is answered from the book, the proxy sends the move to the
+    back end with 'play', so that the back end's position stays in step.
+
+    The book's most frequent move is used, unless it's illegal (eg, because
+    of ko) or the back end rejects it.
+
+    """
+    def __init__(self, book):
+        gtp_proxy.Gtp_proxy.__init__(self)
+        self.book = book
+        self.book_moves_made = 0
+        self.board_size = None
+        self.board = None
+        self.ko_point = None
+        self.history = []
+
+    def _make_engine(self):
+        gtp_proxy.Gtp_proxy._make_engine(self)
+        handlers = {
+            'boardsize'           : self.handle_boardsize,
+            'clear_board'         : self.handle_clear_board,
+            'play'                : self.handle_play,
+            'undo'                : self.handle_undo,
+            'genmove'             : self.handle_genmove,
+            'fixed_handicap'      : self.handle_fixed_handicap,
+            'place_free_handicap' : self.handle_place_free_handicap,
+            'set_free_handicap'   : self.handle_set_free_handicap,
+            'loadsgf'             : self.handle_loadsgf,
+            }
+        for command, handler in handlers.iteritems():
+            if command in self.back_end_commands:
+                self.engine.add_command(command, handler)
+
+    def _reset(self):
+        self.board = boards.Board(self.board_size)
+        self.ko_point = None
+        self.history = []
+
+    def _record_move(self, colour, move):
+        if self.board is None:
+            return
+        self.history.append((self.board.copy(), self.ko_point))
+        if move is None:
+            self.ko_point = None
+            return
+        try:
+            self.ko_point = self.board.play(move[0], move[1], colour)
+        except ValueError:
+            self.board = None
+
+    def _interpret_move(self, vertex):
+        if self.board is None:
+            return None
+        try:
+            return move_from_vertex(vertex, self.board.side)
+        except ValueError:
+            self.board = None
+            return None
+
+    def handle_boardsize(self, args):
+        response = self.handle_command('boardsize', args)
+        try:
+            self.board_size = gtp_engine.interpret_int(args[0])
+        except (IndexError, GtpError):
+            self.board_size = None
+            self.board = None
+        else:
+            self._reset()
+        return response
+
+    def handle_clear_board(self, args):
+        response = self.handle_command('clear_board', args)
+        if self.board_size is not None:
+            self._reset()
+        return response
+
+    def handle_play(self, args):
+        response = self.handle_command('play', args)
+        try:
+            colour = gtp_engine.interpret_colour(args[0])
+            move = self._interpret_move(args[1])
+        except (IndexError, GtpError):
+            self.board = None
+        else:
+            self._record_move(colour, move)
+        return response
+
+    def handle_undo(self, args):
+        response = self.handle_command('undo', args)
+        if self.history:
+            self.board, self.ko_point = self.history.pop()
+        else:
+            self.board = None
+        return response
+
+    def handle_fixed_handicap(self, args):
+        response = self.handle_command('fixed_handicap', args)
+        self._add_handicap_stones(response.split())
+        return response
+
+    def handle_place_free_handicap(self, args):
+        response = self.handle_command('place_free_handicap', args)
+        self._add_handicap_stones(response.split())
+        return response
+
+    def handle_set_free_handicap(self, args):
+        response = self.handle_command('set_free_handicap', args)
+        self._add_handicap_stones(args)
+        return response
+
+    def _add_handicap_stones(self, vertices):
+        if self.board is None:
+            return
+        points = []
+        for vertex in vertices:
+            move = self._interpret_move(vertex)
+            if move is None:
+                self.board = None
+                return
+            points.append(move)
+        self.history = []
+        self.ko_point = None
+        if not self.board.apply_setup(points, [], []):
+            self.board = None
+
+    def handle_loadsgf(self, args):
+        response = self.handle_command('loadsgf', args)
+        self.board = None
+        self.history = []
+        return response
+
+    def _choose_book_move(self, colour):
+        """Return a legal move from the book, or None if there isn't one."""
+        for move, count in self.book.get_moves(self.board, colour):
+            if move is None:
+                return 'pass'
+            if move == self.ko_point or self.board.get(*move) is not None:
+                continue
+            return format_vertex(move)
+        return None
+
+    def handle_genmove(self, args):
+        try:
+            colour = gtp_engine.interpret_colour(args[0])
+        except IndexError:
+            gtp_engine.report_bad_arguments()
+        if self.board is not None:
+            vertex = self._choose_book_move(colour)
+            if vertex is not None:
+                try:
+                    self.pass_command('play', [colour, vertex])
+                except gtp_proxy.BadGtpResponse:
+                    pass
+                except gtp_proxy.BackEndError, e:
+                    raise gtp_engine.GtpFatalError(str(e))
+                else:
+                    self._record_move(colour, self._interpret_move(vertex))
+                    self.book_moves_made += 1
+                    return vertex
+        response = self.handle_command('genmove', args)
+        if response.lower() != 'resign':
+            self._record_move(colour, self._interpret_move(response))
+        return response
@@ -0,0 +1,781 @@
+"""Search a game archive for positions.
+
+A position index records, for every position reached in the main sequence of
+every game in a set of SGF files, a key identifying the position up to
+symmetry, together with the game and move number. Position_index looks
+positions up using mmap and a binary search, so queries are fast however
+large the archive is.
+
+update_position_index() builds an index, or brings an existing one up to
+date: files which have already been indexed and haven't changed since are
+skipped, so it's cheap to rerun it on a directory which is still being written
+to (for example, a ringmaster competition's .games directory).
+
+Index file format (all integers are little-endian unless stated):
+  header: 8-byte magic string, format version (uint32),
+          offset of the state table (uint64), length of the state table (uint64)
+  followed by segments, game tables and state tables.
+
+  segment: records, sorted, each:
+    position key (8 bytes), game id (uint32 big-endian),
+    move number (uint32 big-endian)
+  game table: pickled list (see _read_game_table())
+  state table: pickled dict (see _write_state())
+
+The record fields are big-endian so that sorting the packed records sorts them
+by key, then game, then move number.
+
+When an update only adds games, they're written as a new segment after the
+end of the existing data, followed by a new state table, and then the header
+is rewritten; nothing else in the file is touched. The file is only rewritten
+from scratch (with the remaining games renumbered) when games have to be
+dropped, or when more than half of it is taken up by superseded data.
+
+"""
+
+import bisect
+import cPickle as pickle
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from gomill import compact_game_files
+from gomill import job_manager
+from gomill import opening_books
+from gomill import sgf_moves
+
+
+def get_position_key(board):
+    """Return a key identifying a position up to symmetry.
+
+    board -- boards.Board
+
+    Returns an 8-byte string.
+
+    Positions which are rotations or reflections of one another have the same
+    key. Unlike opening_books.get_canonical_key(), the player to move isn't
+    taken into account.
+
+    """
+    size = board.side
+    cells = [point or "." for row in board.board for point in row]
+    best = min(["".join([cells[i] for i in permutation])
+                for fn, permutation
+                in opening_books.get_symmetry_permutations(size)])
+    return hashlib.md5("%d:%s" % (size, best)).digest()[:8]
+
+def get_game_position_keys(sgf_game):
+    """Return the keys of the positions in an Sgf_game's main sequence.
+
+    Returns a list of keys from get_position_key(): the first is for the setup
+    position (normally the empty board), followed by one for the position
+    after each move.
+
+    Stops at the first move which is to an occupied point.
+
+    Raises ValueError if the game's setup position is unusable (as for
+    sgf_moves.get_setup_and_moves()).
+
+    """
+    return _get_position_keys(*sgf_moves.get_setup_and_moves(sgf_game))
+
+def _get_position_keys(board, plays):
+    """Implementation of get_game_position_keys().
+
+    board -- boards.Board (the setup position; it's modified)
+    plays -- list of pairs (colour, move), as from get_setup_and_moves()
+
+    """
+    keys = [get_position_key(board)]
+    for colour, move in plays:
+        if move is not None:
+            try:
+                board.play(move[0], move[1], colour)
+            except ValueError:
+                break
+        keys.append(get_position_key(board))
+    return keys
+
+
+## Index files
+
+_magic = "GMLPOSIX"
+_format_version = 2
+_header_struct = struct.Struct("<8sIQQ")
+_record_struct = struct.Struct(">8sII")
+
+if array('I').itemsize == 4:
+    _uint32_typecode = 'I'
+else:
+    _uint32_typecode = 'L'
+
+def _uint32s_to_string(a):
+    if sys.byteorder == 'big':
+        a = array(_uint32_typecode, a)
+        a.byteswap()
+    return a.tostring()
+
+def _uint32s_from_string(s):
+    a = array(_uint32_typecode)
+    a.fromstring(s)
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a
+
+class _Game_table(object):
+    """Map a segment's game ids to games.
+
+    Instantiate with the segment's game table from _read_game_table().
+
+    """
+    def __init__(self, runs):
+        self._first_ids = [first_game_id for (first_game_id, _, _) in runs]
+        self._runs = [(pathname, _uint32s_from_string(game_numbers))
+                      for (_, pathname, game_numbers) in runs]
+
+    def get(self, game_id):
+        """Return a pair (pathname, game number)."""
+        i = bisect.bisect_right(self._first_ids, game_id) - 1
+        pathname, game_numbers = self._runs[i]
+        return pathname, game_numbers[game_id - self._first_ids[i]]
+
+def _find_first(m, records_offset, record_count, key):
+    """Return the index of the first record in a segment whose key is >= key.
+    """
+    record_size = _record_struct.size
+    lo = 0
+    hi = record_count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        offset = records_offset + mid*record_size
+        if m[offset:offset+8] < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+class Position_index(object):
+    """Read-only access to a position index file.
+
+    Instantiate with the index's pathname.
+
+    Raises EnvironmentError if the file can't be read, and ValueError if it
+    isn't a valid position index.
+
+    Public attributes:
+      record_count -- int
+      game_count   -- int (number of games currently indexed)
+
+    """
+    def __init__(self, pathname):
+        self._map, state = _open_index_file(pathname)
+        self._segments = state['segments']
+        self._game_tables = [None] * len(self._segments)
+        self.record_count = sum([segment[1] for segment in self._segments])
+        self.game_count = sum([segment[5] for segment in self._segments])
+
+    def close(self):
+        self._map.close()
+
+    def _get_game_table(self, i):
+        game_table = self._game_tables[i]
+        if game_table is None:
+            game_table = _Game_table(
+                _read_game_table(self._map, self._segments[i]))
+            self._game_tables[i] = game_table
+        return game_table
+
+    def find_key(self, key):
+        """Return the occurrences of a position, given its key.
+
+        key -- 8-byte string from get_position_key()
+
+        Returns a list of tuples (pathname, game number, move number).
+
+        Game numbers count from 0 within each file. Move number 0 is the
+        setup position, move number n is the position after the nth move.
+
+        The list is in the order the games were indexed.
+
+        """
+        result = []
+        record_size = _record_struct.size
+        unpack = _record_struct.unpack
+        m = self._map
+        # The segments are in game id order
+        for i, segment in enumerate(self._segments):
+            records_offset, record_count = segment[:2]
+            end = records_offset + record_count*record_size
+            offset = records_offset + record_size * _find_first(
+                m, records_offset, record_count, key)
+            while offset < end:
+                record_key, game_id, move_number = unpack(
+                    m[offset:offset+record_size])
+                if record_key != key:
+                    break
+                pathname, game_number = self._get_game_table(i).get(game_id)
+                result.append((pathname, game_number, move_number))
+                offset += record_size
+        return result
+
+    def find(self, board):
+        """Return the occurrences of a position.
+
+        board -- boards.Board
+
+        Returns a list of tuples (pathname, game number, move number), as for
+        find_key().
+
+        Positions which are rotations or reflections of the board are also
+        found.
+
+        """
+        return self.find_key(get_position_key(board))
+
+def _open_index_file(pathname):
+    """Map an index file and read its state table.
+
+    Returns a pair (mmap, state)
+
+    """
+    f = open(pathname, "rb")
+    try:
+        size = os.fstat(f.fileno()).st_size
+        if size < _header_struct.size:
+            raise ValueError("not a position index: %s" % pathname)
+        m = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+    try:
+        magic, format_version, state_offset, state_length = \
+            _header_struct.unpack(m[:_header_struct.size])
+        if (magic != _magic or format_version != _format_version or
+            state_offset + state_length > size):
+            raise ValueError("not a position index: %s" % pathname)
+        try:
+            state = pickle.loads(m[state_offset:state_offset+state_length])
+        except Exception:
+            raise ValueError("not a position index: %s" % pathname)
+        for (records_offset, record_count, table_offset, table_length,
+             _, _) in state['segments']:
+            if (records_offset + record_count*_record_struct.size > size or
+                table_offset + table_length > size):
+                raise ValueError("not a position index: %s" % pathname)
+    except:
+        m.close()
+        raise
+    return m, state
+
+def _read_game_table(m, segment):
+    """Read a segment's game table.
+
+    Returns a list of tuples (first game id, pathname, game numbers), where
+    game numbers is a string of little-endian uint32s. The game ids in each
+    run are consecutive.
+
+    """
+    table_offset, table_length = segment[2:4]
+    return pickle.loads(m[table_offset:table_offset+table_length])
+
+def _get_wasted_size(m, segments):
+    """Return the number of bytes in an index file which are no longer used.
+    """
+    state_length = _header_struct.unpack(m[:_header_struct.size])[3]
+    used = _header_struct.size + state_length
+    for (_, record_count, _, table_length, _, _) in segments:
+        used += record_count*_record_struct.size + table_length
+    return len(m) - used
+
+def _iter_segment_records(m, segment):
+    """Yield a segment's packed records, in order."""
+    record_size = _record_struct.size
+    block_size = 4096 * record_size
+    records_offset, record_count = segment[:2]
+    end = records_offset + record_count*record_size
+    for block_start in xrange(records_offset, end, block_size):
+        s = m[block_start:min(block_start+block_size, end)]
+        for i in xrange(0, len(s), record_size):
+            yield s[i:i+record_size]
+
+def _iter_run_file(pathname):
+    """Yield the packed records from a file written by _Indexer._spill()."""
+    record_size = _record_struct.size
+    block_size = 4096 * record_size
+    f = open(pathname, "rb")
+    try:
+        while True:
+            s = f.read(block_size)
+            if not s:
+                break
+            for i in xrange(0, len(s), record_size):
+                yield s[i:i+record_size]
+    finally:
+        f.close()
+
+def _merge_records(iterables):
+    """Merge sorted iterables of packed records.
+
+    (This is heapq.merge(), which isn't available in Python 2.5.)
+
+    """
+    heap = []
+    for i, iterable in enumerate(iterables):
+        iterator = iter(iterable)
+        try:
+            heap.append((iterator.next(), i, iterator))
+        except StopIteration:
+            pass
+    heapq.heapify(heap)
+    while heap:
+        record, i, iterator = heap[0]
+        yield record
+        try:
+            heapq.heapreplace(heap, (iterator.next(), i, iterator))
+        except StopIteration:
+            heapq.heappop(heap)
+
+def _write_records(f, records):
+    """Write packed records to a file; return the number written."""
+    count = 0
+    buf = []
+    for record in records:
+        buf.append(record)
+        if len(buf) >= 4096:
+            count += len(buf)
+            f.write("".join(buf))
+            buf = []
+    count += len(buf)
+    f.write("".join(buf))
+    return count
+
+def _write_segment(f, records, runs):
+    """Write a segment and its game table at the current position in a file.
+
+    records -- iterable of packed records, in sorted order
+    runs    -- game table, as from _read_game_table() (not empty)
+
+    Returns a tuple describing the segment for the state table.
+
+    """
+    records_offset = f.tell()
+    record_count = _write_records(f, records)
+    table = pickle.dumps(runs, -1)
+    table_offset = f.tell()
+    f.write(table)
+    game_count = sum([len(game_numbers) // 4
+                      for (_, _, game_numbers) in runs])
+    return (records_offset, record_count, table_offset, len(table),
+            runs[0][0], game_count)
+
+def _write_state(f, state):
+    """Write the state table at the current position, and then the header.
+
+    state -- dict with keys
+      'sources'  -- map pathname -> pair (signature, game count)
+      'segments' -- list of tuples
+                    (records offset, record count,
+                     game table offset, game table length,
+                     first game id, game count)
+
+    A source's signature is (size, mtime) of the SGF file when it was indexed,
+    or None if it must be reindexed next time.
+
+    The segments are in game id order, and the game ids are consecutive from
+    zero.
+
+    """
+    state_offset = f.tell()
+    data = pickle.dumps(state, -1)
+    f.write(data)
+    f.flush()
+    f.seek(0)
+    f.write(_header_struct.pack(
+        _magic, _format_version, state_offset, len(data)))
+
+def _renumber_games(m, segments, live_pathnames):
+    """Give new game ids to the games from files which are being kept.
+
+    m              -- mmap of the old index file
+    segments       -- the old index file's segments
+    live_pathnames -- container of pathnames
+
+    Returns a pair (runs, translations)
+      runs         -- game table for the games which are kept, with new ids
+                      consecutive from zero
+      translations -- list of arrays, one for each segment, mapping
+                      (old game id - segment's first game id) to the new game
+                      id, or -1 for a game which is dropped
+
+    Renumbering preserves the order of the games, so it preserves the order
+    of the records.
+
+    """
+    runs = []
+    translations = []
+    next_game_id = 0
+    for segment in segments:
+        first_game_id, game_count = segment[4:6]
+        translation = array('l', [-1]) * game_count
+        for run_first_id, pathname, game_numbers in _read_game_table(
+                m, segment):
+            if pathname not in live_pathnames:
+                continue
+            count = len(game_numbers) // 4
+            i = run_first_id - first_game_id
+            translation[i:i+count] = array(
+                'l', xrange(next_game_id, next_game_id+count))
+            runs.append((next_game_id, pathname, game_numbers))
+            next_game_id += count
+        translations.append(translation)
+    return runs, translations
+
+def _iter_renumbered_records(m, segment, translation):
+    """Yield a segment's records with new game ids, dropping dead games."""
+    pack = _record_struct.pack
+    unpack = _record_struct.unpack
+    first_game_id = segment[4]
+    for record in _iter_segment_records(m, segment):
+        key, game_id, move_number = unpack(record)
+        new_game_id = translation[game_id - first_game_id]
+        if new_game_id >= 0:
+            yield pack(key, new_game_id, move_number)
+
+def _rewrite_index_file(pathname, old_map, old_segments, translations,
+                        runs, new_records, sources):
+    """Write an index file from scratch, with a single segment.
+
+    old_map      -- mmap of the previous index file, or None
+    old_segments -- the previous index file's segments
+    translations -- as from _renumber_games()
+    runs         -- game table for all the games in the new file
+    new_records  -- iterable of sorted packed records for newly-indexed games
+    sources      -- map pathname -> pair (signature, game count)
+
+    The file is written under a temporary name and renamed into place.
+
+    """
+    iterables = [_iter_renumbered_records(old_map, segment, translation)
+                 for segment, translation in zip(old_segments, translations)]
+    iterables.append(new_records)
+    new_pathname = pathname + ".new"
+    f = open(new_pathname, "wb")
+    try:
+        f.write(_header_struct.pack(_magic, _format_version, 0, 0))
+        segments = []
+        if runs:
+            segments.append(
+                _write_segment(f, _merge_records(iterables), runs))
+        _write_state(f, {'sources' : sources, 'segments' : segments})
+    finally:
+        f.close()
+    os.rename(new_pathname, pathname)
+
+def _append_to_index_file(pathname, old_map, old_segments,
+                          runs, new_record_count, new_records, sources):
+    """Add newly-indexed games to an index file without rewriting it.
+
+    old_map          -- mmap of the index file
+    old_segments     -- the index file's segments
+    runs             -- game table for the new games (may be empty)
+    new_record_count -- int
+    new_records      -- iterable of sorted packed records for the new games
+    sources          -- map pathname -> pair (signature, game count)
+
+    The new segment and state table are written after the end of the existing
+    data, and then the header is rewritten to point to them.
+
+    Trailing segments which are no more than twice the size of the new
+    segment are merged into it (the space they took up is left unused). So
+    each segment is more than twice the size of all the later ones put
+    together, and the number of segments is logarithmic in the number of
+    records.
+
+    """
+    segments = list(old_segments)
+    f = open(pathname, "r+b")
+    try:
+        f.seek(0, 2)
+        if runs:
+            iterables = [new_records]
+            merged_count = new_record_count
+            while segments and segments[-1][1] <= 2 * merged_count:
+                segment = segments.pop()
+                iterables.append(_iter_segment_records(old_map, segment))
+                runs = _read_game_table(old_map, segment) + runs
+                merged_count += segment[1]
+            segments.append(
+                _write_segment(f, _merge_records(iterables), runs))
+        _write_state(f, {'sources' : sources, 'segments' : segments})
+    finally:
+        f.close()
+
+
+## Building indexes
+
+# Maximum number of new records held in memory; more than this are sorted and
+# written to a temporary file.
+_max_run_records = 1 << 20
+
+def _get_file_signature(pathname):
+    st = os.stat(pathname)
+    return (st.st_size, st.st_mtime)
+
+class _Indexing_response(object):
+    """Response from an _Indexing_job.
+
+    Public attributes:
+      pathname  -- as for the job
+      signature -- pair (size, mtime) of the file when it was read
+      games     -- list of pairs (game number, list of position keys)
+      errors    -- list of strings
+
+    """
+    def __init__(self, pathname, signature, games, errors):
+        self.pathname = pathname
+        self.signature = signature
+        self.games = games
+        self.errors = errors
+
+class _Indexing_job(object):
+    """Job finding the position keys for the games in a piece of an SGF file.
+
+    Instantiate with a tuple from compact_game_files.split_sgf_files().
+
+    This is suitable for use with job_manager.
+
+    """
+    def __init__(self, piece):
+        (self.pathname, self.start_offset, self.end_offset,
+         self.first_game_number) = piece
+
+    def run(self, worker_id):
+        def reader(s):
+            return _get_position_keys(
+                *sgf_moves.read_compact_game(s).get_setup_and_moves())
+        try:
+            signature = _get_file_signature(self.pathname)
+            results, errors = compact_game_files.read_sgf_file_games(
+                self.pathname, reader,
+                self.start_offset, self.end_offset, self.first_game_number)
+        except EnvironmentError, e:
+            raise job_manager.JobFailed(str(e))
+        games = [(game_number, keys)
+                 for (game_number, _, _, keys) in results]
+        return _Indexing_response(self.pathname, signature, games, errors)
+
+class _Indexer(object):
+    """Job source for update_position_index().
+
+    Instantiate with
+      pathnames     -- list of SGF files to index
+      first_game_id -- game id for the first new game
+      run_prefix    -- pathname prefix for temporary files
+
+    New records are kept in memory until there are _max_run_records of them;
+    then they're sorted and written to a temporary 'run' file. Call
+    remove_run_files() when finished.
+
+    Public attributes:
+      runs         -- game table for the new games
+      record_count -- number of new records
+      game_count   -- number of new games
+      errors       -- list of strings
+
+    """
+    def __init__(self, pathnames, first_game_id, run_prefix):
+        self.pieces = compact_game_files.split_sgf_files(pathnames)
+        self.next_game_id = first_game_id
+        self.run_prefix = run_prefix
+        self.run_pathnames = []
+        self.records = []
+        self.sources = {}
+        self.failed = set()
+        self.runs = []
+        self.record_count = 0
+        self.game_count = 0
+        self.errors = []
+
+    def get_job(self):
+        try:
+            piece = self.pieces.next()
+        except StopIteration:
+            return job_manager.NoJobAvailable
+        return _Indexing_job(piece)
+
+    def process_response(self, response):
+        pack = _record_struct.pack
+        records = self.records
+        first_game_id = game_id = self.next_game_id
+        game_numbers = array(_uint32_typecode)
+        for game_number, keys in response.games:
+            game_numbers.append(game_number)
+            for move_number, key in enumerate(keys):
+                records.append(pack(key, game_id, move_number))
+                self.record_count += 1
+            game_id += 1
+        self.next_game_id = game_id
+        if game_numbers:
+            self.runs.append((first_game_id, response.pathname,
+                              _uint32s_to_string(game_numbers)))
+        self.game_count += len(game_numbers)
+        # A large file is read in several pieces
+        source = self.sources.get(response.pathname)
+        if source is None:
+            self.sources[response.pathname] = \
+                [response.signature, len(game_numbers)]
+        else:
+            if source[0] != response.signature:
+                source[0] = None
+            source[1] += len(game_numbers)
+        for msg in response.errors:
+            self.errors.append("%s: %s" % (response.pathname, msg))
+        if len(records) >= _max_run_records:
+            self._spill()
+
+    def process_error_response(self, job, message):
+        self.errors.append("%s: %s" % (job.pathname, message))
+        self.failed.add(job.pathname)
+
+    def _spill(self):
+        self.records.sort()
+        pathname = "%s%d" % (self.run_prefix, len(self.run_pathnames))
+        f = open(pathname, "wb")
+        self.run_pathnames.append(pathname)
+        try:
+            _write_records(f, self.records)
+        finally:
+            f.close()
+        self.records = []
+
+    def get_sources(self):
+        """Return a map pathname -> pair (signature, game count).
+
+        Files which weren't read completely have signature None, so they're
+        reindexed next time.
+
+        """
+        result = {}
+        for pathname, (signature, game_count) in self.sources.iteritems():
+            if pathname in self.failed:
+                signature = None
+            result[pathname] = (signature, game_count)
+        return result
+
+    def get_new_records(self):
+        """Return an iterator over the new records, in sorted order."""
+        self.records.sort()
+        return _merge_records(
+            [self.records] +
+            [_iter_run_file(pathname) for pathname in self.run_pathnames])
+
+    def remove_run_files(self):
+        for pathname in self.run_pathnames:
+            try:
+                os.remove(pathname)
+            except EnvironmentError:
+                pass
+        self.run_pathnames = []
+
+def update_position_index(index_pathname, pathnames,
+                          max_workers=None, allow_mp=True):
+    """Create or update a position index.
+
+    index_pathname -- position index file
+    pathnames      -- list of SGF files or directories
+    max_workers    -- number of worker processes (default: one per CPU)
+    allow_mp       -- bool (default True)
+
+    Returns a pair (number of games newly indexed, list of error messages)
+
+    Directories are expanded using compact_game_files.find_sgf_files(). Files
+    may contain collections; large files are divided into pieces using
+    compact_game_files.split_sgf_files().
+
+    If the index file already exists, files whose size and modification time
+    are the same as when they were indexed are skipped. Files which have
+    changed are reindexed, and files which no longer exist (or are no longer
+    in 'pathnames') are dropped from the index. If the existing index file
+    isn't a valid position index, it's rebuilt from scratch.
+
+    If the only change is that there are new files, the new games are appended
+    to the index file. Otherwise the file is rewritten, and the games which
+    are kept are renumbered.
+
+    Each game's main sequence is replayed on a boards.Board, stopping at the
+    first move to an occupied point. Games which can't be read are skipped,
+    and reported in the error messages. If there is a parse error in a
+    collection, the games preceding it are kept.
+
+    Raises EnvironmentError if the index file can't be written.
+
+    """
+    sgf_pathnames = compact_game_files.find_sgf_files(pathnames)
+    old_map = None
+    old_state = {'sources' : {}, 'segments' : []}
+    if os.path.exists(index_pathname):
+        try:
+            old_map, old_state = _open_index_file(index_pathname)
+        except ValueError:
+            pass
+    try:
+        old_sources = old_state['sources']
+        old_segments = old_state['segments']
+        to_index = []
+        unchanged = {}
+        for pathname in sgf_pathnames:
+            source = old_sources.get(pathname)
+            if source is not None and source[0] is not None:
+                try:
+                    current_signature = _get_file_signature(pathname)
+                except EnvironmentError:
+                    current_signature = None
+                if current_signature == source[0]:
+                    unchanged[pathname] = source
+                    continue
+            to_index.append(pathname)
+        dropped_game_count = sum([
+            game_count for (pathname, (_, game_count)) in old_sources.items()
+            if pathname not in unchanged])
+        rewrite = (old_map is None or dropped_game_count > 0 or
+                   2 * _get_wasted_size(old_map, old_segments) > len(old_map))
+        if rewrite:
+            runs, translations = _renumber_games(
+                old_map, old_segments, unchanged)
+            first_game_id = sum([len(game_numbers) // 4
+                                 for (_, _, game_numbers) in runs])
+        else:
+            first_game_id = sum([segment[5] for segment in old_segments])
+        indexer = _Indexer(to_index, first_game_id, index_pathname + ".run")
+        try:
+            job_manager.run_jobs(
+                job_source=indexer,
+                max_workers=max_workers,
+                allow_mp=allow_mp,
+                passed_exceptions=[EnvironmentError])
+            # Write the index if anything was read, even if it produced no
+            # records, so that the new signatures are recorded (otherwise a
+            # file which now has no usable games would be reread every time).
+            if (rewrite or indexer.sources or
+                len(unchanged) != len(old_sources)):
+                sources = unchanged
+                sources.update(indexer.get_sources())
+                if rewrite:
+                    _rewrite_index_file(
+                        index_pathname, old_map, old_segments, translations,
+                        runs + indexer.runs, indexer.get_new_records(),
+                        sources)
+                else:
+                    _append_to_index_file(
+                        index_pathname, old_map, old_segments,
+                        indexer.runs, indexer.record_count,
+                        indexer.get_new_records(), sources)
+        finally:
+            indexer.remove_run_files()
+    finally:
+        if old_map is not None:
+            old_map.close()
+    return indexer.game_count, indexer.errors
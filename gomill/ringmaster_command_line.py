@@ -53,6 +53,12 @@ def do_check(ringmaster, options):
     if not ringmaster.check_players(discard_stderr=False, quiet=options.quiet):
         return 1
 
+def do_export(ringmaster, options):
+    game_count = ringmaster.export_games()
+    if not options.quiet:
+        print "%d games exported to %s" % (
+            game_count, ringmaster.sgf_dir_pathname)
+
 def do_debugstatus(ringmaster, options):
     ringmaster.print_status()
 
@@ -63,13 +69,15 @@ _actions = {
     "report" : do_report,
     "reset" : do_reset,
     "check" : do_check,
+    "export" : do_export,
     "debugstatus" : do_debugstatus,
     }
 
 
 def run(argv, ringmaster_class):
     usage = ("%prog [options] <control file> [command]\n\n"
-             "commands: run (default), stop, show, report, reset, check")
+             "commands: run (default), stop, show, report, reset, check, "
+             "export")
     parser = OptionParser(usage=usage, prog="ringmaster",
                           version=ringmaster_class.public_version)
     parser.add_option("--max-games", "-g", type="int",
@@ -17,6 +17,7 @@ except ImportError:
 
 from gomill import compact_tracebacks
 from gomill import game_jobs
+from gomill import game_stores
 from gomill import job_manager
 from gomill import ringmaster_presenters
 from gomill import terminal_input
@@ -97,7 +98,7 @@ class Ringmaster(object):
         self.base_directory, control_filename = os.path.split(control_pathname)
         self.competition_code, ext = os.path.splitext(control_filename)
         if ext in (".log", ".status", ".cmd", ".hist",
-                   ".report", ".games", ".void", ".gtplogs"):
+                   ".report", ".games", ".gamestore", ".void", ".gtplogs"):
             raise RingmasterError("forbidden control file extension: %s" % ext)
         stem = os.path.join(self.base_directory, self.competition_code)
         self.log_pathname = stem + ".log"
@@ -106,6 +107,7 @@ class Ringmaster(object):
         self.history_pathname = stem + ".hist"
         self.report_pathname = stem + ".report"
         self.sgf_dir_pathname = stem + ".games"
+        self.game_store_pathname = stem + ".gamestore"
         self.void_dir_pathname = stem + ".void"
         self.gtplog_dir_pathname = stem + ".gtplogs"
 
@@ -278,7 +280,7 @@ class Ringmaster(object):
         except EnvironmentError, e:
             raise RingmasterError("failed to open history file:\n%s" % e)
 
-        if self.record_games:
+        if self.record_games and self.record_format == 'sgf':
             try:
                 if not os.path.exists(self.sgf_dir_pathname):
                     os.mkdir(self.sgf_dir_pathname)
@@ -306,6 +308,7 @@ class Ringmaster(object):
 
     ringmaster_settings = [
         Setting('record_games', interpret_bool, True),
+        Setting('record_format', interpret_enum('sgf', 'store'), 'sgf'),
         Setting('stderr_to_log', interpret_bool, True),
         Setting('skip_player_checks', interpret_bool, False),
         ]
@@ -564,7 +567,10 @@ class Ringmaster(object):
         job.sgf_game_name = "%s %s" % (self.competition_code, job.game_id)
         if self.record_games:
             job.sgf_filename = self.get_sgf_filename(job.game_id)
-            job.sgf_dirname = self.sgf_dir_pathname
+            if self.record_format == 'store':
+                job.game_store_pathname = self.game_store_pathname
+            else:
+                job.sgf_dirname = self.sgf_dir_pathname
             job.void_sgf_dirname = self.void_dir_pathname
         if self.write_gtp_logs:
             job.gtp_log_pathname = os.path.join(
@@ -736,6 +742,7 @@ class Ringmaster(object):
             self.command_pathname,
             self.history_pathname,
             self.report_pathname,
+            self.game_store_pathname,
             ]:
             if os.path.exists(pathname):
                 try:
@@ -753,6 +760,27 @@ class Ringmaster(object):
                 except EnvironmentError, e:
                     print >>sys.stderr, e
 
+    def export_games(self):
+        """Write SGF files for the games in the competition's game store.
+
+        The files are written to the standard sgf directory (which is created
+        if necessary), with the same filenames as if record_format were
+        'sgf'.
+
+        Returns the number of games exported.
+
+        """
+        if not os.path.exists(self.game_store_pathname):
+            raise RingmasterError("no game store")
+        try:
+            store = game_stores.Game_store(self.game_store_pathname)
+            if not os.path.exists(self.sgf_dir_pathname):
+                os.mkdir(self.sgf_dir_pathname)
+            return store.export_sgf_files(
+                self.sgf_dir_pathname, self.get_sgf_filename)
+        except (EnvironmentError, ValueError), e:
+            raise RingmasterError("error exporting games:\n%s" % e)
+
     def check_players(self, discard_stderr=False, quiet=False):
         """Check that the engines required for the competition will run.
 
@@ -10,6 +10,43 @@ from gomill import sgf_grammar
 from gomill import sgf_properties
 
 
+# Cache of interpreted property values (see Node.get())
+_value_cache_enabled = True
+# [hits, lookups]
+_value_cache_stats = [0, 0]
+
+def set_value_cache_enabled(b):
+    """Enable or disable caching of interpreted property values.
+
+    The cache is enabled by default. Disabling it doesn't discard values
+    already cached, but they won't be used until it's enabled again.
+
+    """
+    global _value_cache_enabled
+    _value_cache_enabled = bool(b)
+
+def get_value_cache_stats():
+    """Return statistics for the interpreted property value cache.
+
+    Returns a pair (hits, lookups), counting since the module was loaded or
+    reset_value_cache_stats() was last called.
+
+    """
+    return tuple(_value_cache_stats)
+
+def reset_value_cache_stats():
+    """Reset the counts returned by get_value_cache_stats()."""
+    _value_cache_stats[:] = [0, 0]
+
+def _copy_cached_value(value):
+    # Interpreted values are returned to the caller, who might modify them.
+    if type(value) is set:
+        return set(value)
+    if type(value) is list:
+        return list(value)
+    return value
+
+
 class Node(object):
     """An SGF node.
 
@@ -22,11 +59,23 @@ class Node(object):
 
     Changing the SZ property isn't allowed.
 
+    Interpreted property values are cached (see get() and get_move()).
+
     """
+    __slots__ = ('_property_map', '_presenter', '_value_cache')
+
     def __init__(self, property_map, presenter):
         # Map identifier (PropIdent) -> nonempty list of raw values
         self._property_map = property_map
         self._presenter = presenter
+        # None, or map identifier -> tuple
+        #   (raw values list, presenter's cache key, interpreted value)
+        # The identifier None is used for get_move()'s result.
+        # An entry is only used if the node's raw values list for the
+        # identifier is the same object (and the presenter's cache key is the
+        # same), so the cache doesn't go stale if the property map is
+        # changed via another Node sharing it.
+        self._value_cache = None
 
     def get_size(self):
         """Return the board size used to interpret property values."""
@@ -106,6 +155,8 @@ class Node(object):
         if identifier == "SZ" and values != [str(self._presenter.size)]:
             raise ValueError("changing size is not permitted")
         self._property_map[identifier] = values
+        if self._value_cache is not None:
+            self._value_cache.clear()
 
     def unset(self, identifier):
         """Remove the specified property.
@@ -116,6 +167,8 @@ class Node(object):
         if identifier == "SZ" and self._presenter.size != 19:
             raise ValueError("changing size is not permitted")
         del self._property_map[identifier]
+        if self._value_cache is not None:
+            self._value_cache.clear()
 
 
     def set_raw_list(self, identifier, values):
@@ -173,9 +226,33 @@ class Node(object):
 
         See sgf_properties.Presenter.interpret() for details.
 
+        Interpreted values are cached, so asking for the same property again
+        doesn't reinterpret the raw values (unless they, or the presenter's
+        cache key for the property, have changed; see
+        sgf_properties.Presenter.get_cache_key()). Each call returns a new
+        object for values which are sets or lists.
+
         """
-        return self._presenter.interpret(
-            identifier, self._property_map[identifier])
+        raw_values = self._property_map[identifier]
+        presenter = self._presenter
+        if not _value_cache_enabled:
+            return presenter.interpret(identifier, raw_values)
+        cache_key = presenter.get_cache_key(identifier)
+        if cache_key is None:
+            return presenter.interpret(identifier, raw_values)
+        _value_cache_stats[1] += 1
+        cache = self._value_cache
+        if cache is None:
+            cache = self._value_cache = {}
+        else:
+            entry = cache.get(identifier)
+            if (entry is not None and entry[0] is raw_values and
+                entry[1] is cache_key):
+                _value_cache_stats[0] += 1
+                return _copy_cached_value(entry[2])
+        value = presenter.interpret(identifier, raw_values)
+        cache[identifier] = (raw_values, cache_key, value)
+        return _copy_cached_value(value)
 
     def set(self, identifier, value):
         """Set the value of the specified property.
@@ -227,12 +304,34 @@ class Node(object):
 
         Returns None, None if the node contains no B or W property.
 
+        The result is cached in the same way as for get().
+
         """
-        colour, raw = self.get_raw_move()
-        if colour is None:
-            return None, None
-        return (colour,
-                sgf_properties.interpret_go_point(raw, self._presenter.size))
+        values = self._property_map.get("B")
+        if values is not None:
+            colour = "b"
+        else:
+            values = self._property_map.get("W")
+            if values is not None:
+                colour = "w"
+            else:
+                return None, None
+        if not _value_cache_enabled:
+            return (colour, sgf_properties.interpret_go_point(
+                values[0], self._presenter.size))
+        _value_cache_stats[1] += 1
+        cache = self._value_cache
+        if cache is None:
+            cache = self._value_cache = {}
+        else:
+            entry = cache.get(None)
+            if entry is not None and entry[0] is values:
+                _value_cache_stats[0] += 1
+                return entry[2]
+        result = (colour, sgf_properties.interpret_go_point(
+            values[0], self._presenter.size))
+        cache[None] = (values, None, result)
+        return result
 
     def get_setup_stones(self):
         """Retrieve Add Black / Add White / Add Empty properties from a node.
@@ -340,12 +439,51 @@ class Tree_node(Node):
       parent -- the nodes's parent Tree_node (None for the root node)
 
     """
+    # Tree_nodes for a game loaded from a Coarse_game_tree are created lazily:
+    # a node's children aren't built until they are first needed. Until then,
+    # _child_list is None, and _coarse_tree and _coarse_index identify the
+    # node's position in the Coarse_game_tree (the node's property map is
+    # _coarse_tree.sequence[_coarse_index]).
+    __slots__ = ('owner', 'parent', '_child_list',
+                 '_coarse_tree', '_coarse_index')
+
     def __init__(self, parent, properties):
         self.owner = parent.owner
         self.parent = parent
-        self._children = []
+        self._child_list = []
+        self._coarse_tree = None
         Node.__init__(self, properties, parent._presenter)
 
+    def _make_unexpanded_child(self, coarse_tree, index):
+        child = Tree_node(self, coarse_tree.sequence[index])
+        child._child_list = None
+        child._coarse_tree = coarse_tree
+        child._coarse_index = index
+        return child
+
+    def _expand(self):
+        coarse_tree = self._coarse_tree
+        index = self._coarse_index
+        if index < len(coarse_tree.sequence) - 1:
+            self._child_list = [
+                self._make_unexpanded_child(coarse_tree, index+1)]
+        else:
+            self._child_list = [
+                self._make_unexpanded_child(child_tree, 0)
+                for child_tree in coarse_tree.children]
+        self._coarse_tree = None
+        return self._child_list
+
+    @property
+    def _children(self):
+        child_list = self._child_list
+        if child_list is None:
+            return self._expand()
+        return child_list
+
+    def _is_unexpanded(self):
+        return self._child_list is None
+
     def _add_child(self, node):
         self._children.append(node)
 
@@ -443,41 +581,25 @@ class Tree_node(Node):
 
 class _Root_tree_node(Tree_node):
     """Variant of Tree_node used for a game root."""
+    __slots__ = ()
+
     def __init__(self, property_map, owner):
         self.owner = owner
         self.parent = None
-        self._children = []
+        self._child_list = []
+        self._coarse_tree = None
         Node.__init__(self, property_map, owner.presenter)
 
-class _Unexpanded_root_tree_node(_Root_tree_node):
-    """Variant of _Root_tree_node used with 'loaded' Sgf_games."""
-    def __init__(self, owner, coarse_tree):
-        _Root_tree_node.__init__(self, coarse_tree.sequence[0], owner)
-        self._coarse_tree = coarse_tree
-
-    def _expand(self):
-        sgf_grammar.make_tree(
-            self._coarse_tree, self, Tree_node, Tree_node._add_child)
-        delattr(self, '_coarse_tree')
-        self.__class__ = _Root_tree_node
-
-    def __len__(self):
-        self._expand()
-        return self.__len__()
-
-    def __getitem__(self, key):
-        self._expand()
-        return self.__getitem__(key)
-
-    def index(self, child):
-        self._expand()
-        return self.index(child)
-
-    def new_child(self, index=None):
-        self._expand()
-        return self.new_child(index)
+    @classmethod
+    def _from_coarse_game_tree(cls, owner, coarse_tree):
+        root = cls(coarse_tree.sequence[0], owner)
+        root._child_list = None
+        root._coarse_tree = coarse_tree
+        root._coarse_index = 0
+        return root
 
     def _main_sequence_iter(self):
+        # Only valid while the root is unexpanded
         presenter = self._presenter
         for properties in sgf_grammar.main_sequence_iter(self._coarse_tree):
             yield Node(properties, presenter)
@@ -561,7 +683,7 @@ class Sgf_game(object):
         else:
             encoding = override_encoding
         game = cls.__new__(cls, size, encoding)
-        game.root = _Unexpanded_root_tree_node(game, coarse_game)
+        game.root = _Root_tree_node._from_coarse_game_tree(game, coarse_game)
         if override_encoding is not None:
             game.root.set_raw("CA", game.presenter.encoding)
         return game
@@ -581,6 +703,29 @@ class Sgf_game(object):
         coarse_game = sgf_grammar.parse_sgf_game(s)
         return cls.from_coarse_game_tree(coarse_game, override_encoding)
 
+    @classmethod
+    def from_arrays(cls, size, moves, setup=None,
+                    comment_offsets=None, comment_data=None):
+        """Alternative constructor: create an Sgf_game from NumPy arrays.
+
+        size -- int (board size)
+
+        The other parameters are as returned by to_arrays() (so you can pass
+        its result as keyword arguments).
+
+        The game has no variations, and the CA property is set to UTF-8.
+
+        Raises ValueError if the arrays are invalid.
+
+        Raises ImportError if NumPy isn't available.
+
+        See sgf_arrays.arrays_to_coarse_game_tree() for details.
+
+        """
+        from gomill import sgf_arrays
+        return cls.from_coarse_game_tree(sgf_arrays.arrays_to_coarse_game_tree(
+            size, moves, setup, comment_offsets, comment_data))
+
     def serialise(self, wrap=79):
         """Serialise the SGF data as a string.
 
@@ -618,6 +763,36 @@ class Sgf_game(object):
         else:
             return serialised.decode(self.root.get_encoding()).encode(encoding)
 
+    def write(self, f, wrap=79):
+        """Write the SGF data to a file object.
+
+        f    -- file-like object with a write() method
+        wrap -- int (default 79), or None
+
+        Writes the same data as serialise() returns (and raises the same
+        exceptions), but writes it incrementally rather than building the
+        whole serialised game in memory first. If an exception is raised, some
+        of the output may already have been written.
+
+        """
+        try:
+            encoding = self.get_charset()
+        except ValueError:
+            raise ValueError("unsupported charset: %s" %
+                             self.root.get_raw_list("CA"))
+        if self.root._is_unexpanded():
+            pieces = sgf_grammar.iter_game_tree_pieces(self.root._coarse_tree)
+        else:
+            pieces = sgf_grammar.iter_node_tree_pieces(
+                self.root, lambda node:node, Node.get_raw_property_map)
+        raw_encoding = self.root.get_encoding()
+        if encoding == raw_encoding:
+            write = f.write
+        else:
+            def write(s):
+                f.write(s.decode(raw_encoding).encode(encoding))
+        sgf_grammar.write_pieces(pieces, write, wrap)
+
 
     def get_property_presenter(self):
         """Return the property presenter.
@@ -703,10 +878,25 @@ class Sgf_game(object):
         nodes without building the entire game tree.
 
         """
-        if isinstance(self.root, _Unexpanded_root_tree_node):
+        if self.root._is_unexpanded():
             return self.root._main_sequence_iter()
         return iter(self.get_main_sequence())
 
+    def to_arrays(self):
+        """Return the 'leftmost' variation's moves as NumPy arrays.
+
+        Returns a dict of arrays: moves, setup, comment_offsets, comment_data.
+
+        Raises ValueError if there are setup stones after the root node.
+
+        Raises ImportError if NumPy isn't available.
+
+        See sgf_arrays.game_to_arrays() for details.
+
+        """
+        from gomill import sgf_arrays
+        return sgf_arrays.game_to_arrays(self)
+
     def extend_main_sequence(self):
         """Create a new Tree_node and add to the 'leftmost' variation.
 
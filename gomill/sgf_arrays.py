@@ -0,0 +1,194 @@
+"""Export and import of game records as NumPy arrays.
+
+This module requires NumPy.
+
+A game record is represented as a dict with the following keys:
+  moves           -- int8 array of shape (n, 3): colour, row, col
+  setup           -- int8 array of shape (m, 3): colour, row, col
+  comment_offsets -- int32 array of shape (n+1,)
+  comment_data    -- uint8 array
+
+colour is BLACK (0) or WHITE (1). Coordinates are as elsewhere in gomill
+((0, 0) is the lower left); a pass has row and col -1.
+
+The comment on move i is the utf-8 string
+comment_data[comment_offsets[i]:comment_offsets[i+1]] (empty if the move has
+no comment).
+
+"""
+
+import numpy
+
+from gomill import sgf_grammar
+from gomill import sgf_properties
+
+BLACK = 0
+WHITE = 1
+
+_colour_codes = {'b' : BLACK, 'w' : WHITE}
+_colours = {BLACK : 'b', WHITE : 'w'}
+
+
+def _make_arrays(setup_rows, move_rows, comment_offsets, comment_data):
+    if comment_data:
+        data = numpy.frombuffer(comment_data, dtype=numpy.uint8).copy()
+    else:
+        data = numpy.zeros(0, dtype=numpy.uint8)
+    return {
+        'moves'           : numpy.array(move_rows,
+                                        dtype=numpy.int8).reshape(-1, 3),
+        'setup'           : numpy.array(setup_rows,
+                                        dtype=numpy.int8).reshape(-1, 3),
+        'comment_offsets' : numpy.array(comment_offsets, dtype=numpy.int32),
+        'comment_data'    : data,
+        }
+
+def records_to_arrays(setup, moves):
+    """Make arrays from lists of setup stones and moves.
+
+    setup -- iterable of pairs (colour, (row, col))
+    moves -- iterable of tuples (colour, move, comment)
+             move is (row, col), or None for a pass
+             comment is a utf-8 string, or None
+
+    Returns a dict of arrays (see the module docstring).
+
+    'moves' is in the form returned by gameplay.Game_runner.get_moves().
+
+    """
+    setup_rows = [(_colour_codes[colour], row, col)
+                  for (colour, (row, col)) in setup]
+    move_rows = []
+    comment_offsets = [0]
+    comments = []
+    position = 0
+    for colour, move, comment in moves:
+        if move is None:
+            row, col = -1, -1
+        else:
+            row, col = move
+        move_rows.append((_colour_codes[colour], row, col))
+        if comment:
+            comments.append(comment)
+            position += len(comment)
+        comment_offsets.append(position)
+    return _make_arrays(setup_rows, move_rows, comment_offsets,
+                        "".join(comments))
+
+def game_to_arrays(sgf_game):
+    """Make arrays from an Sgf_game's 'leftmost' variation.
+
+    Returns a dict of arrays (see the module docstring).
+
+    The setup stones are the root node's AB and AW properties. Moves and
+    comments are taken from each node with a B or W property (so comments on
+    other nodes are ignored).
+
+    Raises ValueError if there are any AB/AW/AE properties after the root
+    node, or if any of the properties used are malformed.
+
+    """
+    root = sgf_game.get_root()
+    ab, aw, ae = root.get_setup_stones()
+    setup = [('b', point) for point in sorted(ab)]
+    setup += [('w', point) for point in sorted(aw)]
+    moves = []
+    for i, node in enumerate(sgf_game.main_sequence_iter()):
+        if i > 0 and node.has_setup_stones():
+            raise ValueError("setup properties after the root node")
+        colour, move = node.get_move()
+        if colour is None:
+            continue
+        if node.has_property("C"):
+            comment = node.get("C")
+        else:
+            comment = None
+        moves.append((colour, move, comment))
+    return records_to_arrays(setup, moves)
+
+def _get_colour(code):
+    try:
+        return _colours[code]
+    except KeyError:
+        raise ValueError("bad colour code: %s" % code)
+
+def arrays_to_coarse_game_tree(size, moves, setup=None,
+                               comment_offsets=None, comment_data=None):
+    """Make a Coarse_game_tree from arrays.
+
+    size -- int (board size)
+
+    The other parameters are arrays as described in the module docstring (or
+    anything NumPy can convert to them).
+
+    Returns a sgf_grammar.Coarse_game_tree with no variations, suitable for
+    Sgf_game.from_coarse_game_tree(). The root node has FF, GM, SZ and CA
+    (UTF-8) properties, and AB/AW for the setup stones. Each move has its own
+    node.
+
+    Raises ValueError if the arrays have the wrong shape, or contain invalid
+    colours or coordinates.
+
+    """
+    if not 1 <= size <= 26:
+        raise ValueError("size out of range: %s" % size)
+    presenter = sgf_properties.Presenter(size, "UTF-8")
+    point_strings = {}
+    def serialise_point(row, col):
+        try:
+            return point_strings[row, col]
+        except KeyError:
+            pass
+        if row == -1 and col == -1:
+            s = sgf_properties.serialise_go_point(None, size)
+        else:
+            try:
+                s = sgf_properties.serialise_go_point((row, col), size)
+            except ValueError:
+                raise ValueError("point out of range: (%d, %d)" % (row, col))
+        point_strings[row, col] = s
+        return s
+
+    moves = numpy.asarray(moves)
+    if moves.size == 0:
+        moves = moves.reshape(0, 3)
+    if moves.ndim != 2 or moves.shape[1] != 3:
+        raise ValueError("moves array must have shape (n, 3)")
+    root = {
+        'FF' : ["4"],
+        'GM' : ["1"],
+        'SZ' : [str(size)],
+        'CA' : ["UTF-8"],
+        }
+    if setup is not None:
+        setup = numpy.asarray(setup)
+        if setup.size == 0:
+            setup = setup.reshape(0, 3)
+        if setup.ndim != 2 or setup.shape[1] != 3:
+            raise ValueError("setup array must have shape (n, 3)")
+        for code, row, col in setup.tolist():
+            if row == -1 and col == -1:
+                raise ValueError("pass in setup stones")
+            identifier = "A" + _get_colour(code).upper()
+            root.setdefault(identifier, []).append(serialise_point(row, col))
+    if comment_offsets is not None:
+        comment_offsets = numpy.asarray(comment_offsets).tolist()
+        if len(comment_offsets) != len(moves) + 1:
+            raise ValueError("comment_offsets must have one more entry "
+                             "than moves")
+        if comment_data is None:
+            comment_data = ""
+        else:
+            comment_data = numpy.asarray(
+                comment_data, dtype=numpy.uint8).tostring()
+    sequence = [root]
+    for i, (code, row, col) in enumerate(moves.tolist()):
+        node = {_get_colour(code).upper() : [serialise_point(row, col)]}
+        if comment_offsets is not None:
+            comment = comment_data[comment_offsets[i]:comment_offsets[i+1]]
+            if comment:
+                node['C'] = [sgf_properties.serialise_text(comment, presenter)]
+        sequence.append(node)
+    coarse_game = sgf_grammar.Coarse_game_tree()
+    coarse_game.sequence = sequence
+    return coarse_game
@@ -19,6 +19,8 @@ values should pass is_valid_property_value().
 
 """
 
+import mmap
+import os
 import re
 import string
 
@@ -39,6 +41,49 @@ _tokenise_re = re.compile(r"""
 """, re.VERBOSE | re.DOTALL)
 
 
+# Used by scan_main_sequence(). _main_sequence_re matches the rest of a main
+# sequence (following the initial '(;'), up to and including the first ')'.
+# In the text it matches (excluding the ')'), each _main_sequence_token_re
+# match is immediately followed by the next: group 1 is a node's ';' (or '(;'),
+# group 2 is a PropIdent, and group 3 is all its PropValues (with brackets).
+_main_sequence_re = re.compile(r"""
+(?:
+    \s*
+    (?:
+        [A-Za-z]{1,64} \s* \[ [^\\\]]* (?: \\. [^\\\]]* )* \]
+                       (?: \s* \[ [^\\\]]* (?: \\. [^\\\]]* )* \] )*
+        |
+        ;
+        |
+        \( \s* ;
+    )
+)*
+\s* \)
+""", re.VERBOSE | re.DOTALL)
+_main_sequence_token_re = re.compile(r"""
+\s*
+( \(? \s* ; )?
+\s*
+(?:
+    ( [A-Za-z]{1,64} ) \s*
+    ( \[ [^\\\]]* (?: \\. [^\\\]]* )* \]
+      (?: \s* \[ [^\\\]]* (?: \\. [^\\\]]* )* \] )* )
+)?
+""", re.VERBOSE | re.DOTALL)
+_values_re = re.compile(r"\[ ( [^\\\]]* (?: \\. [^\\\]]* )* ) \]",
+                        re.VERBOSE | re.DOTALL)
+
+# Used by iter_game_ranges(). Matches text up to and including the next
+# parenthesis which isn't inside a PropValue (group 1 is the parenthesis; it
+# doesn't participate if there's none before the end of the data, or before
+# an unterminated PropValue).
+_to_paren_re = re.compile(r"""
+[^\[()]*
+(?: \[ [^\\\]]* (?: \\. [^\\\]]* )* \] [^\[()]* )*
+( [()] )?
+""", re.VERBOSE | re.DOTALL)
+
+
 def is_valid_property_identifier(s):
     """Check whether 's' is a well-formed PropIdent.
 
@@ -141,69 +186,144 @@ class Coarse_game_tree(object):
         self.sequence = [] # must be at least one node
         self.children = [] # may be empty
 
+# Group numbers in _tokenise_re
+_V, _I, _D = 1, 2, 3
+
+# Cache of stripped and interned PropIdents, keyed by the source text
+_prop_idents = {}
+
+def _get_prop_ident(token):
+    try:
+        return _prop_idents[token]
+    except KeyError:
+        pass
+    prop_ident = intern(token.translate(None, _lcchars))
+    if len(_prop_idents) < 10000:
+        _prop_idents[token] = prop_ident
+    return prop_ident
+
 def _parse_sgf_game(s, start_position):
-    """Common implementation for parse_sgf_game and parse_sgf_games."""
-    tokens, end_position = tokenise(s, start_position)
-    if not tokens:
+    """Common implementation for parse_sgf_game and parse_sgf_games.
+
+    This builds the game tree in a single pass, accepting the same tokens as
+    tokenise() and producing the same results as parsing its output.
+
+    """
+    m = _find_start_re.search(s, start_position)
+    if not m:
         return None, None
+    next_token = _tokenise_re.scanner(s, m.start()).match
     stack = []
     game_tree = None
     sequence = None
     properties = None
-    index = 0
-    try:
-        while True:
-            token_type, token = tokens[index]
-            index += 1
-            if token_type == 'V':
+    # The property whose values are being collected (prop_values is None if
+    # the previous token wasn't part of a property)
+    prop_ident = None
+    prop_values = None
+    while True:
+        m = next_token()
+        if m is None:
+            raise ValueError("unexpected end of SGF data")
+        token_type = m.lastindex
+        if token_type == _V:
+            if prop_values is None:
                 raise ValueError("unexpected value")
-            if token_type == 'D':
-                if token == ';':
-                    if sequence is None:
-                        raise ValueError("unexpected node")
-                    properties = {}
-                    sequence.append(properties)
-                else:
-                    if sequence is not None:
-                        if not sequence:
-                            raise ValueError("empty sequence")
-                        game_tree.sequence = sequence
-                        sequence = None
-                    if token == '(':
-                        stack.append(game_tree)
-                        game_tree = Coarse_game_tree()
-                        sequence = []
-                    else:
-                        # token == ')'
-                        variation = game_tree
-                        game_tree = stack.pop()
-                        if game_tree is None:
-                            break
-                        game_tree.children.append(variation)
-                    properties = None
+            prop_values.append(m.group(_V))
+            continue
+        if prop_values is not None:
+            if not prop_values:
+                raise ValueError("property with no values")
+            if properties is None:
+                raise ValueError("property value outside a node")
+            if prop_ident in properties:
+                properties[prop_ident] += prop_values
             else:
-                # token_type == 'I'
-                prop_ident = token
-                prop_values = []
-                while True:
-                    token_type, token = tokens[index]
-                    if token_type != 'V':
-                        break
-                    index += 1
-                    prop_values.append(token)
-                if not prop_values:
-                    raise ValueError("property with no values")
-                try:
-                    if prop_ident in properties:
-                        properties[prop_ident] += prop_values
-                    else:
-                        properties[prop_ident] = prop_values
-                except TypeError:
-                    raise ValueError("property value outside a node")
-    except IndexError:
+                properties[prop_ident] = prop_values
+            prop_values = None
+        if token_type == _I:
+            prop_ident = _get_prop_ident(m.group(_I))
+            prop_values = []
+            continue
+        token = m.group(_D)
+        if token == ';':
+            if sequence is None:
+                raise ValueError("unexpected node")
+            properties = {}
+            sequence.append(properties)
+        else:
+            if sequence is not None:
+                if not sequence:
+                    raise ValueError("empty sequence")
+                game_tree.sequence = sequence
+                sequence = None
+            if token == '(':
+                stack.append(game_tree)
+                game_tree = Coarse_game_tree()
+                sequence = []
+            else:
+                # token == ')'
+                variation = game_tree
+                game_tree = stack.pop()
+                if game_tree is None:
+                    return variation, m.end()
+                game_tree.children.append(variation)
+            properties = None
+
+def scan_main_sequence(s, identifiers):
+    """Read selected properties from the main sequence of an SGF game.
+
+    s           -- 8-bit string
+    identifiers -- set of PropIdents
+
+    Returns a list of tuples (node_number, identifier, raw values)
+      node_number -- int (the root is node 0)
+      identifier  -- a member of 'identifiers'
+      raw values  -- nonempty list of raw property values
+
+    The main sequence is the 'leftmost' variation. The tuples are in file
+    order. If a property appears more than once in a node, there is one tuple
+    for each appearance.
+
+    This is much faster than parse_sgf_game() if only a few properties are
+    needed: it doesn't build property maps or a tree, and it stops reading
+    when it reaches the end of the main sequence. So it doesn't report errors
+    in the rest of the game.
+
+    Raises ValueError if no game is found, or there is an error parsing the
+    main sequence. Identifies the start of the SGF content in the same way as
+    parse_sgf_game(), and similarly handles lower-case letters in PropIdents.
+
+    """
+    m = _find_start_re.search(s)
+    if not m:
+        raise ValueError("no SGF data found")
+    start_position = m.start()
+    sequence_start = m.end()
+    m = _main_sequence_re.match(s, sequence_start)
+    if not m:
+        # There's an error in the main sequence. The full parser sees the
+        # same tokens up to that point, so let it report the error.
+        _parse_sgf_game(s, start_position)
         raise ValueError("unexpected end of SGF data")
-    assert index == len(tokens)
-    return variation, end_position
+    result = []
+    node_number = 0
+    for node_start, prop_ident, values in _main_sequence_token_re.findall(
+            s, sequence_start, m.end() - 1):
+        if node_start:
+            node_number += 1
+        if not prop_ident:
+            continue
+        if prop_ident not in identifiers:
+            prop_ident = _get_prop_ident(prop_ident)
+            if prop_ident not in identifiers:
+                continue
+        if values.find("]") == len(values) - 1:
+            # single value
+            result.append((node_number, prop_ident, [values[1:-1]]))
+        else:
+            result.append((node_number, prop_ident, _values_re.findall(values)))
+    return result
 
 def parse_sgf_game(s):
     """Read a single SGF game from a string, returning the parse tree.
@@ -263,6 +383,109 @@ def parse_sgf_collection(s):
     return result
 
 
+def iter_sgf_collection(pathname, start_offset=0):
+    """Read an SGF game collection from a file, one game at a time.
+
+    pathname     -- filename of a file containing SGF data
+    start_offset -- byte offset to start reading from (default 0)
+
+    Returns an iterator yielding tuples (game_tree, start, end)
+      game_tree -- Coarse_game_tree
+      start     -- byte offset of the start of the game in the file
+      end       -- byte offset just after the end of the game
+
+    The file is memory-mapped, so only the game currently being parsed needs
+    to be held in memory as Python objects.
+
+    Raises EnvironmentError if the file can't be read.
+
+    Raises ValueError (when iterated) if no games were found in the file, or if
+    there is an error parsing a game. The games before the one with the error
+    will already have been yielded. See parse_sgf_collection() for details.
+
+    If start_offset is nonzero, it isn't an error if no games are found (and
+    games are numbered in error messages counting from start_offset).
+
+    """
+    f = open(pathname, "rb")
+    try:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            data = ""
+        else:
+            data = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+    return _iter_sgf_games(data, start_offset)
+
+def _iter_sgf_games(data, position):
+    start_offset = position
+    count = 0
+    try:
+        while True:
+            m = _find_start_re.search(data, position)
+            if not m:
+                break
+            start = m.start()
+            try:
+                game_tree, position = _parse_sgf_game(data, start)
+            except ValueError, e:
+                raise ValueError("error parsing game %d: %s" % (count, e))
+            yield game_tree, start, position
+            count += 1
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+    if count == 0 and start_offset == 0:
+        raise ValueError("no SGF data found")
+
+def iter_game_ranges(s, start_position=0):
+    """Find the games in SGF data, without parsing them.
+
+    s              -- 8-bit string (or mmap)
+    start_position -- index into 's'
+
+    Returns an iterator yielding pairs (start, end)
+      start -- index in 's' of the start of a game
+      end   -- index just after the end of the game
+
+    Identifies the start of each game in the same way as
+    parse_sgf_collection(). The end of the game is found by matching
+    parentheses, ignoring any inside PropValues; the game's contents aren't
+    otherwise checked. For well-formed games, the results are the same as
+    iter_sgf_collection()'s.
+
+    This is much faster than parsing the games, so it's suitable for dividing
+    a large collection into pieces to be parsed separately.
+
+    Raises ValueError (when iterated) if the data ends before a game is
+    complete. The games before it will already have been yielded.
+
+    """
+    find_start = _find_start_re.search
+    to_paren = _to_paren_re.match
+    position = start_position
+    while True:
+        m = find_start(s, position)
+        if not m:
+            return
+        start = m.start()
+        position = start
+        depth = 0
+        while True:
+            m = to_paren(s, position)
+            paren = m.group(1)
+            if paren is None:
+                raise ValueError("unexpected end of SGF data")
+            position = m.end()
+            if paren == '(':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    break
+        yield start, position
+
 def block_format(pieces, width=79):
     """Concatenate strings, adding newlines.
 
@@ -288,48 +511,143 @@ def block_format(pieces, width=79):
         lines.append(line)
     return "\n".join(lines)
 
-def serialise_game_tree(game_tree, wrap=79):
-    """Serialise an SGF game as a string.
+def _serialise_properties(properties):
+    # Force FF to the front, largely to work around a Quarry bug which makes
+    # it ignore the first few bytes of the file.
+    for prop_ident, prop_values in sorted(
+            properties.iteritems(),
+            key=lambda (ident, _,): (-(ident=="FF"), ident)):
+        # Make a single string for each property, to get prettier
+        # block_format output.
+        m = [prop_ident]
+        for value in prop_values:
+            m.append("[%s]" % value)
+        yield "".join(m)
+
+def iter_game_tree_pieces(game_tree):
+    """Serialise an SGF game as a sequence of strings.
 
     game_tree -- Coarse_game_tree
-    wrap      -- int (default 79), or None
 
-    Returns an 8-bit string, ending with a newline.
-
-    If 'wrap' is not None, makes some effort to keep output lines no longer
-    than 'wrap'.
+    Returns an iterator of 8-bit strings (delimiters and complete properties),
+    ending with a newline. Their concatenation is the unwrapped output of
+    serialise_game_tree().
 
     """
-    l = []
     to_serialise = [game_tree]
     while to_serialise:
         game_tree = to_serialise.pop()
         if game_tree is None:
-            l.append(")")
+            yield ")"
             continue
-        l.append("(")
+        yield "("
         for properties in game_tree.sequence:
-            l.append(";")
-            # Force FF to the front, largely to work around a Quarry bug which
-            # makes it ignore the first few bytes of the file.
-            for prop_ident, prop_values in sorted(
-                    properties.iteritems(),
-                    key=lambda (ident, _,): (-(ident=="FF"), ident)):
-                # Make a single string for each property, to get prettier
-                # block_format output.
-                m = [prop_ident]
-                for value in prop_values:
-                    m.append("[%s]" % value)
-                l.append("".join(m))
+            yield ";"
+            for piece in _serialise_properties(properties):
+                yield piece
         to_serialise.append(None)
         to_serialise.extend(reversed(game_tree.children))
-    l.append("\n")
+    yield "\n"
+
+def iter_node_tree_pieces(root, get_children, get_properties):
+    """Serialise a node tree as a sequence of strings.
+
+    root           -- node
+    get_children   -- function taking a node, returning a sequence of nodes
+    get_properties -- function taking a node, returning a property map
+
+    Returns an iterator of 8-bit strings, as for iter_game_tree_pieces().
+
+    This produces the same strings as using make_coarse_game_tree() followed
+    by iter_game_tree_pieces(), but doesn't build a Coarse_game_tree.
+
+    """
+    to_serialise = [root]
+    while to_serialise:
+        node = to_serialise.pop()
+        if node is None:
+            yield ")"
+            continue
+        yield "("
+        while True:
+            yield ";"
+            for piece in _serialise_properties(get_properties(node)):
+                yield piece
+            children = get_children(node)
+            if len(children) != 1:
+                break
+            node = children[0]
+        to_serialise.append(None)
+        to_serialise.extend(reversed(children))
+    yield "\n"
+
+def write_pieces(pieces, write, wrap=79):
+    """Write serialised SGF data incrementally.
+
+    pieces -- iterable of strings, from iter_game_tree_pieces() or
+              iter_node_tree_pieces()
+    write  -- function taking an 8-bit string
+    wrap   -- int (default 79), or None
+
+    The concatenation of the strings passed to write() is the same as the
+    result of serialise_game_tree() for the same game tree and 'wrap'.
+
+    Output is passed to write() in blocks of a few tens of kilobytes, each
+    made of complete pieces.
+
+    """
+    buffer = []
+    buffered = 0
+    if wrap is None:
+        for s in pieces:
+            buffer.append(s)
+            buffered += len(s)
+            if buffered > 65536:
+                write("".join(buffer))
+                buffer = []
+                buffered = 0
+    else:
+        # This follows block_format()
+        line = ""
+        started = False
+        for s in pieces:
+            if len(line) + len(s) > wrap:
+                if started:
+                    buffer.append("\n")
+                buffer.append(line)
+                buffered += len(line) + 1
+                started = True
+                line = ""
+                if buffered > 65536:
+                    write("".join(buffer))
+                    buffer = []
+                    buffered = 0
+            line += s
+        if line:
+            if started:
+                buffer.append("\n")
+            buffer.append(line)
+    if buffer:
+        write("".join(buffer))
+
+def serialise_game_tree(game_tree, wrap=79):
+    """Serialise an SGF game as a string.
+
+    game_tree -- Coarse_game_tree
+    wrap      -- int (default 79), or None
+
+    Returns an 8-bit string, ending with a newline.
+
+    If 'wrap' is not None, makes some effort to keep output lines no longer
+    than 'wrap'.
+
+    """
+    l = list(iter_game_tree_pieces(game_tree))
     if wrap is None:
         return "".join(l)
     else:
         return block_format(l, wrap)
 
-
 def make_tree(game_tree, root, node_builder, node_adder):
     """Construct a node tree from a Coarse_game_tree.
 
@@ -343,7 +661,9 @@ def make_tree(game_tree, root, node_builder, node_adder):
     node_builder() to make new nodes and node_adder() to add child nodes to
     their parent.
 
-    Makes no further assumptions about the node type.
+    Makes no further assumptions about the node type (in particular, it
+    doesn't touch the nodes' attributes, so node_builder() must return nodes
+    which are ready to have children added).
 
     """
     to_build = [(root, game_tree, 0)]
@@ -354,7 +674,6 @@ def make_tree(game_tree, root, node_builder, node_adder):
             node_adder(node, child)
             to_build.append((child, game_tree, index+1))
         else:
-            node._children = []
             for child_tree in game_tree.children:
                 child = node_builder(node, child_tree.sequence[0])
                 node_adder(node, child)
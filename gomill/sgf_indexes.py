@@ -0,0 +1,296 @@
+"""Random-access indexes for SGF collection files.
+
+An index is kept in a sidecar file alongside the collection (by default, the
+collection's filename with '.idx' appended). It records each game's byte
+offset and length, together with a summary of the game (board size, players,
+result, and number of moves), so that individual games can be loaded without
+parsing the rest of the file, and subsets of the collection can be selected
+without parsing it at all.
+
+"""
+
+import cPickle as pickle
+import hashlib
+import os
+
+from gomill import sgf
+from gomill import sgf_grammar
+
+
+class Indexed_game(object):
+    """Summary of a game in an SGF collection.
+
+    Public attributes (treat as read-only):
+      number       -- int (counting from 0)
+      offset       -- int (byte offset of the game in the collection file)
+      length       -- int (length of the game's SGF data, in bytes)
+      size         -- int (board size)
+      black_player -- utf-8 string or None
+      white_player -- utf-8 string or None
+      result       -- utf-8 string (the RE property) or None
+      winner       -- 'b', 'w', or None
+      move_count   -- int (number of moves in the main sequence)
+
+    """
+    __slots__ = ('number', 'offset', 'length', 'size', 'black_player',
+                 'white_player', 'result', 'winner', 'move_count')
+
+    def __init__(self, *args):
+        for attr, value in zip(self.__slots__, args):
+            setattr(self, attr, value)
+
+    def _as_tuple(self):
+        return tuple(getattr(self, attr) for attr in self.__slots__)
+
+    def __repr__(self):
+        return "<Indexed_game %d at %d>" % (self.number, self.offset)
+
+
+def _summarise_game(number, coarse_game, start, end):
+    try:
+        sgf_game = sgf.Sgf_game.from_coarse_game_tree(coarse_game)
+        root = sgf_game.get_root()
+        if root.has_property("RE"):
+            result = root.get("RE")
+        else:
+            result = None
+        move_count = 0
+        for node in sgf_game.main_sequence_iter():
+            colour, move = node.get_move()
+            if colour is not None:
+                move_count += 1
+        return Indexed_game(
+            number, start, end - start, sgf_game.get_size(),
+            sgf_game.get_player_name('b'), sgf_game.get_player_name('w'),
+            result, sgf_game.get_winner(), move_count)
+    except ValueError, e:
+        raise ValueError("error in game %d: %s" % (number, e))
+
+
+class Sgf_collection_index(object):
+    """Index of the games in an SGF collection file.
+
+    Instantiate with
+      sgf_pathname   -- filename of the collection
+      index_pathname -- filename of the index file (optional)
+
+    Instantiating doesn't read either file; call update() to load (and, if
+    necessary, rebuild) the index.
+
+    Public attributes (treat as read-only):
+      sgf_pathname   -- as passed to the constructor
+      index_pathname -- the index file's filename
+      games          -- list of Indexed_game objects, in file order
+
+    """
+
+    # Index file format: pickled pair (format_version, state)
+    #   state is a dict with keys
+    #     'scanned_to'   -- int: offset just after the last indexed game
+    #     'scanned_hash' -- md5 digest of the data before scanned_to
+    #     'signature'    -- pair (size, mtime) of the collection file when the
+    #                       index was written
+    #     'games'        -- list of tuples from Indexed_game._as_tuple()
+    index_format_version = 2
+    _hash_chunk_size = 1 << 20
+
+    def __init__(self, sgf_pathname, index_pathname=None):
+        self.sgf_pathname = sgf_pathname
+        if index_pathname is None:
+            index_pathname = sgf_pathname + ".idx"
+        self.index_pathname = index_pathname
+        self.games = []
+        self._scanned_to = 0
+        # md5 object for the data before _scanned_to, or None if not known
+        self._scanned_md5 = None
+        # True if the index file's signature doesn't match the collection
+        self._signature_changed = True
+
+    def _hash_range(self, f, md5, start, end):
+        """Add the data between start and end to an md5 object."""
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(self._hash_chunk_size, remaining))
+            if not chunk:
+                break
+            md5.update(chunk)
+            remaining -= len(chunk)
+
+    def _load_index_file(self):
+        """Load the games from the index file, if it's valid and current.
+
+        Returns True if the index was loaded.
+
+        """
+        try:
+            f = open(self.index_pathname, "rb")
+        except EnvironmentError:
+            return False
+        try:
+            try:
+                format_version, state = pickle.load(f)
+                if format_version != self.index_format_version:
+                    return False
+                scanned_to = state['scanned_to']
+                scanned_hash = state['scanned_hash']
+                signature = state['signature']
+                games = [Indexed_game(*t) for t in state['games']]
+            except Exception:
+                return False
+        finally:
+            f.close()
+        # Check the already-indexed part of the collection hasn't changed. If
+        # the file's size and modification time are as they were when the
+        # index was written, it hasn't; otherwise check its contents.
+        f = open(self.sgf_pathname, "rb")
+        try:
+            st = os.fstat(f.fileno())
+            if (st.st_size, st.st_mtime) == signature:
+                scanned_md5 = None
+                signature_changed = False
+            else:
+                if st.st_size < scanned_to:
+                    return False
+                scanned_md5 = hashlib.md5()
+                self._hash_range(f, scanned_md5, 0, scanned_to)
+                if scanned_md5.digest() != scanned_hash:
+                    return False
+                signature_changed = True
+        finally:
+            f.close()
+        self.games = games
+        self._scanned_to = scanned_to
+        self._scanned_md5 = scanned_md5
+        self._signature_changed = signature_changed
+        return True
+
+    def _write_index_file(self, old_scanned_to):
+        """Write the index file.
+
+        old_scanned_to -- offset covered by _scanned_md5 (if it's set)
+
+        """
+        f = open(self.sgf_pathname, "rb")
+        try:
+            st = os.fstat(f.fileno())
+            if self._scanned_md5 is None:
+                md5 = hashlib.md5()
+                self._hash_range(f, md5, 0, self._scanned_to)
+            else:
+                md5 = self._scanned_md5.copy()
+                self._hash_range(f, md5, old_scanned_to, self._scanned_to)
+        finally:
+            f.close()
+        state = {
+            'scanned_to'   : self._scanned_to,
+            'scanned_hash' : md5.digest(),
+            'signature'    : (st.st_size, st.st_mtime),
+            'games'        : [game._as_tuple() for game in self.games],
+            }
+        f = open(self.index_pathname + ".new", "wb")
+        pickle.dump((self.index_format_version, state), f, protocol=-1)
+        f.close()
+        os.rename(self.index_pathname + ".new", self.index_pathname)
+        self._scanned_md5 = md5
+        self._signature_changed = False
+
+    def update(self):
+        """Bring the index up to date with the collection file.
+
+        Returns the number of newly-indexed games.
+
+        If the index file exists and the collection has only been appended to
+        since it was written, only the new games are parsed. Otherwise the
+        whole collection is indexed from scratch. The index file is rewritten
+        if anything changed.
+
+        If the collection file's size or modification time has changed since
+        the index was written, the already-indexed part of the file is read
+        to check it hasn't changed.
+
+        Raises EnvironmentError if either file can't be read, or the index file
+        can't be written.
+
+        Raises ValueError if there is an error parsing the collection (see
+        sgf_grammar.iter_sgf_collection()), or if a game's root properties are
+        malformed.
+
+        """
+        if not self._load_index_file():
+            self.games = []
+            self._scanned_to = 0
+            self._scanned_md5 = hashlib.md5()
+            self._signature_changed = True
+        new_games = []
+        number = len(self.games)
+        old_scanned_to = scanned_to = self._scanned_to
+        for coarse_game, start, end in sgf_grammar.iter_sgf_collection(
+                self.sgf_pathname, scanned_to):
+            new_games.append(_summarise_game(number, coarse_game, start, end))
+            number += 1
+            scanned_to = end
+        self.games += new_games
+        self._scanned_to = scanned_to
+        if new_games or self._signature_changed:
+            self._write_index_file(old_scanned_to)
+        return len(new_games)
+
+    def get_game_data(self, number):
+        """Return the raw SGF data for the specified game.
+
+        Raises IndexError if there is no such game.
+
+        Raises EnvironmentError if the collection file can't be read.
+
+        """
+        game = self.games[number]
+        f = open(self.sgf_pathname, "rb")
+        try:
+            f.seek(game.offset)
+            return f.read(game.length)
+        finally:
+            f.close()
+
+    def load_game(self, number):
+        """Return an Sgf_game for the specified game.
+
+        Raises IndexError if there is no such game.
+
+        Raises EnvironmentError if the collection file can't be read.
+
+        Raises ValueError if the data can't be parsed (which might mean the
+        collection file has changed since update() was called).
+
+        """
+        return sgf.Sgf_game.from_string(self.get_game_data(number))
+
+    def find_games(self, size=None, winner=None,
+                   black_player=None, white_player=None):
+        """Return the games matching the specified criteria.
+
+        Criteria which are left as None aren't applied; the others are
+        compared against the Indexed_game attributes of the same names.
+
+        Returns a list of Indexed_game objects.
+
+        """
+        criteria = [(attr, value) for (attr, value) in [
+            ('size', size), ('winner', winner),
+            ('black_player', black_player), ('white_player', white_player)]
+                    if value is not None]
+        return [game for game in self.games
+                if all(getattr(game, attr) == value
+                       for (attr, value) in criteria)]
+
+
+def get_collection_index(sgf_pathname, index_pathname=None):
+    """Return an up-to-date Sgf_collection_index for a collection file.
+
+    This is a convenience function which creates an index and calls its
+    update() method (see there for exceptions raised).
+
+    """
+    index = Sgf_collection_index(sgf_pathname, index_pathname)
+    index.update()
+    return index
@@ -1,6 +1,9 @@
 """Higher-level processing of moves and positions from SGF games."""
 
+from array import array
+
 from gomill import boards
+from gomill import sgf_grammar
 from gomill import sgf_properties
 
 
@@ -97,3 +100,286 @@ def indicate_first_player(sgf_game):
     if specify_pl:
         root.set('PL', first_player)
 
+
+def _apply_node(board, node):
+    """Apply a node's setup stones and move to a board.
+
+    Raises ValueError if the resulting position isn't legal or the move is to
+    an occupied point.
+
+    """
+    if node.has_setup_stones():
+        ab, aw, ae = node.get_setup_stones()
+        if not board.apply_setup(ab, aw, ae):
+            raise ValueError("setup position not legal")
+    colour, move = node.get_move()
+    if move is not None:
+        row, col = move
+        try:
+            board.play(row, col, colour)
+        except ValueError:
+            raise ValueError("illegal move")
+
+class Position_cache(object):
+    """Find the positions reached at nodes in an Sgf_game.
+
+    Instantiate with
+      sgf_game        -- Sgf_game
+      interval        -- int (default 16)
+      max_checkpoints -- int (default 1024)
+
+    The cache keeps a packed copy of the position at every interval'th node
+    (counting from the root) on the paths it has visited, so finding a
+    position near a previously-visited one needs at most 'interval' nodes to
+    be replayed.
+
+    At most max_checkpoints positions are kept; the least recently used are
+    discarded first.
+
+    If the game tree or its setup or move properties are changed, call
+    clear() before using the cache again.
+
+    """
+    def __init__(self, sgf_game, interval=16, max_checkpoints=1024):
+        if interval < 1:
+            raise ValueError("interval must be at least 1")
+        self.sgf_game = sgf_game
+        self.size = sgf_game.get_size()
+        self.interval = interval
+        self.max_checkpoints = max_checkpoints
+        # map Tree_node -> list [last-used stamp, depth, packed board]
+        self._checkpoints = {}
+        self._stamp = 0
+
+    def clear(self):
+        """Forget all checkpoints."""
+        self._checkpoints = {}
+
+    def __len__(self):
+        return len(self._checkpoints)
+
+    def _discard_old_checkpoints(self):
+        # Discard a quarter at a time, so this isn't needed on every insertion
+        keep = self.max_checkpoints * 3 // 4
+        by_age = sorted(self._checkpoints.iteritems(),
+                        key=lambda item:item[1][0])
+        for node, entry in by_age[:len(by_age)-keep]:
+            del self._checkpoints[node]
+
+    def position_at(self, node):
+        """Return the position at the specified node.
+
+        node -- Tree_node from the cache's game
+
+        Returns a new boards.Board, representing the position after playing
+        the setup stones and moves from all nodes from the root to 'node'
+        (inclusive).
+
+        Setup stones are permitted in any node.
+
+        Raises ValueError if a setup position isn't legal, or a move is to an
+        occupied point.
+
+        """
+        if node.owner is not self.sgf_game:
+            raise ValueError("node doesn't belong to this game")
+        checkpoints = self._checkpoints
+        self._stamp += 1
+        path = []
+        entry = None
+        while node is not None:
+            entry = checkpoints.get(node)
+            if entry is not None:
+                break
+            path.append(node)
+            node = node.parent
+        if entry is None:
+            board = boards.Board(self.size)
+            depth = -1
+        else:
+            entry[0] = self._stamp
+            depth = entry[1]
+            board = boards.Board.from_packed(self.size, entry[2])
+        interval = self.interval
+        for node in reversed(path):
+            _apply_node(board, node)
+            depth += 1
+            if depth % interval == 0:
+                checkpoints[node] = [self._stamp, depth, board.pack()]
+                if len(checkpoints) > self.max_checkpoints:
+                    self._discard_old_checkpoints()
+        return board
+
+
+
+class Compact_game(object):
+    """Setup stones, main-sequence moves, and basic game info from SGF data.
+
+    Public attributes:
+      size         -- int
+      komi         -- float
+      handicap     -- int or None
+      result       -- utf-8 string (the RE property), or None
+      black_setup  -- array('h') of point indices
+      white_setup  -- array('h') of point indices
+      move_colours -- string containing 'b' or 'w' for each move
+      move_points  -- array('h') of point indices (-1 for a pass)
+
+    A point index is row * size + col.
+
+    These correspond to the values returned by the Sgf_game methods and
+    get_setup_and_moves(). black_setup and white_setup describe the setup
+    position after any AE property has been applied, but the position isn't
+    checked for legality.
+
+    """
+    def get_setup_and_moves(self, board=None):
+        """Return the initial setup and the following moves.
+
+        This returns the same values as the module-level
+        get_setup_and_moves() function would for the original game (see there
+        for details and exceptions raised).
+
+        """
+        size = self.size
+        if board is None:
+            board = boards.Board(size)
+        else:
+            if board.side != size:
+                raise ValueError("wrong board size, must be %d" % size)
+            if not board.is_empty():
+                raise ValueError("board not empty")
+        if self.black_setup or self.white_setup:
+            is_legal = board.apply_setup(
+                [divmod(i, size) for i in self.black_setup],
+                [divmod(i, size) for i in self.white_setup],
+                [])
+            if not is_legal:
+                raise ValueError("setup position not legal")
+        moves = []
+        for colour, i in zip(self.move_colours, self.move_points):
+            if i == -1:
+                moves.append((colour, None))
+            else:
+                moves.append((colour, divmod(i, size)))
+        return board, moves
+
+
+_compact_game_identifiers = frozenset(
+    ['SZ', 'CA', 'KM', 'HA', 'RE', 'AB', 'AW', 'AE', 'B', 'W'])
+
+# Map board size -> dict raw move value -> point index
+_point_indices = {}
+
+def _get_point_indices(size):
+    try:
+        return _point_indices[size]
+    except KeyError:
+        pass
+    indices = {"" : -1}
+    if size <= 19:
+        indices["tt"] = -1
+    for row in xrange(size):
+        for col in xrange(size):
+            indices[chr(97 + col) + chr(96 + size - row)] = row * size + col
+    _point_indices[size] = indices
+    return indices
+
+def read_compact_game(s):
+    """Read a Compact_game from SGF data.
+
+    s -- 8-bit string
+
+    This reads the first game in the string, with the same results as
+    Sgf_game.from_string() followed by get_setup_and_moves(), but much faster.
+    It doesn't build a game tree, it ignores variations and properties other
+    than SZ, CA, KM, HA, RE, AB, AW, AE, B and W, and it stops reading at the
+    end of the main sequence (see sgf_grammar.scan_main_sequence()).
+
+    Raises ValueError if the data can't be parsed, if any of those properties
+    is malformed, or in the cases where get_setup_and_moves() would.
+
+    """
+    props = sgf_grammar.scan_main_sequence(s, _compact_game_identifiers)
+    root = {}
+    for node_number, identifier, values in props:
+        if node_number != 0:
+            break
+        if identifier in root:
+            root[identifier] = root[identifier] + values
+        else:
+            root[identifier] = values
+    try:
+        size_s = root['SZ'][0]
+    except KeyError:
+        size = 19
+    else:
+        try:
+            size = int(size_s)
+        except ValueError:
+            raise ValueError("bad SZ property: %s" % size_s)
+    if not 1 <= size <= 26:
+        raise ValueError("size out of range: %s" % size)
+    presenter = sgf_properties.Presenter(
+        size, root.get('CA', ["ISO-8859-1"])[0])
+    def get(identifier, default):
+        try:
+            values = root[identifier]
+        except KeyError:
+            return default
+        try:
+            return presenter.interpret(identifier, values)
+        except ValueError:
+            raise ValueError("bad %s property" % identifier)
+
+    game = Compact_game()
+    game.size = size
+    game.komi = get('KM', 0.0)
+    handicap = get('HA', None)
+    if handicap == 0:
+        handicap = None
+    elif handicap == 1:
+        raise ValueError("bad HA property: 1")
+    game.handicap = handicap
+    game.result = get('RE', None)
+    indices = _get_point_indices(size)
+    ab = get('AB', set())
+    aw = get('AW', set())
+    ae = get('AE', set())
+    # AE removes setup stones, as in get_setup_and_moves()
+    game.black_setup = array('h', sorted(
+        row * size + col for (row, col) in ab - ae))
+    game.white_setup = array('h', sorted(
+        row * size + col for (row, col) in aw - ae))
+    if ab or aw:
+        if 'B' in root or 'W' in root:
+            raise ValueError("mixed setup and moves in root node")
+        first_move_node = 1
+    else:
+        first_move_node = 0
+
+    colours = []
+    raw_moves = []
+    last_node = -1
+    for node_number, identifier, values in props:
+        if node_number < first_move_node:
+            continue
+        if identifier == 'B' or identifier == 'W':
+            if node_number != last_node:
+                colours.append(identifier)
+                raw_moves.append(values[0])
+                last_node = node_number
+            elif identifier == 'B' and colours[-1] == 'W':
+                # B takes precedence, as in Node.get_raw_move()
+                colours[-1] = 'B'
+                raw_moves[-1] = values[0]
+        elif identifier in ('AB', 'AW', 'AE'):
+            raise ValueError("setup properties after the root node")
+    try:
+        game.move_points = array('h', [indices[raw] for raw in raw_moves])
+    except KeyError:
+        for colour, raw in zip(colours, raw_moves):
+            if raw not in indices:
+                raise ValueError("bad %s property: %s" % (colour, raw))
+    game.move_colours = "".join(colours).lower()
+    return game
@@ -25,6 +25,40 @@ def normalise_charset_name(s):
             .replace("ISO8859", "ISO-8859"))
 
 
+_point_letters = "abcdefghijklmnopqrstuvwxyz"
+
+# Map board size -> pair (decoder, encoder)
+#   decoder -- dict raw value -> (row, col) or None
+#   encoder -- dict (row, col) or None -> raw value
+_go_point_tables = {}
+
+def _get_go_point_tables(size):
+    """Return the decoder and encoder tables for a board size.
+
+    Returns None if the board size isn't supported.
+
+    """
+    try:
+        return _go_point_tables[size]
+    except KeyError:
+        pass
+    if not 1 <= size <= 26:
+        return None
+    decoder = {"" : None}
+    encoder = {}
+    if size <= 19:
+        decoder["tt"] = None
+        encoder[None] = "tt"
+    else:
+        encoder[None] = ""
+    for row in xrange(size):
+        for col in xrange(size):
+            s = _point_letters[col] + _point_letters[size - row - 1]
+            decoder[s] = (row, col)
+            encoder[row, col] = s
+    _go_point_tables[size] = decoder, encoder
+    return decoder, encoder
+
 def interpret_go_point(s, size):
     """Convert a raw SGF Go Point, Move, or Stone value to coordinates.
 
@@ -42,6 +76,16 @@ def interpret_go_point(s, size):
     of gomill), where (0, 0) is the lower left.
 
     """
+    tables = _go_point_tables.get(size) or _get_go_point_tables(size)
+    if tables is not None:
+        try:
+            return tables[0][s]
+        except (KeyError, TypeError):
+            pass
+    return _interpret_go_point(s, size)
+
+def _interpret_go_point(s, size):
+    """Implementation of interpret_go_point() without the lookup table."""
     if s == "" or (s == "tt" and size <= 19):
         return None
     # May propagate ValueError
@@ -65,6 +109,16 @@ def serialise_go_point(move, size):
     gomill), where (0, 0) is the lower left.
 
     """
+    tables = _go_point_tables.get(size) or _get_go_point_tables(size)
+    if tables is not None:
+        try:
+            return tables[1][move]
+        except (KeyError, TypeError):
+            pass
+    return _serialise_go_point(move, size)
+
+def _serialise_go_point(move, size):
+    """Implementation of serialise_go_point() without the lookup table."""
     if not 1 <= size <= 26:
         raise ValueError
     if move is None:
@@ -76,8 +130,8 @@ def serialise_go_point(move, size):
     row, col = move
     if not ((0 <= col < size) and (0 <= row < size)):
         raise ValueError
-    col_s = "abcdefghijklmnopqrstuvwxy"[col]
-    row_s = "abcdefghijklmnopqrstuvwxy"[size - row - 1]
+    col_s = _point_letters[col]
+    row_s = _point_letters[size - row - 1]
     return col_s + row_s
 
 
@@ -331,7 +385,16 @@ def interpret_point_list(values, context):
 
     """
     result = set()
+    tables = _get_go_point_tables(context.size)
+    if tables is None:
+        decoder = {}
+    else:
+        decoder = tables[0]
     for s in values:
+        pt = decoder.get(s)
+        if pt is not None:
+            result.add(pt)
+            continue
         # No need to use parse_compose(), as \: would always be an error.
         p1, is_rectangle, p2 = s.partition(":")
         if is_rectangle:
@@ -363,6 +426,55 @@ def serialise_point_list(points, context):
     result.sort()
     return result
 
+def serialise_compressed_point_list(points, context):
+    """Serialise a list of Points or Stones as a compressed point list.
+
+    points -- iterable of pairs (row, col)
+
+    Returns a list of strings.
+
+    If 'points' is empty, returns an empty list.
+
+    Rectangles of points are described using the 'aa:bb' form. The rectangles
+    are chosen greedily, working from the top left, so the result isn't
+    necessarily the shortest possible.
+
+    This isn't used by default; to use it for (say) AB, register a
+    Property_type using it with the Presenter.
+
+    """
+    remaining = set(points)
+    for point in remaining:
+        # Check the points are valid
+        serialise_point(point, context)
+    result = []
+    for top, left in sorted(remaining, key=lambda pt:(-pt[0], pt[1])):
+        if (top, left) not in remaining:
+            continue
+        right = left
+        while (top, right+1) in remaining:
+            right += 1
+        bottom = top
+        while True:
+            row = bottom - 1
+            for col in xrange(left, right+1):
+                if (row, col) not in remaining:
+                    break
+            else:
+                bottom = row
+                continue
+            break
+        for row in xrange(bottom, top+1):
+            for col in xrange(left, right+1):
+                remaining.remove((row, col))
+        if bottom == top and left == right:
+            result.append(serialise_point((top, left), context))
+        else:
+            result.append("%s:%s" % (serialise_point((top, left), context),
+                                     serialise_point((bottom, right), context)))
+    result.sort()
+    return result
+
 
 def interpret_AP(s, context):
     """Interpret an AP (application) property value.
@@ -642,6 +754,26 @@ class Presenter(_Context):
                 raise ValueError("unknown property")
             return result
 
+    def get_cache_key(self, identifier):
+        """Return a value identifying how a property will be interpreted.
+
+        sgf.Node caches the values returned by interpret(); a cached value is
+        reused only while the raw values and this key are unchanged (compared
+        by identity).
+
+        Returns None if values of the property shouldn't be cached.
+
+        This implementation returns the Property_type used for the
+        property, or None if the property is unknown and there is no type for
+        private properties. Subclasses which override interpret() so that the
+        result depends on other state should override this method too.
+
+        """
+        try:
+            return self._get_effective_property_type(identifier)
+        except ValueError:
+            return None
+
     def interpret_as_type(self, property_type, raw_values):
         """Variant of interpret() for explicitly specified type.
 
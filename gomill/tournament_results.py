@@ -22,6 +22,7 @@ class Matchup_description(object):
       move_limit      -- int
       scorer          -- 'internal' or 'players'
       number_of_games -- int or None
+      time_settings   -- gameplay.Time_settings or None
 
     If alternating is False, player_1 plays black and player_2 plays white;
     otherwise they alternate.
@@ -29,11 +30,14 @@ class Matchup_description(object):
     player_1 and player_2 are always different.
 
     """
+    # Matchups pickled by gomill 0.8.2 and earlier have no time_settings
+    time_settings = None
+
     def describe_details(self):
         """Return a text description of game settings.
 
         This covers the most important game settings which can't be observed
-        in the results table (board size, handicap, and komi).
+        in the results table (board size, handicap, komi, and time limits).
 
         """
         s = "board size: %s   " % self.board_size
@@ -41,6 +45,8 @@ class Matchup_description(object):
             s += "handicap: %s (%s)   " % (
                 self.handicap, self.handicap_style)
         s += "komi: %s" % self.komi
+        if self.time_settings is not None:
+            s += "   time: %s" % self.time_settings.describe()
         return s
 
 
@@ -94,6 +100,7 @@ class Tournament_results(object):
                            matchup.player_1, matchup.player_2)
         ms.calculate_colour_breakdown()
         ms.calculate_time_stats()
+        ms.calculate_resource_stats()
         return ms
 
 
@@ -216,6 +223,44 @@ class Matchup_stats(object):
         else:
             self.average_time_2 = None
 
+    def calculate_resource_stats(self):
+        """Calculate engine resource usage statistics.
+
+        max_rss_1                  -- int (kilobytes) or None
+        max_rss_2                  -- int (kilobytes) or None
+        average_max_rss_1          -- float (kilobytes) or None
+        average_max_rss_2          -- float (kilobytes) or None
+        average_major_faults_1     -- float or None
+        average_major_faults_2     -- float or None
+        average_context_switches_1 -- float or None
+        average_context_switches_2 -- float or None
+
+        max_rss is the largest peak resident set size seen in any game;
+        average_max_rss is the mean of the per-game peaks.
+
+        Averages are taken over the games for which resource usage is
+        available; they are None if it isn't available for any game.
+
+        """
+        def average(l):
+            if not l:
+                return None
+            return sum(l) / len(l)
+        for player, suffix in ((self.player_1, "_1"), (self.player_2, "_2")):
+            usages = [r.resource_usage[player] for r in self._results]
+            known = [u for u in usages if u is not None]
+            rss = [u.max_rss for u in known]
+            if rss:
+                max_rss = max(rss)
+            else:
+                max_rss = None
+            setattr(self, "max_rss" + suffix, max_rss)
+            setattr(self, "average_max_rss" + suffix, average(rss))
+            setattr(self, "average_major_faults" + suffix,
+                    average([u.major_faults for u in known]))
+            setattr(self, "average_context_switches" + suffix,
+                    average([u.context_switches for u in known]))
+
 
 def make_matchup_stats_table(ms):
     """Produce an ascii table showing matchup statistics.
@@ -284,6 +329,16 @@ def make_matchup_stats_table(ms):
         i = t.add_column(align='right', right_padding=2)
         t.set_column_values(i, [avg_time_1_s, avg_time_2_s])
 
+    if ms.max_rss_1 or ms.max_rss_2:
+        def format_rss(kb):
+            if kb is None:
+                return "    ----"
+            return "%6.1fMB" % (kb / 1024)
+        t.add_heading("max rss")
+        i = t.add_column(align='right', right_padding=2)
+        t.set_column_values(i, [format_rss(ms.max_rss_1),
+                                format_rss(ms.max_rss_2)])
+
     return t
 
 def write_matchup_summary(out, matchup, ms):
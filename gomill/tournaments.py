@@ -24,6 +24,7 @@ class Matchup(tournament_results.Matchup_description):
 
     Additional attributes:
       event_description -- string to show as sgf event
+      time_settings     -- gameplay.Time_settings or None
 
     Instantiate with
       matchup_id -- identifier
@@ -39,8 +40,8 @@ class Matchup(tournament_results.Matchup_description):
     'event_code' is used for the sgf event description (combined with 'name'
     if available).
 
-    Instantiation raises ControlFileError if the handicap settings aren't
-    permitted.
+    Instantiation raises ControlFileError if the handicap or time settings
+    aren't permitted.
 
     """
     def __init__(self, matchup_id, player_1, player_2, parameters,
@@ -61,6 +62,9 @@ class Matchup(tournament_results.Matchup_description):
 
         competitions.validate_handicap(
             self.handicap, self.handicap_style, self.board_size)
+        self.time_settings = competitions.make_time_settings(
+            self.main_time, self.byo_yomi_time, self.byo_yomi_style,
+            self.byo_yomi_stones, self.byo_yomi_periods)
 
         if name is None:
             name = "%s v %s" % (self.player_1, self.player_2)
@@ -125,6 +129,7 @@ class Tournament(Competition):
     #  *scheduler             -- Group_scheduler (group codes are matchup ids)
     #  *engine_names          -- map player code -> string
     #  *engine_descriptions   -- map player code -> string
+    #  *genmove_cache_stats   -- map player code -> pair (hits, lookups)
     #   working_matchups      -- set of matchup ids
     #       (matchups which have successfully completed a game in this run)
     #   probationary_matchups -- set of matchup ids
@@ -183,6 +188,7 @@ class Tournament(Competition):
         self.results = defaultdict(list)
         self.engine_names = {}
         self.engine_descriptions = {}
+        self.genmove_cache_stats = {}
         self.scheduler = competition_schedulers.Group_scheduler()
         self.ghost_matchups = {}
         self._set_scheduler_groups()
@@ -193,6 +199,7 @@ class Tournament(Competition):
             'scheduler' : self.scheduler,
             'engine_names' : self.engine_names,
             'engine_descriptions' : self.engine_descriptions,
+            'genmove_cache_stats' : self.genmove_cache_stats,
             }
 
     def set_status(self, status):
@@ -204,6 +211,8 @@ class Tournament(Competition):
         self.scheduler.rollback()
         self.engine_names = status['engine_names']
         self.engine_descriptions = status['engine_descriptions']
+        # In gomill 0.8.2 and earlier, there was no genmove_cache_stats
+        self.genmove_cache_stats = status.get('genmove_cache_stats', {})
 
 
     def get_game(self):
@@ -227,6 +236,7 @@ class Tournament(Competition):
         job.move_limit = matchup.move_limit
         job.handicap = matchup.handicap
         job.handicap_is_free = (matchup.handicap_style == 'free')
+        job.time_settings = matchup.time_settings
         job.use_internal_scorer = (matchup.scorer == 'internal')
         job.internal_scorer_handicap_compensation = \
             matchup.internal_scorer_handicap_compensation
@@ -239,6 +249,12 @@ class Tournament(Competition):
                 ed.get_short_description() or "[no name available]"
             self.engine_descriptions[player_code] = \
                 ed.get_long_description() or "[no description available]"
+        for player_code, (hits, lookups) in \
+                response.genmove_cache_stats.iteritems():
+            old_hits, old_lookups = self.genmove_cache_stats.get(
+                player_code, (0, 0))
+            self.genmove_cache_stats[player_code] = (
+                old_hits + hits, old_lookups + lookups)
         matchup_id, game_number = response.game_data
         game_id = response.game_id
         self.working_matchups.add(matchup_id)
@@ -278,6 +294,7 @@ class Tournament(Competition):
             results, matchup.player_1, matchup.player_2)
         ms.calculate_colour_breakdown()
         ms.calculate_time_stats()
+        ms.calculate_resource_stats()
         tournament_results.write_matchup_summary(out, matchup, ms)
 
     def write_matchup_reports(self, out):
@@ -312,6 +329,11 @@ class Tournament(Competition):
         """Write descriptions of all players to 'out'."""
         for code, description in sorted(self.engine_descriptions.items()):
             print >>out, ("player %s: %s" % (code, description))
+        for code, (hits, lookups) in sorted(self.genmove_cache_stats.items()):
+            if lookups:
+                print >>out, ("player %s genmove cache: %d hits from %d "
+                              "lookups (%.1f%%)" %
+                              (code, hits, lookups, 100.0 * hits / lookups))
 
     def get_tournament_results(self):
         return tournament_results.Tournament_results(
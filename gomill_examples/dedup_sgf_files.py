@@ -0,0 +1,67 @@
+"""Find duplicate games in SGF files.
+
+  dedup_sgf_files.py [options] <sgf file or directory> ...
+
+This demonstrates the game_fingerprints module.
+
+"""
+
+import os
+import sys
+import tempfile
+from optparse import OptionParser
+
+from gomill import game_fingerprints
+
+
+_description = """\
+Find games in SGF files (which may contain collections) which are the same
+apart from rotation, reflection, swapped colours, or game information, using a
+pool of worker processes. Directories are searched recursively for .sgf files.
+Each group of duplicates is listed with the first copy first.
+"""
+
+def main(argv):
+    parser = OptionParser(
+        usage="%prog [options] <sgf file or directory> ...",
+        description=_description)
+    parser.add_option("--output", metavar="FILE",
+                      help="write the first copy of each game to FILE")
+    parser.add_option("--hash-file", metavar="FILE",
+                      help="file to use for the on-disk hash table "
+                      "(default in the temporary directory)")
+    parser.add_option("--workers", type="int",
+                      help="number of worker processes (default one per CPU)")
+    parser.add_option("--quiet", action="store_true",
+                      help="don't list duplicates or report unreadable games")
+    opts, args = parser.parse_args(argv)
+    if not args:
+        parser.error("not enough arguments")
+    if opts.workers is not None and opts.workers < 1:
+        parser.error("--workers must be at least 1")
+    if opts.hash_file is None:
+        fd, hash_pathname = tempfile.mkstemp(suffix=".fpset")
+        os.close(fd)
+    else:
+        hash_pathname = opts.hash_file
+    try:
+        game_count, unique_count, groups, errors = \
+            game_fingerprints.find_duplicate_games(
+                args, hash_pathname, output_pathname=opts.output,
+                max_workers=opts.workers)
+    except EnvironmentError, e:
+        print >>sys.stderr, "dedup_sgf_files:", str(e)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        sys.exit(1)
+    if not opts.quiet:
+        for msg in errors:
+            print >>sys.stderr, msg
+        for group in groups:
+            print "  ".join("%s:%d" % (pathname, game_number)
+                            for (pathname, game_number) in group)
+    print "%d games read, %d unique, %d errors" % (
+        game_count, unique_count, len(errors))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
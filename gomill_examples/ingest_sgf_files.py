@@ -0,0 +1,49 @@
+"""Read games from SGF files into a compact game file.
+
+  ingest_sgf_files.py [options] <output file> <sgf file or directory> ...
+
+This demonstrates the compact_game_files module.
+
+"""
+
+import sys
+from optparse import OptionParser
+
+from gomill import compact_game_files
+
+
+_description = """\
+Read the setup stones and main-line moves from SGF files (which may contain
+collections), using a pool of worker processes, and write them to a compact
+game file. Directories are searched recursively for .sgf files.
+"""
+
+def main(argv):
+    parser = OptionParser(
+        usage="%prog [options] <output file> <sgf file or directory> ...",
+        description=_description)
+    parser.add_option("--workers", type="int",
+                      help="number of worker processes (default one per CPU)")
+    parser.add_option("--quiet", action="store_true",
+                      help="don't report unreadable games")
+    opts, args = parser.parse_args(argv)
+    if len(args) < 2:
+        parser.error("not enough arguments")
+    if opts.workers is not None and opts.workers < 1:
+        parser.error("--workers must be at least 1")
+    output_pathname = args[0]
+    try:
+        game_count, errors = compact_game_files.ingest_sgf_files(
+            args[1:], output_pathname, max_workers=opts.workers)
+    except EnvironmentError, e:
+        print >>sys.stderr, "ingest_sgf_files:", str(e)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        sys.exit(1)
+    if not opts.quiet:
+        for msg in errors:
+            print >>sys.stderr, msg
+    print "%d games written, %d errors" % (game_count, len(errors))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,86 @@
+"""Build an opening book, or run a GTP proxy which plays from one.
+
+  opening_book_proxy.py [options] build <book file> <sgf file> ...
+  opening_book_proxy.py run <book file> <back end command> [args]
+
+This demonstrates the opening_books module.
+
+"""
+
+import sys
+from optparse import OptionParser
+
+from gomill import gtp_proxy
+from gomill import opening_books
+from gomill import sgf
+from gomill import sgf_grammar
+
+
+def build_book(book_pathname, sgf_pathnames, max_moves, min_count):
+    builder = opening_books.Opening_book_builder(max_moves)
+    for pathname in sgf_pathnames:
+        f = open(pathname)
+        sgf_src = f.read()
+        f.close()
+        try:
+            coarse_games = sgf_grammar.parse_sgf_collection(sgf_src)
+        except ValueError, e:
+            print >>sys.stderr, "skipping %s: %s" % (pathname, e)
+            continue
+        for coarse_game in coarse_games:
+            try:
+                builder.add_game(sgf.Sgf_game.from_coarse_game_tree(
+                    coarse_game))
+            except ValueError, e:
+                print >>sys.stderr, "skipping game in %s: %s" % (pathname, e)
+    builder.write(book_pathname, min_count)
+    print "%d games added" % builder.games_added
+
+def run_proxy(book_pathname, command):
+    try:
+        book = opening_books.Opening_book(book_pathname)
+    except (EnvironmentError, ValueError), e:
+        sys.exit("opening_book_proxy: %s" % e)
+    proxy = opening_books.Opening_book_proxy(book)
+    try:
+        proxy.set_back_end_subprocess(command)
+    except gtp_proxy.BackEndError, e:
+        sys.exit("opening_book_proxy: %s" % e)
+    try:
+        proxy.run()
+    except KeyboardInterrupt:
+        sys.exit(1)
+
+
+_description = """\
+Build an opening book from SGF files (which may contain collections), or run
+a GTP proxy which answers genmove from a book while the game is in book.
+"""
+
+def main(argv):
+    parser = OptionParser(
+        usage="%prog [options] build <book file> <sgf file> ...\n"
+              "       %prog run <book file> <back end command> [args]",
+        description=_description)
+    parser.disable_interspersed_args()
+    parser.add_option("--max-moves", type="int", default=40,
+                      help="moves to take from each game (default 40)")
+    parser.add_option("--min-count", type="int", default=2,
+                      help="omit moves seen fewer times (default 2)")
+    opts, args = parser.parse_args(argv)
+    if len(args) < 3:
+        parser.error("not enough arguments")
+    action, book_pathname = args[:2]
+    if action == "build":
+        try:
+            build_book(book_pathname, args[2:], opts.max_moves, opts.min_count)
+        except EnvironmentError, e:
+            print >>sys.stderr, "opening_book_proxy:", str(e)
+            sys.exit(1)
+    elif action == "run":
+        run_proxy(book_pathname, args[2:])
+    else:
+        parser.error("unknown action: %s" % action)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,98 @@
+"""Build a position index of SGF files, and search it.
+
+  position_search.py [options] update <index file> <sgf file or directory> ...
+  position_search.py [options] find <index file> <sgf file> [move number]
+
+This demonstrates the position_index module.
+
+"""
+
+import sys
+from optparse import OptionParser
+
+from gomill import position_index
+from gomill import sgf
+from gomill import sgf_moves
+
+
+_description = """\
+'update' creates or updates a position index, recording every position
+reached in the SGF files (which may contain collections). Directories are
+searched recursively for .sgf files. Files which haven't changed since the
+last update are skipped. 'find' lists the games in the index which reached the
+position after the given move of an SGF file (default the last move), allowing
+for rotations and reflections.
+"""
+
+def do_update(opts, args):
+    game_count, errors = position_index.update_position_index(
+        args[0], args[1:], max_workers=opts.workers)
+    if not opts.quiet:
+        for msg in errors:
+            print >>sys.stderr, msg
+    print "%d games indexed, %d errors" % (game_count, len(errors))
+
+def do_find(opts, args):
+    index_pathname, sgf_pathname = args[:2]
+    if len(args) > 2:
+        try:
+            move_number = int(args[2])
+        except ValueError:
+            raise ValueError("bad move number: %s" % args[2])
+    else:
+        move_number = None
+    f = open(sgf_pathname, "rb")
+    sgf_src = f.read()
+    f.close()
+    sgf_game = sgf.Sgf_game.from_string(sgf_src)
+    board, plays = sgf_moves.get_setup_and_moves(sgf_game)
+    if move_number is None:
+        move_number = len(plays)
+    elif not 0 <= move_number <= len(plays):
+        raise ValueError("move number out of range")
+    for colour, move in plays[:move_number]:
+        if move is not None:
+            board.play(move[0], move[1], colour)
+    index = position_index.Position_index(index_pathname)
+    try:
+        occurrences = index.find(board)
+    finally:
+        index.close()
+    for pathname, game_number, found_move_number in occurrences:
+        print "%s:%d move %d" % (pathname, game_number, found_move_number)
+
+_commands = {
+    "update" : (do_update, 2),
+    "find"   : (do_find, 2),
+    }
+
+def main(argv):
+    parser = OptionParser(
+        usage="%prog [options] update <index file> <sgf file or dir> ...\n"
+              "       %prog [options] find <index file> <sgf file> [move]",
+        description=_description)
+    parser.add_option("--workers", type="int",
+                      help="number of worker processes (default one per CPU)")
+    parser.add_option("--quiet", action="store_true",
+                      help="don't report unreadable games")
+    opts, args = parser.parse_args(argv)
+    if not args:
+        parser.error("no command specified")
+    try:
+        fn, min_args = _commands[args[0]]
+    except KeyError:
+        parser.error("unknown command: %s" % args[0])
+    if len(args) - 1 < min_args:
+        parser.error("not enough arguments")
+    if opts.workers is not None and opts.workers < 1:
+        parser.error("--workers must be at least 1")
+    try:
+        fn(opts, args[1:])
+    except (EnvironmentError, ValueError), e:
+        print >>sys.stderr, "position_search:", str(e)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -12,22 +12,20 @@ from gomill import sgf_grammar
 from gomill import sgf
 
 def split_sgf_collection(pathname):
-    f = open(pathname)
-    sgf_src = f.read()
-    f.close()
     dirname, basename = os.path.split(pathname)
     root, ext = os.path.splitext(basename)
     try:
-        coarse_games = sgf_grammar.parse_sgf_collection(sgf_src)
+        for i, (coarse_game, _, _) in enumerate(
+                sgf_grammar.iter_sgf_collection(pathname)):
+            sgf_game = sgf.Sgf_game.from_coarse_game_tree(coarse_game)
+            sgf_game.get_root().add_comment_text(
+                "Split from %s (game %d)" % (basename, i+1))
+            split_pathname = os.path.join(dirname,
+                                          "%s_%d%s" % (root, i+1, ext))
+            with open(split_pathname, "wb") as f:
+                sgf_game.write(f)
     except ValueError, e:
         raise StandardError("error parsing file: %s" % e)
-    for i, coarse_game in enumerate(coarse_games):
-        sgf_game = sgf.Sgf_game.from_coarse_game_tree(coarse_game)
-        sgf_game.get_root().add_comment_text(
-            "Split from %s (game %d)" % (basename, i+1))
-        split_pathname = os.path.join(dirname, "%s_%d%s" % (root, i+1, ext))
-        with open(split_pathname, "wb") as f:
-            f.write(sgf_game.serialise())
 
 
 _description = """\
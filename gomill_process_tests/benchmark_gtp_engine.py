@@ -0,0 +1,67 @@
+"""Benchmark for Gtp_engine_protocol.handle_line().
+
+Run from the top level directory:
+  python gomill_process_tests/benchmark_gtp_engine.py [number_of_lines]
+
+Pushes a stream of play/genmove command lines through handle_line() and
+reports the number of commands handled per second. The handlers do no work,
+so this measures the engine-side protocol overhead.
+
+"""
+
+import sys
+import time
+
+from gomill import gtp_engine
+from gomill.common import format_vertex
+
+def make_engine():
+    def handle_play(args):
+        return ""
+    def handle_genmove(args):
+        return "D4"
+    engine = gtp_engine.Gtp_engine_protocol()
+    engine.add_protocol_commands()
+    engine.add_command('play', handle_play)
+    engine.add_command('genmove', handle_genmove)
+    return engine
+
+def make_lines():
+    lines = []
+    for row in range(19):
+        for col in range(19):
+            vertex = format_vertex((row, col))
+            lines.append("play b %s\n" % vertex)
+            lines.append("genmove w\n")
+    return lines
+
+def run_benchmark(engine, lines, number_of_lines):
+    handle_line = engine.handle_line
+    count = 0
+    start = time.time()
+    while count < number_of_lines:
+        for line in lines:
+            handle_line(line)
+        count += len(lines)
+    elapsed = time.time() - start
+    return count, elapsed
+
+def main(argv):
+    if argv:
+        number_of_lines = int(argv[0])
+    else:
+        number_of_lines = 1000000
+    engine = make_engine()
+    lines = make_lines()
+    # Numbered commands, which don't qualify for handle_line()'s fast path.
+    numbered_lines = ["%d %s" % (i, line) for (i, line) in enumerate(lines)]
+    for description, test_lines in [
+        ("plain", lines),
+        ("with ids", numbered_lines),
+        ]:
+        count, elapsed = run_benchmark(engine, test_lines, number_of_lines)
+        print "%-9s %d commands in %.2fs: %.0f commands/second" % (
+            description, count, elapsed, count / elapsed)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,85 @@
+"""Benchmark for the point and vertex lookup tables.
+
+Run from the top level directory:
+  python gomill_process_tests/benchmark_point_codecs.py
+
+Converts every point on a 19x19 board (and a pass) to and from SGF and GTP
+form repeatedly, comparing the table-driven functions with the implementations
+they fall back to. Also times interpreting and serialising a point list such
+as an AB property with many setup stones.
+
+"""
+
+import time
+
+from gomill import common
+from gomill import sgf_properties
+
+SIZE = 19
+REPEAT = 200
+
+def run(fn, args_list, repeat=REPEAT):
+    start = time.time()
+    for i in xrange(repeat):
+        for args in args_list:
+            fn(*args)
+    elapsed = time.time() - start
+    return elapsed * 1000000 / (repeat * len(args_list))
+
+def report(description, fast_fn, slow_fn, args_list):
+    fast = run(fast_fn, args_list)
+    slow = run(slow_fn, args_list)
+    print "  %-22s %7.3f us per call (%7.3f us without table)" % (
+        description, fast, slow)
+
+def main():
+    moves = [(row, col) for row in range(SIZE) for col in range(SIZE)]
+    moves.append(None)
+    sgf_values = [sgf_properties.serialise_go_point(move, SIZE)
+                  for move in moves]
+    vertices = [common.format_vertex(move) for move in moves]
+    print "SGF:"
+    report("interpret_go_point",
+           sgf_properties.interpret_go_point,
+           sgf_properties._interpret_go_point,
+           [(s, SIZE) for s in sgf_values])
+    report("serialise_go_point",
+           sgf_properties.serialise_go_point,
+           sgf_properties._serialise_go_point,
+           [(move, SIZE) for move in moves])
+    print "GTP:"
+    report("move_from_vertex",
+           common.move_from_vertex,
+           common._move_from_vertex,
+           [(vertex, SIZE) for vertex in vertices])
+    report("format_vertex",
+           common.format_vertex,
+           common._format_vertex,
+           [(move,) for move in moves])
+
+    print "Point lists (%d points):" % (len(moves) // 2)
+    context = sgf_properties._Context(SIZE, "UTF-8")
+    points = set(moves[:-1:2])
+    values = sgf_properties.serialise_point_list(points, context)
+    compressed = sgf_properties.serialise_compressed_point_list(
+        points, context)
+    for description, fn, args in [
+        ("interpret_point_list", sgf_properties.interpret_point_list,
+         (values, context)),
+        ("serialise_point_list", sgf_properties.serialise_point_list,
+         (points, context)),
+        ("serialise_compressed", sgf_properties.serialise_compressed_point_list,
+         (points, context)),
+        ]:
+        print "  %-22s %7.2f ms per call" % (
+            description, run(fn, [args], repeat=50) / 1000)
+    print "  %d values uncompressed, %d compressed" % (
+        len(values), len(compressed))
+    whole_board = set(moves[:-1])
+    print "  whole board: %d values uncompressed, %d compressed" % (
+        len(sgf_properties.serialise_point_list(whole_board, context)),
+        len(sgf_properties.serialise_compressed_point_list(
+            whole_board, context)))
+
+if __name__ == "__main__":
+    main()
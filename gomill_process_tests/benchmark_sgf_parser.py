@@ -0,0 +1,80 @@
+"""Benchmark for the SGF parser.
+
+Run from the top level directory:
+  python gomill_process_tests/benchmark_sgf_parser.py [sgf file ...]
+
+Parses each file (which may contain a collection) repeatedly with
+sgf_grammar.parse_sgf_collection(), and reports the throughput. The time
+taken by sgf_grammar.tokenise() alone over the same data is shown for
+comparison.
+
+If no files are given, uses a generated game with a long main sequence,
+deeply nested variations, and comments.
+
+"""
+
+import random
+import sys
+import time
+
+from gomill import sgf_grammar
+
+def make_variation(rnd, depth, length):
+    pieces = []
+    for i in range(length):
+        colour = "BW"[i % 2]
+        move = chr(97 + rnd.randrange(19)) + chr(97 + rnd.randrange(19))
+        pieces.append(";%s[%s]" % (colour, move))
+        if rnd.random() < 0.2:
+            pieces.append("C[comment on move %d with \\] escape]" % i)
+        if rnd.random() < 0.1:
+            pieces.append("LB[%s:A][aa:B]TR[%s]" % (move, move))
+    if depth > 0:
+        for i in range(3):
+            pieces.append("(%s)" % make_variation(rnd, depth-1, length // 2))
+    return "".join(pieces)
+
+def make_game():
+    rnd = random.Random(1)
+    return ("(;FF[4]GM[1]SZ[19]PB[Black]PW[White]KM[6.5]RE[W+R]%s)" %
+            make_variation(rnd, 5, 120))
+
+def run_benchmark(fn, s, minimum_time=2.0):
+    count = 0
+    start = time.time()
+    while True:
+        fn(s)
+        count += 1
+        elapsed = time.time() - start
+        if elapsed >= minimum_time:
+            return count, elapsed
+
+def tokenise_all(s):
+    position = 0
+    while True:
+        tokens, position = sgf_grammar.tokenise(s, position)
+        if not tokens:
+            break
+
+def main(argv):
+    if argv:
+        sources = []
+        for pathname in argv:
+            f = open(pathname, "rb")
+            sources.append((pathname, f.read()))
+            f.close()
+    else:
+        sources = [("generated", make_game())]
+    for description, s in sources:
+        game_count = len(sgf_grammar.parse_sgf_collection(s))
+        print "%s: %d game(s), %d bytes" % (description, game_count, len(s))
+        for label, fn in [
+            ("parse", sgf_grammar.parse_sgf_collection),
+            ("tokenise", tokenise_all),
+            ]:
+            count, elapsed = run_benchmark(fn, s)
+            print "  %-9s %.2f MB/second" % (
+                label, count * len(s) / elapsed / 1e6)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
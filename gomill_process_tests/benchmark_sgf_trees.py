@@ -0,0 +1,116 @@
+"""Benchmark for building Sgf_game node trees.
+
+Run from the top level directory:
+  python gomill_process_tests/benchmark_sgf_trees.py [sgf file]
+
+Loads the game and then navigates it in several ways, reporting the time
+taken and the peak memory use (maximum resident set size) for each. Each test
+runs in a separate forked process, so the memory figures are independent.
+
+If no file is given, uses a generated review-style game with a long main
+sequence and many nested variations.
+
+This only works on Unix.
+
+"""
+
+import os
+import random
+import resource
+import sys
+import time
+
+from gomill import sgf
+
+
+def make_variation(rnd, depth, length):
+    pieces = []
+    for i in range(length):
+        colour = "BW"[i % 2]
+        move = chr(97 + rnd.randrange(19)) + chr(97 + rnd.randrange(19))
+        pieces.append(";%s[%s]" % (colour, move))
+        if rnd.random() < 0.1:
+            pieces.append("C[comment on move %d]" % i)
+    if depth > 0:
+        for i in range(4):
+            pieces.append("(%s)" % make_variation(rnd, depth-1, length // 2))
+    return "".join(pieces)
+
+def make_game():
+    rnd = random.Random(1)
+    return ("(;FF[4]GM[1]SZ[19]PB[Black]PW[White]KM[6.5]RE[W+R]%s)" %
+            make_variation(rnd, 5, 500))
+
+def count_nodes(node):
+    count = 0
+    to_visit = [node]
+    while to_visit:
+        node = to_visit.pop()
+        count += 1
+        to_visit.extend(node)
+    return count
+
+def test_load(s):
+    sgf.Sgf_game.from_string(s).get_root()
+
+def test_main_sequence(s):
+    sgf.Sgf_game.from_string(s).get_main_sequence()
+
+def test_one_variation(s):
+    game = sgf.Sgf_game.from_string(s)
+    node = game.get_root()
+    while node:
+        node = node[-1]
+
+def test_full_tree(s):
+    return count_nodes(sgf.Sgf_game.from_string(s).get_root())
+
+tests = [
+    ("load", test_load),
+    ("main sequence", test_main_sequence),
+    ("last variation", test_one_variation),
+    ("full tree", test_full_tree),
+    ]
+
+def run_in_child(fn, s, repeat):
+    """Run fn(s) 'repeat' times in a forked child.
+
+    Returns a tuple (seconds per run, peak RSS in KB, fn's last return value)
+
+    The return value must be an int or None.
+
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        start = time.time()
+        for i in xrange(repeat):
+            result = fn(s)
+        os.write(write_fd, repr(((time.time() - start) / repeat, result)))
+        os._exit(0)
+    os.close(write_fd)
+    elapsed, result = eval(os.read(read_fd, 1000))
+    os.close(read_fd)
+    _, _, usage = os.wait4(pid, 0)
+    return elapsed, usage.ru_maxrss, result
+
+def main(argv):
+    # The parent process doesn't build any trees itself, so that the memory
+    # figures for the children aren't affected by its heap.
+    if argv:
+        f = open(argv[0], "rb")
+        description, s = argv[0], f.read()
+        f.close()
+    else:
+        description, s = "generated", make_game()
+    _, baseline_rss, _ = run_in_child(lambda s:None, s, 1)
+    _, _, node_count = run_in_child(test_full_tree, s, 1)
+    print "%s: %d bytes, %d nodes" % (description, len(s), node_count)
+    for label, fn in tests:
+        elapsed, rss, _ = run_in_child(fn, s, 5)
+        print "  %-15s %7.1f ms  %7d KB" % (
+            label, elapsed * 1000, rss - baseline_rss)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
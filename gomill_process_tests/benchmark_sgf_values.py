@@ -0,0 +1,77 @@
+"""Benchmark for the cache of interpreted SGF property values.
+
+Run from the top level directory:
+  python gomill_process_tests/benchmark_sgf_values.py [sgf file]
+
+Walks every node in the game repeatedly, calling get_move() and getting the
+values of the C, AB and AW properties, with the value cache enabled and
+disabled.
+
+If no file is given, uses a generated game with many comments and setup
+stones.
+
+"""
+
+import random
+import sys
+import time
+
+from gomill import sgf
+
+
+def make_game():
+    rnd = random.Random(1)
+    pieces = ["(;FF[4]GM[1]SZ[19]CA[UTF-8]AB[aa:ai][pp]AW[jj:ks]"]
+    for i in range(3000):
+        colour = "BW"[i % 2]
+        move = chr(97 + rnd.randrange(19)) + chr(97 + rnd.randrange(19))
+        pieces.append(";%s[%s]" % (colour, move))
+        if rnd.random() < 0.5:
+            pieces.append("C[comment on move %d: \\]escaped\\\\ and "
+                          "a soft \\\nline break\n%s]" % (i, "text " * 10))
+        if rnd.random() < 0.05:
+            pieces.append("AB[ab:cd][ee]AW[qq:rs]")
+    pieces.append(")")
+    return "".join(pieces)
+
+def walk(nodes):
+    for node in nodes:
+        node.get_move()
+        for identifier in ("C", "AB", "AW"):
+            if node.has_property(identifier):
+                node.get(identifier)
+
+def run_benchmark(nodes, repeat):
+    start = time.time()
+    for i in xrange(repeat):
+        walk(nodes)
+    return (time.time() - start) / repeat
+
+def main(argv):
+    if argv:
+        f = open(argv[0], "rb")
+        description, s = argv[0], f.read()
+        f.close()
+    else:
+        description, s = "generated", make_game()
+    nodes = []
+    to_visit = [sgf.Sgf_game.from_string(s).get_root()]
+    while to_visit:
+        node = to_visit.pop()
+        nodes.append(node)
+        to_visit.extend(node)
+    print "%s: %d nodes" % (description, len(nodes))
+    sgf.set_value_cache_enabled(False)
+    elapsed = run_benchmark(nodes, 20)
+    print "  %-22s %7.2f ms per walk" % ("cache disabled", elapsed * 1000)
+    sgf.set_value_cache_enabled(True)
+    elapsed = run_benchmark(nodes, 1)
+    print "  %-22s %7.2f ms per walk" % ("cache enabled (cold)", elapsed * 1000)
+    sgf.reset_value_cache_stats()
+    elapsed = run_benchmark(nodes, 20)
+    hits, lookups = sgf.get_value_cache_stats()
+    print "  %-22s %7.2f ms per walk (%d hits from %d lookups)" % (
+        "cache enabled (warm)", elapsed * 1000, hits, lookups)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
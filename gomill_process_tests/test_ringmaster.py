@@ -41,6 +41,9 @@ matchups = [
 
 def normalise_report(s):
     """Remove nondeterminancy in a ringmaster report."""
+    # This is for 'max rss' columns
+    s = re.sub(r" +max rss$", "", s, flags=re.MULTILINE)
+    s = re.sub(r" +[0-9]+\.[0-9]MB$", "", s, flags=re.MULTILINE)
     # This is for 'avg cpu' lines
     return re.sub(r"[0-9]\.[0-9]{2}$", "x.xx", s, flags=re.MULTILINE)
 
@@ -151,6 +151,27 @@ def test_copy(tc):
     b1.play(2, 1, 'b')
     tc.assertEqual(b1, b2)
 
+def test_pack(tc):
+    b1 = boards.Board(9)
+    s = b1.pack()
+    tc.assertEqual(s, "." * 81)
+    b2 = boards.Board.from_packed(9, s)
+    tc.assertEqual(b2, b1)
+    tc.assertIs(b2.is_empty(), True)
+    b1.play(2, 3, 'b')
+    b1.play(3, 4, 'w')
+    s = b1.pack()
+    tc.assertEqual(len(s), 81)
+    b2 = boards.Board.from_packed(9, s)
+    tc.assertEqual(b2, b1)
+    tc.assertIs(b2.is_empty(), False)
+    b2.play(5, 5, 'b')
+    tc.assertNotEqual(b2, b1)
+    tc.assertRaisesRegexp(ValueError, "wrong length for packed board",
+                          boards.Board.from_packed, 13, s)
+    tc.assertRaisesRegexp(ValueError, "invalid packed board",
+                          boards.Board.from_packed, 9, "x" * 81)
+
 def test_full_board_selfcapture(tc):
     b = boards.Board(9)
     tc.assertTrue(b.is_empty())
@@ -1,5 +1,7 @@
 """Tests for common.py."""
 
+from __future__ import with_statement
+
 import string
 
 from gomill_tests import gomill_test_support
@@ -42,6 +44,27 @@ def test_format_vertex(tc):
     tc.assertRaises(ValueError, fv, (25, 1))
     tc.assertRaises(ValueError, fv, (1, 25))
 
+def test_vertex_tables(tc):
+    # The lookup tables agree with the parsing code
+    fv = common.format_vertex
+    cv = common.move_from_vertex
+    for size in (1, 9, 19, 25):
+        for row in xrange(size):
+            for col in xrange(size):
+                vertex = fv((row, col))
+                tc.assertEqual(cv(vertex, size), (row, col))
+                tc.assertEqual(cv(vertex.lower(), size), (row, col))
+                tc.assertEqual(cv("%s0%d" % (vertex[0], row+1), size),
+                               (row, col))
+        if size < 25:
+            tc.assertRaises(ValueError, cv, fv((size, 0)), size)
+            tc.assertRaises(ValueError, cv, fv((0, size)), size)
+    tc.assertEqual(cv("PASS", 19), None)
+    tc.assertEqual(fv([3, 4]), "E4")
+    with tc.assertRaises(ValueError) as ar:
+        cv("Z25", 19)
+    tc.assertEqual(str(ar.exception), "vertex is off board: 'z25'")
+
 def test_format_vertex_list(tc):
     fvl = common.format_vertex_list
     tc.assertEqual(fvl([]), "")
@@ -0,0 +1,213 @@
+"""Tests for compact_game_files.py."""
+
+from __future__ import with_statement
+
+import os
+
+from gomill_tests import gomill_test_support
+
+from gomill import compact_game_files
+from gomill import sgf
+from gomill import sgf_moves
+
+def make_tests(suite):
+    suite.addTests(gomill_test_support.make_simple_tests(globals()))
+    suite.addTests(gomill_test_support.make_multiprocessing_tests(
+        check_ingestion, "ingest_sgf_files"))
+
+
+GAME1 = "(;SZ[9]KM[6.5]RE[W+R]AB[aa][bb]AW[cc];W[ee];B[];W[ab])"
+GAME2 = "(;SZ[19]HA[2]AB[dd][pp];W[qd](;B[dp])(;B[pd]))"
+GAME3 = "(;SZ[13]KM[0.3];B[aa];W[mm])"
+
+def compact_as_tuple(game):
+    return (game.size, game.komi, game.handicap, game.result,
+            list(game.black_setup), list(game.white_setup),
+            game.move_colours, list(game.move_points))
+
+def test_read_sgf_file_games(tc):
+    dirname = tc.sandbox()
+    pathname = gomill_test_support.write_file(
+        dirname, "games.sgf",
+        GAME1 + "\n(;SZ[9];B[zz])\n" + GAME3 + "\n(;B[aa]")
+    results, errors = compact_game_files.read_sgf_file_games(
+        pathname, sgf_moves.read_compact_game)
+    tc.assertEqual([(n, start, end) for (n, start, end, game) in results],
+                   [(0, 0, len(GAME1)),
+                    (2, len(GAME1) + 16, len(GAME1) + 16 + len(GAME3))])
+    tc.assertEqual(compact_as_tuple(results[0][3]),
+                   compact_as_tuple(sgf_moves.read_compact_game(GAME1)))
+    tc.assertEqual(errors, [
+        "game 1: bad B property: zz",
+        "error parsing game 3: unexpected end of SGF data",
+        ])
+    # Part of the file
+    start = len(GAME1) + 1
+    tc.assertEqual(compact_game_files.read_sgf_file_games(
+        pathname, len, start, len(GAME1) + 16, 1),
+        ([(1, start, start + 14, 14)], []))
+    tc.assertEqual(compact_game_files.read_sgf_file_games(
+        pathname, len, start + 15, None, 2),
+        ([(2, start + 15, start + 15 + len(GAME3), len(GAME3))],
+         ["error parsing game 3: unexpected end of SGF data"]))
+    empty = gomill_test_support.write_file(dirname, "empty.sgf", "")
+    tc.assertEqual(compact_game_files.read_sgf_file_games(empty, len),
+                   ([], ["no SGF data found"]))
+    tc.assertRaises(EnvironmentError, compact_game_files.read_sgf_file_games,
+                    os.path.join(dirname, "missing.sgf"), len)
+
+def test_split_sgf_files(tc):
+    dirname = tc.sandbox()
+    game = "(;C[(]B[aa])"
+    small = gomill_test_support.write_file(dirname, "small.sgf", game)
+    large = gomill_test_support.write_file(
+        dirname, "large.sgf", "junk " + "\n".join([game] * 10) + "\n")
+    incomplete = gomill_test_support.write_file(
+        dirname, "incomplete.sgf", "\n".join([game] * 4 + ["(;B[aa]"]))
+    missing = os.path.join(dirname, "missing.sgf")
+    pieces = list(compact_game_files.split_sgf_files(
+        [small, large, incomplete, missing], 40))
+    tc.assertEqual(pieces, [
+        (small, 0, None, 0),
+        (large, 0, 31, 0),
+        (large, 31, 70, 2),
+        (large, 70, 109, 5),
+        (large, 109, None, 8),
+        (incomplete, 0, 39, 0),
+        (incomplete, 39, None, 3),
+        (missing, 0, None, 0),
+        ])
+    tc.assertEqual(list(compact_game_files.split_sgf_files([large])),
+                   [(large, 0, None, 0)])
+    # Reading the pieces gives the same results as reading the whole file
+    for pathname in [large, incomplete]:
+        results = []
+        errors = []
+        for piece in compact_game_files.split_sgf_files([pathname], 40):
+            piece_results, piece_errors = \
+                compact_game_files.read_sgf_file_games(
+                    piece[0], sgf_moves.read_compact_game, *piece[1:])
+            results += piece_results
+            errors += piece_errors
+        expected_results, expected_errors = \
+            compact_game_files.read_sgf_file_games(
+                pathname, sgf_moves.read_compact_game)
+        tc.assertEqual([result[:3] for result in results],
+                       [result[:3] for result in expected_results])
+        tc.assertEqual(errors, expected_errors)
+
+def test_pack_games(tc):
+    games = [(3, sgf_moves.read_compact_game(GAME1)),
+             (0, sgf_moves.read_compact_game(GAME2))]
+    data = compact_game_files.pack_games(games)
+    unpacked = compact_game_files.unpack_games(data)
+    tc.assertEqual([(n, compact_as_tuple(game)) for (n, game) in unpacked],
+                   [(n, compact_as_tuple(game)) for (n, game) in games])
+    tc.assertEqual(unpacked[1][1].handicap, 2)
+    tc.assertIsNone(unpacked[1][1].result)
+    tc.assertEqual(compact_game_files.unpack_games(""), [])
+    tc.assertRaisesRegexp(ValueError, "malformed game record",
+                          compact_game_files.unpack_games, data[:-1])
+
+def test_find_sgf_files(tc):
+    dirname = tc.sandbox()
+    os.mkdir(os.path.join(dirname, "sub"))
+    gomill_test_support.write_file(dirname, "b.sgf", GAME1)
+    gomill_test_support.write_file(dirname, "a.SGF", GAME1)
+    gomill_test_support.write_file(dirname, "notes.txt", "")
+    gomill_test_support.write_file(
+        os.path.join(dirname, "sub"), "c.sgf", GAME1)
+    tc.assertEqual(compact_game_files.find_sgf_files([dirname, "x.dat"]), [
+        os.path.join(dirname, "a.SGF"),
+        os.path.join(dirname, "b.sgf"),
+        os.path.join(dirname, "sub", "c.sgf"),
+        "x.dat",
+        ])
+
+def check_ingestion(tc, allow_mp):
+    dirname = tc.sandbox()
+    os.mkdir(os.path.join(dirname, "sgf"))
+    sgf_dir = os.path.join(dirname, "sgf")
+    p1 = gomill_test_support.write_file(sgf_dir, "one.sgf", GAME1)
+    p2 = gomill_test_support.write_file(
+        sgf_dir, "collection.sgf",
+        GAME2 + "\n(;SZ[9];B[zz])\n" + GAME3 + "\n(;B[aa]")
+    p3 = os.path.join(dirname, "missing.sgf")
+    output_pathname = os.path.join(dirname, "games.dat")
+    game_count, errors = compact_game_files.ingest_sgf_files(
+        [sgf_dir, p3], output_pathname, max_workers=2, allow_mp=allow_mp)
+    tc.assertEqual(game_count, 3)
+    tc.assertEqual(sorted(errors), sorted([
+        "%s: error parsing game 3: unexpected end of SGF data" % p2,
+        "%s: game 1: bad B property: zz" % p2,
+        "%s: [Errno 2] No such file or directory: '%s'" % (p3, p3),
+        ]))
+    games = sorted(compact_game_files.read_compact_game_file(output_pathname))
+    tc.assertEqual([(source, n) for (source, n, game) in games],
+                   [(p2, 0), (p2, 2), (p1, 0)])
+    tc.assertEqual(compact_as_tuple(games[2][2]),
+                   compact_as_tuple(sgf_moves.read_compact_game(GAME1)))
+    tc.assertEqual(games[1][2].komi, 0.3)
+
+def test_ingest_large_file(tc):
+    dirname = tc.sandbox()
+    pathname = gomill_test_support.write_file(
+        dirname, "collection.sgf",
+        "\n".join([GAME1, GAME2, "(;SZ[9];B[zz])", GAME3] * 5 + ["(;B[aa]"]))
+    output_pathname = os.path.join(dirname, "games.dat")
+    saved_range_size = compact_game_files._default_range_size
+    compact_game_files._default_range_size = 100
+    try:
+        game_count, errors = compact_game_files.ingest_sgf_files(
+            [pathname], output_pathname, allow_mp=False)
+    finally:
+        compact_game_files._default_range_size = saved_range_size
+    tc.assertEqual(game_count, 15)
+    tc.assertEqual(errors, [
+        "%s: game %d: bad B property: zz" % (pathname, n)
+        for n in (2, 6, 10, 14, 18)] + [
+        "%s: error parsing game 20: unexpected end of SGF data" % pathname])
+    games = list(compact_game_files.read_compact_game_file(output_pathname))
+    tc.assertEqual([n for (_, n, _) in games],
+                   [n for n in range(20) if n % 4 != 2])
+    tc.assertEqual(compact_as_tuple(games[-1][2]),
+                   compact_as_tuple(sgf_moves.read_compact_game(GAME3)))
+    # The file was divided into several chunks
+    with open(output_pathname, "rb") as f:
+        tc.assertTrue(f.read().count(pathname) > 1)
+
+def test_ingest_setup_removal(tc):
+    dirname = tc.sandbox()
+    s = "(;SZ[9]AB[aa][bb]AE[aa];B[cc])"
+    pathname = gomill_test_support.write_file(dirname, "game.sgf", s)
+    output_pathname = os.path.join(dirname, "games.dat")
+    tc.assertEqual(compact_game_files.ingest_sgf_files(
+        [pathname], output_pathname, allow_mp=False), (1, []))
+    [(_, _, game)] = compact_game_files.read_compact_game_file(output_pathname)
+    board, plays = game.get_setup_and_moves()
+    expected_board, expected_plays = sgf_moves.get_setup_and_moves(
+        sgf.Sgf_game.from_string(s))
+    tc.assertEqual(board.list_occupied_points(),
+                   expected_board.list_occupied_points())
+    tc.assertEqual(plays, expected_plays)
+
+def test_bad_compact_game_file(tc):
+    pathname = gomill_test_support.write_file(
+        tc.sandbox(), "games.dat", "nonsense")
+    with tc.assertRaises(ValueError) as ar:
+        list(compact_game_files.read_compact_game_file(pathname))
+    tc.assertEqual(str(ar.exception),
+                   "not a compact game file: %s" % pathname)
+    writer = compact_game_files.Compact_game_file_writer(pathname)
+    data = compact_game_files.pack_games(
+        [(0, sgf_moves.read_compact_game(GAME1))])
+    writer.write_chunk("src", 1, data)
+    writer.write_chunk("src2", 1, data)
+    writer.close()
+    with open(pathname, "rb") as f:
+        s = f.read()
+    gomill_test_support.write_file(tc.sandbox(), "games.dat", s[:-3])
+    games = compact_game_files.read_compact_game_file(pathname)
+    tc.assertEqual(games.next()[:2], ("src", 0))
+    tc.assertRaisesRegexp(ValueError, "truncated compact game file",
+                          games.next)
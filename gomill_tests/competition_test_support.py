@@ -38,6 +38,7 @@ def fake_response(job, winner):
             '%s engine\ntestdescription' % job.player_w.code),
         }
     response.game_data = job.game_data
+    response.genmove_cache_stats = {}
     response.warnings = []
     response.log_entries = []
     return response
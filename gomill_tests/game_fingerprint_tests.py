@@ -0,0 +1,106 @@
+"""Tests for game_fingerprints.py."""
+
+from __future__ import with_statement
+
+import os
+
+from gomill_tests import gomill_test_support
+
+from gomill import compact_game_files
+from gomill import game_fingerprints
+from gomill import sgf_moves
+
+def make_tests(suite):
+    suite.addTests(gomill_test_support.make_simple_tests(globals()))
+    suite.addTests(gomill_test_support.make_multiprocessing_tests(
+        check_find_duplicates, "find_duplicate_games"))
+
+
+GAME = "(;SZ[9]KM[6.5]PB[Alice]AB[aa][bc]AW[cc];W[ee];B[];W[ab];B[hg])"
+# GAME rotated a quarter turn, with different game info
+ROTATED = "(;SZ[9]KM[0]PW[Bob]RE[W+R]AB[ia][gb]AW[gc];W[ee];B[];W[ha];B[ch])"
+# GAME reflected left-right, with the colours swapped
+SWAPPED = "(;SZ[9]AW[ia][hc]AB[gc];B[ee];W[];B[ib];W[bg])"
+# Last move differs
+DIFFERENT = "(;SZ[9]AB[aa][bc]AW[cc];W[ee];B[];W[ab];B[hh])"
+# Same moves, different board size
+BIGGER = "(;SZ[19]AB[aa][bc]AW[cc];W[ee];B[];W[ab];B[hg])"
+
+def fingerprint(s):
+    return game_fingerprints.get_fingerprint(sgf_moves.read_compact_game(s))
+
+def test_get_fingerprint(tc):
+    fp = fingerprint(GAME)
+    tc.assertEqual(len(fp), 16)
+    tc.assertEqual(fingerprint(ROTATED), fp)
+    tc.assertEqual(fingerprint(SWAPPED), fp)
+    tc.assertNotEqual(fingerprint(DIFFERENT), fp)
+    tc.assertNotEqual(fingerprint(BIGGER), fp)
+    # Pass and the point with index 0 are distinguished
+    tc.assertNotEqual(fingerprint("(;SZ[5];B[ae])"), fingerprint("(;SZ[5];B[])"))
+    tc.assertNotEqual(fingerprint("(;SZ[5];B[ae])"),
+                      fingerprint("(;SZ[5];B[ae];W[])"))
+
+def test_fingerprint_set(tc):
+    pathname = os.path.join(tc.sandbox(), "fp.dat")
+    fpset = game_fingerprints.Fingerprint_set(pathname, initial_capacity=4)
+    keys = ["%016d" % i for i in xrange(100)]
+    for i, key in enumerate(keys):
+        tc.assertIsNone(fpset.add(key, i * 3))
+    tc.assertEqual(len(fpset), 100)
+    for i, key in enumerate(keys):
+        tc.assertEqual(fpset.add(key, 7), i * 3)
+        tc.assertEqual(fpset.get(key), i * 3)
+    tc.assertIsNone(fpset.get("x" * 16))
+    tc.assertFalse("x" * 16 in fpset)
+    tc.assertTrue(keys[0] in fpset)
+    tc.assertEqual(len(fpset), 100)
+    tc.assertRaisesRegexp(ValueError, "key must be 16 bytes",
+                          fpset.add, "short", 1)
+    fpset.close()
+    fpset.close()
+    tc.assertFalse(os.path.exists(pathname + ".new"))
+    with open(pathname, "rb") as f:
+        tc.assertEqual(f.read(8), "GMLFPSET")
+
+def check_find_duplicates(tc, allow_mp):
+    dirname = tc.sandbox()
+    sgf_dir = os.path.join(dirname, "sgf")
+    os.mkdir(sgf_dir)
+    p1 = gomill_test_support.write_file(sgf_dir, "a.sgf", GAME)
+    p2 = gomill_test_support.write_file(
+        sgf_dir, "b.sgf",
+        DIFFERENT + "\n" + ROTATED + "\n(;SZ[9];B[zz])\n" +
+        SWAPPED + "\n" + BIGGER + "\n" + DIFFERENT)
+    p3 = gomill_test_support.write_file(sgf_dir, "c.sgf", BIGGER + "\n(;B[aa]")
+    p4 = os.path.join(dirname, "missing.sgf")
+    hash_pathname = os.path.join(dirname, "fp.dat")
+    output_pathname = os.path.join(dirname, "out.sgf")
+    game_count, unique_count, groups, errors = \
+        game_fingerprints.find_duplicate_games(
+            [sgf_dir, p4], hash_pathname, output_pathname,
+            max_workers=2, allow_mp=allow_mp)
+    tc.assertEqual(game_count, 7)
+    tc.assertEqual(unique_count, 3)
+    tc.assertEqual(groups, [
+        [(p1, 0), (p2, 1), (p2, 3)],
+        [(p2, 0), (p2, 5)],
+        [(p2, 4), (p3, 0)],
+        ])
+    tc.assertEqual(sorted(errors), sorted([
+        "%s: game 2: bad B property: zz" % p2,
+        "%s: error parsing game 1: unexpected end of SGF data" % p3,
+        "%s: [Errno 2] No such file or directory: '%s'" % (p4, p4),
+        ]))
+    tc.assertFalse(os.path.exists(hash_pathname))
+    with open(output_pathname, "rb") as f:
+        tc.assertEqual(f.read(), GAME + "\n" + DIFFERENT + "\n" + BIGGER + "\n")
+
+def test_find_duplicate_games_split_files(tc):
+    # The larger files are divided into several pieces
+    saved_range_size = compact_game_files._default_range_size
+    compact_game_files._default_range_size = 50
+    try:
+        check_find_duplicates(tc, allow_mp=True)
+    finally:
+        compact_game_files._default_range_size = saved_range_size
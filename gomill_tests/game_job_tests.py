@@ -6,6 +6,8 @@ import os
 from textwrap import dedent
 
 from gomill import game_jobs
+from gomill import gameplay
+from gomill import sgf
 from gomill.job_manager import JobFailed
 
 from gomill_tests import gomill_test_support
@@ -23,6 +25,8 @@ class Test_game_job(game_jobs.Game_job):
     Additional attributes:
      _sgf_pathname_written -- pathname sgf file would have been written to
      _sgf_written          -- contents that would have been written
+     _store_written        -- (pathname, game id, Sgf_game) that would have
+                              been written to a game store
      _mkdir_pathname       -- directory pathname that would have been created
 
     """
@@ -30,12 +34,16 @@ class Test_game_job(game_jobs.Game_job):
         game_jobs.Game_job.__init__(self, *args, **kwargs)
         self._sgf_pathname_written = None
         self._sgf_written = None
+        self._store_written = None
         self._mkdir_pathname = None
 
     def _write_sgf(self, pathname, sgf_string):
         self._sgf_pathname_written = pathname
         self._sgf_written = sgf_string
 
+    def _write_to_store(self, pathname, game_id, sgf_game):
+        self._store_written = (pathname, game_id, sgf_game)
+
     def _ensure_dir(self, pathname):
         self._mkdir_pathname = pathname
 
@@ -184,6 +192,18 @@ def test_game_job_no_sgf(tc):
     tc.assertEqual(result.game_result.sgf_result, "B+10.5")
     tc.assertIsNone(fx.job._sgf_pathname_written)
 
+def test_game_job_game_store(tc):
+    fx = Game_job_fixture(tc)
+    fx.job.game_store_pathname = "/sgf/test.gamestore"
+    result = fx.job.run()
+    tc.assertEqual(result.game_result.sgf_result, "B+10.5")
+    tc.assertIsNone(fx.job._sgf_pathname_written)
+    pathname, game_id, sgf_game = fx.job._store_written
+    tc.assertEqual(pathname, "/sgf/test.gamestore")
+    tc.assertEqual(game_id, "gameid")
+    tc.assertEqual(sgf_game.get_root().get("RE"), "B+10.5")
+    tc.assertIn("Game id gameid", sgf_game.get_root().get("C"))
+
 def test_game_job_forfeit(tc):
     fx = Game_job_fixture(tc)
     fx.force_error('w', 'genmove')
@@ -525,6 +545,61 @@ def test_game_job_cpu_time_fail(tc):
     W[gc];B[eb];W[gb];B[ea];W[ga];B[tt];C[one beat two B+10.5]W[tt])
     """))
 
+def test_game_job_resource_usage(tc):
+    fx = Game_job_fixture(tc)
+    fx.job.player_w.memory_sample_interval = 2.5
+    result = fx.job.run()
+    tc.assertIsNone(
+        fx.get_channel('one').requested_memory_sample_interval)
+    tc.assertEqual(
+        fx.get_channel('two').requested_memory_sample_interval, 2.5)
+    tc.assertIs(result.resource_usage, result.game_result.resource_usage)
+    ru_one = result.resource_usage['one']
+    ru_two = result.resource_usage['two']
+    tc.assertEqual(ru_one.max_rss, 546*1024)
+    tc.assertEqual(ru_one.memory_sample_count, 0)
+    tc.assertIsNone(ru_one.sampled_max_rss)
+    tc.assertEqual(ru_two.max_rss, 567*1024)
+    tc.assertEqual(ru_two.memory_sample_count, 2)
+    tc.assertEqual(ru_two.sampled_max_rss, 567*1024)
+    tc.assertEqual(ru_two.sampled_mean_rss, 567*768)
+
+def test_game_job_genmove_cache(tc):
+    pathname = os.path.join(tc.sandbox(), "genmove.cache")
+    fx = Game_job_fixture(tc)
+    fx.job.player_b.genmove_cache = pathname
+    result = fx.job.run()
+    tc.assertEqual(result.game_result.sgf_result, "B+10.5")
+    tc.assertEqual(result.genmove_cache_stats, {'one' : (0, 10)})
+    tc.assertEqual(result.log_entries,
+                   ["one genmove cache: 0 hits from 10 lookups"])
+    fx2 = Game_job_fixture(tc)
+    fx2.job.player_b.genmove_cache = pathname
+    result2 = fx2.job.run()
+    tc.assertEqual(result2.game_result.sgf_result, "B+10.5")
+    tc.assertEqual(result2.genmove_cache_stats, {'one' : (10, 10)})
+    tc.assertNotIn(
+        ('genmove', ['b']), fx2.get_channel('one').engine.commands_handled)
+
+def test_game_job_genmove_cache_bad_pathname(tc):
+    fx = Game_job_fixture(tc)
+    fx.job.player_w.genmove_cache = os.path.join(
+        tc.sandbox(), "nonexistent", "genmove.cache")
+    with tc.assertRaises(JobFailed) as ar:
+        fx.job.run()
+    tc.assertTrue(str(ar.exception).startswith(
+        "player two: can't open genmove cache:\n"))
+
+def test_game_job_time_settings(tc):
+    fx = Game_job_fixture(tc)
+    fx.job.time_settings = gameplay.Time_settings(3600)
+    result = fx.job.run()
+    tc.assertEqual(result.game_result.sgf_result, "B+10.5")
+    sgf_game = sgf.Sgf_game.from_string(fx.job._get_sgf_written())
+    tc.assertEqual(sgf_game.get_root().get('TM'), 3600)
+    tc.assertFalse(sgf_game.get_root().has_property('OT'))
+    tc.assertTrue(sgf_game.get_last_node().has_property('WL'))
+
 def test_game_job_player_descriptions(tc):
     fx = Game_job_fixture(tc)
     fx.add_handler('b', 'name', lambda args: "blackname")
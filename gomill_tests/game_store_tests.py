@@ -0,0 +1,118 @@
+"""Tests for game_stores.py."""
+
+from __future__ import with_statement
+
+import os
+
+from gomill_tests import gomill_test_support
+
+from gomill import game_stores
+from gomill import sgf
+
+def make_tests(suite):
+    suite.addTests(gomill_test_support.make_simple_tests(globals()))
+
+
+GAME1 = ("(;FF[4]AB[aa]AP[gomill:0.8]C[root\ncomment]CA[UTF-8]KM[7.5]RE[B+R]"
+         "SZ[9];B[ee]BL[12.5]C[hi];W[tt]WL[3];B[];C[empty node])")
+GAME2 = "(;FF[4]GM[1]SZ[19];B[pd];W[dp](;B[pp])(;B[dd]))"
+
+def test_store_and_read(tc):
+    pathname = os.path.join(tc.sandbox(), "test.gamestore")
+    game1 = sgf.Sgf_game.from_string(GAME1)
+    game_stores.append_game(pathname, "g1", game1)
+    game_stores.append_game(pathname, "g2", sgf.Sgf_game.from_string(GAME2))
+    store = game_stores.Game_store(pathname)
+    tc.assertEqual(len(store), 2)
+    tc.assertEqual(store.get_game_ids(), ["g1", "g2"])
+    tc.assertTrue("g1" in store)
+    tc.assertFalse("g3" in store)
+    g1, g2 = store.games
+    tc.assertEqual((g1.game_id, g1.size, g1.result, g1.winner, g1.move_count),
+                   ("g1", 9, "B+R", 'b', 3))
+    tc.assertEqual((g2.game_id, g2.size, g2.result, g2.winner, g2.move_count),
+                   ("g2", 19, None, None, 3))
+    tc.assertEqual(store.get_sgf("g1"), game1.serialise())
+    # Only the main sequence is stored
+    tc.assertEqual(store.get_sgf("g2"),
+                   "(;FF[4]GM[1]SZ[19];B[pd];W[dp];B[pp])\n")
+    tc.assertEqual(store.get_sgf_game("g1").get_root().get("C"),
+                   "root\ncomment")
+    tc.assertRaises(KeyError, store.get_sgf_game, "g3")
+
+def test_refresh(tc):
+    pathname = os.path.join(tc.sandbox(), "test.gamestore")
+    game = sgf.Sgf_game.from_string(GAME1)
+    game_stores.append_game(pathname, "g1", game)
+    store = game_stores.Game_store(pathname)
+    tc.assertEqual(store.refresh(), 0)
+    game_stores.append_game(pathname, "g2", game)
+    # Replaces the earlier record
+    game_stores.append_game(pathname, "g1", sgf.Sgf_game(13))
+    # Partly-written record
+    record = game_stores.pack_game("g3", game)
+    with open(pathname, "ab") as f:
+        f.write(record[:-5])
+    tc.assertEqual(store.refresh(), 2)
+    tc.assertEqual(store.get_game_ids(), ["g2", "g1"])
+    tc.assertEqual(store.get_sgf_game("g1").get_size(), 13)
+    with open(pathname, "ab") as f:
+        f.write(record[-5:])
+    tc.assertEqual(store.refresh(), 1)
+    tc.assertEqual(store.get_game_ids(), ["g2", "g1", "g3"])
+    tc.assertEqual(store.get_sgf("g3"), game.serialise())
+    # Several replacements in one refresh
+    game_stores.append_game(pathname, "g2", game)
+    game_stores.append_game(pathname, "g4", game)
+    game_stores.append_game(pathname, "g2", game)
+    game_stores.append_game(pathname, "g3", game)
+    tc.assertEqual(store.refresh(), 4)
+    tc.assertEqual(store.get_game_ids(), ["g1", "g4", "g2", "g3"])
+    tc.assertEqual(len(store), 4)
+
+def test_export_sgf_files(tc):
+    dirname = tc.sandbox()
+    pathname = os.path.join(dirname, "test.gamestore")
+    os.mkdir(os.path.join(dirname, "out"))
+    game_stores.append_game(pathname, "0_000", sgf.Sgf_game.from_string(GAME1))
+    game_stores.append_game(pathname, "0_001", sgf.Sgf_game.from_string(GAME2))
+    store = game_stores.Game_store(pathname)
+    tc.assertEqual(store.export_sgf_files(os.path.join(dirname, "out")), 2)
+    tc.assertEqual(sorted(os.listdir(os.path.join(dirname, "out"))),
+                   ["0_000.sgf", "0_001.sgf"])
+    with open(os.path.join(dirname, "out", "0_000.sgf")) as f:
+        tc.assertEqual(f.read(), store.get_sgf("0_000"))
+
+def test_export_sgf_files_with_filenames(tc):
+    dirname = tc.sandbox()
+    pathname = os.path.join(dirname, "test.gamestore")
+    game_stores.append_game(pathname, "0_000", sgf.Sgf_game.from_string(GAME1))
+    store = game_stores.Game_store(pathname)
+    tc.assertEqual(store.export_sgf_files(
+        dirname, lambda game_id: "game-%s.sgf" % game_id), 1)
+    with open(os.path.join(dirname, "game-0_000.sgf")) as f:
+        tc.assertEqual(f.read(), store.get_sgf("0_000"))
+
+def test_store_without_fcntl(tc):
+    pathname = os.path.join(tc.sandbox(), "test.gamestore")
+    saved_fcntl = game_stores.fcntl
+    game_stores.fcntl = None
+    try:
+        game_stores.append_game(pathname, "g1", sgf.Sgf_game(9))
+        store = game_stores.Game_store(pathname)
+        game_stores.append_game(pathname, "g2", sgf.Sgf_game(13))
+        tc.assertEqual(store.refresh(), 1)
+        tc.assertEqual(store.get_game_ids(), ["g1", "g2"])
+    finally:
+        game_stores.fcntl = saved_fcntl
+
+def test_bad_store(tc):
+    dirname = tc.sandbox()
+    pathname = os.path.join(dirname, "test.gamestore")
+    with open(pathname, "wb") as f:
+        f.write("nonsense")
+    with tc.assertRaises(ValueError) as ar:
+        game_stores.Game_store(pathname)
+    tc.assertEqual(str(ar.exception), "not a game store: %s" % pathname)
+    tc.assertRaises(EnvironmentError, game_stores.Game_store,
+                    os.path.join(dirname, "missing"))
@@ -9,6 +9,11 @@ from gomill import gameplay
 
 from gomill_tests import gomill_test_support
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 def make_tests(suite):
     suite.addTests(gomill_test_support.make_simple_tests(globals()))
 
@@ -1143,6 +1148,25 @@ def test_game_runner_fixed_handicap(tc):
 (;FF[4]AB[cc][cg][gc]AP[gomill:VER]CA[UTF-8]DT[***]GM[1]HA[3]KM[11]RE[W+99]SZ[9];W[ci];B[di];W[tt];B[tt])
 """)
 
+def test_game_runner_to_arrays(tc):
+    if numpy is None:
+        tc.skipTest("numpy not available")
+    fx = Game_runner_fixture(
+        tc, size=9,
+        moves=[('w', 'C1'), ('b', 'D1')])
+    fx.enable_get_last_move_comment('b')
+    fx.game_runner.prepare()
+    fx.game_runner.set_handicap(3, is_free=False)
+    fx.game_runner.run()
+    arrays = fx.game_runner.to_arrays()
+    tc.assertEqual(arrays['setup'].tolist(),
+                   [[0, 2, 2], [0, 6, 6], [0, 6, 2]])
+    tc.assertEqual(arrays['moves'].tolist(),
+                   [[1, 0, 2], [0, 0, 3], [1, -1, -1], [0, -1, -1]])
+    tc.assertEqual(arrays['comment_offsets'].tolist(), [0, 0, 9, 9, 20])
+    tc.assertEqual(arrays['comment_data'].tostring(),
+                   "b-move/D1b-move/pass")
+
 def test_game_runner_free_handicap(tc):
     class _Backend(Testing_backend):
         def get_free_handicap(self, handicap):
@@ -1383,3 +1407,168 @@ def test_game_runner_state_checks(tc):
     tc.assertRaises(gameplay.GameRunnerStateError, gr2.set_handicap, 3, False)
     tc.assertRaises(gameplay.GameRunnerStateError, gr1.run)
     tc.assertEqual(gr2.make_sgf().get_root().get("HA"), 3)
+
+
+### Time limits
+
+def test_time_settings(tc):
+    ts = gameplay.Time_settings(600)
+    tc.assertEqual(ts.main_time, 600.0)
+    tc.assertEqual(ts.byo_yomi_time, 0.0)
+    tc.assertIs(ts.has_byo_yomi, False)
+    tc.assertIsNone(ts.describe_overtime())
+    tc.assertEqual(ts.describe(), "600s absolute")
+    ts = gameplay.Time_settings(600, 300, byo_yomi_stones=25)
+    tc.assertIs(ts.has_byo_yomi, True)
+    tc.assertEqual(ts.describe_overtime(), "25/300 Canadian")
+    tc.assertEqual(ts.describe(), "600s + 25/300 Canadian")
+    ts = gameplay.Time_settings(0, 30.5, byo_yomi_style='japanese',
+                                byo_yomi_periods=5)
+    tc.assertEqual(ts.describe(), "0s + 5x30.5 byo-yomi")
+
+def test_time_settings_validation(tc):
+    def check(msg, *args, **kwargs):
+        tc.assertRaisesRegexp(ValueError, "^%s$" % msg,
+                              gameplay.Time_settings, *args, **kwargs)
+    check("negative main_time", -1)
+    check("negative byo_yomi_time", 10, -1)
+    check("no time allowed", 0)
+    check("unknown byo_yomi_style: fischer", 10, 10, byo_yomi_style='fischer')
+    check("byo_yomi_stones must be positive", 10, 10, byo_yomi_stones=0)
+    check("byo_yomi_periods must be positive", 10, 10, byo_yomi_periods=0)
+
+def test_game_clock_absolute(tc):
+    clock = gameplay.Game_clock(gameplay.Time_settings(10))
+    tc.assertIs(clock.record_move_time(4), True)
+    tc.assertEqual(clock.time_left, 6.0)
+    tc.assertIs(clock.in_byo_yomi, False)
+    tc.assertIsNone(clock.stones_left)
+    tc.assertIsNone(clock.periods_left)
+    tc.assertIs(clock.record_move_time(6), True)
+    tc.assertEqual(clock.time_left, 0.0)
+    tc.assertIs(clock.record_move_time(0.5), False)
+
+def test_game_clock_canadian(tc):
+    clock = gameplay.Game_clock(
+        gameplay.Time_settings(10, 20, byo_yomi_stones=2))
+    tc.assertIs(clock.record_move_time(15), True)
+    tc.assertIs(clock.in_byo_yomi, True)
+    tc.assertEqual(clock.time_left, 15.0)
+    tc.assertEqual(clock.stones_left, 1)
+    tc.assertIs(clock.record_move_time(12), True)
+    # new period
+    tc.assertEqual(clock.time_left, 20.0)
+    tc.assertEqual(clock.stones_left, 2)
+    tc.assertIs(clock.record_move_time(19), True)
+    tc.assertEqual(clock.stones_left, 1)
+    tc.assertIs(clock.record_move_time(2), False)
+
+def test_game_clock_japanese(tc):
+    clock = gameplay.Game_clock(
+        gameplay.Time_settings(10, 5, byo_yomi_style='japanese',
+                               byo_yomi_periods=3))
+    tc.assertIs(clock.record_move_time(12), True)
+    tc.assertIs(clock.in_byo_yomi, True)
+    tc.assertEqual(clock.periods_left, 3)
+    tc.assertIsNone(clock.stones_left)
+    tc.assertEqual(clock.time_left, 5.0)
+    tc.assertIs(clock.record_move_time(4), True)
+    tc.assertEqual(clock.periods_left, 3)
+    tc.assertIs(clock.record_move_time(7), True)
+    tc.assertEqual(clock.periods_left, 2)
+    tc.assertIs(clock.record_move_time(10), True)
+    tc.assertEqual(clock.periods_left, 1)
+    tc.assertIs(clock.record_move_time(5.5), False)
+
+
+class Timed_testing_backend(Testing_backend):
+    """Variant of Testing_backend which reports time-related notifications.
+
+    Set move_durations to a dict colour -> list of floats to control how long
+    each call to get_move() appears to take (the default is one second).
+
+    Use install_fake_clock() to make a Game_runner use the fake time.
+
+    """
+    def __init__(self, size, moves):
+        Testing_backend.__init__(self, size, moves)
+        self.move_durations = {'b' : [], 'w' : []}
+        self.fake_time = 1000.0
+
+    def install_fake_clock(self, game_runner):
+        game_runner._get_time = lambda: self.fake_time
+
+    def notify_time_settings(self, time_settings):
+        self.log.append("notify_time_settings: %s" % time_settings.describe())
+
+    def notify_time_left(self, colour, clock):
+        self.log.append("notify_time_left -> %s: %r %r" %
+                        (colour, clock.time_left,
+                         clock.stones_left or clock.periods_left))
+
+    def get_move(self, colour):
+        durations = self.move_durations[colour]
+        if durations:
+            self.fake_time += durations.pop(0)
+        else:
+            self.fake_time += 1.0
+        return Testing_backend.get_move(self, colour)
+
+def test_game_runner_time_settings(tc):
+    fx = Game_runner_fixture(
+        tc, moves=[('b', 'C1'), ('w', 'D1'), ('b', 'C2'), ('w', 'D2')],
+        backend_cls=Timed_testing_backend)
+    fx.backend.install_fake_clock(fx.game_runner)
+    fx.backend.move_durations['b'] = [3, 10]
+    fx.game_runner.set_time_settings(
+        gameplay.Time_settings(5, 10, byo_yomi_stones=2))
+    fx.run_game()
+    tc.assertEqual(fx.backend.log[:8], [
+        "start_new_game: size=5, komi=11.0",
+        "notify_time_settings: 5s + 2/10 Canadian",
+        "notify_time_left -> b: 5.0 None",
+        "get_move <- b: move/C1",
+        "get_last_move_comment <- b",
+        "notify_move -> w C1",
+        "notify_time_left -> w: 5.0 None",
+        "get_move <- w: move/D1",
+        ])
+    tc.assertIn("notify_time_left -> b: 2.0 None", fx.backend.log)
+    tc.assertEqual(fx.game_runner.result.sgf_result, 'W+99')
+    tc.assertEqual(fx.sgf_string(), """\
+(;FF[4]AP[gomill:VER]CA[UTF-8]DT[***]GM[1]KM[11]OT[2/10 Canadian]RE[W+99]SZ[5]TM[5];B[ce]BL[2];W[de]WL[4];B[cd]BL[2]OB[1];W[dd]WL[3];B[tt]BL[10]OB[2];W[tt]WL[2])
+""")
+
+def test_game_runner_time_loss(tc):
+    fx = Game_runner_fixture(
+        tc, moves=[('b', 'C1'), ('w', 'D1'), ('b', 'C2'), ('w', 'D2')],
+        backend_cls=Timed_testing_backend)
+    fx.backend.install_fake_clock(fx.game_runner)
+    fx.backend.move_durations['w'] = [2, 4]
+    fx.game_runner.set_time_settings(gameplay.Time_settings(5))
+    fx.run_game()
+    result = fx.game_runner.result
+    tc.assertEqual(result.sgf_result, 'B+T')
+    tc.assertEqual(result.winning_colour, 'b')
+    tc.assertEqual(result.detail, "out of time")
+    tc.assertIs(result.is_forfeit, False)
+    tc.assertEqual(fx.game_runner.get_moves(), [
+        ('b', (0, 2), None),
+        ('w', (0, 3), None),
+        ('b', (1, 2), None),
+        ])
+    tc.assertEqual(fx.backend.log[-3:], [
+        "get_move <- w: move/D2",
+        "end_game",
+        "get_last_move_comment <- w",
+        ])
+    tc.assertEqual(fx.sgf_moves_and_comments(), [
+        "root: --", "b C1: --", "w D1: --", "b C2: --"])
+    tc.assertNotIn('OT', fx.sgf_string())
+
+def test_game_runner_time_settings_state_check(tc):
+    backend = Testing_backend(size=9, moves=[])
+    gr = gameplay.Game_runner(backend, board_size=9)
+    gr.prepare()
+    tc.assertRaises(gameplay.GameRunnerStateError,
+                    gr.set_time_settings, gameplay.Time_settings(5))
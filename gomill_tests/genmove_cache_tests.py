@@ -0,0 +1,90 @@
+"""Tests for genmove_caches.py"""
+
+import os
+
+from gomill import genmove_caches
+
+from gomill_tests import gomill_test_support
+
+def make_tests(suite):
+    suite.addTests(gomill_test_support.make_simple_tests(globals()))
+
+
+def test_make_cache_key(tc):
+    key = genmove_caches.make_cache_key("engine", 9, 7.5, 'b', ["w D4"])
+    tc.assertEqual(len(key), 32)
+    tc.assertEqual(
+        key, genmove_caches.make_cache_key("engine", 9, 7.5, 'b', ["w D4"]))
+    tc.assertNotEqual(
+        key, genmove_caches.make_cache_key("engine", 9, 7.5, 'w', ["w D4"]))
+    tc.assertNotEqual(
+        key, genmove_caches.make_cache_key("engine", 9, 6.5, 'b', ["w D4"]))
+    tc.assertNotEqual(
+        key, genmove_caches.make_cache_key("engine", 9, 7.5, 'b', []))
+    tc.assertNotEqual(
+        key, genmove_caches.make_cache_key("other", 9, 7.5, 'b', ["w D4"]))
+    tc.assertEqual(
+        genmove_caches.make_cache_key("engine", 9, 7, 'b', []),
+        genmove_caches.make_cache_key("engine", 9, 7.0, 'b', []))
+
+def test_genmove_cache(tc):
+    pathname = os.path.join(tc.sandbox(), "genmove.cache")
+    cache1 = genmove_caches.Genmove_cache(pathname)
+    cache2 = genmove_caches.Genmove_cache(pathname)
+    tc.assertIsNone(cache1.lookup("k1"))
+    cache1.store("k1", "D4")
+    tc.assertEqual(cache1.lookup("k1"), "d4")
+    tc.assertEqual(cache2.lookup("k1"), "d4")
+    # the first entry for a key wins
+    cache2.store("k2", "pass")
+    cache1.store("k2", "resign")
+    tc.assertEqual(cache1.lookup("k2"), "pass")
+    cache1.close()
+    cache2.close()
+    cache3 = genmove_caches.Genmove_cache(pathname)
+    tc.assertEqual(cache3.lookup("k1"), "d4")
+    tc.assertEqual(cache3.lookup("k2"), "pass")
+    cache3.close()
+    f = open(pathname)
+    tc.assertEqual(f.read(), "k1 d4\nk2 pass\n")
+    f.close()
+
+def test_genmove_cache_incomplete_line(tc):
+    pathname = os.path.join(tc.sandbox(), "genmove.cache")
+    f = open(pathname, "w")
+    f.write("k1 d4\nk2 pa")
+    f.close()
+    cache = genmove_caches.Genmove_cache(pathname)
+    tc.assertEqual(cache.lookup("k1"), "d4")
+    tc.assertIsNone(cache.lookup("k2"))
+    f = open(pathname, "a")
+    f.write("ss\n")
+    f.close()
+    tc.assertEqual(cache.lookup("k2"), "pass")
+    cache.close()
+
+def test_get_genmove_cache(tc):
+    pathname = os.path.join(tc.sandbox(), "genmove.cache")
+    cache = genmove_caches.get_genmove_cache(pathname)
+    tc.assertIs(genmove_caches.get_genmove_cache(pathname), cache)
+    tc.assertIsNot(genmove_caches.get_genmove_cache(pathname + "2"), cache)
+    genmove_caches.close_genmove_caches()
+    tc.assertIsNone(cache._fd)
+    cache2 = genmove_caches.get_genmove_cache(pathname)
+    tc.assertIsNot(cache2, cache)
+    genmove_caches.close_genmove_caches()
+
+def test_genmove_cache_without_fcntl(tc):
+    pathname = os.path.join(tc.sandbox(), "genmove.cache")
+    saved_fcntl = genmove_caches.fcntl
+    genmove_caches.fcntl = None
+    try:
+        cache = genmove_caches.Genmove_cache(pathname)
+        cache.store("k1", "D4")
+        tc.assertEqual(cache.lookup("k1"), "d4")
+        cache.close()
+        cache = genmove_caches.Genmove_cache(pathname)
+        tc.assertEqual(cache.lookup("k1"), "d4")
+        cache.close()
+    finally:
+        genmove_caches.fcntl = saved_fcntl
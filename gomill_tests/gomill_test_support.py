@@ -1,5 +1,8 @@
 """Gomill-specific test support code."""
 
+from __future__ import with_statement
+
+import os
 import re
 
 from gomill import __version__
@@ -116,6 +119,13 @@ def sgf_moves_and_comments_from_string(s):
     """Variant of sgf_moves_and_comments taking a string parameter."""
     return sgf_moves_and_comments(sgf.Sgf_game.from_string(s))
 
+def write_file(dirname, filename, contents):
+    """Write a file (in binary mode), returning its pathname."""
+    pathname = os.path.join(dirname, filename)
+    with open(pathname, "wb") as f:
+        f.write(contents)
+    return pathname
+
 
 traceback_line_re = re.compile(
     r"  .*/([a-z0-9_]+)\.pyc?:[0-9]+ \(([a-z0-9_]+)\)")
@@ -229,3 +239,21 @@ def make_simple_tests(source, prefix="test_"):
     """
     return test_framework.make_simple_tests(
         source, prefix, testcase_class=Gomill_SimpleTestCase)
+
+def make_multiprocessing_tests(check_fn, name):
+    """Make test cases running a check with and without multiprocessing.
+
+      check_fn -- function (tc, allow_mp)
+      name     -- string
+
+    Returns a list of two test cases, test_<name> (calling check_fn with
+    allow_mp=False) and test_<name>_multiprocessing (with allow_mp=True).
+
+    """
+    def make(allow_mp, suffix):
+        def fn(tc):
+            check_fn(tc, allow_mp)
+        fn.__name__ = "test_%s%s" % (name, suffix)
+        fn.__module__ = check_fn.__module__
+        return Gomill_SimpleTestCase(fn)
+    return [make(False, ""), make(True, "_multiprocessing")]
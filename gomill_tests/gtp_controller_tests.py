@@ -767,6 +767,26 @@ def test_subprocess_channel_with_controller(tc):
     rusage = channel.resource_usage
     tc.assertTrue(hasattr(rusage, 'ru_utime'))
 
+def test_subprocess_channel_memory_sampling(tc):
+    fx = gtp_engine_fixtures.State_reporter_fixture(tc)
+    channel = gtp_controller.Subprocess_gtp_channel(
+        fx.persistent_cmd, stderr=fx.devnull)
+    channel.enable_memory_sampling(0)
+    controller = Gtp_controller(channel, 'subprocess test')
+    # The engine is still running after responding to these
+    controller.do_command("tell")
+    controller.do_command("tell")
+    controller.close()
+    if os.path.exists("/proc/self/statm"):
+        tc.assertTrue(len(channel.memory_samples) >= 2)
+        tc.assertTrue(all(rss > 0 for rss in channel.memory_samples))
+    else:
+        tc.assertEqual(channel.memory_samples, [])
+    ru = gtp_controller.Engine_resource_usage(
+        channel.resource_usage, channel.memory_samples)
+    tc.assertTrue(ru.max_rss > 0)
+    tc.assertEqual(ru.memory_sample_count, len(channel.memory_samples))
+
 
 ### Game_controller
 
@@ -1114,6 +1134,17 @@ def test_game_controller_set_player_subprocess(tc):
     gc.close_players()
     tc.assertEqual(gc.get_resource_usage_cpu_times(),
                    {'b': 546.2, 'w': 567.2})
+    resource_usage = gc.get_resource_usage()
+    ru_b = resource_usage['b']
+    tc.assertEqual(ru_b.cpu_time, 546.2)
+    tc.assertEqual(ru_b.max_rss, 546*1024)
+    tc.assertEqual(ru_b.minor_faults, 5460)
+    tc.assertEqual(ru_b.major_faults, 3)
+    tc.assertEqual(ru_b.context_switches, 25)
+    tc.assertEqual(ru_b.memory_sample_count, 0)
+    tc.assertIsNone(ru_b.sampled_max_rss)
+    tc.assertIsNone(ru_b.sampled_mean_rss)
+    tc.assertEqual(resource_usage['w'].max_rss, 567*1024)
 
 def test_game_controller_set_player_subprocess_error(tc):
     msf = gtp_engine_fixtures.Mock_subprocess_fixture(tc)
@@ -1125,4 +1156,5 @@ def test_game_controller_set_player_subprocess_error(tc):
         "error starting subprocess for player one:\nexec forced to fail")
     tc.assertRaises(KeyError, gc.get_controller, 'b')
     tc.assertEqual(gc.get_resource_usage_cpu_times(), {'b' : None, 'w' : None})
+    tc.assertEqual(gc.get_resource_usage(), {'b' : None, 'w' : None})
 
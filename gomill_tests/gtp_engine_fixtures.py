@@ -259,6 +259,8 @@ class State_reporter_fixture(object):
     Attributes:
       pathname -- pathname of the state reporter python script
       cmd      -- command list suitable for use with suprocess.Popen
+      persistent_cmd -- command list for a state reporter which keeps
+                        running until it receives 'quit'
       devnull  -- file open for writing to /dev/null
 
     """
@@ -267,6 +269,7 @@ class State_reporter_fixture(object):
             os.path.join(os.path.dirname(__file__),
                          "subprocess_state_reporter.py"))
         self.cmd = ["python", self._pathname]
+        self.persistent_cmd = ["python", self._pathname, "--persist"]
         self.devnull = open(os.devnull, "w")
         tc.addCleanup(self.devnull.close)
 
@@ -310,10 +313,15 @@ class Mock_subprocess_gtp_channel(
         requested_stderr
         requested_cwd
         requested_env
+        requested_memory_sample_interval
 
     After close(), provides mocked-up exit_status and resource_usage, like a
     Subprocess_gtp_channel. The cpu time used is a function of command[0]
-    ('testb' gives user/system 546/0.2; 'testw' gives 567/0.2).
+    ('testb' gives user/system 546/0.2; 'testw' gives 567/0.2). So is the
+    maximum resident set size ('testb' gives 546MB; 'testw' gives 567MB).
+
+    If enable_memory_sampling() was called, memory_samples is set to half and
+    all of the maximum resident set size.
 
     """
     engine_registry = {}
@@ -325,6 +333,7 @@ class Mock_subprocess_gtp_channel(
         self.requested_stderr = stderr
         self.requested_cwd = cwd
         self.requested_env = env
+        self.requested_memory_sample_interval = None
         self.id = None
         engine = None
         callbacks = []
@@ -372,7 +381,13 @@ class Mock_subprocess_gtp_channel(
         self.exit_status = 0
         fake_time = sum(map(ord, self.requested_command[0]))
         self.resource_usage = Mock_resource_usage(
-            ru_utime=fake_time, ru_stime=0.2)
+            ru_utime=fake_time, ru_stime=0.2, ru_maxrss=fake_time*1024,
+            ru_minflt=fake_time*10, ru_majflt=3, ru_nvcsw=20, ru_nivcsw=5)
+        if self.requested_memory_sample_interval is not None:
+            self.memory_samples = [fake_time*512, fake_time*1024]
+
+    def enable_memory_sampling(self, interval):
+        self.requested_memory_sample_interval = interval
 
 
 class Mock_subprocess_fixture(object):
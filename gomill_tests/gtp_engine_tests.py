@@ -54,3 +54,50 @@ def test_run_gtp_session_broken_pipe(tc):
     command_pipe.close()
     response_pipe.close()
 
+
+def test_handle_line(tc):
+    def handle_test(args):
+        if args:
+            return "args: " + " ".join(args)
+        else:
+            return "test response"
+    def handle_messy(args):
+        return "a\tb\n\nc\x07  \n"
+    def handle_fail(args):
+        raise gtp_engine.GtpError("failed: " + " ".join(args))
+    def handle_empty(args):
+        return None
+
+    engine = gtp_engine.Gtp_engine_protocol()
+    engine.add_protocol_commands()
+    engine.add_command('test', handle_test)
+    engine.add_command('messy', handle_messy)
+    engine.add_command('fail', handle_fail)
+    engine.add_command('empty', handle_empty)
+
+    for line, expected in [
+        ("test\n", "= test response\n\n"),
+        ("test", "= test response\n\n"),
+        ("test ab  cd\n", "= args: ab cd\n\n"),
+        ("  test ab\n", "= args: ab\n\n"),
+        ("test\tab\n", "= args: ab\n\n"),
+        ("test ab\r\n", "= args: ab\n\n"),
+        ("te\x01st ab\n", "= args: ab\n\n"),
+        ("test ab # comment\n", "= args: ab\n\n"),
+        ("12 test ab\n", "=12 args: ab\n\n"),
+        ("12test ab\n", "=12 args: ab\n\n"),
+        ("-3 test\n", "= test response\n\n"),
+        ("messy\n", "= a b\n.\nc\n\n"),
+        ("fail x\n", "? failed: x\n\n"),
+        ("5 fail x\n", "?5 failed: x\n\n"),
+        ("empty\n", "=\n\n"),
+        ("xyzzy\n", "? unknown command\n\n"),
+        ("7 xyzzy\n", "?7 unknown command\n\n"),
+        ("\n", None),
+        ("   \n", None),
+        ("# comment\n", None),
+        ("12\n", None),
+        ]:
+        tc.assertEqual(engine.handle_line(line), (expected, False),
+                       "line %r" % line)
+    tc.assertEqual(engine.handle_line("quit\n"), ("=\n\n", True))
@@ -3,9 +3,12 @@
 from __future__ import with_statement
 
 import cPickle as pickle
+import os
 from textwrap import dedent
 
 from gomill import boards
+from gomill import gameplay
+from gomill import genmove_caches
 from gomill import gtp_controller
 from gomill import gtp_games
 from gomill.common import format_vertex
@@ -953,6 +956,108 @@ def test_move_callback(tc):
                    "b E1,w G1,b E2,w G2,b E3,w G3,b E4,w G4,b E5,w G5,b E6,"
                    "w G6,b E7,w G7,b E8,w G8,b E9,w G9,b pass,w pass")
 
+def test_time_settings(tc):
+    def handle_time_command(args):
+        return ""
+    fx = Gtp_game_fixture(tc)
+    fx.engine_b.add_command('time_settings', handle_time_command)
+    fx.engine_b.add_command('time_left', handle_time_command)
+    fx.game.set_time_settings(gameplay.Time_settings(600, 300, byo_yomi_stones=25))
+    fx.game.prepare()
+    fx.game.run()
+    tc.assertEqual(fx.engine_b.commands_handled[7:10], [
+        ('known_command', ['time_settings']),
+        ('time_settings', ['600', '300', '25']),
+        ('known_command', ['time_left']),
+        ])
+    tc.assertEqual(fx.engine_b.commands_handled[10],
+                   ('time_left', ['b', '600', '0']))
+    tc.assertEqual(fx.engine_b.commands_handled[11], ('genmove', ['b']))
+    tc.assertNotIn('time_left', [c for (c, args) in
+                                 fx.engine_w.commands_handled])
+    root = fx.sgf_root()
+    tc.assertEqual(root.get('TM'), 600)
+    tc.assertEqual(root.get('OT'), "25/300 Canadian")
+
+def test_time_settings_japanese(tc):
+    def handle_time_command(args):
+        return ""
+    fx = Gtp_game_fixture(tc)
+    fx.engine_b.add_command('kgs-time_settings', handle_time_command)
+    fx.engine_w.add_command('time_settings', handle_time_command)
+    fx.game.set_time_settings(
+        gameplay.Time_settings(60, 30, byo_yomi_style='japanese',
+                               byo_yomi_periods=5))
+    fx.game.prepare()
+    tc.assertIn(('kgs-time_settings', ['byoyomi', '60', '30', '5']),
+                fx.engine_b.commands_handled)
+    tc.assertIn(('time_settings', ['60', '30', '1']),
+                fx.engine_w.commands_handled)
+
+def test_genmove_cache(tc):
+    pathname = os.path.join(tc.sandbox(), "genmove.cache")
+    cache = genmove_caches.Genmove_cache(pathname)
+    tc.addCleanup(cache.close)
+    moves = [
+        ('b', 'C3'), ('w', 'D3'),
+        ('b', 'E3'), ('w', 'F3'),
+        ('b', 'resign'),
+        ]
+    fx = Gtp_game_fixture(
+        tc, Programmed_player(moves), Programmed_player(moves))
+    fx.game.set_genmove_cache('b', cache, "test engine")
+    fx.game.prepare()
+    fx.game.run()
+    tc.assertEqual(fx.game.result.sgf_result, "W+R")
+    tc.assertEqual(fx.game.get_genmove_cache_stats(), {'b' : (0, 3)})
+
+    # Black's engine would play differently, but the cache is used
+    moves2 = [
+        ('b', 'A1'), ('w', 'D3'),
+        ('b', 'A2'), ('w', 'F3'),
+        ('b', 'A3'),
+        ]
+    fx2 = Gtp_game_fixture(
+        tc, Programmed_player(moves2), Programmed_player(moves2))
+    fx2.game.set_genmove_cache('b', cache, "test engine")
+    fx2.game.prepare()
+    fx2.game.run()
+    tc.assertEqual(fx2.game.result.sgf_result, "W+R")
+    fx2.check_moves(moves[:-1])
+    tc.assertEqual(fx2.game.get_genmove_cache_stats(), {'b' : (3, 3)})
+    tc.assertEqual(fx2.player_b.seen_played, ['C3', 'D3', 'E3', 'F3'])
+    tc.assertNotIn('genmove', [c for (c, args) in
+                               fx2.engine_b.commands_handled])
+
+    # A different engine identity doesn't share the entries
+    fx3 = Gtp_game_fixture(
+        tc, Programmed_player(moves2), Programmed_player(moves2))
+    fx3.game.set_genmove_cache('b', cache, "other engine")
+    fx3.game.prepare()
+    fx3.game.run()
+    fx3.check_moves(moves2 + [('w', 'pass'), ('b', 'pass')])
+    tc.assertEqual(fx3.game.get_genmove_cache_stats(), {'b' : (0, 4)})
+
+def test_genmove_cache_play_rejected(tc):
+    pathname = os.path.join(tc.sandbox(), "genmove.cache")
+    cache = genmove_caches.Genmove_cache(pathname)
+    tc.addCleanup(cache.close)
+    moves = [('b', 'C3'), ('w', 'D3'), ('b', 'resign')]
+    fx = Gtp_game_fixture(
+        tc, Programmed_player(moves), Programmed_player(moves))
+    fx.game.set_genmove_cache('b', cache, "test engine")
+    fx.game.prepare()
+    fx.game.run()
+    fx2 = Gtp_game_fixture(
+        tc, Programmed_player(moves, reject=('C3', "no thanks")),
+        Programmed_player(moves))
+    fx2.game.set_genmove_cache('b', cache, "test engine")
+    fx2.game.prepare()
+    fx2.game.run()
+    fx2.check_moves(moves[:-1])
+    tc.assertEqual(fx2.game.get_genmove_cache_stats(), {'b' : (1, 2)})
+    tc.assertIn(('genmove', ['b']), fx2.engine_b.commands_handled)
+
 def test_gtp_cpu_time(tc):
     def handle_cpu_time_good(args):
         return "99.5"
@@ -990,6 +1095,19 @@ def test_game_result_cpu_time_pickle_compatibility(tc):
     result2 = pickle.loads(pickle.dumps(result))
     tc.assertEqual(result2.cpu_times, {'one' : 33.5, 'two' : None})
 
+def test_game_result_resource_usage_pickle_compatibility(tc):
+    fx = Gtp_game_fixture(tc)
+    fx.game.prepare()
+    fx.game.run()
+    result = fx.game.result
+    tc.assertEqual(result.resource_usage, {'one' : None, 'two' : None})
+    # Simulate a result pickled by an older version of gomill
+    state = result.__getstate__()[:8]
+    result2 = gtp_games.Game_result.__new__(gtp_games.Game_result)
+    result2.__setstate__(state)
+    tc.assertEqual(result2.resource_usage, {'one' : None, 'two' : None})
+    tc.assertEqual(result2.describe(), result.describe())
+
 
 def test_cautious_mode_setting(tc):
     fx = Gtp_game_fixture(tc)
@@ -2,6 +2,8 @@
 
 from __future__ import with_statement
 
+import threading
+
 from gomill import gtp_controller
 from gomill import gtp_proxy
 from gomill.gtp_engine import GtpError, GtpFatalError
@@ -133,6 +135,45 @@ def test_handle_command(tc):
     fx.check_command('xyzzy', ['error'],
                      "normal error", expect_failure=True)
 
+def test_response_cache(tc):
+    fx = Proxy_fixture(tc)
+    fx.proxy.enable_response_cache(static_commands=['test'],
+                                   position_commands=['multiline'])
+    fx.check_command('test', ['ab'], "args: ab")
+    fx.check_command('test', ['ab'], "args: ab")
+    fx.check_command('test', ['cd'], "args: cd")
+    tc.assertEqual(fx.proxy.pass_command('multiline', []),
+                   "first line  \n  second line\nthird line")
+    fx.check_command('multiline', [],
+                     "first line  \n  second line\nthird line")
+    # failure responses aren't cached, and other commands invalidate the
+    # position cache but not the static cache
+    fx.check_command('error', [], "normal error", expect_failure=True)
+    fx.check_command('error', [], "normal error", expect_failure=True)
+    fx.check_command('multiline', [],
+                     "first line  \n  second line\nthird line")
+    fx.check_command('test', ['ab'], "args: ab")
+    tc.assertEqual(
+        fx.commands_handled,
+        [('list_commands', []), ('test', ['ab']), ('test', ['cd']),
+         ('multiline', []), ('error', []), ('error', []), ('multiline', [])])
+    tc.assertEqual(fx.proxy.cache_hits, {'test' : 2, 'multiline' : 1})
+    tc.assertEqual(fx.proxy.cache_misses, {'test' : 2, 'multiline' : 2})
+
+def test_response_cache_defaults(tc):
+    fx = Proxy_fixture(tc)
+    fx.proxy.enable_response_cache()
+    fx.check_command('gomill-passthrough', ['known_command', 'test'], "true")
+    fx.check_command('gomill-passthrough', ['known_command', 'test'], "true")
+    fx.check_command('gomill-passthrough', ['protocol_version'], "2")
+    fx.check_command('gomill-passthrough', ['protocol_version'], "2")
+    tc.assertEqual(
+        fx.commands_handled,
+        [('list_commands', []), ('known_command', ['test']),
+         ('protocol_version', [])])
+    tc.assertEqual(fx.proxy.cache_hits,
+                   {'known_command' : 1, 'protocol_version' : 1})
+
 def test_handle_command_with_channel_error(tc):
     def handle_xyzzy(args):
         return fx.proxy.handle_command("test", [])
@@ -239,3 +280,128 @@ def test_set_back_end_subprocess_nonexistent_program(tc):
     tc.assertIsInstance(ar.exception.cause, GtpChannelError)
     # check it's safe to close when the controller was never set
     proxy.close()
+
+
+class Fanout_fixture(object):
+    """Fixture managing a Gtp_fanout_proxy with player engines as back ends.
+
+    Instantiate with a list of move lists, one for each back end (as for
+    Programmed_player), and any Gtp_fanout_proxy constructor arguments.
+
+    attributes:
+      proxy            -- Gtp_fanout_proxy
+      engine           -- the proxy engine
+      channels         -- list of Testing_gtp_channels
+      commands_handled -- list of commands_handled lists from the back ends
+
+    The back end engines support 'undo', which does nothing, and 'name', which
+    returns "back end <n>".
+
+    """
+    def __init__(self, tc, move_lists, **kwargs):
+        self.tc = tc
+        self.channels = []
+        self.commands_handled = []
+        controllers = []
+        for i, moves in enumerate(move_lists):
+            engine = gtp_engine_fixtures.make_player_engine(
+                gtp_engine_fixtures.Programmed_player(moves))
+            engine.add_command('undo', lambda args: None)
+            engine.add_command('name', lambda args, i=i: "back end %d" % i)
+            channel = gtp_controller_test_support.Testing_gtp_channel(engine)
+            self.channels.append(channel)
+            self.commands_handled.append(engine.commands_handled)
+            controllers.append(
+                gtp_controller.Gtp_controller(channel, 'testbackend%d' % i))
+        self.proxy = gtp_proxy.Gtp_fanout_proxy(**kwargs)
+        self.proxy.set_back_end_controllers(controllers)
+        self.engine = self.proxy.engine
+
+    def check_command(self, *args, **kwargs):
+        gtp_engine_test_support.check_engine(
+            self.tc, self.engine, *args, **kwargs)
+
+def test_fanout_proxy(tc):
+    release = threading.Event()
+    def slow_move():
+        release.wait()
+        return "C3"
+    fx = Fanout_fixture(tc, [[('w', slow_move), ('w', 'D5')],
+                             [('w', 'E5'), ('w', 'D5')]])
+    fx.check_command('boardsize', ['9'], "")
+    fx.check_command('play', ['b', 'D4'], "")
+    fx.check_command('genmove', ['w'], "E5")
+    # back end 0 is still thinking; this is queued for it
+    fx.check_command('play', ['b', 'F6'], "")
+    release.set()
+    fx.check_command('genmove', ['w'], "D5")
+    fx.proxy.close()
+    tc.assertEqual(
+        fx.commands_handled[0],
+        [('list_commands', []), ('boardsize', ['9']), ('play', ['b', 'D4']),
+         ('genmove', ['w']), ('undo', []), ('play', ['w', 'E5']),
+         ('play', ['b', 'F6']), ('genmove', ['w']), ('quit', [])])
+    tc.assertEqual(
+        fx.commands_handled[1],
+        [('boardsize', ['9']), ('play', ['b', 'D4']),
+         ('genmove', ['w']), ('play', ['b', 'F6']), ('genmove', ['w']),
+         ('quit', [])])
+    tc.assertTrue(fx.proxy.genmove_wins[1] >= 1)
+    tc.assertEqual(sum(fx.proxy.genmove_wins.values()), 2)
+    tc.assertEqual(fx.proxy.get_live_back_ends(), [0, 1])
+
+def test_fanout_proxy_voting(tc):
+    fx = Fanout_fixture(tc, [[('b', 'C3')], [('b', 'D4')], [('b', 'D4')]],
+                        quorum=3)
+    fx.check_command('genmove', ['b'], "D4")
+    fx.proxy.close()
+    # the winner is whichever D4 arrived first
+    tc.assertIn(fx.proxy.genmove_wins, [{1 : 1}, {2 : 1}])
+    tc.assertEqual(
+        fx.commands_handled[0][1:],
+        [('genmove', ['b']), ('undo', []), ('play', ['b', 'D4']),
+         ('quit', [])])
+    tc.assertEqual(fx.commands_handled[2], [('genmove', ['b']), ('quit', [])])
+
+def test_fanout_proxy_drops_inconsistent_back_end(tc):
+    release = threading.Event()
+    def slow_move():
+        release.wait()
+        return "C3"
+    fx = Fanout_fixture(tc, [[('b', 'D4')], [('b', slow_move)]])
+    fx.channels[1].engine.player.reject = ('E5', "illegal move")
+    fx.check_command('genmove', ['b'], "D4")
+    fx.check_command('play', ['w', 'E5'], "")
+    release.set()
+    fx.proxy.close()
+    tc.assertEqual(fx.proxy.get_live_back_ends(), [0])
+    tc.assertEqual(fx.proxy.get_dropped_back_ends(),
+                   [(1, "response to 'play' disagrees with back end 0")])
+    tc.assertEqual(
+        fx.commands_handled[1],
+        [('genmove', ['b']), ('undo', []), ('play', ['b', 'D4']),
+         ('play', ['w', 'E5']), ('quit', [])])
+
+def test_fanout_proxy_failures(tc):
+    fx = Fanout_fixture(tc, [[('b', 'fail')], [('b', 'fail')]])
+    fx.check_command('genmove', ['b'], "forced to fail", expect_failure=True)
+    fx.channels[0].fail_next_command = True
+    fx.check_command('name', [], "back end 1")
+    tc.assertEqual(fx.proxy.get_live_back_ends(), [1])
+    fx.check_command('name', [], "back end 1")
+    fx.channels[1].fail_next_command = True
+    fx.check_command('clear_board', [],
+                     "all back ends have failed:\n"
+                     "transport error sending 'clear_board' to "
+                     "testbackend1:\n"
+                     "forced failure for send_command_line",
+                     expect_failure=True, expect_end=True)
+    fx.check_command('name', [],
+                     "all back ends have failed:\n"
+                     "transport error sending 'name' to testbackend0:\n"
+                     "forced failure for send_command_line\n"
+                     "transport error sending 'clear_board' to "
+                     "testbackend1:\n"
+                     "forced failure for send_command_line",
+                     expect_failure=True, expect_end=True)
+    fx.proxy.close()
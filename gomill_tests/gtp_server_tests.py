@@ -0,0 +1,134 @@
+"""Tests for gtp_server.py"""
+
+from __future__ import with_statement
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+from gomill import gtp_engine
+from gomill import gtp_server
+
+from gomill_tests import gomill_test_support
+
+def make_tests(suite):
+    suite.addTests(gomill_test_support.make_simple_tests(globals()))
+
+
+class Counting_engine(gtp_engine.Gtp_engine_protocol):
+    """Engine whose 'count' command reports a per-session counter."""
+    def __init__(self):
+        gtp_engine.Gtp_engine_protocol.__init__(self)
+        self.add_protocol_commands()
+        self.add_command('count', self.handle_count)
+        self.counter = 0
+
+    def handle_count(self, args):
+        self.counter += 1
+        return str(self.counter)
+
+
+class Gtp_server_fixture(object):
+    """Fixture running a GTP server in a background thread.
+
+    attributes:
+      server        -- the server object
+      ended_engines -- list of engines whose sessions have ended
+
+    """
+    def __init__(self, tc, address, use_processes=False):
+        self.ended_engines = []
+        self.server = gtp_server.make_gtp_server(
+            Counting_engine, address, use_processes=use_processes,
+            end_session_callback=self.ended_engines.append)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval' : 0.01})
+        self.thread.start()
+        tc.addCleanup(self.stop)
+
+    def stop(self):
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        self.server = None
+
+    def connect(self):
+        """Open a connection to the server.
+
+        Returns a pair of file objects (reader, writer).
+
+        """
+        address = self.server.server_address
+        if isinstance(address, basestring):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.connect(address)
+        reader = sock.makefile('rb')
+        writer = sock.makefile('wb', 0)
+        sock.close()
+        return reader, writer
+
+def send_command(connection, line):
+    """Send a command line and return the response."""
+    reader, writer = connection
+    writer.write(line + "\n")
+    response = ""
+    while not response.endswith("\n\n"):
+        s = reader.readline()
+        if s == "":
+            raise EOFError
+        response += s
+    return response
+
+
+def test_tcp_sessions(tc):
+    fx = Gtp_server_fixture(tc, ('127.0.0.1', 0))
+    c1 = fx.connect()
+    c2 = fx.connect()
+    tc.assertEqual(send_command(c1, "count"), "= 1\n\n")
+    tc.assertEqual(send_command(c1, "count"), "= 2\n\n")
+    tc.assertEqual(send_command(c2, "count"), "= 1\n\n")
+    tc.assertEqual(send_command(c2, "3 xyzzy"), "?3 unknown command\n\n")
+    tc.assertEqual(send_command(c1, "quit"), "=\n\n")
+    tc.assertEqual(c1[0].read(), "")
+    tc.assertEqual(send_command(c2, "count"), "= 2\n\n")
+    c2[1].close()
+    c2[0].close()
+    fx.stop()
+    tc.assertEqual(sorted(engine.counter for engine in fx.ended_engines),
+                   [2, 2])
+
+def test_unix_sessions(tc):
+    dirname = tempfile.mkdtemp(prefix="gomill_test")
+    tc.addCleanup(shutil.rmtree, dirname)
+    pathname = os.path.join(dirname, "gtp.sock")
+    fx = Gtp_server_fixture(tc, pathname)
+    c1 = fx.connect()
+    c2 = fx.connect()
+    tc.assertEqual(send_command(c1, "count"), "= 1\n\n")
+    tc.assertEqual(send_command(c2, "count"), "= 1\n\n")
+    tc.assertEqual(send_command(c1, "count"), "= 2\n\n")
+    send_command(c1, "quit")
+    send_command(c2, "quit")
+    fx.stop()
+    tc.assertFalse(os.path.exists(pathname))
+
+def test_forking_sessions(tc):
+    fx = Gtp_server_fixture(tc, ('127.0.0.1', 0), use_processes=True)
+    c1 = fx.connect()
+    c2 = fx.connect()
+    tc.assertEqual(send_command(c1, "count"), "= 1\n\n")
+    tc.assertEqual(send_command(c2, "count"), "= 1\n\n")
+    tc.assertEqual(send_command(c1, "count"), "= 2\n\n")
+    send_command(c1, "quit")
+    send_command(c2, "quit")
+    tc.assertEqual(c1[0].read(), "")
+    tc.assertEqual(c2[0].read(), "")
+    fx.stop()
+    # The sessions ran in child processes
+    tc.assertEqual(fx.ended_engines, [])
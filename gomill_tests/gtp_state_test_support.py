@@ -60,15 +60,25 @@ class Testing_gtp_state(gtp_states.Gtp_state):
 
     This doesn't read from or write to the filesystem.
 
+    Public attributes for testing:
+      files_loaded -- list of pathnames passed to _load_file()
+
     """
     def __init__(self, *args, **kwargs):
         super(Testing_gtp_state, self).__init__(*args, **kwargs)
         self._file_contents = {}
+        self._file_versions = {}
+        self.files_loaded = []
 
     def _register_file(self, pathname, contents):
         self._file_contents[pathname] = contents
+        self._file_versions[pathname] = self._file_versions.get(pathname, 0) + 1
+
+    def _get_file_signature(self, pathname):
+        return self._file_versions.get(pathname)
 
     def _load_file(self, pathname):
+        self.files_loaded.append(pathname)
         try:
             return self._file_contents[pathname]
         except KeyError:
@@ -1,5 +1,6 @@
 """Tests for gtp_state.py."""
 
+import time
 from textwrap import dedent
 
 from gomill import boards
@@ -74,9 +75,8 @@ def test_gtp_state(tc):
     game_state = fx.player.last_game_state
     # default board size is min(acceptable_sizes)
     tc.assertEqual(game_state.size, 9)
-    b = boards.Board(9)
-    b.play(2, 0, 'b')
-    tc.assertEqual(game_state.board, b)
+    # The game state is a snapshot from before the move was played
+    tc.assertEqual(game_state.board, boards.Board(9))
     tc.assertEqual(game_state.komi, 0.0)
     tc.assertEqual(game_state.history_base, boards.Board(9))
     tc.assertEqual(game_state.move_history, [])
@@ -276,6 +276,186 @@ def test_undo(tc):
     fx.check_command('gomill-explain_last_move', [], "")
     fx.check_command('undo', [], "cannot undo", expect_failure=True)
 
+def test_game_state_snapshots(tc):
+    fx = Gtp_state_fixture(tc)
+    fx.check_command('play', ['B', 'E5'], "")
+    fx.player.set_next_move("C3")
+    fx.check_command('genmove', ['W'], "C3")
+    game_state = fx.player.last_game_state
+    board_before = game_state.board.copy()
+    fx.check_command('play', ['B', 'D4'], "")
+    fx.check_command('undo', [], "")
+    fx.check_command('undo', [], "")
+    fx.check_command('play', ['W', 'A1'], "")
+    tc.assertEqual(game_state.board, board_before)
+    tc.assertEqual(len(game_state.move_history), 1)
+    tc.assertEqual(game_state.move_history[0].move, (4, 4))
+    fx.check_command('genmove', ['B'], "pass")
+    tc.assertIs(fx.player.last_game_state.history_base,
+                game_state.history_base)
+
+def test_move_history_view(tc):
+    moves = [gtp_states.History_move('b', (2, 3)),
+             gtp_states.History_move('w', None),
+             gtp_states.History_move('b', (4, 4))]
+    view = gtp_states.Move_history_view(moves, 2)
+    moves.append(gtp_states.History_move('w', (0, 0)))
+    tc.assertEqual(len(view), 2)
+    tc.assertIs(view[0], moves[0])
+    tc.assertIs(view[-1], moves[1])
+    tc.assertRaises(IndexError, view.__getitem__, 2)
+    tc.assertRaises(IndexError, view.__getitem__, -3)
+    tc.assertEqual(view[:], moves[:2])
+    tc.assertEqual(view[::-1], [moves[1], moves[0]])
+    tc.assertEqual(view[1:5], [moves[1]])
+    tc.assertEqual(list(view), moves[:2])
+    tc.assertEqual(view, moves[:2])
+    tc.assertNotEqual(view, moves)
+    tc.assertEqual(view + [moves[3]], [moves[0], moves[1], moves[3]])
+    tc.assertEqual(gtp_states.get_last_move(view, 'b'), (True, None))
+    tc.assertEqual(gtp_states.get_last_move(view, 'w'), (False, None))
+    tc.assertEqual(gtp_states.get_last_move(
+        gtp_states.Move_history_view(moves, 3), 'w'), (True, (4, 4)))
+    tc.assertFalse(gtp_states.Move_history_view(moves, 0))
+
+def test_reset_to_moves_copies(tc):
+    fx = Gtp_state_fixture(tc)
+    history_moves = [gtp_states.History_move('b', (2, 3)),
+                     gtp_states.History_move('w', (4, 4))]
+    fx.gtp_state.reset_to_moves(history_moves)
+    history_moves.pop()
+    tc.assertEqual(len(fx.gtp_state.move_history), 2)
+    fx.check_command('undo', [], "")
+    tc.assertEqual(len(history_moves), 1)
+
+def test_undo_restores_ko(tc):
+    fx = Gtp_state_fixture(tc)
+    for colour, vertex in [
+        ('B', 'C4'), ('W', 'C3'), ('B', 'E4'), ('W', 'E3'), ('B', 'D5'),
+        ('W', 'D2'), ('B', 'A9'), ('W', 'D4'), ('B', 'D3')]:
+        fx.check_command('play', [colour, vertex], "")
+    fx.check_command('genmove', ['W'], "pass")
+    tc.assertEqual(fx.player.last_game_state.ko_point, (3, 3))
+    fx.check_command('play', ['B', 'J9'], "")
+    fx.check_command('genmove', ['W'], "pass")
+    tc.assertIsNone(fx.player.last_game_state.ko_point)
+    fx.check_command('undo', [], "")
+    fx.check_command('undo', [], "")
+    fx.check_command('undo', [], "")
+    fx.check_command('genmove', ['W'], "pass")
+    tc.assertEqual(fx.player.last_game_state.ko_point, (3, 3))
+    fx.check_command('undo', [], "")
+    fx.check_command('undo', [], "")
+    fx.check_command('showboard', [], dedent("""
+    9  #  .  .  .  .  .  .  .  .
+    8  .  .  .  .  .  .  .  .  .
+    7  .  .  .  .  .  .  .  .  .
+    6  .  .  .  .  .  .  .  .  .
+    5  .  .  .  #  .  .  .  .  .
+    4  .  .  #  o  #  .  .  .  .
+    3  .  .  o  .  o  .  .  .  .
+    2  .  .  .  o  .  .  .  .  .
+    1  .  .  .  .  .  .  .  .  .
+       A  B  C  D  E  F  G  H  J"""))
+
+class Pondering_player(object):
+    """Move generator and reply predictor for testing pondering.
+
+    The move generator plays the first empty point in the top row; the reply
+    predictor predicts the first empty point in the bottom row.
+
+    Public attributes:
+      log -- list of strings describing calls
+
+    If block_pondering is set, the move generator doesn't return while
+    pondering until it's cancelled.
+
+    """
+    def __init__(self):
+        self.log = []
+        self.block_pondering = False
+
+    def _first_empty(self, board, row):
+        for col in range(board.side):
+            if board.get(row, col) is None:
+                return (row, col)
+
+    def genmove(self, game_state, colour):
+        if game_state.is_pondering:
+            token = game_state.cancellation_token
+            if self.block_pondering:
+                while not token.is_cancelled():
+                    time.sleep(0.005)
+        result = gtp_states.Move_generator_result()
+        result.move = self._first_empty(game_state.board, game_state.size-1)
+        self.log.append("%s%s %s (%d moves)" % (
+            "ponder " if game_state.is_pondering else "",
+            colour, format_vertex(result.move), len(game_state.move_history)))
+        return result
+
+    def predict(self, game_state, colour):
+        result = gtp_states.Move_generator_result()
+        result.move = self._first_empty(game_state.board, 0)
+        self.log.append("predict %s %s" % (colour, format_vertex(result.move)))
+        return result
+
+def test_pondering(tc):
+    player = Pondering_player()
+    gtp_state = gtp_states.Gtp_state(player.genmove, acceptable_sizes=(9,))
+    gtp_state.enable_pondering(player.predict)
+    engine = gtp_engine.Gtp_engine_protocol()
+    engine.add_commands(gtp_state.get_handlers())
+    def check(command, args, expected):
+        gtp_engine_test_support.check_engine(tc, engine, command, args,
+                                             expected)
+    check('genmove', ['b'], "A9")
+    check('play', ['w', 'A1'], "")
+    check('genmove', ['b'], "B9")
+    tc.assertEqual(player.log[:3], [
+        "b A9 (0 moves)",
+        "predict w A1",
+        "ponder b B9 (2 moves)",
+        ])
+    # Wrong prediction
+    gtp_state._ponder.done.wait()
+    tc.assertEqual(player.log[3:], [
+        "predict w B1",
+        "ponder b C9 (4 moves)",
+        ])
+    del player.log[:]
+    check('play', ['w', 'J1'], "")
+    tc.assertIsNone(gtp_state._ponder)
+    check('genmove', ['b'], "C9")
+    tc.assertEqual(player.log[0], "b C9 (4 moves)")
+    # Pondering cancelled by undo
+    tc.assertIsNotNone(gtp_state._ponder)
+    check('undo', [], "")
+    tc.assertIsNone(gtp_state._ponder)
+
+def test_pondering_cancelled_by_time(tc):
+    player = Pondering_player()
+    player.block_pondering = True
+    gtp_state = gtp_states.Gtp_state(player.genmove, acceptable_sizes=(9,))
+    gtp_state.enable_pondering(player.predict)
+    engine = gtp_engine.Gtp_engine_protocol()
+    engine.add_commands(gtp_state.get_handlers())
+    engine.add_commands(gtp_state.get_time_handlers())
+    def check(command, args, expected):
+        gtp_engine_test_support.check_engine(tc, engine, command, args,
+                                             expected)
+    check('genmove', ['b'], "A9")
+    check('play', ['w', 'A1'], "")
+    check('time_left', ['b', '1', '20'], "")
+    check('genmove', ['b'], "B9")
+    # The genmove starts a new ponder, which may already have logged its
+    # prediction
+    tc.assertEqual(player.log[:3], [
+        "b A9 (0 moves)",
+        "predict w A1",
+        "ponder b B9 (2 moves)",
+        ])
+    gtp_state._discard_ponder()
+
 def test_fixed_handicap(tc):
     fx = Gtp_state_fixture(tc)
     fx.check_command('fixed_handicap', ['3'], "C3 G7 C7")
@@ -497,6 +677,68 @@ def test_loadsgf(tc):
     1  .  .  .  .  .  .  .  .  .
        A  B  C  D  E  F  G  H  J"""))
 
+def test_loadsgf_cache(tc):
+    fx = Gtp_state_fixture(tc)
+    fx.gtp_state.checkpoint_interval = 2
+    fx.gtp_state._register_file(
+        "test1.sgf",
+        "(;SZ[9];B[ee];W[eg];B[dg];W[dh];B[df];W[fh];B[];W[])")
+    fx.gtp_state._register_file("test2.sgf", "(;SZ[9];B[aa])")
+    moves_recorded = []
+    original_record_move = fx.gtp_state.record_move
+    def record_move(history_move):
+        moves_recorded.append(format_vertex(history_move.move))
+        original_record_move(history_move)
+    fx.gtp_state.record_move = record_move
+
+    fx.check_command('loadsgf', ["test1.sgf", "6"], "")
+    tc.assertEqual(moves_recorded, ["E5", "E3", "D3", "D2", "D4"])
+    del moves_recorded[:]
+    fx.check_command('loadsgf', ["test1.sgf", "7"], "")
+    tc.assertEqual(moves_recorded, ["D4", "F2"])
+    del moves_recorded[:]
+    fx.check_command('loadsgf', ["test1.sgf", "4"], "")
+    tc.assertEqual(moves_recorded, ["D3"])
+    tc.assertEqual(fx.gtp_state.files_loaded, ["test1.sgf"])
+    fx.check_command('showboard', [], dedent("""
+    9  .  .  .  .  .  .  .  .  .
+    8  .  .  .  .  .  .  .  .  .
+    7  .  .  .  .  .  .  .  .  .
+    6  .  .  .  .  .  .  .  .  .
+    5  .  .  .  .  #  .  .  .  .
+    4  .  .  .  .  .  .  .  .  .
+    3  .  .  .  #  o  .  .  .  .
+    2  .  .  .  .  .  .  .  .  .
+    1  .  .  .  .  .  .  .  .  .
+       A  B  C  D  E  F  G  H  J"""))
+    # undo past the checkpoint
+    fx.check_command('undo', [], "")
+    fx.check_command('undo', [], "")
+    fx.check_command('showboard', [], dedent("""
+    9  .  .  .  .  .  .  .  .  .
+    8  .  .  .  .  .  .  .  .  .
+    7  .  .  .  .  .  .  .  .  .
+    6  .  .  .  .  .  .  .  .  .
+    5  .  .  .  .  #  .  .  .  .
+    4  .  .  .  .  .  .  .  .  .
+    3  .  .  .  .  .  .  .  .  .
+    2  .  .  .  .  .  .  .  .  .
+    1  .  .  .  .  .  .  .  .  .
+       A  B  C  D  E  F  G  H  J"""))
+
+    fx.gtp_state.sgf_cache_size = 1
+    fx.check_command('loadsgf', ["test2.sgf"], "")
+    fx.check_command('loadsgf', ["test2.sgf"], "")
+    fx.check_command('loadsgf', ["test1.sgf", "3"], "")
+    tc.assertEqual(fx.gtp_state.files_loaded,
+                   ["test1.sgf", "test2.sgf", "test1.sgf"])
+    # File changed
+    fx.gtp_state._register_file("test1.sgf", "(;SZ[9];B[aa];W[bb])")
+    fx.check_command('loadsgf', ["test1.sgf"], "")
+    tc.assertEqual(fx.gtp_state.files_loaded,
+                   ["test1.sgf", "test2.sgf", "test1.sgf", "test1.sgf"])
+    tc.assertEqual(len(fx.gtp_state.move_history), 2)
+
 def test_savesgf(tc):
     scrub_sgf = gomill_test_support.scrub_sgf
 
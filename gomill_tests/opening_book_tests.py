@@ -0,0 +1,188 @@
+"""Tests for opening_books.py"""
+
+from __future__ import with_statement
+
+import os
+
+from gomill import boards
+from gomill import gtp_controller
+from gomill import opening_books
+from gomill import sgf
+
+from gomill_tests import gomill_test_support
+from gomill_tests import gtp_controller_test_support
+from gomill_tests import gtp_engine_fixtures
+from gomill_tests import gtp_engine_test_support
+
+def make_tests(suite):
+    suite.addTests(gomill_test_support.make_simple_tests(globals()))
+
+
+def transform(point):
+    """Reflect a 9x9 point in the anti-diagonal."""
+    row, col = point
+    return (8-col, 8-row)
+
+def make_board(black_points, white_points):
+    board = boards.Board(9)
+    board.apply_setup(black_points, white_points, [])
+    return board
+
+def test_canonical_key(tc):
+    b1 = make_board([(2, 3), (6, 6)], [(3, 3)])
+    b2 = make_board([transform((2, 3)), transform((6, 6))],
+                    [transform((3, 3))])
+    key1, t1 = opening_books.get_canonical_key(b1, 'b')
+    key2, t2 = opening_books.get_canonical_key(b2, 'b')
+    tc.assertEqual(len(key1), 8)
+    tc.assertEqual(key1, key2)
+    tc.assertEqual(t1(1, 5), t2(*transform((1, 5))))
+    key3, _ = opening_books.get_canonical_key(b1, 'w')
+    tc.assertNotEqual(key1, key3)
+    b1.play(0, 0, 'b')
+    key4, _ = opening_books.get_canonical_key(b1, 'b')
+    tc.assertNotEqual(key1, key4)
+
+def test_build_and_lookup(tc):
+    b1 = make_board([(2, 3)], [])
+    b2 = make_board([transform((2, 3))], [])
+    builder = opening_books.Opening_book_builder()
+    builder.add_position(b1, 'w', (5, 6))
+    builder.add_position(b1, 'w', (5, 6))
+    builder.add_position(b2, 'w', transform((5, 6)))
+    builder.add_position(b1, 'w', (1, 1))
+    builder.add_position(b1, 'b', None)
+    pathname = os.path.join(tc.sandbox(), "test.book")
+    builder.write(pathname)
+    book = opening_books.Opening_book(pathname)
+    tc.addCleanup(book.close)
+    tc.assertEqual(book.record_count, 3)
+    tc.assertEqual(book.get_moves(b1, 'w'), [((5, 6), 3), ((1, 1), 1)])
+    tc.assertEqual(book.get_moves(b2, 'w'),
+                   [(transform((5, 6)), 3), (transform((1, 1)), 1)])
+    tc.assertEqual(book.get_moves(b1, 'b'), [(None, 1)])
+    tc.assertEqual(book.get_moves(boards.Board(9), 'b'), [])
+
+    pathname2 = os.path.join(tc.sandbox(), "test2.book")
+    builder.write(pathname2, min_count=2)
+    book2 = opening_books.Opening_book(pathname2)
+    tc.addCleanup(book2.close)
+    tc.assertEqual(book2.get_moves(b2, 'w'), [(transform((5, 6)), 3)])
+    tc.assertEqual(book2.get_moves(b1, 'b'), [])
+
+def test_add_game(tc):
+    builder = opening_books.Opening_book_builder(max_moves=2)
+    builder.add_game(sgf.Sgf_game.from_string(
+        "(;SZ[9];B[ee];W[cg];B[gc])"))
+    builder.add_game(sgf.Sgf_game.from_string(
+        "(;SZ[9];B[ee];W[gc];B[cg])"))
+    tc.assertEqual(builder.games_added, 2)
+    pathname = os.path.join(tc.sandbox(), "test.book")
+    builder.write(pathname)
+    book = opening_books.Opening_book(pathname)
+    tc.addCleanup(book.close)
+    tc.assertEqual(book.get_moves(boards.Board(9), 'b'), [((4, 4), 2)])
+    board = make_board([(4, 4)], [])
+    ((move, count),) = book.get_moves(board, 'w')
+    tc.assertEqual(count, 2)
+    tc.assertIn(move, [(2, 2), (2, 6), (6, 2), (6, 6)])
+    board.play(2, 2, 'w')
+    tc.assertEqual(book.get_moves(board, 'b'), [])
+
+def test_bad_book_file(tc):
+    pathname = os.path.join(tc.sandbox(), "bad.book")
+    with open(pathname, "wb") as f:
+        f.write("GMLBOOK1\x01\x00\x00\x00")
+    with tc.assertRaises(ValueError) as ar:
+        opening_books.Opening_book(pathname)
+    tc.assertEqual(str(ar.exception), "not an opening book: %s" % pathname)
+    with open(pathname, "wb") as f:
+        f.write("xyzzy")
+    tc.assertRaises(ValueError, opening_books.Opening_book, pathname)
+
+
+class Book_proxy_fixture(object):
+    """Fixture managing an Opening_book_proxy with a player engine back end.
+
+    attributes:
+      proxy            -- Opening_book_proxy
+      engine           -- the proxy engine
+      player           -- the back end's Programmed_player
+      commands_handled -- from the back end
+
+    """
+    def __init__(self, tc, sgf_strings, moves, reject=None):
+        self.tc = tc
+        builder = opening_books.Opening_book_builder()
+        for s in sgf_strings:
+            builder.add_game(sgf.Sgf_game.from_string(s))
+        pathname = os.path.join(tc.sandbox(), "test.book")
+        builder.write(pathname)
+        book = opening_books.Opening_book(pathname)
+        tc.addCleanup(book.close)
+        self.player = gtp_engine_fixtures.Programmed_player(moves, reject)
+        engine = gtp_engine_fixtures.make_player_engine(self.player)
+        self.commands_handled = engine.commands_handled
+        channel = gtp_controller_test_support.Testing_gtp_channel(engine)
+        controller = gtp_controller.Gtp_controller(channel, 'testbackend')
+        self.proxy = opening_books.Opening_book_proxy(book)
+        self.proxy.set_back_end_controller(controller)
+        self.engine = self.proxy.engine
+
+    def check_command(self, *args, **kwargs):
+        gtp_engine_test_support.check_engine(
+            self.tc, self.engine, *args, **kwargs)
+
+def test_book_proxy(tc):
+    fx = Book_proxy_fixture(tc, ["(;SZ[9];B[ee];W[cg];B[gc])"],
+                            [('w', 'J9'), ('b', 'B2')])
+    fx.check_command('boardsize', ['9'], "")
+    fx.check_command('clear_board', [], "")
+    fx.check_command('genmove', ['b'], "E5")
+    fx.check_command('play', ['w', 'C3'], "")
+    fx.check_command('genmove', ['b'], "G7")
+    fx.check_command('genmove', ['w'], "J9")
+    fx.check_command('genmove', ['b'], "B2")
+    tc.assertEqual(fx.proxy.book_moves_made, 2)
+    tc.assertEqual(fx.commands_handled, [
+        ('list_commands', []),
+        ('boardsize', ['9']),
+        ('clear_board', []),
+        ('play', ['b', 'E5']),
+        ('play', ['w', 'C3']),
+        ('play', ['b', 'G7']),
+        ('genmove', ['w']),
+        ('genmove', ['b']),
+        ])
+    # back in book after clear_board
+    fx.check_command('clear_board', [], "")
+    fx.check_command('genmove', ['b'], "E5")
+    tc.assertEqual(fx.proxy.book_moves_made, 3)
+
+def test_book_proxy_symmetry(tc):
+    fx = Book_proxy_fixture(tc, ["(;SZ[9];B[cg];W[gc];B[gg])"], [])
+    fx.check_command('boardsize', ['9'], "")
+    fx.check_command('play', ['b', 'G7'], "")
+    fx.check_command('genmove', ['w'], "C3")
+    fx.check_command('play', ['b', 'G3'], "")
+    fx.check_command('genmove', ['w'], "pass")
+    tc.assertEqual(fx.proxy.book_moves_made, 1)
+
+def test_book_proxy_rejected_move(tc):
+    fx = Book_proxy_fixture(tc, ["(;SZ[9];B[ee])"], [('b', 'B2')],
+                            reject=('E5', "no thanks"))
+    fx.check_command('boardsize', ['9'], "")
+    fx.check_command('genmove', ['b'], "B2")
+    tc.assertEqual(fx.proxy.book_moves_made, 0)
+    tc.assertEqual(fx.commands_handled[2:], [
+        ('play', ['b', 'E5']),
+        ('genmove', ['b']),
+        ])
+
+def test_book_proxy_unknown_position(tc):
+    fx = Book_proxy_fixture(tc, ["(;SZ[9];B[ee])"], [('b', 'B2')])
+    # no boardsize yet
+    fx.check_command('genmove', ['b'], "B2")
+    fx.check_command('boardsize', ['9'], "")
+    fx.check_command('genmove', ['b'], "E5")
+    tc.assertEqual(fx.proxy.book_moves_made, 1)
@@ -283,6 +283,7 @@ def test_play(tc):
                                   't2 engine\ntest \xc2\xa3description'),
         }
     response1.game_data = job1.game_data
+    response1.genmove_cache_stats = {'t2' : (3, 8)}
     fx.comp.process_game_result(response1)
 
     expected_report = dedent("""\
@@ -296,6 +297,7 @@ def test_play(tc):
     player t1: t1 engine:v1.2.3
     player t2: t2 engine
     test \xc2\xa3description
+    player t2 genmove cache: 3 hits from 8 lookups (37.5%)
     """)
     fx.check_screen_report(expected_report)
     fx.check_short_report(expected_report, expected_players)
@@ -584,3 +586,40 @@ def test_matchup_reappearance(tc):
     check_screen_report(tc, comp3, expected_matchups_3)
     check_short_report(tc, comp3, expected_matchups_3, expected_fake_players)
 
+
+def test_time_settings(tc):
+    config = default_config()
+    config['main_time'] = 600
+    config['byo_yomi_time'] = 30
+    config['byo_yomi_style'] = 'japanese'
+    config['byo_yomi_periods'] = 5
+    config['matchups'].append(Matchup_config('t2', 't1', main_time=None))
+    fx = Playoff_fixture(tc, config)
+    tr = fx.comp.get_tournament_results()
+    m0 = tr.get_matchup('0')
+    tc.assertEqual(m0.time_settings.main_time, 600.0)
+    tc.assertEqual(m0.describe_details(),
+                   "board size: 13   komi: 7.5   "
+                   "time: 600s + 5x30 byo-yomi")
+    tc.assertIsNone(tr.get_matchup('1').time_settings)
+    job = fx.comp.get_game()
+    tc.assertIs(job.time_settings, m0.time_settings)
+
+def test_matchup_without_time_settings(tc):
+    # Matchups unpickled from a status file written by gomill 0.8.2 have no
+    # time_settings attribute
+    fx = Playoff_fixture(tc)
+    m0 = fx.comp.get_tournament_results().get_matchup('0')
+    del m0.time_settings
+    m0 = pickle.loads(pickle.dumps(m0))
+    tc.assertIsNone(m0.time_settings)
+    tc.assertEqual(m0.describe_details(), "board size: 13   komi: 7.5")
+
+def test_bad_time_settings(tc):
+    comp = playoffs.Playoff('test')
+    config = default_config()
+    config['matchups'].append(Matchup_config('t1', 't2', main_time=-1))
+    with tc.assertRaises(ControlFileError) as ar:
+        comp.initialise_from_control_file(config)
+    tc.assertMultiLineEqual(str(ar.exception), dedent("""\
+    matchup 1: bad time settings: negative main_time"""))
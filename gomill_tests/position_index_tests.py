@@ -0,0 +1,207 @@
+"""Tests for position_index.py."""
+
+from __future__ import with_statement
+
+import os
+
+from gomill_tests import gomill_test_support
+
+from gomill import boards
+from gomill import position_index
+
+def make_tests(suite):
+    suite.addTests(gomill_test_support.make_simple_tests(globals()))
+    suite.addTests(gomill_test_support.make_multiprocessing_tests(
+        check_index, "update_position_index"))
+
+
+GAME1 = "(;SZ[9];B[cc];W[gg];B[cg])"
+# GAME1 reflected, with an extra move
+GAME2 = "(;SZ[9];B[gc];W[cg];B[gg];W[ee])"
+GAME3 = "(;SZ[9]AB[aa];W[ba];B[ab])"
+
+def make_board(size, black, white):
+    board = boards.Board(size)
+    for (row, col) in black:
+        board.play(row, col, 'b')
+    for (row, col) in white:
+        board.play(row, col, 'w')
+    return board
+
+def test_get_position_key(tc):
+    board1 = make_board(9, [(2, 3)], [(4, 4)])
+    # rotated
+    board2 = make_board(9, [(3, 6)], [(4, 4)])
+    # reflected
+    board3 = make_board(9, [(2, 5)], [(4, 4)])
+    # colours swapped
+    board4 = make_board(9, [(4, 4)], [(2, 3)])
+    key = position_index.get_position_key(board1)
+    tc.assertEqual(len(key), 8)
+    tc.assertEqual(position_index.get_position_key(board2), key)
+    tc.assertEqual(position_index.get_position_key(board3), key)
+    tc.assertNotEqual(position_index.get_position_key(board4), key)
+    tc.assertNotEqual(
+        position_index.get_position_key(make_board(13, [(2, 3)], [(4, 4)])),
+        key)
+
+def check_index(tc, allow_mp):
+    dirname = tc.sandbox()
+    sgf_dir = os.path.join(dirname, "games")
+    os.mkdir(sgf_dir)
+    p1 = gomill_test_support.write_file(sgf_dir, "g1.sgf", GAME1)
+    p2 = gomill_test_support.write_file(
+        sgf_dir, "g2.sgf", "(;SZ[9]AB[aa];B[aa])\n" + GAME2 + "\n(;B[aa]")
+    index_pathname = os.path.join(dirname, "positions.idx")
+    game_count, errors = position_index.update_position_index(
+        index_pathname, [sgf_dir], max_workers=2, allow_mp=allow_mp)
+    tc.assertEqual(game_count, 3)
+    tc.assertEqual(errors, [
+        "%s: error parsing game 2: unexpected end of SGF data" % p2])
+    index = position_index.Position_index(index_pathname)
+    tc.addCleanup(index.close)
+    tc.assertEqual(index.game_count, 3)
+    # 4 + 1 (stopping at the illegal move) + 5 positions
+    tc.assertEqual(index.record_count, 10)
+    # position after B[cc] W[gg], rotated
+    board = make_board(9, [(2, 6)], [(6, 2)])
+    tc.assertEqual(sorted(index.find(board)), [(p1, 0, 2), (p2, 1, 2)])
+    # position after B[cc] W[gg] B[cg], reflected
+    board = make_board(9, [(6, 2), (2, 2)], [(6, 6)])
+    tc.assertEqual(sorted(index.find(board)), [(p1, 0, 3), (p2, 1, 3)])
+    board.play(4, 4, 'w')
+    tc.assertEqual(index.find(board), [(p2, 1, 4)])
+    tc.assertEqual(len(index.find(boards.Board(9))), 2)
+    tc.assertEqual(index.find(boards.Board(19)), [])
+
+def test_incremental_update(tc):
+    dirname = tc.sandbox()
+    index_pathname = os.path.join(dirname, "positions.idx")
+    p1 = gomill_test_support.write_file(dirname, "g1.sgf", GAME1)
+    p2 = gomill_test_support.write_file(dirname, "g2.sgf", GAME2)
+    tc.assertEqual(position_index.update_position_index(
+        index_pathname, [dirname], allow_mp=False), (2, []))
+    # Nothing has changed
+    tc.assertEqual(position_index.update_position_index(
+        index_pathname, [dirname], allow_mp=False), (0, []))
+    # New file (the sort of thing the ringmaster does)
+    p3 = gomill_test_support.write_file(dirname, "g3.sgf", GAME3)
+    tc.assertEqual(position_index.update_position_index(
+        index_pathname, [dirname], allow_mp=False), (1, []))
+    index = position_index.Position_index(index_pathname)
+    tc.assertEqual(index.game_count, 3)
+    tc.assertEqual(index.find(make_board(9, [(8, 0), (7, 0)], [(8, 1)])),
+                   [(p3, 0, 2)])
+    tc.assertEqual(len(index.find(boards.Board(9))), 2)
+    index.close()
+    # Changed and removed files
+    gomill_test_support.write_file(dirname, "g1.sgf", GAME3)
+    st = os.stat(p1)
+    os.utime(p1, (st.st_atime, st.st_mtime + 10))
+    os.remove(p2)
+    tc.assertEqual(position_index.update_position_index(
+        index_pathname, [dirname], allow_mp=False), (1, []))
+    index = position_index.Position_index(index_pathname)
+    tc.addCleanup(index.close)
+    tc.assertEqual(index.game_count, 2)
+    tc.assertEqual(index.record_count, 6)
+    tc.assertEqual(index.find(boards.Board(9)), [])
+    tc.assertEqual(index.find(make_board(9, [(8, 0), (7, 0)], [(8, 1)])),
+                   [(p3, 0, 2), (p1, 0, 2)])
+    # The file was rewritten, with the games renumbered
+    m, state = position_index._open_index_file(index_pathname)
+    m.close()
+    tc.assertEqual([segment[4:] for segment in state['segments']], [(0, 2)])
+    tc.assertEqual(sorted(state['sources']), [p1, p3])
+    tc.assertEqual(sorted(os.listdir(dirname)),
+                   ["g1.sgf", "g3.sgf", "positions.idx"])
+
+def test_append_update(tc):
+    dirname = tc.sandbox()
+    index_pathname = os.path.join(dirname, "positions.idx")
+    gomill_test_support.write_file(dirname, "g1.sgf", GAME1)
+    position_index.update_position_index(
+        index_pathname, [dirname], allow_mp=False)
+    with open(index_pathname, "rb") as f:
+        old_contents = f.read()
+    # Nothing has changed: the file isn't written
+    position_index.update_position_index(
+        index_pathname, [dirname], allow_mp=False)
+    with open(index_pathname, "rb") as f:
+        tc.assertEqual(f.read(), old_contents)
+    # New file: the new games are appended, and only the header is
+    # overwritten
+    pathnames = [gomill_test_support.write_file(dirname, "h0.sgf", GAME2)]
+    tc.assertEqual(position_index.update_position_index(
+        index_pathname, [dirname], allow_mp=False), (1, []))
+    with open(index_pathname, "rb") as f:
+        contents = f.read()
+    header_size = position_index._header_struct.size
+    tc.assertTrue(len(contents) > len(old_contents))
+    tc.assertEqual(contents[header_size:len(old_contents)],
+                   old_contents[header_size:])
+    for i in range(1, 6):
+        pathnames.append(gomill_test_support.write_file(
+            dirname, "h%d.sgf" % i, GAME2))
+        tc.assertEqual(position_index.update_position_index(
+            index_pathname, [dirname], allow_mp=False), (1, []))
+        # Small segments are merged
+        m, state = position_index._open_index_file(index_pathname)
+        m.close()
+        tc.assertTrue(len(state['segments']) <= 2)
+    index = position_index.Position_index(index_pathname)
+    tc.addCleanup(index.close)
+    tc.assertEqual(index.game_count, 7)
+    tc.assertEqual(index.record_count, 34)
+    board = make_board(9, [(6, 2), (2, 2)], [(6, 6)])
+    tc.assertEqual(index.find(board),
+                   [(os.path.join(dirname, "g1.sgf"), 0, 3)] +
+                   [(pathname, 0, 3) for pathname in pathnames])
+
+def test_spilled_runs(tc):
+    # The new records don't all fit in memory
+    saved_max_run_records = position_index._max_run_records
+    position_index._max_run_records = 3
+    try:
+        check_index(tc, allow_mp=False)
+    finally:
+        position_index._max_run_records = saved_max_run_records
+    tc.assertEqual(sorted(os.listdir(tc.sandbox())),
+                   ["games", "positions.idx"])
+
+def test_file_without_games(tc):
+    dirname = tc.sandbox()
+    index_pathname = os.path.join(dirname, "positions.idx")
+    p1 = gomill_test_support.write_file(dirname, "g1.sgf", GAME1)
+    tc.assertEqual(position_index.update_position_index(
+        index_pathname, [p1], allow_mp=False), (1, []))
+    # The file changes, and now has no usable games
+    gomill_test_support.write_file(dirname, "g1.sgf", "(;SZ[9];B[zz])")
+    st = os.stat(p1)
+    os.utime(p1, (st.st_atime, st.st_mtime + 10))
+    tc.assertEqual(position_index.update_position_index(
+        index_pathname, [p1], allow_mp=False),
+        (0, ["%s: game 0: bad B property: zz" % p1]))
+    # It isn't reread
+    tc.assertEqual(position_index.update_position_index(
+        index_pathname, [p1], allow_mp=False), (0, []))
+    index = position_index.Position_index(index_pathname)
+    tc.addCleanup(index.close)
+    tc.assertEqual(index.game_count, 0)
+    tc.assertEqual(index.record_count, 0)
+
+def test_bad_index_file(tc):
+    dirname = tc.sandbox()
+    index_pathname = gomill_test_support.write_file(
+        dirname, "positions.idx", "nonsense")
+    with tc.assertRaises(ValueError) as ar:
+        position_index.Position_index(index_pathname)
+    tc.assertEqual(str(ar.exception),
+                   "not a position index: %s" % index_pathname)
+    # An invalid index is rebuilt
+    p1 = gomill_test_support.write_file(dirname, "g1.sgf", GAME1)
+    tc.assertEqual(position_index.update_position_index(
+        index_pathname, [p1], allow_mp=False), (1, []))
+    index = position_index.Position_index(index_pathname)
+    tc.addCleanup(index.close)
+    tc.assertEqual(index.record_count, 4)
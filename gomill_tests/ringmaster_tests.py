@@ -9,6 +9,8 @@ from gomill_tests import ringmaster_test_support
 from gomill_tests import gtp_engine_fixtures
 from gomill_tests.playoff_tests import fake_response
 
+from gomill import game_stores
+from gomill import sgf
 from gomill.ringmasters import RingmasterError
 
 def make_tests(suite):
@@ -227,6 +229,37 @@ def test_settings(tc):
     tc.assertEqual(fx.ringmaster.get_sgf_filename("0_000"), "0_000.sgf")
     tc.assertEqual(fx.ringmaster.get_sgf_pathname("0_000"),
                    "/nonexistent/ctl/test.games/0_000.sgf")
+    tc.assertIsNone(job.game_store_pathname)
+
+def test_record_format_setting(tc):
+    fx = Ringmaster_fixture(tc, playoff_ctl, [
+        "record_games = True",
+        "record_format = 'store'",
+        ])
+    job = fx.get_job()
+    tc.assertEqual(job.game_store_pathname, '/nonexistent/ctl/test.gamestore')
+    tc.assertIsNone(job.sgf_dirname)
+    tc.assertEqual(job.sgf_filename, '0_000.sgf')
+    tc.assertEqual(job.void_sgf_dirname, '/nonexistent/ctl/test.void')
+
+def test_export_games(tc):
+    fx = Ringmaster_fixture(tc, playoff_ctl, [
+        "record_games = True",
+        "record_format = 'store'",
+        ])
+    dirname = tc.sandbox()
+    ringmaster = fx.ringmaster
+    ringmaster.game_store_pathname = os.path.join(dirname, "test.gamestore")
+    ringmaster.sgf_dir_pathname = os.path.join(dirname, "test.games")
+    tc.assertRaisesRegexp(RingmasterError, "no game store",
+                          ringmaster.export_games)
+    game_stores.append_game(ringmaster.game_store_pathname, "0_000",
+                            sgf.Sgf_game(9))
+    # The filenames come from get_sgf_filename()
+    ringmaster.get_sgf_filename = lambda game_id: "game-%s.sgf" % game_id
+    tc.assertEqual(ringmaster.export_games(), 1)
+    tc.assertEqual(os.listdir(ringmaster.sgf_dir_pathname),
+                   ["game-0_000.sgf"])
 
 def test_stderr_settings(tc):
     fx = Ringmaster_fixture(tc, playoff_ctl, [
@@ -305,9 +338,9 @@ def test_run(tc):
         fx.messages('screen_report'),
         ["p1 v p2 (3/400 games)\n"
          "board size: 9   komi: 7.5\n"
-         "     wins                   avg cpu\n"
-         "p1      3 100.00%   (black)  546.20\n"
-         "p2      0   0.00%   (white)  567.20"])
+         "     wins                   avg cpu  max rss\n"
+         "p1      3 100.00%   (black)  546.20   546.0MB\n"
+         "p2      0   0.00%   (white)  567.20   567.0MB"])
     tc.assertMultiLineEqual(
         fx.get_log(),
         "run started at *** with max_games 3\n"
@@ -476,9 +509,9 @@ def test_status_roundtrip(tc):
         fx2.messages('screen_report'),
         ["p1 v p2 (3/400 games)\n"
          "board size: 9   komi: 7.5\n"
-         "     wins                   avg cpu\n"
-         "p1      3 100.00%   (black)  546.20\n"
-         "p2      0   0.00%   (white)  567.20"])
+         "     wins                   avg cpu  max rss\n"
+         "p1      3 100.00%   (black)  546.20   546.0MB\n"
+         "p2      0   0.00%   (white)  567.20   567.0MB"])
 
 def test_status(tc):
     # Construct suitable competition status
@@ -506,9 +539,9 @@ def test_status(tc):
         fx.messages('screen_report'),
         ["p1 v p2 (3/400 games)\n"
          "board size: 9   komi: 7.5\n"
-         "     wins                   avg cpu\n"
-         "p1      3 100.00%   (black)  546.20\n"
-         "p2      0   0.00%   (white)  567.20"])
+         "     wins                   avg cpu  max rss\n"
+         "p1      3 100.00%   (black)  546.20   546.0MB\n"
+         "p2      0   0.00%   (white)  567.20   567.0MB"])
 
     fx.ringmaster.set_test_status((-1, status.copy()))
     tc.assertRaisesRegexp(
@@ -565,6 +598,6 @@ def test_no_cpu_time(tc):
         fx.messages('screen_report'),
         ["p1 v p2 (3/400 games)\n"
          "board size: 9   komi: 7.5\n"
-         "     wins\n"
-         "p1      3 100.00%   (black)\n"
-         "p2      0   0.00%   (white)"])
+         "     wins                   max rss\n"
+         "p1      3 100.00%   (black)  546.0MB\n"
+         "p2      0   0.00%   (white)  567.0MB"])
@@ -12,11 +12,20 @@ test_modules = [
     'sgf_properties_tests',
     'sgf_tests',
     'sgf_moves_tests',
+    'sgf_index_tests',
+    'compact_game_file_tests',
+    'sgf_array_tests',
+    'game_fingerprint_tests',
+    'position_index_tests',
+    'game_store_tests',
     'gameplay_tests',
     'gtp_engine_tests',
     'gtp_state_tests',
     'gtp_controller_tests',
     'gtp_proxy_tests',
+    'gtp_server_tests',
+    'opening_book_tests',
+    'genmove_cache_tests',
     'gtp_game_tests',
     'game_job_tests',
     'setting_tests',
@@ -0,0 +1,116 @@
+"""Tests for sgf_arrays.py."""
+
+from textwrap import dedent
+
+from gomill_tests import gomill_test_support
+
+from gomill import sgf
+
+try:
+    import numpy
+    from gomill import sgf_arrays
+except ImportError:
+    numpy = None
+
+def make_tests(suite):
+    suite.addTests(gomill_test_support.make_simple_tests(globals()))
+
+def check_numpy_available(tc):
+    if numpy is None:
+        tc.skipTest("numpy not available")
+
+
+SAMPLE_SGF = dedent(r"""
+(;FF[4]CA[UTF-8]GM[1]SZ[9]AB[ai][bh]AW[ee]C[root comment]
+;B[dg]C[first \] move]
+;W[ef]
+;C[no move here]
+;B[]C[pass]
+;W[cc]
+(;B[aa])(;B[bb]))
+""")
+
+def test_game_to_arrays(tc):
+    check_numpy_available(tc)
+    sgf_game = sgf.Sgf_game.from_string(SAMPLE_SGF)
+    arrays = sgf_game.to_arrays()
+    tc.assertEqual(sorted(arrays.keys()),
+                   ['comment_data', 'comment_offsets', 'moves', 'setup'])
+    tc.assertEqual(arrays['moves'].dtype, numpy.int8)
+    tc.assertEqual(arrays['moves'].tolist(), [
+        [0, 2, 3],
+        [1, 3, 4],
+        [0, -1, -1],
+        [1, 6, 2],
+        [0, 8, 0],
+        ])
+    tc.assertEqual(arrays['setup'].dtype, numpy.int8)
+    tc.assertEqual(arrays['setup'].tolist(), [
+        [0, 0, 0],
+        [0, 1, 1],
+        [1, 4, 4],
+        ])
+    tc.assertEqual(arrays['comment_offsets'].dtype, numpy.int32)
+    tc.assertEqual(arrays['comment_offsets'].tolist(),
+                   [0, 12, 12, 16, 16, 16])
+    tc.assertEqual(arrays['comment_data'].dtype, numpy.uint8)
+    tc.assertEqual(arrays['comment_data'].tostring(), "first ] movepass")
+
+def test_game_to_arrays_empty(tc):
+    check_numpy_available(tc)
+    arrays = sgf.Sgf_game(19).to_arrays()
+    tc.assertEqual(arrays['moves'].shape, (0, 3))
+    tc.assertEqual(arrays['setup'].shape, (0, 3))
+    tc.assertEqual(arrays['comment_offsets'].tolist(), [0])
+    tc.assertEqual(arrays['comment_data'].shape, (0,))
+
+def test_game_to_arrays_errors(tc):
+    check_numpy_available(tc)
+    sgf_game = sgf.Sgf_game.from_string("(;SZ[9];B[aa];AB[bb])")
+    tc.assertRaisesRegexp(ValueError, "setup properties after the root node",
+                          sgf_game.to_arrays)
+
+def test_from_arrays(tc):
+    check_numpy_available(tc)
+    sgf_game = sgf.Sgf_game.from_string(SAMPLE_SGF)
+    arrays = sgf_game.to_arrays()
+    game2 = sgf.Sgf_game.from_arrays(9, **arrays)
+    tc.assertEqual(game2.serialise(wrap=None),
+                   "(;FF[4]AB[ai][bh]AW[ee]CA[UTF-8]GM[1]SZ[9];B[dg]"
+                   "C[first \\] move];W[ef];B[tt]C[pass];W[cc];B[aa])\n")
+    tc.assertEqual(game2.get_size(), 9)
+    arrays2 = game2.to_arrays()
+    for key in arrays:
+        tc.assertEqual(arrays2[key].tolist(), arrays[key].tolist())
+
+    game3 = sgf.Sgf_game.from_arrays(
+        19, numpy.array([[0, 3, 3], [1, 15, 15]], dtype=numpy.int8))
+    tc.assertEqual(game3.serialise(wrap=None),
+                   "(;FF[4]CA[UTF-8]GM[1]SZ[19];B[dp];W[pd])\n")
+
+def test_from_arrays_errors(tc):
+    check_numpy_available(tc)
+    tc.assertRaisesRegexp(ValueError, "size out of range: 27",
+                          sgf.Sgf_game.from_arrays, 27, [])
+    tc.assertRaisesRegexp(ValueError, r"moves array must have shape \(n, 3\)",
+                          sgf.Sgf_game.from_arrays, 9, [[0, 1]])
+    tc.assertRaisesRegexp(ValueError, "bad colour code: 2",
+                          sgf.Sgf_game.from_arrays, 9, [[2, 1, 1]])
+    tc.assertRaisesRegexp(ValueError, r"point out of range: \(9, 1\)",
+                          sgf.Sgf_game.from_arrays, 9, [[0, 9, 1]])
+    tc.assertRaisesRegexp(ValueError, "pass in setup stones",
+                          sgf.Sgf_game.from_arrays, 9, [], [[0, -1, -1]])
+    tc.assertRaisesRegexp(
+        ValueError, "comment_offsets must have one more entry than moves",
+        sgf.Sgf_game.from_arrays, 9, [[0, 1, 1]], None, [0])
+
+def test_records_to_arrays(tc):
+    check_numpy_available(tc)
+    arrays = sgf_arrays.records_to_arrays(
+        [('b', (2, 2)), ('b', (6, 6))],
+        [('w', (3, 4), "hello"), ('b', None, None), ('w', (0, 0), "")])
+    tc.assertEqual(arrays['setup'].tolist(), [[0, 2, 2], [0, 6, 6]])
+    tc.assertEqual(arrays['moves'].tolist(),
+                   [[1, 3, 4], [0, -1, -1], [1, 0, 0]])
+    tc.assertEqual(arrays['comment_offsets'].tolist(), [0, 5, 5, 5])
+    tc.assertEqual(arrays['comment_data'].tostring(), "hello")
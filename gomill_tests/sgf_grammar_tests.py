@@ -2,6 +2,8 @@
 
 from __future__ import with_statement
 
+import os
+
 from gomill_tests import gomill_test_support
 
 from gomill import sgf_grammar
@@ -229,6 +231,10 @@ def test_parser_tree_structure(tc):
                           parse_sgf_game, "(;B[ag](;W[ah];)B[ai])")
     tc.assertRaisesRegexp(ValueError, "property value outside a node",
                           parse_sgf_game, "(;B[ag](;W[ah])(B[ai]))")
+    tc.assertRaisesRegexp(ValueError, "property with no values",
+                          parse_sgf_game, "(;B[ag](B))")
+    tc.assertRaisesRegexp(ValueError, "unexpected end of SGF data",
+                          parse_sgf_game, "(;B[ag](;W[ah])(B")
 
 def test_parser_properties(tc):
     parse_sgf_game = sgf_grammar.parse_sgf_game
@@ -247,6 +253,9 @@ def test_parser_properties(tc):
     tc.assertEqual(props("(;XX[1]YY[2]XX[3]YY[4])"),
                    [{'XX': ['1', '3'], 'YY' : ['2', '4']}])
 
+    tc.assertEqual(props("(;AddBlack[ai]AB[bh]AdB[ee];Black[bc])"),
+                   [{'AB': ['ai', 'bh', 'ee']}, {'B': ['bc']}])
+
 def test_parse_sgf_collection(tc):
     parse_sgf_collection = sgf_grammar.parse_sgf_collection
 
@@ -283,6 +292,96 @@ def test_parse_sgf_collection(tc):
                    "error parsing game 1: unexpected end of SGF data")
 
 
+def test_iter_sgf_collection(tc):
+    def write(s):
+        pathname = os.path.join(tc.sandbox(), "collection.sgf")
+        f = open(pathname, "wb")
+        f.write(s)
+        f.close()
+        return pathname
+
+    pathname = write("dummy (;X[1];X[2];X[3](;B[bc])) junk (;Y[1];Y[2]) Nonsense")
+    results = list(sgf_grammar.iter_sgf_collection(pathname))
+    tc.assertEqual(len(results), 2)
+    tc.assertEqual([(start, end) for (_, start, end) in results],
+                   [(6, 31), (37, 49)])
+    tc.assertEqual(len(results[0][0].sequence), 3)
+    tc.assertEqual(results[1][0].sequence, [{'Y' : ['1']}, {'Y' : ['2']}])
+
+    pathname = write("")
+    tc.assertRaisesRegexp(ValueError, "no SGF data found",
+                          list, sgf_grammar.iter_sgf_collection(pathname))
+    pathname = write("()")
+    tc.assertRaisesRegexp(ValueError, "no SGF data found",
+                          list, sgf_grammar.iter_sgf_collection(pathname))
+
+    pathname = write("(( (;X[1];X[2];X[3](;B[bc])) ();) (;Y[1];Y[2]")
+    games = sgf_grammar.iter_sgf_collection(pathname)
+    game_tree, start, end = games.next()
+    tc.assertEqual(len(game_tree.sequence), 3)
+    with tc.assertRaises(ValueError) as ar:
+        games.next()
+    tc.assertEqual(str(ar.exception),
+                   "error parsing game 1: unexpected end of SGF data")
+
+    tc.assertRaises(EnvironmentError, sgf_grammar.iter_sgf_collection,
+                    os.path.join(tc.sandbox(), "nonexistent.sgf"))
+
+def test_iter_game_ranges(tc):
+    def ranges(s, start_position=0):
+        return list(sgf_grammar.iter_game_ranges(s, start_position))
+    s = "dummy (;X[1];X[2];X[3](;B[bc])) junk (;Y[1];Y[2]) Nonsense"
+    tc.assertEqual(ranges(s), [(6, 31), (37, 49)])
+    tc.assertEqual(ranges(s, 31), [(37, 49)])
+    tc.assertEqual(ranges(""), [])
+    tc.assertEqual(ranges("()"), [])
+    # Parentheses in PropValues are ignored
+    s = r"(;C[a ) b \] ( c]PB[\\](;B[aa]C[)])(;B[bb]))(;C[(])"
+    tc.assertEqual(ranges(s), [(0, 44), (44, 51)])
+    tc.assertEqual(
+        [(start, end) for (_, start, end)
+         in sgf_grammar.iter_sgf_collection(
+             gomill_test_support.write_file(tc.sandbox(), "a.sgf", s))],
+        [(0, 44), (44, 51)])
+    # The contents of the games aren't checked
+    tc.assertEqual(ranges("(;B[aa]#)"), [(0, 9)])
+
+    games = sgf_grammar.iter_game_ranges("(;X[1](;B[aa])(;B[bb])) (;Y[1];Y[2]")
+    tc.assertEqual(games.next(), (0, 23))
+    with tc.assertRaises(ValueError) as ar:
+        games.next()
+    tc.assertEqual(str(ar.exception), "unexpected end of SGF data")
+    for s in ["(;C[x])(;C[x)", "(;C[x\\])", "(;C[x]\\"]:
+        tc.assertRaisesRegexp(ValueError, "unexpected end of SGF data",
+                              ranges, s)
+
+def test_scan_main_sequence(tc):
+    scan = sgf_grammar.scan_main_sequence
+    tc.assertEqual(
+        scan("junk ( ;SZ[9]C[x];B[ab]C[y] (\n;W[bc]C[z\\]](;B[cd])(;B[dd]))"
+             "(;B[ee]) ;AddBlack[aa][bb:cc]\n[dd];W[])",
+             set(['B', 'W', 'AB', 'SZ'])),
+        [(0, 'SZ', ['9']), (1, 'B', ['ab']), (2, 'W', ['bc']),
+         (3, 'B', ['cd'])])
+    tc.assertEqual(
+        scan("(;SZ[9];B[ab];AddBlack[aa][bb:cc]\n[dd]aB[;(])",
+             set(['B', 'AB'])),
+        [(1, 'B', ['ab']), (2, 'AB', ['aa', 'bb:cc', 'dd']), (2, 'B', [';('])])
+    tc.assertEqual(scan("(;;C[x];)", set(['B'])), [])
+
+    def check_error(s, message):
+        tc.assertRaisesRegexp(ValueError, message, scan, s, set(['B']))
+    check_error("", "no SGF data found")
+    check_error("(;B[ab];W[bc]", "unexpected end of SGF data")
+    check_error("(;B[ab];W[bc](", "unexpected end of SGF data")
+    check_error("(;B[ab]();W[bc])", "empty sequence")
+    check_error("(;B[ab](W[bc]))", "property value outside a node")
+    check_error("(;B[ab];W)", "property with no values")
+    check_error("(;B[ab];[bc])", "unexpected value")
+    # not in the main sequence
+    tc.assertEqual(scan("(;B[ab](;W[bc])(;W))", set(['B'])),
+                   [(0, 'B', ['ab'])])
+
 def test_parse_compose(tc):
     pc = sgf_grammar.parse_compose
     tc.assertEqual(pc("word"), ("word", None))
@@ -377,3 +476,40 @@ def test_serialise_game_tree(tc):
     tc.assertEqual(sgf_grammar.serialise_game_tree(coarse_game, wrap=None),
                    serialised.replace("\n", "")+"\n")
 
+
+def test_write_pieces(tc):
+    coarse_game = sgf_grammar.parse_sgf_game(
+        "(;AB[aa][ab][ac]C[comment \xa3];W[ab];C[];C[]"
+        "(;B[bc])(;B[bd];W[ca](;B[da])(;B[db];W[ea])))")
+    pieces = list(sgf_grammar.iter_game_tree_pieces(coarse_game))
+    tc.assertEqual(pieces[:5], ["(", ";", "AB[aa][ab][ac]", "C[comment \xa3]",
+                                ";"])
+    for wrap in [None, 79, 10, 1, 0]:
+        written = []
+        sgf_grammar.write_pieces(iter(pieces), written.append, wrap)
+        tc.assertEqual("".join(written),
+                       sgf_grammar.serialise_game_tree(coarse_game, wrap))
+    written = []
+    sgf_grammar.write_pieces(["(", ";", "C[%s]" % ("x" * 100000), ")", "\n"],
+                             written.append)
+    tc.assertEqual(len(written), 2)
+
+def test_iter_node_tree_pieces(tc):
+    coarse_game = sgf_grammar.parse_sgf_game(
+        "(;AB[aa][ab][ac]C[comment \xa3];W[ab];C[];C[]"
+        "(;B[bc])(;B[bd];W[ca](;B[da])(;B[db];W[ea])))")
+    class Node(object):
+        # make_tree() mustn't need any other attributes
+        __slots__ = ('properties', 'children')
+        def __init__(self, properties):
+            self.properties = properties
+            self.children = []
+    root = Node(None)
+    sgf_grammar.make_tree(coarse_game, root,
+                          lambda parent, properties: Node(properties),
+                          lambda parent, child: parent.children.append(child))
+    root.properties = coarse_game.sequence[0]
+    tc.assertEqual(
+        list(sgf_grammar.iter_node_tree_pieces(
+            root, lambda node: node.children, lambda node: node.properties)),
+        list(sgf_grammar.iter_game_tree_pieces(coarse_game)))
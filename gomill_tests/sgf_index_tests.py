@@ -0,0 +1,125 @@
+"""Tests for sgf_indexes.py."""
+
+from __future__ import with_statement
+
+import os
+
+from gomill_tests import gomill_test_support
+
+from gomill import sgf_indexes
+
+def make_tests(suite):
+    suite.addTests(gomill_test_support.make_simple_tests(globals()))
+
+
+GAME1 = "(;SZ[9]PB[Black one]PW[White one]RE[W+R];B[ee];W[cg];B[];W[gc])"
+GAME2 = "(;SZ[19]PB[Black two]RE[B+3.5];B[dd](;W[pp])(;W[pd];B[dp]))"
+GAME3 = "(;SZ[9]PW[White one]RE[W+T];B[ee])"
+
+def write_collection(tc, s, mode="wb"):
+    pathname = os.path.join(tc.sandbox(), "collection.sgf")
+    with open(pathname, mode) as f:
+        f.write(s)
+    return pathname
+
+def test_index(tc):
+    pathname = write_collection(tc, "junk\n" + GAME1 + "\n" + GAME2 + "\n")
+    index = sgf_indexes.Sgf_collection_index(pathname)
+    tc.assertEqual(index.index_pathname, pathname + ".idx")
+    tc.assertEqual(index.update(), 2)
+    tc.assertTrue(os.path.exists(pathname + ".idx"))
+    game1, game2 = index.games
+    tc.assertEqual(game1._as_tuple(),
+                   (0, 5, len(GAME1), 9, "Black one", "White one", "W+R",
+                    'w', 4))
+    tc.assertEqual(game2._as_tuple(),
+                   (1, 6 + len(GAME1), len(GAME2), 19, "Black two", None,
+                    "B+3.5", 'b', 2))
+    tc.assertEqual(index.get_game_data(1), GAME2)
+    sgf_game = index.load_game(0)
+    tc.assertEqual(sgf_game.get_player_name('w'), "White one")
+    tc.assertRaises(IndexError, index.load_game, 2)
+
+def test_find_games(tc):
+    pathname = write_collection(tc, GAME1 + GAME2 + GAME3)
+    index = sgf_indexes.get_collection_index(pathname)
+    tc.assertEqual([game.number for game in index.find_games(size=9)],
+                   [0, 2])
+    tc.assertEqual([game.number for game in index.find_games(winner='b')],
+                   [1])
+    tc.assertEqual([game.number for game in
+                    index.find_games(size=9, white_player="White one",
+                                     black_player="Black one")],
+                   [0])
+    tc.assertEqual(len(index.find_games()), 3)
+    tc.assertEqual(index.find_games(size=13), [])
+
+def test_incremental_update(tc):
+    pathname = write_collection(tc, GAME1)
+    index = sgf_indexes.get_collection_index(pathname)
+    tc.assertEqual(len(index.games), 1)
+    with open(pathname, "ab") as f:
+        f.write("\n" + GAME2 + GAME3)
+    index2 = sgf_indexes.Sgf_collection_index(pathname)
+    tc.assertEqual(index2.update(), 2)
+    tc.assertEqual([game.number for game in index2.games], [0, 1, 2])
+    tc.assertEqual(index2.get_game_data(2), GAME3)
+    tc.assertEqual(index2.update(), 0)
+    index3 = sgf_indexes.Sgf_collection_index(pathname)
+    tc.assertEqual(index3.update(), 0)
+    tc.assertEqual(len(index3.games), 3)
+
+def test_rebuild_after_change(tc):
+    pathname = write_collection(tc, GAME1 + GAME2)
+    sgf_indexes.get_collection_index(pathname)
+    write_collection(tc, GAME3 + GAME2)
+    index = sgf_indexes.Sgf_collection_index(pathname)
+    tc.assertEqual(index.update(), 2)
+    tc.assertEqual(index.games[0].move_count, 1)
+    write_collection(tc, GAME3)
+    tc.assertEqual(index.update(), 1)
+    tc.assertEqual(len(index.games), 1)
+
+def test_same_length_change(tc):
+    padding = "\n" * 10000
+    pathname = write_collection(tc, GAME1 + padding + GAME2)
+    tc.assertEqual(sgf_indexes.get_collection_index(pathname).games[0].size, 9)
+    st = os.stat(pathname)
+    # Same length, and well before the end of the indexed data
+    write_collection(tc, GAME1.replace("SZ[9]", "SZ[7]") + padding + GAME2)
+    os.utime(pathname, (st.st_atime, st.st_mtime + 10))
+    index = sgf_indexes.Sgf_collection_index(pathname)
+    tc.assertEqual(index.update(), 2)
+    tc.assertEqual(index.games[0].size, 7)
+
+def test_touched_collection(tc):
+    pathname = write_collection(tc, GAME1 + GAME2)
+    sgf_indexes.get_collection_index(pathname)
+    st = os.stat(pathname)
+    os.utime(pathname, (st.st_atime, st.st_mtime + 10))
+    index = sgf_indexes.Sgf_collection_index(pathname)
+    tc.assertEqual(index.update(), 0)
+    tc.assertEqual(len(index.games), 2)
+    # The index file was rewritten with the new modification time
+    index2 = sgf_indexes.Sgf_collection_index(pathname)
+    tc.assertEqual(index2.update(), 0)
+    tc.assertFalse(index2._signature_changed)
+    tc.assertIsNone(index2._scanned_md5)
+
+def test_bad_index_file(tc):
+    pathname = write_collection(tc, GAME1)
+    with open(pathname + ".idx", "wb") as f:
+        f.write("nonsense")
+    index = sgf_indexes.get_collection_index(pathname)
+    tc.assertEqual(len(index.games), 1)
+    index2 = sgf_indexes.Sgf_collection_index(pathname)
+    tc.assertEqual(index2.update(), 0)
+
+def test_bad_collection(tc):
+    pathname = write_collection(tc, GAME1 + "(;SZ[0])")
+    with tc.assertRaises(ValueError) as ar:
+        sgf_indexes.get_collection_index(pathname)
+    tc.assertEqual(str(ar.exception), "error in game 1: size out of range: 0")
+    pathname = write_collection(tc, GAME1 + "(;B[ee]")
+    tc.assertRaisesRegexp(ValueError, "error parsing game 1",
+                          sgf_indexes.get_collection_index, pathname)
@@ -111,6 +111,77 @@ def test_get_setup_and_moves_board_provided(tc):
     tc.assertRaisesRegexp(ValueError, "wrong board size, must be 9$",
                           sgf_moves.get_setup_and_moves, g1, b2)
 
+def test_read_compact_game(tc):
+    game = sgf_moves.read_compact_game(SAMPLE_SGF)
+    tc.assertEqual(game.size, 9)
+    tc.assertEqual(game.komi, 7.5)
+    tc.assertIsNone(game.handicap)
+    tc.assertEqual(game.result, "W+R")
+    tc.assertEqual(list(game.black_setup), [0, 10, 40])
+    tc.assertEqual(list(game.white_setup), [59, 60])
+    game2 = sgf_moves.read_compact_game("(;SZ[9]AB[aa][bb]AE[aa];B[cc])")
+    tc.assertEqual(list(game2.black_setup), [64])
+    tc.assertEqual(list(game2.white_setup), [])
+    tc.assertEqual(game.move_colours, "bwbw")
+    tc.assertEqual(game.move_points.typecode, 'h')
+    tc.assertEqual(list(game.move_points), [21, 31, -1, -1])
+    board1, plays1 = game.get_setup_and_moves()
+    tc.assertBoardEqual(board1, DIAGRAM1)
+    tc.assertEqual(plays1,
+                   [('b', (2, 3)), ('w', (3, 4)), ('b', None), ('w', None)])
+    b = boards.Board(9)
+    board2, plays2 = game.get_setup_and_moves(b)
+    tc.assertIs(board2, b)
+    tc.assertRaisesRegexp(ValueError, "board not empty",
+                          game.get_setup_and_moves, b)
+
+def test_read_compact_game_matches_sgf_game(tc):
+    for s in [
+        SAMPLE_SGF,
+        "(;SZ[26]HA[2]AB[aa:bb];W[zz](;B[ab];W[];B[tt])(;B[cc]))",
+        "(;B[ab]C[move in root];W[ba])",
+        "(;SZ[9];B[ab]W[cc];W[bc]B[dd];W[ba]W[ab];Black[ee]AddWhite[])",
+        "(;SZ[9]  ;B[ab]  ( ;W[bc]) ( ;B[cd]))",
+        "(;SZ[9]AB[aa][bb]AE[aa];B[cc])",
+        "(;SZ[9]AB[aa]AW[bb]AE[aa][bb];B[cc])",
+        "(;SZ[9]AE[aa];B[cc])",
+        "(;SZ[9]AE[aa]B[cc])",
+        ]:
+        sgf_game = sgf.Sgf_game.from_string(s)
+        try:
+            expected = sgf_moves.get_setup_and_moves(sgf_game)
+        except ValueError:
+            expected = None
+        try:
+            game = sgf_moves.read_compact_game(s)
+            result = game.get_setup_and_moves()
+        except ValueError:
+            result = None
+        if expected is None or result is None:
+            tc.assertIs(expected, result, s)
+        else:
+            tc.assertEqual(result[0].list_occupied_points(),
+                           expected[0].list_occupied_points(), s)
+            tc.assertEqual(result[1], expected[1], s)
+
+def test_read_compact_game_errors(tc):
+    def check(s, message):
+        tc.assertRaisesRegexp(ValueError, message,
+                              sgf_moves.read_compact_game, s)
+    check("(;SZ[9]AB[aa];B[aa]W[ab];AW[bb])",
+          "setup properties after the root node")
+    check("(;SZ[9]AB[aa]B[bb])", "mixed setup and moves in root node")
+    check("(;SZ[9];B[ab];W[jj])", "^bad W property: jj$")
+    check("(;SZ[9]KM[x];B[ab])", "^bad KM property$")
+    check("(;SZ[9]HA[1];B[ab])", "^bad HA property: 1$")
+    check("(;SZ[27];B[ab])", "size out of range: 27")
+    check("(;SZ[9];B[ab];W)", "property with no values")
+    check("junk", "no SGF data found")
+    # errors outside the main sequence aren't detected
+    game = sgf_moves.read_compact_game("(;SZ[9];B[ab](;W[bb])(;W[ba]W))")
+    tc.assertEqual(game.move_colours, "bw")
+
+
 
 def test_set_initial_position(tc):
     board = ascii_boards.interpret_diagram(DIAGRAM1, 9)
@@ -139,3 +210,61 @@ def test_indicate_first_player(tc):
     tc.assertEqual(g4.serialise(),
                    "(;FF[4]GM[1]SZ[9];C[no game])\n")
 
+
+def test_position_cache(tc):
+    sgf_game = sgf.Sgf_game.from_string(
+        "(;SZ[9]AB[ai];B[bh];W[ee]"
+        "(;B[aa];W[ab];AE[ee]AW[gc];B[fc])"
+        "(;B[ba];W[bi]))")
+    cache = sgf_moves.Position_cache(sgf_game, interval=2)
+    main_sequence = sgf_game.get_main_sequence()
+    board = cache.position_at(main_sequence[2])
+    tc.assertEqual(board.list_occupied_points(),
+                   [('b', (0, 0)), ('b', (1, 1)), ('w', (4, 4))])
+    # checkpoints at depths 0 and 2
+    tc.assertEqual(len(cache), 2)
+    board.play(8, 8, 'w')
+    tc.assertIsNone(cache.position_at(main_sequence[2]).get(8, 8))
+    board = cache.position_at(main_sequence[-1])
+    tc.assertEqual(sorted(board.list_occupied_points()),
+                   [('b', (0, 0)), ('b', (1, 1)), ('b', (6, 5)),
+                    ('b', (8, 0)), ('w', (6, 6)), ('w', (7, 0))])
+    tc.assertEqual(len(cache), 4)
+    variation_node = sgf_game.get_root()[0][0][1][0]
+    board = cache.position_at(variation_node)
+    tc.assertEqual(sorted(board.list_occupied_points()),
+                   [('b', (0, 0)), ('b', (1, 1)), ('b', (8, 1)),
+                    ('w', (0, 1)), ('w', (4, 4))])
+    cache.clear()
+    tc.assertEqual(len(cache), 0)
+    tc.assertEqual(cache.position_at(variation_node), board)
+
+    other_game = sgf.Sgf_game(9)
+    tc.assertRaisesRegexp(ValueError, "node doesn't belong to this game",
+                          cache.position_at, other_game.get_root())
+
+def test_position_cache_errors(tc):
+    sgf_game = sgf.Sgf_game.from_string(
+        "(;SZ[9];B[aa];W[bb];B[bb];W[cc])")
+    cache = sgf_moves.Position_cache(sgf_game, interval=1)
+    node = sgf_game.get_last_node()
+    tc.assertRaisesRegexp(ValueError, "illegal move",
+                          cache.position_at, node)
+    # Positions before the bad move were still recorded
+    tc.assertEqual(len(cache), 3)
+    tc.assertRaisesRegexp(ValueError, "interval must be at least 1",
+                          sgf_moves.Position_cache, sgf_game, interval=0)
+
+def test_position_cache_discards_checkpoints(tc):
+    moves = "".join(";B[%s%s]" % ("abcdefghi"[i % 9], "abcdefghi"[i // 9])
+                    for i in range(60))
+    sgf_game = sgf.Sgf_game.from_string("(;SZ[9]%s)" % moves)
+    cache = sgf_moves.Position_cache(sgf_game, interval=1, max_checkpoints=8)
+    main_sequence = sgf_game.get_main_sequence()
+    for node in main_sequence:
+        board = cache.position_at(node)
+        tc.assertTrue(len(cache) <= 8)
+    tc.assertEqual(len(board.list_occupied_points()), 60)
+    # The most recent checkpoints are kept
+    tc.assertIn(main_sequence[-1], cache._checkpoints)
+    tc.assertNotIn(main_sequence[1], cache._checkpoints)
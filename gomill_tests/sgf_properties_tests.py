@@ -157,6 +157,25 @@ def test_serialise_move(tc):
     tc.assertRaises(ValueError, serialise_move, (0, -1), 9)
     tc.assertRaises(TypeError, serialise_move, (1, 1.5), 9)
 
+def test_go_point_tables(tc):
+    # The lookup tables agree with the implementation without them
+    for size in xrange(1, 27):
+        for row in xrange(size):
+            for col in xrange(size):
+                s = sgf_properties._serialise_go_point((row, col), size)
+                tc.assertEqual(
+                    sgf_properties.serialise_go_point((row, col), size), s)
+                tc.assertEqual(sgf_properties.interpret_go_point(s, size),
+                               (row, col))
+                tc.assertEqual(sgf_properties._interpret_go_point(s, size),
+                               (row, col))
+        tc.assertEqual(sgf_properties.serialise_go_point(None, size),
+                       sgf_properties._serialise_go_point(None, size))
+    tc.assertEqual(sgf_properties.serialise_go_point((0, 25), 26), "zz")
+    tc.assertEqual(sgf_properties.serialise_go_point((25, 25), 26), "za")
+    tc.assertEqual(sgf_properties.interpret_go_point("za", 26), (25, 25))
+    tc.assertRaises(ValueError, sgf_properties.serialise_go_point, (0, 0), 27)
+
 def test_interpret_point(tc):
     def interpret_point(s, size):
         context = sgf_properties._Context(size, "UTF-8")
@@ -274,6 +293,43 @@ def test_serialise_point_list(tc):
                    set([(1,2), (3,4), (4,5)]))
     tc.assertRaises(ValueError, spl, [(18, 0), None], 19)
 
+def test_serialise_compressed_point_list(tc):
+    def ipl(l, size):
+        context = sgf_properties._Context(size, "UTF-8")
+        return sgf_properties.interpret_point_list(l, context)
+    def scpl(l, size):
+        context = sgf_properties._Context(size, "UTF-8")
+        return sgf_properties.serialise_compressed_point_list(l, context)
+
+    tc.assertEqual(scpl([], 9), [])
+    tc.assertEqual(scpl([(8, 0)], 9), ['aa'])
+    tc.assertEqual(scpl([(18, 0), (16, 1)], 19), ['aa', 'bc'])
+    tc.assertEqual(scpl([(16, 0), (16, 1), (17, 0), (17, 1)], 19), ['ab:bc'])
+    # A column
+    tc.assertEqual(scpl([(6, 0), (7, 0), (8, 0)], 9), ['aa:ac'])
+    # the spec example; the greedy choice isn't the same as the spec's
+    points = ipl(["aa:bi", "ca:ce"], 9)
+    tc.assertEqual(scpl(points, 9), ['aa:ce', 'af:bi'])
+    tc.assertEqual(ipl(scpl(points, 9), 9), points)
+    # An L shape
+    points = set([(8, 0), (8, 1), (8, 2), (7, 0), (6, 0)])
+    tc.assertEqual(scpl(points, 9), ['aa:ca', 'ab:ac'])
+    tc.assertEqual(ipl(scpl(points, 9), 9), points)
+    whole_board = set((row, col) for row in range(19) for col in range(19))
+    tc.assertEqual(scpl(whole_board, 19), ['aa:ss'])
+    tc.assertEqual(ipl(scpl(whole_board, 19), 19), whole_board)
+    tc.assertRaises(ValueError, scpl, [(18, 0), None], 19)
+    tc.assertRaises(ValueError, scpl, [(18, 0), (19, 0)], 19)
+
+    presenter = sgf_properties.Presenter(19, "UTF-8")
+    presenter.register_property('AB', sgf_properties.Property_type(
+        sgf_properties.interpret_point_list,
+        sgf_properties.serialise_compressed_point_list,
+        uses_list=True))
+    tc.assertEqual(
+        presenter.serialise('AB', [(16, 0), (16, 1), (17, 0), (17, 1)]),
+        ['ab:bc'])
+
 
 def test_AP(tc):
     def serialise(arg):
@@ -3,11 +3,13 @@
 
 from __future__ import with_statement
 
+from cStringIO import StringIO
 from textwrap import dedent
 
 from gomill_tests import gomill_test_support
 
 from gomill import sgf
+from gomill import sgf_properties
 
 def make_tests(suite):
     suite.addTests(gomill_test_support.make_simple_tests(globals()))
@@ -296,6 +298,41 @@ def test_serialise_wrap(tc):
     tc.assertEqual(map(str, sgf_game.get_main_sequence()),
                    map(str, sgf_game2.get_main_sequence()))
 
+def test_write(tc):
+    def write(sgf_game, **kwargs):
+        f = StringIO()
+        sgf_game.write(f, **kwargs)
+        return f.getvalue()
+
+    # unexpanded game
+    sgf_game = sgf.Sgf_game.from_string(SAMPLE_SGF_VAR)
+    tc.assertEqual(write(sgf_game), sgf_game.serialise())
+    tc.assertEqual(write(sgf_game, wrap=None), sgf_game.serialise(wrap=None))
+    tc.assertEqual(write(sgf_game, wrap=5), sgf_game.serialise(wrap=5))
+    # expanded and modified game
+    sgf_game.get_root()[0].new_child().set_move('b', (3, 3))
+    sgf_game.get_root()[0].set("C", "x" * 100)
+    sgf_game.get_last_node().set("C", "long" * 50000)
+    for wrap in [79, None, 0, 30]:
+        tc.assertEqual(write(sgf_game, wrap=wrap),
+                       sgf_game.serialise(wrap=wrap))
+    tc.assertEqual(write(sgf.Sgf_game(9)), sgf.Sgf_game(9).serialise())
+
+def test_write_transcoding(tc):
+    g1 = sgf.Sgf_game.from_string("""
+    (;FF[4]C[£]CA[utf-8]GM[1]SZ[19];C[Δ])
+    """)
+    g1.get_root().set("CA", "latin-1")
+    f = StringIO()
+    tc.assertRaises(UnicodeEncodeError, g1.write, f)
+    g1.get_root()[0].set("C", "£")
+    f = StringIO()
+    g1.write(f)
+    tc.assertEqual(f.getvalue(), g1.serialise())
+    g1.get_root().set("CA", "unknown")
+    tc.assertRaisesRegexp(ValueError, r"unsupported charset: \['unknown']",
+                          g1.write, f)
+
 def test_encoding(tc):
     g1 = sgf.Sgf_game(19)
     tc.assertEqual(g1.get_charset(), "UTF-8")
@@ -492,6 +529,34 @@ def test_tree_new_child_with_unexpanded_root_and_index(tc):
     tc.assertEqual(sgf_game.serialise(),
                    "(;SZ[9](;N[n1];N[n3])(;N[n2])(;N[n4]))\n")
 
+def test_lazy_expansion(tc):
+    sgf_game = sgf.Sgf_game.from_string(
+        "(;SZ[9];N[n1](;N[n2];N[n3])(;N[n4](;N[n5])(;N[n6]))(;N[n7]))")
+    root = sgf_game.get_root()
+    n1 = root[0]
+    n4 = n1[1]
+    tc.assertEqual(n4.get("N"), "n4")
+    # Nodes are only built when their parent is visited
+    tc.assertFalse(n1._is_unexpanded())
+    tc.assertTrue(n1[0]._is_unexpanded())
+    tc.assertTrue(n4._is_unexpanded())
+    tc.assertEqual([node.get("N") for node in n4], ["n5", "n6"])
+    tc.assertIs(n1[1][1], n4[1])
+    tc.assertEqual(n1.index(n4), 1)
+    tc.assertEqual(len(n1[2]), 0)
+    # Unexpanded nodes can be changed and moved
+    n1[0][0].new_child().set("N", "n8")
+    n4[0].reparent(n1[2], 0)
+    n1[0].delete()
+    tc.assertEqual(sgf_game.serialise(),
+                   "(;SZ[9];N[n1](;N[n4];N[n6])(;N[n7];N[n5]))\n")
+
+def test_nodes_have_slots(tc):
+    sgf_game = sgf.Sgf_game.from_string("(;SZ[9];N[n1])")
+    root = sgf_game.get_root()
+    for node in [root, root[0], list(sgf_game.main_sequence_iter())[0]]:
+        tc.assertRaises(AttributeError, setattr, node, 'xyzzy', 1)
+
 def test_reparent(tc):
     g1 = sgf.Sgf_game.from_string("(;SZ[9](;N[n1];N[n3])(;N[n2]))")
     root = g1.get_root()
@@ -712,6 +777,78 @@ def test_node_aliasing(tc):
     plain_node.set_raw_list('XX', ["1", "2", "3"])
     tc.assertEqual(tree_node.get_raw_list('XX'), ["1", "2", "3"])
 
+def test_value_cache(tc):
+    sgf.reset_value_cache_stats()
+    tc.addCleanup(sgf.reset_value_cache_stats)
+    sgf_game = sgf.Sgf_game.from_string(
+        "(;SZ[9]AB[aa][bb]C[first];B[cc];W[])")
+    root = sgf_game.get_root()
+    tc.assertEqual(root.get("C"), "first")
+    tc.assertEqual(root.get("C"), "first")
+    tc.assertEqual(sgf.get_value_cache_stats(), (1, 2))
+    # Returned sets are fresh copies
+    ab = root.get("AB")
+    ab.add((4, 4))
+    tc.assertEqual(root.get("AB"), set([(8, 0), (7, 1)]))
+    tc.assertEqual(sgf.get_value_cache_stats(), (2, 4))
+    root.set("C", "second")
+    tc.assertEqual(root.get("C"), "second")
+    root.unset("C")
+    tc.assertRaises(KeyError, root.get, "C")
+    root.set_raw("C", "third")
+    tc.assertEqual(root.get("C"), "third")
+    # Changes to the property type are noticed
+    presenter = sgf_game.get_property_presenter()
+    presenter.register_property("C", presenter.get_property_type("SZ"))
+    tc.assertRaises(ValueError, root.get, "C")
+    presenter.register_property("C", presenter.get_property_type("GN"))
+
+    node = root[0]
+    tc.assertEqual(node.get_move(), ('b', (6, 2)))
+    tc.assertEqual(node.get_move(), ('b', (6, 2)))
+    node.set_move('w', (0, 0))
+    tc.assertEqual(node.get_move(), ('w', (0, 0)))
+    tc.assertEqual(node[0].get_move(), ('w', None))
+    # Changes made via another Node sharing the property map are noticed
+    plain_node = sgf.Node(node.get_raw_property_map(), node.get_presenter())
+    plain_node.set_move('b', (1, 1))
+    tc.assertEqual(node.get_move(), ('b', (1, 1)))
+    tc.assertEqual(node.get("B"), (1, 1))
+    plain_node.set("B", (2, 2))
+    tc.assertEqual(node.get("B"), (2, 2))
+
+    sgf.reset_value_cache_stats()
+    sgf.set_value_cache_enabled(False)
+    tc.addCleanup(sgf.set_value_cache_enabled, True)
+    tc.assertEqual(node.get("B"), (2, 2))
+    tc.assertEqual(node.get_move(), ('b', (2, 2)))
+    tc.assertEqual(sgf.get_value_cache_stats(), (0, 0))
+
+def test_value_cache_presenter_subclass(tc):
+    class Upper_presenter(sgf_properties.Presenter):
+        def interpret(self, identifier, raw_values):
+            result = sgf_properties.Presenter.interpret(
+                self, identifier, raw_values)
+            if identifier == "C":
+                result = result.upper()
+            return result
+    class Uncached_presenter(Upper_presenter):
+        def get_cache_key(self, identifier):
+            return None
+    sgf.reset_value_cache_stats()
+    tc.addCleanup(sgf.reset_value_cache_stats)
+    node = sgf.Node({'C' : ["comment"], 'AB' : ["aa"]},
+                    Upper_presenter(9, "UTF-8"))
+    tc.assertEqual(node.get("C"), "COMMENT")
+    tc.assertEqual(node.get("C"), "COMMENT")
+    tc.assertEqual(node.get("AB"), set([(8, 0)]))
+    tc.assertEqual(sgf.get_value_cache_stats(), (1, 3))
+    sgf.reset_value_cache_stats()
+    node = sgf.Node({'C' : ["comment"]}, Uncached_presenter(9, "UTF-8"))
+    tc.assertEqual(node.get("C"), "COMMENT")
+    tc.assertEqual(node.get("C"), "COMMENT")
+    tc.assertEqual(sgf.get_value_cache_stats(), (0, 0))
+
 def test_node_set(tc):
     sgf_game = sgf.Sgf_game.from_string("(;FF[4]GM[1]SZ[9])")
     root = sgf_game.get_root()
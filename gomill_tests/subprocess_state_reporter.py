@@ -2,6 +2,9 @@
 
 This is used by gtp_controller_tests.test_subprocess_channel
 
+Normally it exits after responding to a single command. With the --persist
+option, it responds to commands until it receives 'quit'.
+
 This mustn't import any gomill or gomill_tests code.
 
 """
@@ -9,11 +12,20 @@ import sys
 import os
 
 def main():
+    persist = (sys.argv[1:] == ["--persist"])
     sys.stderr.write("subprocess_state_reporter: testing\n")
-    # Read the GTP command
-    sys.stdin.readline()
-    sys.stdout.write("= cwd: %s\nGOMILL_TEST:%s\n\n" %
-                     (os.getcwd(), os.environ.get("GOMILL_TEST")))
+    while True:
+        # Read the GTP command
+        command = sys.stdin.readline()
+        if persist and command.strip() == "quit":
+            sys.stdout.write("=\n\n")
+            sys.stdout.flush()
+            break
+        sys.stdout.write("= cwd: %s\nGOMILL_TEST:%s\n\n" %
+                         (os.getcwd(), os.environ.get("GOMILL_TEST")))
+        sys.stdout.flush()
+        if not persist or not command:
+            break
 
 if __name__ == "__main__":
     main()